@@ -1,7 +1,15 @@
-"""AI provider factory: real Gemini, or a deterministic offline fake."""
+"""AI provider factory: real Gemini, a recorded cassette, or a deterministic
+offline fake."""
+import logging
+
 from ..config import get_settings
+from ..schemas import CVData
 from .base import AIProvider
 
+log = logging.getLogger(__name__)
+
+_warned_unrecorded = False
+
 
 def get_provider(byok_key: str | None = None) -> AIProvider:
     settings = get_settings()
@@ -9,14 +17,53 @@ def get_provider(byok_key: str | None = None) -> AIProvider:
         from .gemini import GeminiProvider
 
         return GeminiProvider(api_key=byok_key)
+    if settings.ai_replaying:
+        from .replay import ReplayProvider, cassette
+
+        return ReplayProvider(
+            cassette(settings.cvg_replay_cassette), latency_scale=settings.cvg_replay_latency_scale,
+        )
     if settings.ai_enabled:
         from .gemini import GeminiProvider
 
         # Vertex mode wins for server traffic: service-account auth and
         # pay-as-you-go quotas instead of the key's free-tier daily cap.
         if settings.gemini_use_vertex:
-            return GeminiProvider(api_key=None)
-        return GeminiProvider(api_key=settings.gemini_api_key)
+            provider = GeminiProvider(api_key=None)
+        else:
+            provider = GeminiProvider(api_key=settings.gemini_api_key)
+        if settings.cvg_replay_cassette:
+            from .replay import ReplayProvider, cassette
+
+            return ReplayProvider(cassette(settings.cvg_replay_cassette), inner=provider)
+        return provider
+    if settings.cvg_replay_cassette:
+        # Record mode with nothing real to record from: say so once instead
+        # of leaving an empty cassette to be discovered after the run.
+        global _warned_unrecorded
+        if not _warned_unrecorded:
+            _warned_unrecorded = True
+            log.warning(
+                "CVG_REPLAY_MODE=record but no Gemini key or Vertex is configured: "
+                "nothing is recorded to %s", settings.cvg_replay_cassette,
+            )
     from .fake import FakeProvider
 
     return FakeProvider()
+
+
+async def release_prompt_cache(master_data: dict) -> None:
+    """A master CV was edited or deleted: drop the server's explicit prompt
+    caches built from its old content (ai/ctxcache.py). Only server Gemini
+    traffic creates them; best effort, they expire on their own."""
+    provider = get_provider()
+    release = getattr(provider, "release_context", None)
+    if release is None:
+        return
+    try:
+        dropped = await release(CVData.model_validate(master_data))
+    except Exception:
+        log.warning("prompt cache release failed", exc_info=True)
+        return
+    if dropped:
+        log.info("released %d prompt cache entries for a changed master CV", dropped)
@@ -1,8 +1,14 @@
 """Provider protocol. Every method returns validated pydantic objects —
-the LLM never emits raw markup, only structured data."""
+the LLM never emits raw markup, only structured data.
+
+The three generation methods accept an optional on_progress callback; when
+given, the provider streams the response and calls it after every chunk
+(see stream.StreamProgress). The return value is validated either way."""
+from contextvars import ContextVar
 from typing import Protocol
 
 from ..schemas import CVData, JobAnalysis, LetterData
+from .stream import ProgressCallback
 
 
 class AIError(Exception):
@@ -13,21 +19,36 @@ class AIError(Exception):
         self.byok = byok
 
 
+# Models that answered a call in this context other than the one cache_tag
+# names (a lite fallback or hedge), appended by the provider. Shared caches
+# set a fresh list around a call and do not file its answer when it fills.
+off_tag_answers: ContextVar[list[str] | None] = ContextVar("ai_off_tag_answers", default=None)
+
+
 class AIProvider(Protocol):
+    # Which model's answers this provider gives (Gemini model name, "fake",
+    # "replay:<cassette>"); shared caches key on it, so a fake or replayed
+    # answer is never served where a real one was asked for.
+    cache_tag: str
+
     async def analyze(self, jd: str, cv_text: str, language: str) -> JobAnalysis: ...
 
     async def parse_cv(self, raw_text: str | None, pdf_bytes: bytes | None, language: str) -> CVData: ...
 
     async def tailor_cv(
         self, jd: str, analysis: JobAnalysis, master: CVData, language: str,
-        rewrite_intensity: str = "major",
+        rewrite_intensity: str = "major", on_progress: ProgressCallback | None = None,
     ) -> CVData: ...
 
     async def write_letter(
-        self, jd: str, analysis: JobAnalysis, cv: CVData, language: str
+        self, jd: str, analysis: JobAnalysis, cv: CVData, language: str,
+        on_progress: ProgressCallback | None = None,
     ) -> LetterData: ...
 
-    async def outreach(self, jd: str, analysis: JobAnalysis, cv: CVData, language: str) -> str: ...
+    async def outreach(
+        self, jd: str, analysis: JobAnalysis, cv: CVData, language: str,
+        on_progress: ProgressCallback | None = None,
+    ) -> str: ...
 
     async def edit_cv_data(self, cv: CVData, instruction: str, language: str) -> CVData: ...
 
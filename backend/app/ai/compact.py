@@ -0,0 +1,118 @@
+"""Compact serialization of prompt inputs.
+
+`model_dump_json(indent=1)` spent input tokens on whitespace and on every
+empty field of the schema (a typical master CV carries dozens of "" and []),
+and each experience/education item repeated the same long key names. Prompt
+inputs now drop empty fields, use no indentation, and, for read-only context
+(the master CV the generation prompts work from), abbreviate keys with a
+legend. Documents the model must return in the same schema (the edit
+prompts) keep their real key names: only empties and whitespace go.
+
+GEMINI_COMPACT_PROMPTS=0 restores the verbose form, which is what
+backend/evals/eval_prompt_compaction.py compares against.
+"""
+import json
+import re
+
+from pydantic import BaseModel
+
+from ..config import get_settings
+
+# Schema keys worth abbreviating: the ones repeated per list item or long.
+# Contact keys stay spelled out; they are few and self-describing. That
+# rules out "location", which Contacts shares with the list items.
+SHORT_KEYS = {
+    "full_name": "fn",
+    "headline": "hl",
+    "contacts": "ct",
+    "summary": "sm",
+    "experience": "xp",
+    "education": "ed",
+    "skills": "sk",
+    "projects": "pj",
+    "languages": "lg",
+    "interests": "ir",
+    "certifications": "ce",
+    "title": "t",
+    "company": "co",
+    "start": "s",
+    "end": "e",
+    "bullets": "b",
+    "degree": "dg",
+    "school": "sc",
+    "details": "dt",
+    "category": "cat",
+    "items": "it",
+    "description": "ds",
+    "tech": "tc",
+    "level": "lv",
+    "issuer": "is",
+    "year": "y",
+}
+
+_SPACES = re.compile(r"[ \t ]+")
+_BLANK_LINES = re.compile(r"\n\s*\n\s*\n+")
+
+
+def prune(value):
+    """Drop None, empty strings, empty lists and empty dicts, recursively."""
+    if isinstance(value, dict):
+        pruned = {k: prune(v) for k, v in value.items()}
+        return {k: v for k, v in pruned.items() if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        pruned = [prune(v) for v in value]
+        return [v for v in pruned if v not in (None, "", [], {})]
+    return value
+
+
+def _shorten(value, used: set[str]):
+    if isinstance(value, dict):
+        out = {}
+        for key, v in value.items():
+            short = SHORT_KEYS.get(key)
+            if short is not None:
+                used.add(key)
+            out[short or key] = _shorten(v, used)
+        return out
+    if isinstance(value, list):
+        return [_shorten(v, used) for v in value]
+    return value
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def enabled() -> bool:
+    return get_settings().gemini_compact_prompts
+
+
+def context_json(model: BaseModel) -> str:
+    """Read-only prompt context: pruned, unindented, abbreviated keys with a
+    legend line the prompt carries along. A short CV does not repeat its
+    keys often enough to pay for the legend; it keeps the real names."""
+    if not enabled():
+        return model.model_dump_json(indent=1)
+    data = prune(model.model_dump())
+    plain = _dumps(data)
+    used: set[str] = set()
+    short = _dumps(_shorten(data, used))
+    legend = ", ".join(f"{SHORT_KEYS[key]}={key}" for key in SHORT_KEYS if key in used)
+    abbreviated = f"(keys abbreviated: {legend})\n{short}"
+    return abbreviated if legend and len(abbreviated) < len(plain) else plain
+
+
+def document_json(model: BaseModel) -> str:
+    """A document the model edits and returns in the same schema: pruned and
+    unindented, real key names."""
+    if not enabled():
+        return model.model_dump_json(indent=1)
+    return _dumps(prune(model.model_dump()))
+
+
+def text(value: str) -> str:
+    """Free text (job descriptions): collapse runs of spaces and blank lines."""
+    if not enabled():
+        return value
+    lines = (_SPACES.sub(" ", line).strip() for line in value.strip().splitlines())
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines))
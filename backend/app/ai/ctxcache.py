@@ -0,0 +1,193 @@
+"""Prompt-prefix caching for the generation calls.
+
+tailor/letter/outreach prompts are split into a stable prefix (instructions +
+master CV) and a per-posting suffix (prompts.*_parts), so a 10-posting batch
+repeats one prefix per method instead of sending the master CV 30 times.
+GeminiProvider registers each prefix as explicit cached content, once per
+credential and model, and later calls send only the suffix. Handles carry
+the master-CV hash they were built from and expire with their TTL; editing
+or deleting a master CV releases its handles early.
+
+TokenLedger counts prompt tokens as cached or billed (fed by ai/usage.py).
+Gemini reports cached tokens in its usage metadata; the FakeProvider asks
+LocalPrefixCache, a stand-in with the same TTL semantics, so the saving is
+measurable offline.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+
+from google.genai import errors as genai_errors
+from google.genai import types
+
+log = logging.getLogger(__name__)
+
+# Gemini refuses to cache fewer input tokens than this (model-dependent,
+# 1024 for the flash family); shorter prefixes are simply sent inline.
+_MIN_CACHE_TOKENS = 1024
+# Stop handing out a handle this long before it expires server-side.
+_REFRESH_MARGIN_S = 60.0
+_MAX_HANDLES = 512
+# A create that failed for any other reason than the API refusing the prefix
+# (a 503, a timeout) is retried after this long rather than after the TTL.
+_RETRY_AFTER_S = 60.0
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4
+
+
+def digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+@dataclass
+class TokenLedger:
+    """Process-wide prompt token counts: cached tokens are billed at the
+    discounted rate, the rest at full price."""
+
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    calls: int = 0
+
+    @property
+    def billed_tokens(self) -> int:
+        return self.prompt_tokens - self.cached_tokens
+
+    def record(self, prompt: int, cached: int) -> None:
+        self.prompt_tokens += prompt
+        self.cached_tokens += min(cached, prompt)
+        self.calls += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "billed_tokens": self.billed_tokens,
+        }
+
+    def reset(self) -> None:
+        self.prompt_tokens = self.cached_tokens = self.calls = 0
+
+
+ledger = TokenLedger()
+
+
+class LocalPrefixCache:
+    """Offline stand-in for provider-side caching: a prefix seen within the
+    TTL counts as cached, exactly as a live cache handle would."""
+
+    def __init__(self) -> None:
+        self._expires: dict[str, float] = {}
+
+    def account(self, prefix: str, ttl_s: float) -> int:
+        """Prompt tokens a call sending this prefix would get from cache."""
+        now = time.monotonic()
+        key = digest(prefix)
+        hit = ttl_s > 0 and self._expires.get(key, 0.0) > now
+        cacheable = estimate_tokens(prefix) >= _MIN_CACHE_TOKENS
+        if ttl_s > 0 and cacheable and not hit:
+            self._expires[key] = now + ttl_s
+        return estimate_tokens(prefix) if hit else 0
+
+    def clear(self) -> None:
+        self._expires.clear()
+
+
+local = LocalPrefixCache()
+
+
+@dataclass
+class _Handle:
+    name: str
+    master_hash: str
+    expires_at: float
+
+
+class ContextCacheRegistry:
+    """Explicit-cache handles keyed by (credential id, model, prefix digest).
+    Creation is deduplicated: a batch's parallel jobs share one create call,
+    and a prefix the API refused is sent inline until its TTL passes (a
+    transient failure: for _RETRY_AFTER_S)."""
+
+    def __init__(self) -> None:
+        self._handles: dict[tuple[str, str, str], _Handle] = {}
+        self._refused: dict[tuple[str, str, str], float] = {}
+        self._pending: dict[tuple[str, str, str], asyncio.Future] = {}
+
+    async def handle(self, client, cred: str, model: str, prefix: str, master_hash: str, ttl_s: float) -> str | None:
+        """Name of a live cached-content entry for this prefix, or None to
+        send the prefix inline."""
+        if ttl_s <= 0 or estimate_tokens(prefix) < _MIN_CACHE_TOKENS:
+            return None
+        key = (cred, model, digest(prefix))
+        now = time.monotonic()
+        entry = self._handles.get(key)
+        if entry is not None and entry.expires_at - _REFRESH_MARGIN_S > now:
+            return entry.name
+        if self._refused.get(key, 0.0) > now:
+            return None
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._create(client, model, prefix, master_hash, ttl_s))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        try:
+            # shield: one caller's cancellation (a lost hedge) must not abort
+            # the create the others are waiting on.
+            name = await asyncio.shield(pending)
+        except Exception as exc:
+            log.info("context cache unavailable on %s (%s); sending the prefix inline", model, exc)
+            self._refused[key] = now + (ttl_s if _refusal(exc) else min(ttl_s, _RETRY_AFTER_S))
+            return None
+        if len(self._handles) >= _MAX_HANDLES:
+            for stale in [k for k, h in self._handles.items() if h.expires_at <= now]:
+                del self._handles[stale]
+        self._handles[key] = _Handle(name, master_hash, now + ttl_s)
+        return name
+
+    def forget(self, name: str) -> None:
+        """Drop a handle the API no longer recognizes."""
+        for key in [k for k, h in self._handles.items() if h.name == name]:
+            del self._handles[key]
+
+    async def release(self, client, cred: str, master_hash: str) -> int:
+        """Delete this credential's entries built from one master CV (it was
+        edited or deleted: they would only bill storage until their TTL).
+        Returns how many were dropped."""
+        keys = [k for k, h in self._handles.items() if k[0] == cred and h.master_hash == master_hash]
+        for key in keys:
+            name = self._handles.pop(key).name
+            try:
+                await client.aio.caches.delete(name=name)
+            except Exception as exc:  # it expires on its own anyway
+                log.info("could not delete context cache %s: %s", name, exc)
+        return len(keys)
+
+    async def _create(self, client, model: str, prefix: str, master_hash: str, ttl_s: float) -> str:
+        cache = await client.aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                contents=[types.Content(role="user", parts=[types.Part(text=prefix)])],
+                ttl=f"{int(ttl_s)}s",
+                display_name=f"cvg-{master_hash[:16]}",
+            ),
+        )
+        return cache.name
+
+    def clear(self) -> None:
+        self._handles.clear()
+        self._refused.clear()
+        self._pending.clear()
+
+
+def _refusal(exc: Exception) -> bool:
+    """The API rejected caching this prefix (unsupported model, too small,
+    not allowed): asking again within the TTL gets the same answer."""
+    return isinstance(exc, genai_errors.APIError) and getattr(exc, "code", 0) in (400, 403, 404)
+
+
+registry = ContextCacheRegistry()
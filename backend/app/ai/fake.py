@@ -4,6 +4,9 @@ instead of smart, but the contracts are identical."""
 import asyncio
 import re
 
+from pydantic import BaseModel
+
+from ..config import get_settings
 from ..schemas import (
     Contacts,
     CVData,
@@ -14,6 +17,8 @@ from ..schemas import (
     LetterRecipient,
     SkillGroup,
 )
+from . import compact, ctxcache, prompts, usage
+from .stream import ProgressCallback, StreamProgress
 
 _TECH_HINTS = [
     "python", "java", "typescript", "javascript", "react", "node", "sql", "postgres",
@@ -27,10 +32,44 @@ _EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")
 _PHONE = re.compile(r"(?:\+?\d[\d ()./-]{7,}\d)")
 
 
+_STREAM_CHUNK = 48  # characters per fake stream chunk
+
+
 class FakeProvider:
+    cache_tag = "fake"
+
+    def __init__(self, stream: bool = False):
+        """stream=True replays generation results as chunked output through
+        on_progress, exercising the streaming path without a network."""
+        self._stream = stream
+
     async def _tick(self):
         await asyncio.sleep(0.01)
 
+    def _account(self, method: str, prompt: str | tuple[str, str], output) -> None:
+        """Report the tokens the real provider would spend: the prompt it
+        would send (a (prefix, suffix) pair goes through the local
+        prefix-cache stand-in) and the output, estimated at 4 chars/token."""
+        prefix, suffix = prompt if isinstance(prompt, tuple) else ("", prompt)
+        cached = ctxcache.local.account(prefix, get_settings().gemini_context_cache_minutes * 60.0) if prefix else 0
+        text = output.model_dump_json() if isinstance(output, BaseModel) else str(output)
+        usage.record(
+            method, ctxcache.estimate_tokens(prefix + suffix), ctxcache.estimate_tokens(text), cached,
+        )
+
+    async def _streamed(self, value, on_progress: ProgressCallback | None):
+        if not self._stream or on_progress is None:
+            return value
+        is_model = isinstance(value, BaseModel)
+        payload = value.model_dump_json() if is_model else value
+        progress = StreamProgress(type(value).model_fields if is_model else ())
+        for i in range(0, len(payload), _STREAM_CHUNK):
+            await asyncio.sleep(0)
+            progress.feed(payload[i:i + _STREAM_CHUNK])
+            on_progress(progress)
+        # Same contract as the real stream: the assembled text is what counts.
+        return type(value).model_validate_json(progress.text) if is_model else progress.text
+
     async def analyze(self, jd: str, cv_text: str, language: str) -> JobAnalysis:
         await self._tick()
         low = jd.lower()
@@ -49,7 +88,7 @@ class FakeProvider:
         m = re.search(r"(?:chez|at|company:|société)\s+([A-Z][\w&. -]{2,40})", jd)
         if m:
             company = m.group(1).strip()
-        return JobAnalysis(
+        analysis = JobAnalysis(
             job_title=title,
             company=company,
             language_detected=(
@@ -60,6 +99,8 @@ class FakeProvider:
             keywords=keywords,
             notes="Deterministic offline analysis (no API key configured).",
         )
+        self._account("analyze", prompts.analyze_prompt(compact.text(jd), cv_text), analysis)
+        return analysis
 
     async def parse_cv(self, raw_text: str | None, pdf_bytes: bytes | None, language: str) -> CVData:
         await self._tick()
@@ -90,22 +131,37 @@ class FakeProvider:
 
     async def tailor_cv(
         self, jd: str, analysis: JobAnalysis, master: CVData, language: str,
-        rewrite_intensity: str = "major",
+        rewrite_intensity: str = "major", on_progress: ProgressCallback | None = None,
     ) -> CVData:
         await self._tick()
         tailored = master.model_copy(deep=True)
         terms = [k.term for k in analysis.keywords][:8]
         if terms:
             tailored.skills = [SkillGroup(category="Key match", items=terms)] + tailored.skills
-        if rewrite_intensity == "reshape":
-            return tailored
-        target = analysis.job_title if analysis.job_title != "Job Application" else "this role"
-        prefix = {"fr": "Profil ciblé : ", "de": "Zielprofil: "}.get(language, "Targeted profile: ")
-        tailored.summary = f"{prefix}{target}. {master.summary}"[:500]
-        return tailored
-
-    async def write_letter(self, jd: str, analysis: JobAnalysis, cv: CVData, language: str) -> LetterData:
+        if rewrite_intensity != "reshape":
+            target = analysis.job_title if analysis.job_title != "Job Application" else "this role"
+            prefix = {"fr": "Profil ciblé : ", "de": "Zielprofil: "}.get(language, "Targeted profile: ")
+            tailored.summary = f"{prefix}{target}. {master.summary}"[:500]
+        self._account("tailor_cv", prompts.tailor_cv_parts(
+            compact.text(jd), analysis.notes, [k.term for k in analysis.keywords],
+            compact.context_json(master), language, rewrite_intensity,
+        ), tailored)
+        return await self._streamed(tailored, on_progress)
+
+    async def write_letter(
+        self, jd: str, analysis: JobAnalysis, cv: CVData, language: str,
+        on_progress: ProgressCallback | None = None,
+    ) -> LetterData:
         await self._tick()
+        letter = self._letter(analysis, language)
+        self._account(
+            "write_letter",
+            prompts.letter_parts(compact.text(jd), analysis.notes, compact.context_json(cv), language),
+            letter,
+        )
+        return await self._streamed(letter, on_progress)
+
+    def _letter(self, analysis: JobAnalysis, language: str) -> LetterData:
         company = analysis.company or {
             "fr": "votre entreprise", "de": "Ihr Unternehmen",
         }.get(language, "your company")
@@ -145,27 +201,38 @@ class FakeProvider:
             closing="Yours sincerely,",
         )
 
-    async def outreach(self, jd: str, analysis: JobAnalysis, cv: CVData, language: str) -> str:
+    async def outreach(
+        self, jd: str, analysis: JobAnalysis, cv: CVData, language: str,
+        on_progress: ProgressCallback | None = None,
+    ) -> str:
         await self._tick()
         if language == "de":
-            return (
+            text = (
                 f"Guten Tag, ich habe mich soeben auf die Position {analysis.job_title} beworben. "
                 "Mein Profil passt eng zu Ihren Anforderungen. Hätten Sie 15 Minuten für ein kurzes Gespräch?"
             )
-        if language == "fr":
-            return (
+        elif language == "fr":
+            text = (
                 f"Bonjour, je viens de postuler au poste de {analysis.job_title}. "
                 "Mon profil correspond étroitement à vos besoins. Seriez-vous disponible pour un échange de 15 minutes ?"
             )
-        return (
-            f"Hi, I just applied for the {analysis.job_title} role. "
-            "My background matches the requirements closely; open to a quick 15-minute chat?"
+        else:
+            text = (
+                f"Hi, I just applied for the {analysis.job_title} role. "
+                "My background matches the requirements closely; open to a quick 15-minute chat?"
+            )
+        self._account(
+            "outreach", prompts.outreach_parts(compact.text(jd), compact.context_json(cv), language), text,
         )
+        return await self._streamed(text, on_progress)
 
     async def edit_cv_data(self, cv: CVData, instruction: str, language: str) -> CVData:
         await self._tick()
         edited = cv.model_copy(deep=True)
         edited.summary = (edited.summary + f" [edited: {instruction[:60]}]").strip()
+        self._account(
+            "edit_cv_data", prompts.edit_cv_prompt(compact.document_json(cv), instruction, language), edited,
+        )
         return edited
 
     async def edit_letter_data(self, letter: LetterData, instruction: str, language: str) -> LetterData:
@@ -173,6 +240,10 @@ class FakeProvider:
         edited = letter.model_copy(deep=True)
         if edited.paragraphs:
             edited.paragraphs[-1] = (edited.paragraphs[-1] + f" [edited: {instruction[:60]}]").strip()
+        self._account(
+            "edit_letter_data",
+            prompts.edit_letter_prompt(compact.document_json(letter), instruction, language), edited,
+        )
         return edited
 
     async def edit_source(self, source: str, instruction: str) -> str:
@@ -1,8 +1,11 @@
 """Gemini provider — modern google-genai SDK, async, schema-enforced output."""
 import asyncio
+import hashlib
 import json
 import logging
 import re
+import time
+from collections import OrderedDict
 from typing import TypeVar
 
 from google import genai
@@ -12,14 +15,36 @@ from pydantic import BaseModel
 
 from ..config import get_settings
 from ..schemas import CVData, JobAnalysis, LetterData
-from . import prompts
-from .base import AIError
+from . import compact, ctxcache, health, prompts, usage
+from .base import AIError, off_tag_answers
+from .ratelimit import CredentialLimiter, limiter_for
+from .stream import ProgressCallback, StreamProgress
 
 log = logging.getLogger(__name__)
 T = TypeVar("T", bound=BaseModel)
 
 _TIMEOUT = 90
 _MAX_RETRY_SLEEP = 65.0
+# Seconds of model time a call may spend across all its attempts (rate-limit
+# queueing excluded). One slow call holds the whole job and its
+# job_concurrency slot, so the quick, small-output methods get tight budgets.
+_BUDGETS = {
+    "analyze": 40.0,
+    "outreach": 30.0,
+    "parse_cv": 120.0,
+    "tailor_cv": 120.0,
+    "write_letter": 75.0,
+    "edit_cv_data": 90.0,
+    "edit_letter_data": 60.0,
+    "edit_source": 90.0,
+    "repair_source": 90.0,
+    "edit_message": 30.0,
+}
+# Methods whose output the lite model handles acceptably: they fall back to it
+# on primary errors or an open breaker, and hedge to it when slow. The CV
+# rewrite and parsing stay on the primary model.
+_LITE_TOLERANT = {"analyze", "outreach", "write_letter", "edit_letter_data", "edit_message"}
+_UNHEALTHY = (500, 502, 503, 504)
 
 # Google's 429s carry the wait time two ways: a RetryInfo detail
 # ("'retryDelay': '28.3s'") and prose ("Please retry in 28.343756161s").
@@ -37,23 +62,124 @@ def _retry_delay_seconds(exc: Exception) -> float | None:
     return None
 
 
+def _record_usage(method: str, metadata) -> None:
+    """Report a response's usage metadata (prompt, response and cached token
+    counts) for accounting."""
+    prompt = getattr(metadata, "prompt_token_count", None)
+    if isinstance(prompt, int):
+        usage.record(
+            method, prompt,
+            getattr(metadata, "candidates_token_count", None) or 0,
+            getattr(metadata, "cached_content_token_count", None) or 0,
+        )
+
+
+def _credential_id(api_key: str) -> str:
+    """Pool/cache key for an API key. Only this digest is ever used as a key
+    or shown in logs; the raw key lives solely inside its genai.Client."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:32]
+
+
+class _ClientPool:
+    """genai.Client instances reused across requests: each owns HTTP
+    connection pools, so building one per call redid TCP+TLS setup on every
+    chat edit. Server credentials (Vertex, the configured key) are kept for
+    the process lifetime; BYOK clients expire after an idle TTL and the
+    least recently used is dropped beyond a size cap. A dropped client's
+    transports are closed once the calls that may still hold it are done."""
+
+    BYOK_IDLE_S = 600.0
+    BYOK_MAX = 64
+    # A provider keeps its own reference to its client, so an evicted one can
+    # still be mid-call: longer than any call's budget plus a 429 pause.
+    RETIRE_AFTER_S = 300.0
+
+    def __init__(self) -> None:
+        self._server: dict[str, genai.Client] = {}
+        self._byok: OrderedDict[str, tuple[genai.Client, float]] = OrderedDict()
+        self._closing: set[asyncio.Task] = set()
+
+    def server(self, cred: str, factory) -> genai.Client:
+        client = self._server.get(cred)
+        if client is None:
+            client = self._server[cred] = factory()
+        return client
+
+    def byok(self, api_key: str) -> genai.Client:
+        now = time.monotonic()
+        for cid, (old, last_used) in list(self._byok.items()):
+            if now - last_used > self.BYOK_IDLE_S:
+                del self._byok[cid]
+                self._retire(old)
+        cid = _credential_id(api_key)
+        entry = self._byok.pop(cid, None)
+        client = entry[0] if entry is not None else genai.Client(api_key=api_key)
+        self._byok[cid] = (client, now)
+        while len(self._byok) > self.BYOK_MAX:
+            self._retire(self._byok.popitem(last=False)[1][0])
+        return client
+
+    def _retire(self, client: genai.Client) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:  # no loop: nothing can be mid-call on it
+            client.close()
+            return
+
+        def close() -> None:
+            task = loop.create_task(self._close(client))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+        loop.call_later(self.RETIRE_AFTER_S, close)
+
+    @staticmethod
+    async def _close(client: genai.Client) -> None:
+        try:
+            client.close()
+            await client.aio.aclose()
+        except Exception as exc:  # noqa: BLE001 — best effort, it is unreachable anyway
+            log.info("closing a retired Gemini client failed: %s", exc)
+
+    def clear(self) -> None:
+        self._server.clear()
+        self._byok.clear()
+
+
+_pool = _ClientPool()
+
+# validate_key outcomes per credential id: (ok, monotonic expiry). A failure
+# is kept only briefly: it may have been a timeout rather than a bad key.
+_VALIDATED_OK_S = 600.0
+_VALIDATED_FAIL_S = 30.0
+_validated: dict[str, tuple[bool, float]] = {}
+
+
 class GeminiProvider:
     def __init__(self, api_key: str | None):
         """api_key=None -> Vertex AI via the runtime service account (server
-        traffic); a key -> AI Studio API (BYOK, or a key-configured server)."""
+        traffic); a key -> AI Studio API (BYOK, or a key-configured server).
+        The underlying client comes from the process-wide pool."""
         settings = get_settings()
+        self._cred: str
         if api_key:
             self._byok = api_key != settings.gemini_api_key
-            self._client = genai.Client(api_key=api_key)
+            self._cred = _credential_id(api_key)
+            if self._byok:
+                self._client = _pool.byok(api_key)
+            else:
+                self._client = _pool.server(f"key:{self._cred}", lambda: genai.Client(api_key=api_key))
         else:
             self._byok = False
-            self._client = genai.Client(
-                vertexai=True,
-                project=settings.gcp_project or None,
-                location=settings.gcp_location or "global",
+            project, location = settings.gcp_project or None, settings.gcp_location or "global"
+            self._cred = f"vertex:{project}:{location}"
+            self._client = _pool.server(
+                self._cred,
+                lambda: genai.Client(vertexai=True, project=project, location=location),
             )
         self._model = settings.gemini_model
         self._model_lite = settings.gemini_model_lite
+        self.cache_tag = self._model
 
     # -- low level -----------------------------------------------------------
     def _translate_error(self, exc: Exception) -> AIError:
@@ -76,54 +202,197 @@ class GeminiProvider:
             return AIError("The AI took too long to respond. Try again.", byok=self._byok)
         return AIError("Unexpected AI failure. Try again.", byok=self._byok)
 
-    async def _generate(self, contents, *, schema: type[T] | None = None, lite: bool = False, attempts_left: int = 2):
-        model = self._model_lite if lite else self._model
+    async def _request(
+        self, model: str, contents, config, schema: type[T] | None, on_progress: ProgressCallback | None,
+        method: str = "",
+    ) -> tuple[str | None, object | None]:
+        """One model call -> (text, parsed). Streams when someone is listening
+        for progress; a streamed response is only parsed at the end."""
+        if on_progress is None:
+            resp = await self._client.aio.models.generate_content(model=model, contents=contents, config=config)
+            _record_usage(method, getattr(resp, "usage_metadata", None))
+            return resp.text, resp.parsed
+        progress = StreamProgress(schema.model_fields if schema is not None else ())
+        stream = await self._client.aio.models.generate_content_stream(
+            model=model, contents=contents, config=config
+        )
+        metadata = None
+        async for chunk in stream:
+            metadata = getattr(chunk, "usage_metadata", None) or metadata
+            progress.feed(chunk.text or "", tokens=getattr(metadata, "candidates_token_count", None))
+            on_progress(progress)
+        _record_usage(method, metadata)
+        return progress.text, None
+
+    async def _cached_prefix(self, model: str, prefix: str, master_hash: str) -> str | None:
+        """Explicit cache handle for a prompt prefix. Server credentials only:
+        a BYOK key's cache storage would bill the user, and free-tier keys
+        cannot create caches. BYOK still gets the provider's implicit prefix
+        caching, since the prefix comes first."""
+        minutes = get_settings().gemini_context_cache_minutes
+        if self._byok or minutes <= 0:
+            return None
+        return await ctxcache.registry.handle(self._client, self._cred, model, prefix, master_hash, minutes * 60.0)
+
+    async def release_context(self, master: CVData) -> int:
+        """Drop the explicit caches built from this master CV's prefix."""
+        if self._byok:
+            return 0
+        digest = ctxcache.digest(compact.context_json(master))
+        return await ctxcache.registry.release(self._client, self._cred, digest)
+
+    async def _timed(
+        self, model: str, method: str, contents, config, schema: type[T] | None,
+        on_progress: ProgressCallback | None, prefix: str | None = None, master_hash: str = "",
+    ) -> tuple[str | None, object | None]:
+        """_request, feeding the model's breaker and latency window. A prompt
+        prefix goes by cache handle when one is live, else inline."""
+        started = time.monotonic()
+        cached = await self._cached_prefix(model, prefix, master_hash) if prefix is not None else None
+        try:
+            if cached is not None:
+                with_cache = (config or types.GenerateContentConfig()).model_copy(update={"cached_content": cached})
+                result = await self._request(model, contents, with_cache, schema, on_progress, method)
+            else:
+                result = await self._request(model, (prefix or "") + contents, config, schema, on_progress, method)
+        except genai_errors.APIError as exc:
+            code = getattr(exc, "code", 0)
+            if cached is not None and code in (400, 403, 404):
+                # The handle expired or was deleted server-side: resend inline.
+                ctxcache.registry.forget(cached)
+                return await self._timed(model, method, prefix + contents, config, schema, on_progress)
+            if code in _UNHEALTHY:
+                health.breaker(model).failure()
+            raise
+        health.breaker(model).success()
+        health.window(model, method).record(time.monotonic() - started)
+        return result
+
+    async def _hedged(
+        self, limiter: CredentialLimiter, model: str, method: str, contents, config,
+        schema: type[T] | None, on_progress: ProgressCallback | None, prefix: str | None, master_hash: str,
+    ) -> tuple[str | None, object | None]:
+        """One attempt. If it outlives the method's learned p95, a second
+        request races it (to the lite model when the method tolerates it) and
+        the first good answer wins. Progress keeps coming from the primary."""
+        primary = asyncio.ensure_future(
+            self._timed(model, method, contents, config, schema, on_progress, prefix, master_hash)
+        )
+        delay = None if self._byok or not get_settings().gemini_hedging else health.window(model, method).hedge_delay()
+        if delay is None:
+            result = await primary
+            self._answered_by(model)
+            return result
+        tasks = {primary}
+        hedge_model = model
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            # BYOK keys never hedge and a hedge never queues: it only goes out
+            # when the credential has a slot free right now.
+            if not done and limiter.try_acquire():
+                hedge_model = self._model_lite if method in _LITE_TOLERANT else model
+                log.info("gemini %s slower than p95 (%.1fs); hedging on %s", method, delay, hedge_model)
+                tasks.add(asyncio.ensure_future(
+                    self._timed(hedge_model, method, contents, config, schema, None, prefix, master_hash)
+                ))
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._answered_by(model if task is primary else hedge_model)
+                        return task.result()
+                tasks -= done
+                if not tasks:
+                    # Both failed: surface the primary's error.
+                    raise primary.exception()
+        finally:
+            for task in tasks | {primary}:
+                task.cancel()
+
+    def _answered_by(self, model: str) -> None:
+        """Note an answer from a model other than cache_tag's for the shared
+        caches (base.off_tag_answers)."""
+        answers = off_tag_answers.get()
+        if answers is not None and model != self.cache_tag:
+            answers.append(model)
+
+    async def _generate(
+        self, contents, *, schema: type[T] | None = None, lite: bool = False, attempts_left: int = 2,
+        on_progress: ProgressCallback | None = None, method: str = "",
+        prefix: str | None = None, master_hash: str = "",
+    ):
+        """One model call with retries. `prefix` is the stable, cacheable
+        head of the prompt (prompts.*_parts); `contents` then holds the rest."""
         config = None
         if schema is not None:
             config = types.GenerateContentConfig(
                 response_mime_type="application/json",
                 response_schema=schema,
             )
-        try:
-            resp = await asyncio.wait_for(
-                self._client.aio.models.generate_content(model=model, contents=contents, config=config),
-                timeout=_TIMEOUT,
-            )
-        except Exception as exc:  # noqa: BLE001 — translated below
-            code = getattr(exc, "code", 0) if isinstance(exc, genai_errors.APIError) else 0
-            delay: float | None = None
-            if code == 429:
-                # Rate limits (free tier: 5 req/min) tell us when to come back;
-                # honoring that is the difference between a slow job and a dead one.
-                delay = min((_retry_delay_seconds(exc) or 30.0) + 1.0, _MAX_RETRY_SLEEP)
-            elif code in (500, 502, 503) or isinstance(exc, asyncio.TimeoutError):
-                delay = 1.5
-            if attempts_left > 0 and delay is not None:
-                log.info("gemini transient (%s); retrying in %.1fs", code or "timeout", delay)
-                await asyncio.sleep(delay)
-                return await self._generate(
-                    contents, schema=schema, lite=lite, attempts_left=attempts_left - 1
+        limiter = limiter_for(self._cred, byok=self._byok)
+        loop = asyncio.get_running_loop()
+        remaining = _BUDGETS.get(method, _TIMEOUT)
+        fallback = lite or method in _LITE_TOLERANT and not health.breaker(self._model).admit()
+        while True:
+            model = self._model_lite if fallback else self._model
+            await limiter.acquire()
+            started = loop.time()
+            try:
+                text, parsed = await asyncio.wait_for(
+                    self._hedged(
+                        limiter, model, method, contents, config, schema, on_progress, prefix, master_hash
+                    ),
+                    timeout=remaining,
                 )
-            log.warning("gemini call failed: %s", exc)
-            raise self._translate_error(exc) from exc
+                break
+            except Exception as exc:  # noqa: BLE001 — translated below
+                remaining -= loop.time() - started
+                code = getattr(exc, "code", 0) if isinstance(exc, genai_errors.APIError) else 0
+                if isinstance(exc, asyncio.TimeoutError):
+                    health.breaker(model).failure()
+                delay: float | None = None
+                if code == 429:
+                    # Rate limits (free tier: 5 req/min) tell us when to come back;
+                    # honoring that is the difference between a slow job and a dead one.
+                    # The pause applies to every caller on this credential, so the
+                    # siblings stop hammering the closed window too.
+                    delay = min((_retry_delay_seconds(exc) or 30.0) + 1.0, _MAX_RETRY_SLEEP)
+                    limiter.pause(delay)
+                elif code in _UNHEALTHY or isinstance(exc, asyncio.TimeoutError):
+                    delay = 1.5
+                    if not fallback and method in _LITE_TOLERANT:
+                        # Primary erroring or slow: the lite model answers now.
+                        fallback, delay = True, 0.0
+                # Each retry needs budget left to be worth making.
+                if attempts_left > 0 and delay is not None and remaining > 1.0:
+                    attempts_left -= 1
+                    log.info(
+                        "gemini transient (%s); retrying %sin %.1fs", code or "timeout",
+                        "on the lite model " if fallback and model != self._model_lite else "", delay,
+                    )
+                    if code != 429 and delay:
+                        await asyncio.sleep(delay)
+                    continue
+                log.warning("gemini call failed: %s", exc)
+                raise self._translate_error(exc) from exc
 
         if schema is not None:
-            parsed = resp.parsed
             if parsed is None:
-                # Schema enforcement nearly always succeeds; fall back to manual parse.
+                # Streamed output, or schema enforcement missed: parse manually.
                 try:
-                    parsed = schema.model_validate_json(resp.text or "")
+                    parsed = schema.model_validate_json(text or "")
                 except Exception as exc:
                     raise AIError("The AI returned an unreadable result. Try again.", byok=self._byok) from exc
             return parsed
-        text = resp.text
         if not text:
             raise AIError("The AI returned an empty result (possibly a safety block).", byok=self._byok)
         return text.strip()
 
     # -- protocol ----------------------------------------------------------------
     async def analyze(self, jd: str, cv_text: str, language: str) -> JobAnalysis:
-        return await self._generate(prompts.analyze_prompt(jd, cv_text), schema=JobAnalysis)
+        return await self._generate(
+            prompts.analyze_prompt(compact.text(jd), cv_text), schema=JobAnalysis, method="analyze"
+        )
 
     async def parse_cv(self, raw_text: str | None, pdf_bytes: bytes | None, language: str) -> CVData:
         if pdf_bytes is not None:
@@ -133,52 +402,74 @@ class GeminiProvider:
             ]
         else:
             contents = prompts.parse_cv_prompt(language) + "\n\nCV TEXT:\n" + (raw_text or "")
-        return await self._generate(contents, schema=CVData)
+        return await self._generate(contents, schema=CVData, method="parse_cv")
 
     async def tailor_cv(
         self, jd: str, analysis: JobAnalysis, master: CVData, language: str,
-        rewrite_intensity: str = "major",
+        rewrite_intensity: str = "major", on_progress: ProgressCallback | None = None,
     ) -> CVData:
         keywords = [k.term for k in analysis.keywords]
-        prompt = prompts.tailor_cv_prompt(
-            jd, analysis.notes, keywords, master.model_dump_json(indent=1), language,
-            rewrite_intensity=rewrite_intensity,
+        master_json = compact.context_json(master)
+        prefix, suffix = prompts.tailor_cv_parts(
+            compact.text(jd), analysis.notes, keywords, master_json, language, rewrite_intensity=rewrite_intensity,
+        )
+        tailored: CVData = await self._generate(
+            suffix, schema=CVData, on_progress=on_progress, method="tailor_cv",
+            prefix=prefix, master_hash=ctxcache.digest(master_json),
         )
-        tailored: CVData = await self._generate(prompt, schema=CVData)
         # Contacts and identity are not the model's to change.
         tailored.full_name = master.full_name or tailored.full_name
         tailored.contacts = master.contacts
         return tailored
 
-    async def write_letter(self, jd: str, analysis: JobAnalysis, cv: CVData, language: str) -> LetterData:
-        prompt = prompts.letter_prompt(jd, analysis.notes, cv.model_dump_json(indent=1), language)
-        letter: LetterData = await self._generate(prompt, schema=LetterData)
+    async def write_letter(
+        self, jd: str, analysis: JobAnalysis, cv: CVData, language: str,
+        on_progress: ProgressCallback | None = None,
+    ) -> LetterData:
+        cv_json = compact.context_json(cv)
+        prefix, suffix = prompts.letter_parts(compact.text(jd), analysis.notes, cv_json, language)
+        letter: LetterData = await self._generate(
+            suffix, schema=LetterData, on_progress=on_progress, method="write_letter",
+            prefix=prefix, master_hash=ctxcache.digest(cv_json),
+        )
         return letter
 
-    async def outreach(self, jd: str, analysis: JobAnalysis, cv: CVData, language: str) -> str:
-        return await self._generate(prompts.outreach_prompt(jd, cv.model_dump_json(), language))
+    async def outreach(
+        self, jd: str, analysis: JobAnalysis, cv: CVData, language: str,
+        on_progress: ProgressCallback | None = None,
+    ) -> str:
+        cv_json = compact.context_json(cv)
+        prefix, suffix = prompts.outreach_parts(compact.text(jd), cv_json, language)
+        return await self._generate(
+            suffix, on_progress=on_progress, method="outreach",
+            prefix=prefix, master_hash=ctxcache.digest(cv_json),
+        )
 
     async def edit_cv_data(self, cv: CVData, instruction: str, language: str) -> CVData:
-        prompt = prompts.edit_cv_prompt(cv.model_dump_json(indent=1), instruction, language)
-        return await self._generate(prompt, schema=CVData)
+        prompt = prompts.edit_cv_prompt(compact.document_json(cv), instruction, language)
+        return await self._generate(prompt, schema=CVData, method="edit_cv_data")
 
     async def edit_letter_data(self, letter: LetterData, instruction: str, language: str) -> LetterData:
-        prompt = prompts.edit_letter_prompt(letter.model_dump_json(indent=1), instruction, language)
-        return await self._generate(prompt, schema=LetterData)
+        prompt = prompts.edit_letter_prompt(compact.document_json(letter), instruction, language)
+        return await self._generate(prompt, schema=LetterData, method="edit_letter_data")
 
     async def edit_source(self, source: str, instruction: str) -> str:
-        text: str = await self._generate(prompts.edit_source_prompt(source, instruction))
+        text: str = await self._generate(prompts.edit_source_prompt(source, instruction), method="edit_source")
         return _strip_fences(text)
 
     async def repair_source(self, source: str, diagnostics: str) -> str:
-        text: str = await self._generate(prompts.repair_source_prompt(source, diagnostics))
+        text: str = await self._generate(prompts.repair_source_prompt(source, diagnostics), method="repair_source")
         return _strip_fences(text)
 
     async def edit_message(self, text: str, instruction: str) -> str:
-        out: str = await self._generate(prompts.edit_message_prompt(text, instruction))
+        out: str = await self._generate(prompts.edit_message_prompt(text, instruction), method="edit_message")
         return out.strip()
 
     async def validate_key(self) -> bool:
+        now = time.monotonic()
+        known = _validated.get(self._cred)
+        if known is not None and known[1] > now:
+            return known[0]
         try:
             await asyncio.wait_for(
                 self._client.aio.models.generate_content(
@@ -188,9 +479,14 @@ class GeminiProvider:
                 ),
                 timeout=15,
             )
-            return True
+            ok = True
         except Exception:
-            return False
+            ok = False
+        if len(_validated) > 4 * _ClientPool.BYOK_MAX:
+            for cid in [c for c, (_, expires) in _validated.items() if expires <= now]:
+                del _validated[cid]
+        _validated[self._cred] = (ok, now + (_VALIDATED_OK_S if ok else _VALIDATED_FAIL_S))
+        return ok
 
 
 def _strip_fences(text: str) -> str:
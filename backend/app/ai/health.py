@@ -0,0 +1,98 @@
+"""Per-model health shared by every Gemini call in the process.
+
+Two signals drive GeminiProvider's tail-latency handling: recent latencies per
+(model, method), whose p95 sets when a hedged second request goes out, and a
+circuit breaker per model that routes lite-tolerant methods to the lite model
+while the primary one is failing.
+"""
+import math
+import time
+from collections import deque
+
+# Hedging waits for a learned p95; until enough calls were seen there is no
+# estimate worth acting on.
+_MIN_SAMPLES = 20
+_WINDOW = 100
+# Never hedge sooner than this: the second request costs quota.
+_MIN_HEDGE_S = 2.0
+
+
+class LatencyWindow:
+    def __init__(self, size: int = _WINDOW):
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        if len(self._samples) < _MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+    def hedge_delay(self) -> float | None:
+        p95 = self.quantile(0.95)
+        return None if p95 is None else max(p95, _MIN_HEDGE_S)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures and stays open for
+    `cooldown` seconds. After that, admit() lets exactly one probe through
+    while everyone else stays on the fallback: its success closes the
+    breaker, its failure re-opens it at once. A probe that never reports
+    back frees the slot after another cooldown."""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_until = 0.0
+
+    @property
+    def open(self) -> bool:
+        if self._failures < self.threshold:
+            return False
+        now = time.monotonic()
+        return now < self._opened_at + self.cooldown or now < self._probe_until
+
+    def admit(self) -> bool:
+        """May this call go to the model? Claims the probe slot when the
+        cooldown is over and nobody holds it."""
+        if self.open:
+            return False
+        if self._failures >= self.threshold:
+            self._probe_until = time.monotonic() + self.cooldown
+        return True
+
+    def success(self) -> None:
+        self._failures = 0
+        self._probe_until = 0.0
+
+    def failure(self) -> None:
+        self._failures += 1
+        if self._failures >= self.threshold:
+            self._opened_at = time.monotonic()
+            self._probe_until = 0.0
+
+
+_windows: dict[tuple[str, str], LatencyWindow] = {}
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def window(model: str, method: str) -> LatencyWindow:
+    key = (model, method)
+    if key not in _windows:
+        _windows[key] = LatencyWindow()
+    return _windows[key]
+
+
+def breaker(model: str) -> CircuitBreaker:
+    if model not in _breakers:
+        _breakers[model] = CircuitBreaker()
+    return _breakers[model]
+
+
+def reset() -> None:
+    _windows.clear()
+    _breakers.clear()
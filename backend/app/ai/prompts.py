@@ -2,6 +2,10 @@
 (response_schema), so prompts focus on quality, not output formatting."""
 from . import typst_ref
 
+# Bump on any change to a generation prompt below: cached tailoring results
+# (aicache.result_key) embed it, so old outputs stop being served.
+PROMPT_VERSION = "3"
+
 LANG_NAMES = {"en": "English", "fr": "French", "de": "German"}
 
 
@@ -80,13 +84,19 @@ keyword with no support in the master CV must NOT appear.""",
 }
 
 
-def tailor_cv_prompt(
+# The three generation prompts are split into a stable PREFIX (instructions +
+# master CV, byte-identical for every posting in a batch) and a per-posting
+# SUFFIX (keywords, employer notes, job description). Providers cache the
+# prefix (see ai/ctxcache.py); nothing posting-specific may move into it.
+
+
+def tailor_cv_parts(
     jd: str, analysis_notes: str, keywords: list[str], master_json: str, language: str,
     rewrite_intensity: str = "major",
-) -> str:
+) -> tuple[str, str]:
     mandate = _INTENSITY_MANDATES.get(rewrite_intensity, _INTENSITY_MANDATES["major"])
-    return f"""You are an elite CV writer. Rewrite the candidate's master CV so it is
-laser-targeted at the job below, in {lang_name(language)}.
+    prefix = f"""You are an elite CV writer. Rewrite the candidate's master CV so it is
+laser-targeted at the job given at the end, in {lang_name(language)}.
 
 {mandate}
 
@@ -117,8 +127,8 @@ HARD RULES — violating any of these makes the output unusable:
    experience bullet already proves. Cutting is the job, not a failure. Do
    not pad to reach the budget either: a half-empty page fails just as hard
    as one that overflows.
-3. Weave the job's key terms in naturally WHERE THE CANDIDATE GENUINELY HAS
-   the skill: {", ".join(keywords[:14])}.
+3. Weave the job's KEY TERMS (listed with the job) in naturally WHERE THE
+   CANDIDATE GENUINELY HAS the skill.
 4. headline: mirror the target role's title language (without lying about
    seniority). Do not promise a specialism the bullets never evidence: if the
    headline names a domain, something below it must prove the candidate has
@@ -162,17 +172,28 @@ HARD RULES — violating any of these makes the output unusable:
 12. Never use an em dash (—) in any field. Use a comma, colon, period, or
    " | " instead.
 
+MASTER CV (single source of truth — JSON):
+{master_json}
+"""
+    suffix = f"""
+KEY TERMS: {", ".join(keywords[:14])}
+
 WHAT THIS EMPLOYER CARES ABOUT: {analysis_notes}
 
 JOB DESCRIPTION:
 {jd}
-
-MASTER CV (single source of truth — JSON):
-{master_json}
 """
+    return prefix, suffix
 
 
-def letter_prompt(jd: str, analysis_notes: str, cv_json: str, language: str) -> str:
+def tailor_cv_prompt(
+    jd: str, analysis_notes: str, keywords: list[str], master_json: str, language: str,
+    rewrite_intensity: str = "major",
+) -> str:
+    return "".join(tailor_cv_parts(jd, analysis_notes, keywords, master_json, language, rewrite_intensity))
+
+
+def letter_parts(jd: str, analysis_notes: str, cv_json: str, language: str) -> tuple[str, str]:
     doc_name = {"fr": "lettre de motivation", "de": "Anschreiben"}.get(language, "cover letter")
     default_recipient = {
         "fr": '"Madame, Monsieur"',
@@ -182,8 +203,8 @@ def letter_prompt(jd: str, analysis_notes: str, cv_json: str, language: str) ->
         "fr": ' (e.g. "Objet : Candidature au poste de ...")',
         "de": ' (e.g. "Bewerbung als ...")',
     }.get(language, "")
-    return f"""Write an outstanding cover letter ({doc_name})
-in {lang_name(language)} for the job below, from the candidate described by the CV JSON.
+    prefix = f"""Write an outstanding cover letter ({doc_name})
+in {lang_name(language)} for the job given at the end, from the candidate described by the CV JSON.
 
 Fill ONLY these fields (the system fills sender/date/signature):
 - recipient: name (use the hiring contact if known, else a natural default
@@ -202,31 +223,44 @@ Fill ONLY these fields (the system fills sender/date/signature):
 
 Tone: confident, specific, human. Zero clichés, zero placeholders.
 Never use an em dash (—) anywhere; use a comma, colon, or period instead.
+
+CANDIDATE CV (JSON):
+{cv_json}
+"""
+    suffix = f"""
 WHAT THIS EMPLOYER CARES ABOUT: {analysis_notes}
 
 JOB DESCRIPTION:
 {jd}
-
-CANDIDATE CV (JSON):
-{cv_json}
 """
+    return prefix, suffix
 
 
-def outreach_prompt(jd: str, cv_json: str, language: str) -> str:
-    return f"""Write a short LinkedIn outreach message (under 700 characters) in
-{lang_name(language)} from the candidate to a recruiter about the job below.
+def letter_prompt(jd: str, analysis_notes: str, cv_json: str, language: str) -> str:
+    return "".join(letter_parts(jd, analysis_notes, cv_json, language))
+
+
+def outreach_parts(jd: str, cv_json: str, language: str) -> tuple[str, str]:
+    prefix = f"""Write a short LinkedIn outreach message (under 700 characters) in
+{lang_name(language)} from the candidate to a recruiter about the job given at the end.
 
 Rules: mention the exact role, one concrete relevant achievement with a real
 number from the CV, end with a soft ask (15-min chat). No placeholders: if
 no recruiter name is known, open naturally without one. Never use an em dash
 (—); use a comma, colon, or period instead. Return ONLY the message text.
 
-JOB DESCRIPTION:
-{jd[:4000]}
-
 CANDIDATE CV (JSON):
 {cv_json}
 """
+    suffix = f"""
+JOB DESCRIPTION:
+{jd[:4000]}
+"""
+    return prefix, suffix
+
+
+def outreach_prompt(jd: str, cv_json: str, language: str) -> str:
+    return "".join(outreach_parts(jd, cv_json, language))
 
 
 def edit_cv_prompt(cv_json: str, instruction: str, language: str) -> str:
@@ -0,0 +1,147 @@
+"""Per-credential request limiter shared by every Gemini call in the process.
+
+A 429 used to stall only the call that received it: the sibling calls of the
+same job and every other job on that key kept firing into the closed window
+and collected their own 429s. One limiter per credential (Vertex project,
+server key, each BYOK key) now pauses all of them together for the
+server-suggested retryDelay and releases waiters in arrival order. An optional
+requests-per-minute bucket keeps known free-tier keys under their quota up
+front.
+
+Waits are announced through `wait_listener`, a context variable the job
+runner sets so the expected delay shows up in the job's events. A caller
+queued behind another announces its expected wait as it joins the queue.
+"""
+import asyncio
+import time
+from collections.abc import Callable
+from contextvars import ContextVar
+
+from ..config import get_settings
+
+WaitListener = Callable[[float], None]
+
+wait_listener: ContextVar[WaitListener | None] = ContextVar("gemini_wait_listener", default=None)
+
+# Waits shorter than this are not worth announcing.
+_ANNOUNCE_S = 1.0
+_IDLE_PRUNE_S = 3600.0
+_MAX_LIMITERS = 256
+
+
+class CredentialLimiter:
+    def __init__(self, rpm: int = 0):
+        self.rpm = rpm
+        self._tokens = float(rpm)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self.last_used = self._refilled
+        # Callers holding or queued on _lock, for the wait a newcomer announces.
+        self._queued = 0
+        # asyncio.Lock wakes waiters FIFO: whoever queued first goes first
+        # once a pause ends.
+        self._lock = asyncio.Lock()
+
+    @property
+    def paused_for(self) -> float:
+        return max(0.0, self._paused_until - time.monotonic())
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller on this credential for `seconds` (a 429 hint)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._refilled)  # now may be a sleep target ahead of the clock
+        if self.rpm > 0:
+            self._tokens = min(float(self.rpm), self._tokens + elapsed * self.rpm / 60.0)
+        self._refilled = max(self._refilled, now)
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now, without queueing: for
+        optional extra requests (hedges) that must not eat into the quota
+        callers are waiting for."""
+        now = time.monotonic()
+        if self._lock.locked() or self._paused_until > now:
+            return False
+        if self.rpm > 0:
+            self._refill(now)
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+        self.last_used = now
+        return True
+
+    def queue_wait(self) -> float:
+        """Expected wait for a caller arriving now behind the queue: what is
+        left of the pause plus one bucket interval per caller ahead."""
+        interval = 60.0 / self.rpm if self.rpm > 0 else 0.0
+        return self.paused_for + self._queued * interval
+
+    async def acquire(self) -> None:
+        """Wait for this caller's turn: queue position, any active pause, and
+        the rpm bucket, in that order."""
+        if self._lock.locked():
+            # Queued callers only reach the announce below once they hold the
+            # lock; say now how long the line ahead is expected to take.
+            _announce(self.queue_wait())
+        self._queued += 1
+        try:
+            await self._acquire_locked()
+        finally:
+            self._queued -= 1
+
+    async def _acquire_locked(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            while True:
+                wait = self._paused_until - now
+                if wait <= 0 and self.rpm > 0:
+                    self._refill(now)
+                    # Tolerance: a refill computed from the sleep target
+                    # can land a rounding error short of a whole token.
+                    if self._tokens < 1.0 - 1e-9:
+                        wait = (1.0 - self._tokens) * 60.0 / self.rpm
+                if wait <= 0:
+                    break
+                _announce(wait)
+                target = now + wait
+                await asyncio.sleep(wait)
+                # Treat the sleep as having reached its target; only a pause
+                # extended meanwhile by another caller's 429 keeps us waiting.
+                now = max(time.monotonic(), target)
+            if self.rpm > 0:
+                self._tokens = max(0.0, self._tokens - 1.0)
+            self.last_used = now
+
+
+def _announce(wait: float) -> None:
+    listener = wait_listener.get()
+    if listener is not None and wait >= _ANNOUNCE_S:
+        listener(wait)
+
+
+_limiters: dict[str, CredentialLimiter] = {}
+_limiters_loop: asyncio.AbstractEventLoop | None = None
+
+
+def limiter_for(cred: str, *, byok: bool) -> CredentialLimiter:
+    """The process-wide limiter for a credential id (never a raw key)."""
+    global _limiters_loop
+    loop = asyncio.get_running_loop()
+    if loop is not _limiters_loop:
+        # asyncio.Lock binds to one loop; a new loop (tests, reloads) starts fresh.
+        _limiters.clear()
+        _limiters_loop = loop
+    limiter = _limiters.get(cred)
+    if limiter is None:
+        if len(_limiters) >= _MAX_LIMITERS:
+            now = time.monotonic()
+            for key, old in list(_limiters.items()):
+                if now - old.last_used > _IDLE_PRUNE_S and not old.paused_for and not old._lock.locked():
+                    del _limiters[key]
+        settings = get_settings()
+        limiter = _limiters[cred] = CredentialLimiter(
+            settings.gemini_byok_rpm if byok else settings.gemini_rpm
+        )
+    return limiter
@@ -0,0 +1,266 @@
+"""Record/replay provider for offline benchmarking.
+
+The FakeProvider answers in ~10ms with a few hundred bytes, so a load test
+of /api/generate through it measures neither the real payload sizes (a
+tailored CV, a full letter) nor the seconds each call holds a job. This
+provider records real answers once and plays them back offline:
+
+- record (CVG_REPLAY_MODE=record): wraps the real provider; every answer is
+  appended to a JSONL cassette with its wall-clock latency and token usage,
+  keyed by method + a hash of the prompt inputs.
+- replay (the default when CVG_REPLAY_CASSETTE is set): no network and no
+  key. An exact key match answers with its own recording; any other input
+  draws a recording of the same method (stable per input), so a benchmark
+  with varied postings still gets real payloads and the recorded latency
+  distribution. CVG_REPLAY_LATENCY_SCALE stretches or shrinks the waits
+  (0 = instant).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from ..schemas import CVData, JobAnalysis, LetterData
+from . import usage
+from .base import AIError, AIProvider
+from .stream import ProgressCallback, StreamProgress
+
+log = logging.getLogger(__name__)
+
+# Methods whose answer is a schema object; the rest return plain text.
+_SCHEMAS: dict[str, type[BaseModel]] = {
+    "analyze": JobAnalysis,
+    "parse_cv": CVData,
+    "tailor_cv": CVData,
+    "write_letter": LetterData,
+    "edit_cv_data": CVData,
+    "edit_letter_data": LetterData,
+}
+# A replayed stream is cut into this many chunks spread over the latency.
+_STREAM_CHUNKS = 20
+
+
+def prompt_key(*inputs) -> str:
+    """Stable hash of a call's prompt inputs (models, text, PDF bytes)."""
+
+    def plain(value):
+        if isinstance(value, BaseModel):
+            return value.model_dump(mode="json")
+        if isinstance(value, bytes):
+            return "sha256:" + hashlib.sha256(value).hexdigest()
+        return value
+
+    blob = json.dumps([plain(v) for v in inputs], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+@dataclass
+class Take:
+    """One recorded answer. output is JSON-ready: a model dump or a string."""
+
+    method: str
+    key: str
+    latency_s: float
+    output: object
+    usage: dict[str, int] = field(default_factory=dict)
+
+
+class Cassette:
+    """Recorded takes, indexed by (method, key) and by method. Backed by an
+    append-only JSONL file so a recording survives an interrupted run."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._exact: dict[tuple[str, str], Take] = {}
+        self._by_method: dict[str, list[Take]] = {}
+        if path.exists():
+            for n, line in enumerate(path.read_text(encoding="utf-8").splitlines(), 1):
+                if not line.strip():
+                    continue
+                try:
+                    self._index(Take(**json.loads(line)))
+                except (TypeError, ValueError):
+                    log.warning("replay cassette %s: skipping unreadable line %d", path, n)
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def _index(self, take: Take) -> None:
+        if (take.method, take.key) not in self._exact:
+            self._by_method.setdefault(take.method, []).append(take)
+        self._exact[(take.method, take.key)] = take
+
+    async def add(self, take: Take) -> None:
+        """Index at once, append to the file off the event loop: a recording
+        server keeps serving while the disk catches up."""
+        self._index(take)
+        line = json.dumps(asdict(take), ensure_ascii=False) + "\n"
+        await asyncio.to_thread(self._append, line)
+
+    def _append(self, line: str) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as fh:
+            fh.write(line)
+
+    def lookup(self, method: str, key: str) -> Take | None:
+        """The exact recording, else one of the method's recordings chosen by
+        the key (the same input always draws the same take)."""
+        take = self._exact.get((method, key))
+        if take is not None:
+            return take
+        takes = self._by_method.get(method)
+        if not takes:
+            return None
+        return takes[int(key[:12], 16) % len(takes)]
+
+
+_cassettes: dict[Path, Cassette] = {}
+
+
+def cassette(path: str | Path) -> Cassette:
+    """Process-wide cassette per file: get_provider runs once per job, the
+    file is read once."""
+    resolved = Path(path).expanduser().resolve()
+    if resolved not in _cassettes:
+        _cassettes[resolved] = Cassette(resolved)
+    return _cassettes[resolved]
+
+
+class ReplayProvider:
+    def __init__(self, tape: Cassette, *, inner: AIProvider | None = None, latency_scale: float = 1.0):
+        """inner=None replays from the tape; with a provider, every call goes
+        to it and its answer is recorded."""
+        self._tape = tape
+        self._inner = inner
+        self._scale = max(latency_scale, 0.0)
+        # Recording passes the real answers through; replay serves the tape's.
+        self.cache_tag = inner.cache_tag if inner is not None else f"replay:{tape.path.name}"
+
+    async def _call(
+        self, method: str, key: str, live: Callable[[], Awaitable], on_progress: ProgressCallback | None = None,
+    ):
+        if self._inner is not None:
+            return await self._record(method, key, live)
+        take = self._tape.lookup(method, key)
+        if take is None:
+            raise AIError(f"No recorded {method} answer in the replay cassette.")
+        spent = take.usage
+        usage.record(method, spent.get("prompt", 0), spent.get("response", 0), spent.get("cached", 0))
+        schema = _SCHEMAS.get(method)
+        payload = json.dumps(take.output, ensure_ascii=False) if schema is not None else str(take.output)
+        delay = take.latency_s * self._scale
+        if on_progress is None:
+            await asyncio.sleep(delay)
+            text = payload
+        else:
+            progress = StreamProgress(schema.model_fields if schema is not None else ())
+            step = max(1, -(-len(payload) // _STREAM_CHUNKS))
+            for i in range(0, len(payload), step):
+                await asyncio.sleep(delay / _STREAM_CHUNKS)
+                progress.feed(payload[i:i + step])
+                on_progress(progress)
+            text = progress.text
+        return schema.model_validate_json(text) if schema is not None else text
+
+    async def _record(self, method: str, key: str, live: Callable[[], Awaitable]):
+        # Capture this call's token usage for the take, then hand it on to
+        # the job's own log.
+        outer = usage.current.get()
+        spent = usage.UsageLog()
+        token = usage.current.set(spent)
+        started = time.monotonic()
+        try:
+            result = await live()
+        finally:
+            usage.current.reset(token)
+        latency = time.monotonic() - started
+        if outer is not None:
+            outer.merge(spent)
+        totals = {"prompt": 0, "response": 0, "cached": 0}
+        for entry in spent.methods.values():
+            for name in totals:
+                totals[name] += entry[name]
+        output = result.model_dump(mode="json") if isinstance(result, BaseModel) else result
+        await self._tape.add(Take(method, key, round(latency, 3), output, totals))
+        return result
+
+    # -- protocol ----------------------------------------------------------------
+    async def analyze(self, jd: str, cv_text: str, language: str) -> JobAnalysis:
+        return await self._call(
+            "analyze", prompt_key(jd, cv_text, language), lambda: self._inner.analyze(jd, cv_text, language),
+        )
+
+    async def parse_cv(self, raw_text: str | None, pdf_bytes: bytes | None, language: str) -> CVData:
+        return await self._call(
+            "parse_cv", prompt_key(raw_text, pdf_bytes, language),
+            lambda: self._inner.parse_cv(raw_text, pdf_bytes, language),
+        )
+
+    async def tailor_cv(
+        self, jd: str, analysis: JobAnalysis, master: CVData, language: str,
+        rewrite_intensity: str = "major", on_progress: ProgressCallback | None = None,
+    ) -> CVData:
+        tailored: CVData = await self._call(
+            "tailor_cv", prompt_key(jd, analysis, master, language, rewrite_intensity),
+            lambda: self._inner.tailor_cv(jd, analysis, master, language, rewrite_intensity, on_progress),
+            on_progress,
+        )
+        # A take drawn for another master still carries that master's identity.
+        tailored.full_name = master.full_name or tailored.full_name
+        tailored.contacts = master.contacts
+        return tailored
+
+    async def write_letter(
+        self, jd: str, analysis: JobAnalysis, cv: CVData, language: str,
+        on_progress: ProgressCallback | None = None,
+    ) -> LetterData:
+        return await self._call(
+            "write_letter", prompt_key(jd, analysis, cv, language),
+            lambda: self._inner.write_letter(jd, analysis, cv, language, on_progress), on_progress,
+        )
+
+    async def outreach(
+        self, jd: str, analysis: JobAnalysis, cv: CVData, language: str,
+        on_progress: ProgressCallback | None = None,
+    ) -> str:
+        return await self._call(
+            "outreach", prompt_key(jd, analysis, cv, language),
+            lambda: self._inner.outreach(jd, analysis, cv, language, on_progress), on_progress,
+        )
+
+    async def edit_cv_data(self, cv: CVData, instruction: str, language: str) -> CVData:
+        return await self._call(
+            "edit_cv_data", prompt_key(cv, instruction, language),
+            lambda: self._inner.edit_cv_data(cv, instruction, language),
+        )
+
+    async def edit_letter_data(self, letter: LetterData, instruction: str, language: str) -> LetterData:
+        return await self._call(
+            "edit_letter_data", prompt_key(letter, instruction, language),
+            lambda: self._inner.edit_letter_data(letter, instruction, language),
+        )
+
+    async def edit_source(self, source: str, instruction: str) -> str:
+        return await self._call(
+            "edit_source", prompt_key(source, instruction), lambda: self._inner.edit_source(source, instruction),
+        )
+
+    async def repair_source(self, source: str, diagnostics: str) -> str:
+        return await self._call(
+            "repair_source", prompt_key(source, diagnostics),
+            lambda: self._inner.repair_source(source, diagnostics),
+        )
+
+    async def edit_message(self, text: str, instruction: str) -> str:
+        return await self._call(
+            "edit_message", prompt_key(text, instruction), lambda: self._inner.edit_message(text, instruction),
+        )
+
+    async def validate_key(self) -> bool:
+        return True if self._inner is None else await self._inner.validate_key()
@@ -0,0 +1,92 @@
+"""Incremental assembly of streamed model output.
+
+Both providers feed response chunks into a StreamProgress as they arrive.
+It keeps the full text (validated against the schema once the stream ends)
+and scans the JSON on the fly, so the pipeline can report which top-level
+fields are already complete while the model is still writing.
+"""
+from collections.abc import Callable, Sequence
+
+# ~4 characters per token is Gemini's own rule of thumb for Latin text; used
+# only when the stream carries no usage metadata (the fake, early chunks).
+_CHARS_PER_TOKEN = 4
+
+
+class StreamProgress:
+    def __init__(self, fields: Sequence[str] = ()):
+        """fields: the schema's top-level keys; empty for plain-text output."""
+        self.fields = tuple(fields)
+        self.sections: list[str] = []  # top-level keys whose value has closed
+        self.tokens = 0
+        self._parts: list[str] = []
+        self._chars = 0
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+        self._expect_key = False
+        self._capture: list[str] | None = None
+        self._key: str | None = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    @property
+    def chars(self) -> int:
+        return self._chars
+
+    def feed(self, chunk: str, tokens: int | None = None) -> None:
+        """Append one chunk. tokens: the provider's running output-token count,
+        when it reports one."""
+        self._parts.append(chunk)
+        self._chars += len(chunk)
+        self.tokens = tokens if tokens else self._chars // _CHARS_PER_TOKEN
+        if self.fields:
+            for ch in chunk:
+                self._scan(ch)
+
+    def fraction(self, expected_chars: int = 700) -> float:
+        """Rough completion, 0..1: closed fields for structured output,
+        characters against an expected length for plain text."""
+        if self.fields:
+            return min(1.0, len(self.sections) / len(self.fields))
+        return min(1.0, self._chars / expected_chars)
+
+    def _close_key(self) -> None:
+        if self._key is not None and self._key not in self.sections:
+            self.sections.append(self._key)
+        self._key = None
+
+    def _scan(self, ch: str) -> None:
+        if self._in_str:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_str = False
+                if self._capture is not None:
+                    self._key = "".join(self._capture)
+                    self._capture = None
+            elif self._capture is not None:
+                self._capture.append(ch)
+            return
+        if ch == '"':
+            self._in_str = True
+            if self._depth == 1 and self._expect_key:
+                self._capture = []
+                self._expect_key = False
+        elif ch in "{[":
+            self._depth += 1
+            if self._depth == 1:
+                self._expect_key = True
+        elif ch in "}]":
+            if self._depth == 1:
+                self._close_key()
+            self._depth -= 1
+        elif ch == "," and self._depth == 1:
+            self._close_key()
+            self._expect_key = True
+
+
+ProgressCallback = Callable[[StreamProgress], None]
@@ -0,0 +1,44 @@
+"""Per-method token accounting for provider calls.
+
+Every call reports its prompt, response and cached token counts: Gemini from
+usage metadata, the FakeProvider from a chars/4 estimate of the prompt it
+would have sent. Counts go to the process-wide ledger (ai/ctxcache.py) and,
+when a job is running, to that job's UsageLog via the `current` context
+variable, which the job runner sets and stores on Job.token_usage.
+"""
+from contextvars import ContextVar
+
+from . import ctxcache
+
+
+class UsageLog:
+    """{method: {"calls", "prompt", "response", "cached"}}, JSON-ready."""
+
+    def __init__(self, initial: dict | None = None):
+        self.methods: dict[str, dict[str, int]] = {m: dict(v) for m, v in (initial or {}).items()}
+
+    def record(self, method: str, prompt: int, response: int, cached: int = 0) -> None:
+        entry = self.methods.setdefault(method, {"calls": 0, "prompt": 0, "response": 0, "cached": 0})
+        entry["calls"] += 1
+        entry["prompt"] += prompt
+        entry["response"] += response
+        entry["cached"] += cached
+
+    def merge(self, other: "UsageLog") -> None:
+        for method, entry in other.methods.items():
+            mine = self.methods.setdefault(method, {"calls": 0, "prompt": 0, "response": 0, "cached": 0})
+            for name, count in entry.items():
+                mine[name] += count
+
+    def as_dict(self) -> dict:
+        return {m: dict(v) for m, v in self.methods.items()}
+
+
+current: ContextVar[UsageLog | None] = ContextVar("ai_usage_log", default=None)
+
+
+def record(method: str, prompt: int, response: int, cached: int = 0) -> None:
+    ctxcache.ledger.record(prompt, cached)
+    log = current.get()
+    if log is not None:
+        log.record(method or "other", prompt, response, cached)
@@ -0,0 +1,212 @@
+"""Shared caches in front of the LLM provider.
+
+The job analysis depends on the posting alone, so it is cached in the
+database keyed by a hash of the normalized job description, language and
+the answering provider's cache_tag (a BYOK Gemini job never gets an
+offline fake's analysis, nor the reverse): any instance can serve what
+another computed, and expiry is a TTL plus a size cap (oldest entries go
+first). Concurrent jobs for the same posting, e.g. a duplicate inside one
+/api/generate batch, share a single in-flight provider call instead of each
+paying for their own.
+
+Generated documents are memoized too, but only when RESULT_CACHE_TTL_HOURS
+opts in: the key covers the master CV, posting, rewrite intensity, language,
+cache_tag, prompts.PROMPT_VERSION and the compaction switch, so a hit is a
+regeneration with identical inputs. BYOK jobs never read or write it (their
+key, their call).
+
+An answer from a model other than cache_tag's (a lite fallback or hedge,
+see watch_off_tag) is used by the job that asked but never stored.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import unicodedata
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+
+from .ai import compact, prompts
+from .ai.base import AIProvider, off_tag_answers
+from .config import get_settings
+from .db import session_factory
+from .models import AnalysisCacheEntry, ResultCacheEntry
+from .schemas import JobAnalysis
+
+log = logging.getLogger(__name__)
+
+_inflight: dict[str, asyncio.Future] = {}
+
+
+def normalize_jd(jd: str) -> str:
+    """Whitespace and Unicode form are layout, not content: a posting copied
+    from two different pages should hash the same."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", jd)).strip()
+
+
+@contextmanager
+def watch_off_tag() -> Iterator[list[str]]:
+    """Collect the models that answer off cache_tag inside the block (tasks
+    started in it included); a non-empty list means: do not store."""
+    answers: list[str] = []
+    token = off_tag_answers.set(answers)
+    try:
+        yield answers
+    finally:
+        off_tag_answers.reset(token)
+
+
+def analysis_key(tag: str, jd: str, language: str) -> str:
+    """tag is the provider's cache_tag: the model that answers is part of
+    every key, so a model bump (or a fake/replayed provider) never serves
+    another model's outputs."""
+    h = hashlib.sha256(f"{tag}\x00{language}\x00".encode())
+    h.update(normalize_jd(jd).encode())
+    return h.hexdigest()
+
+
+def result_key(
+    stage: str, tag: str, master: dict, jd: str, language: str, rewrite_intensity: str = ""
+) -> str:
+    """stage: cv | letter | message. Only the CV depends on the intensity.
+    Compaction changes what the model is sent, so its switch counts too."""
+    form = "compact" if compact.enabled() else "verbose"
+    header = "\x00".join([stage, tag, prompts.PROMPT_VERSION, form, language, rewrite_intensity])
+    h = hashlib.sha256(header.encode())
+    h.update(b"\x00")
+    h.update(json.dumps(master, sort_keys=True, ensure_ascii=False).encode())
+    h.update(b"\x00")
+    h.update(normalize_jd(jd).encode())
+    return h.hexdigest()
+
+
+def _expired(created_at: datetime, now: datetime, ttl_hours: int) -> bool:
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=UTC)
+    return now - created_at > timedelta(hours=ttl_hours)
+
+
+async def _evict(db, model, now: datetime, ttl_hours: int, max_entries: int) -> None:
+    """Drop expired rows, then the oldest beyond the size cap. Caller commits."""
+    await db.execute(delete(model).where(model.created_at < now - timedelta(hours=ttl_hours)))
+    count = (await db.execute(select(func.count(model.key)))).scalar_one()
+    excess = count - max_entries
+    if excess > 0:
+        oldest = select(model.key).order_by(model.created_at).limit(excess)
+        await db.execute(delete(model).where(model.key.in_(oldest)))
+
+
+async def load_analysis(key: str) -> JobAnalysis | None:
+    ttl = get_settings().analysis_cache_ttl_hours
+    if ttl <= 0:
+        return None
+    async with session_factory()() as db:
+        row = await db.get(AnalysisCacheEntry, key)
+    if row is None or _expired(row.created_at, datetime.now(UTC), ttl):
+        return None
+    try:
+        return JobAnalysis.model_validate(row.analysis)
+    except ValueError:
+        return None
+
+
+async def store_analysis(key: str, analysis: JobAnalysis) -> None:
+    """Insert (or refresh) an entry, then enforce the TTL and the size cap."""
+    settings = get_settings()
+    if settings.analysis_cache_ttl_hours <= 0:
+        return
+    now = datetime.now(UTC)
+    async with session_factory()() as db:
+        row = await db.get(AnalysisCacheEntry, key)
+        if row is None:
+            db.add(AnalysisCacheEntry(key=key, analysis=analysis.model_dump(), created_at=now))
+        else:
+            row.analysis = analysis.model_dump()
+            row.created_at = now
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Another instance stored the same posting first; theirs is as good.
+            await db.rollback()
+            return
+
+        await _evict(
+            db, AnalysisCacheEntry, now,
+            settings.analysis_cache_ttl_hours, settings.analysis_cache_max_entries,
+        )
+        await db.commit()
+
+
+async def analyze(provider: AIProvider, jd: str, cv_text: str, language: str) -> tuple[JobAnalysis, bool]:
+    """provider.analyze behind the shared cache. Returns (analysis, cached):
+    cached is True when no provider call was made on this job's behalf."""
+    key = analysis_key(provider.cache_tag, jd, language)
+    hit = await load_analysis(key)
+    if hit is not None:
+        return hit, True
+
+    pending = _inflight.get(key)
+    if pending is not None:
+        # shield: a cancelled follower must not cancel the leader's call.
+        return (await asyncio.shield(pending)).model_copy(deep=True), True
+
+    with watch_off_tag() as off_tag:
+        task = asyncio.ensure_future(provider.analyze(jd, cv_text, language))
+    _inflight[key] = task
+    try:
+        analysis = await asyncio.shield(task)
+    finally:
+        _inflight.pop(key, None)
+    if off_tag:
+        log.info("analysis answered by %s, not %s: not cached", off_tag[-1], provider.cache_tag)
+        return analysis, False
+    try:
+        await store_analysis(key, analysis)
+    except Exception:
+        log.warning("analysis cache write failed", exc_info=True)
+    return analysis, False
+
+
+def results_enabled() -> bool:
+    return get_settings().result_cache_ttl_hours > 0
+
+
+async def load_result(key: str) -> dict | str | None:
+    """A memoized CVData/LetterData dump or outreach text, or None."""
+    ttl = get_settings().result_cache_ttl_hours
+    if ttl <= 0:
+        return None
+    async with session_factory()() as db:
+        row = await db.get(ResultCacheEntry, key)
+    if row is None or _expired(row.created_at, datetime.now(UTC), ttl):
+        return None
+    return row.value
+
+
+async def store_result(key: str, value: dict | str) -> None:
+    settings = get_settings()
+    if settings.result_cache_ttl_hours <= 0:
+        return
+    now = datetime.now(UTC)
+    async with session_factory()() as db:
+        row = await db.get(ResultCacheEntry, key)
+        if row is None:
+            db.add(ResultCacheEntry(key=key, value=value, created_at=now))
+        else:
+            row.value = value
+            row.created_at = now
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return
+        await _evict(
+            db, ResultCacheEntry, now,
+            settings.result_cache_ttl_hours, settings.result_cache_max_entries,
+        )
+        await db.commit()
@@ -4,6 +4,7 @@ import re
 import shutil
 from functools import lru_cache
 from pathlib import Path
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -47,14 +48,46 @@ class Settings(BaseSettings):
     gemini_model: str = "gemini-3.5-flash"
     gemini_model_lite: str = "gemini-3.1-flash-lite"
     cvg_fake_ai: bool = False  # force the deterministic offline provider
+    # Record/replay cassette (ai/replay.py) for offline benchmarks. "replay"
+    # answers from the file with no key or network and wins over everything
+    # but BYOK; "record" wraps the real server provider and appends to it.
+    cvg_replay_cassette: str = ""
+    cvg_replay_mode: Literal["replay", "record"] = "replay"
+    cvg_replay_latency_scale: float = 1.0  # recorded latency x this; 0 = instant
+    # Requests per minute allowed per credential before calls queue; 0 = no
+    # proactive cap (429 retry hints still pause every caller on the key).
+    # Free-tier AI Studio keys allow 5.
+    gemini_rpm: int = 0
+    gemini_byok_rpm: int = 0
+    # Race a second request against calls slower than their method's p95
+    # (server credentials only; BYOK quota is the user's).
+    gemini_hedging: bool = True
+    # Explicit context caching of the instructions + master CV prompt prefix
+    # (server credentials); minutes a cache entry lives, 0 = always inline.
+    gemini_context_cache_minutes: int = 60
+    # Prompt inputs without empty fields/indentation, abbreviated CV keys
+    # (ai/compact.py). Off = the verbose form, for evals.
+    gemini_compact_prompts: bool = True
 
     # Typst
     typst_bin: str = ""
     templates_dir: Path = REPO_ROOT / "templates"
     compile_concurrency: int = 4
+    # Start the one-page fit on the rung the layout estimator predicts will
+    # fit (typstsvc/layout.py) instead of the stored density. Off = walk the
+    # ladder from the stored rung, for evals.
+    typst_layout_estimate: bool = True
 
     # Jobs
     job_concurrency: int = 6
+    # Shared JobAnalysis cache (DB table, so every instance sees every entry).
+    # Keyed by the normalized job description + language; 0 hours disables it.
+    analysis_cache_ttl_hours: int = 72
+    analysis_cache_max_entries: int = 5000
+    # Opt-in memo of tailored CV / letter / outreach for identical (master CV,
+    # JD, intensity, language, prompt version) inputs. Never used for BYOK.
+    result_cache_ttl_hours: int = 0  # 0 = off
+    result_cache_max_entries: int = 2000
 
     # Web
     allowed_origins: str = ""  # comma separated; sensible defaults applied below
@@ -72,7 +105,8 @@ class Settings(BaseSettings):
     adsense_client: str = ""
 
     # LaTeX compile service (services/latexc). Feature stays dark until both
-    # LATEXC_URL and LATEXC_TOKEN are set.
+    # LATEXC_URL and LATEXC_TOKEN are set. Comma separated for a pool of
+    # instances (texsvc/pool.py); they share the token.
     latexc_url: str = ""
     latexc_token: str = ""
     latexc_service: str = "cvglowup-latexc"
@@ -125,10 +159,18 @@ class Settings(BaseSettings):
     def ai_enabled(self) -> bool:
         return (bool(self.gemini_api_key) or self.gemini_use_vertex) and not self.cvg_fake_ai
 
+    @property
+    def ai_replaying(self) -> bool:
+        return bool(self.cvg_replay_cassette) and self.cvg_replay_mode == "replay"
+
     @property
     def billing_enabled(self) -> bool:
         return bool(self.stripe_secret_key and self.stripe_price_plus and self.stripe_price_pro)
 
+    @property
+    def latexc_urls(self) -> list[str]:
+        return [u.strip().rstrip("/") for u in self.latexc_url.split(",") if u.strip()]
+
     @property
     def latex_enabled(self) -> bool:
         return bool(self.latexc_url and self.latexc_token)
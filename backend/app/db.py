@@ -46,6 +46,10 @@ def _ensure_columns(conn) -> None:
     cols = {c["name"] for c in inspect(conn).get_columns("jobs")}
     if "gen_params" not in cols:
         conn.execute(text("ALTER TABLE jobs ADD COLUMN gen_params JSON"))
+    if "checkpoints" not in cols:
+        conn.execute(text("ALTER TABLE jobs ADD COLUMN checkpoints JSON"))
+    if "token_usage" not in cols:
+        conn.execute(text("ALTER TABLE jobs ADD COLUMN token_usage JSON"))
 
 
 async def init_db() -> None:
@@ -6,15 +6,22 @@ accepted the request. SSE readers poll the DB, so any instance can serve
 progress for any job.
 """
 import asyncio
+import contextlib
+import hashlib
+import json
 import logging
+import math
+import time
 import uuid
+from collections.abc import Callable
 from datetime import UTC, datetime
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from . import ats, quota
-from .ai import get_provider
+from . import aicache, ats, quota
+from .ai import get_provider, ratelimit, usage
 from .ai.base import AIError
+from .ai.stream import ProgressCallback, StreamProgress
 from .config import get_settings
 from .db import session_factory
 from .models import Document, Job, Photo
@@ -58,6 +65,150 @@ def letter_date(language: str, city: str) -> str:
     return f"{city}, {base}" if city else base
 
 
+_STAGE_LABELS = {"cv": "tailored CV", "letter": "cover letter", "message": "outreach message"}
+# Streamed generation is reported at most this often: each report is one DB
+# write, picked up by the SSE readers' poll.
+_PROGRESS_INTERVAL = 2.0
+
+
+def _stage_key(stage: str, *inputs) -> str:
+    """Content hash of everything a stage's output depends on."""
+    h = hashlib.sha256(stage.encode())
+    for part in inputs:
+        h.update(b"\x00")
+        h.update(json.dumps(part, sort_keys=True, ensure_ascii=False).encode())
+    return h.hexdigest()
+
+
+def _checkpoint(job: Job, stage: str, key: str):
+    """The stage output saved by an earlier attempt, if its inputs still match."""
+    saved = (job.checkpoints or {}).get(stage)
+    if isinstance(saved, dict) and saved.get("key") == key:
+        return saved.get("value")
+    return None
+
+
+def _save_checkpoint(job: Job, stage: str, key: str, value) -> None:
+    # Reassign, never mutate in place: the JSON column does not track mutation.
+    checkpoints = dict(job.checkpoints or {})
+    checkpoints[stage] = {"key": key, "value": value}
+    job.checkpoints = checkpoints
+
+
+class _RateLimitNotice:
+    """Installed as the job's ratelimit.wait_listener: records when calls on
+    the job's AI credential are held back by a 429 pause or the rpm cap."""
+
+    def __init__(self):
+        self.until = 0.0
+        self.changed = False
+
+    def __call__(self, seconds: float) -> None:
+        self.until = max(self.until, time.monotonic() + seconds)
+        self.changed = True
+
+    def message(self) -> str | None:
+        left = self.until - time.monotonic()
+        if left < 1:
+            return None
+        return f"The AI rate limit was reached; resuming in about {math.ceil(left)}s…"
+
+    def poll(self, pct: int) -> tuple[str, int] | None:
+        if not self.changed:
+            return None
+        self.changed = False
+        message = self.message()
+        return (message, pct) if message else None
+
+
+class _GenerateProgress:
+    """Live view of the parallel generate calls, fed by the provider's stream
+    callbacks: fields completed per document and output tokens received."""
+
+    def __init__(self, stages: list[str], notice: _RateLimitNotice):
+        self.stages = stages
+        self.notice = notice
+        self.streams: dict[str, StreamProgress] = {}
+        self.done: set[str] = set()
+        self.changed = False
+
+    def callback(self, stage: str) -> ProgressCallback:
+        def on_progress(progress: StreamProgress) -> None:
+            self.streams[stage] = progress
+            self.changed = True
+
+        return on_progress
+
+    def finish(self, stage: str) -> None:
+        self.done.add(stage)
+        self.changed = True
+
+    def fraction(self) -> float:
+        parts = [
+            1.0 if stage in self.done
+            else self.streams[stage].fraction() if stage in self.streams
+            else 0.0
+            for stage in self.stages
+        ]
+        return sum(parts) / len(parts) if parts else 1.0
+
+    def message(self) -> str:
+        bits = []
+        for stage in self.stages:
+            label, progress = _STAGE_LABELS[stage], self.streams.get(stage)
+            if stage in self.done:
+                bits.append(f"{label} done")
+            elif progress is None:
+                bits.append(f"{label} starting")
+            elif progress.fields:
+                bits.append(f"{label} {len(progress.sections)}/{len(progress.fields)} sections")
+            else:
+                bits.append(f"{label} {progress.chars} characters")
+        tokens = sum(p.tokens for p in self.streams.values())
+        return f"Writing: {', '.join(bits)} ({tokens} tokens received)…"
+
+    def poll(self) -> tuple[str, int] | None:
+        if not (self.changed or self.notice.changed):
+            return None
+        self.changed = self.notice.changed = False
+        return self.notice.message() or self.message(), 30 + int(30 * self.fraction())
+
+
+Poll = Callable[[], tuple[str, int] | None]
+
+
+async def _report_progress(db: AsyncSession, job: Job, step: str, poll: Poll, stop: asyncio.Event) -> None:
+    """Emit whatever poll() reports as `step` events until stop is set. The
+    only user of the session while the provider calls run, so the writes
+    never interleave."""
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=_PROGRESS_INTERVAL)
+        except TimeoutError:
+            pass
+        update = None if stop.is_set() else poll()
+        if update is not None:
+            await _emit(db, job, step, *update)
+
+
+@contextlib.asynccontextmanager
+async def _reporting(db: AsyncSession, job: Job, step: str, poll: Poll):
+    stop = asyncio.Event()
+    reporter = asyncio.create_task(_report_progress(db, job, step, poll, stop))
+    try:
+        yield
+    finally:
+        stop.set()
+        await reporter
+
+
+def _store_token_usage(job: Job) -> None:
+    """Copy the running job's provider token counts onto the row."""
+    tokens = usage.current.get()
+    if tokens is not None:
+        job.token_usage = tokens.as_dict()
+
+
 async def _emit(db: AsyncSession, job: Job, step: str, message: str, pct: int) -> None:
     events = list(job.events or [])
     events.append(
@@ -127,6 +278,8 @@ async def _run_job(
         job = await db.get(Job, job_id)
         if job is None:
             return
+        # Counts accumulate across retries: the job's cost is every attempt.
+        usage.current.set(usage.UsageLog(job.token_usage))
         try:
             await _pipeline(
                 db, job, master_data, photo_id, template, accent, show_photo, byok_key,
@@ -136,6 +289,7 @@ async def _run_job(
             job.status = "failed"
             job.error = str(exc)
             job.finished_at = datetime.now(UTC)
+            _store_token_usage(job)
             if not job.byok:
                 await quota.refund_one(db, job.user_id, guest_hash)
             await _emit(db, job, "failed", str(exc), 100)
@@ -144,6 +298,7 @@ async def _run_job(
             job.status = "failed"
             job.error = "Internal error while generating. Please try again."
             job.finished_at = datetime.now(UTC)
+            _store_token_usage(job)
             if not job.byok:
                 await quota.refund_one(db, job.user_id, guest_hash)
             await _emit(db, job, "failed", f"Internal error: {type(exc).__name__}", 100)
@@ -170,9 +325,26 @@ async def _pipeline(
         asyncio.create_task(_ensure_latex_warm())
 
     job.status = "running"
-    await _emit(db, job, "analyze", "Scanning the job description like a recruiter would…", 8)
-
-    analysis: JobAnalysis = await provider.analyze(job.job_description, master.plain_text(), language)
+    # Rate-limit waits on this job's credential surface as job events; the
+    # gather below copies the context, so its tasks report here too.
+    notice = _RateLimitNotice()
+    ratelimit.wait_listener.set(notice)
+    # Stage outputs are checkpointed on the job as they land, so a retry after
+    # a render failure or a 429 resumes at the first stage that never finished.
+    analysis_key = _stage_key("analysis", job.job_description, master.plain_text(), language)
+    saved = _checkpoint(job, "analysis", analysis_key)
+    if saved is not None:
+        await _emit(db, job, "analyze", "Reusing the job analysis from the previous attempt…", 8)
+        analysis = JobAnalysis.model_validate(saved)
+    else:
+        await _emit(db, job, "analyze", "Scanning the job description like a recruiter would…", 8)
+        async with _reporting(db, job, "analyze", lambda: notice.poll(8)):
+            analysis, cached = await aicache.analyze(
+                provider, job.job_description, master.plain_text(), language
+            )
+        if cached:
+            log.info("job %s: analysis served from the shared cache", job.id)
+        _save_checkpoint(job, "analysis", analysis_key, analysis.model_dump())
     job.title = analysis.job_title
     job.company = analysis.company
     job.analysis = analysis.model_dump()
@@ -182,11 +354,85 @@ async def _pipeline(
         f"Found {len(analysis.keywords)} key requirements. Current match {before['score']}%.", 22,
     )
 
-    await _emit(db, job, "generate", "Tailoring CV, cover letter and outreach in parallel…", 30)
-    cv_task = provider.tailor_cv(job.job_description, analysis, master, language, rewrite_intensity)
-    letter_task = provider.write_letter(job.job_description, analysis, master, language)
-    msg_task = provider.outreach(job.job_description, analysis, master, language)
-    tailored, letter, message = await asyncio.gather(cv_task, letter_task, msg_task)
+    jd, analysis_dump, master_dump = job.job_description, analysis.model_dump(), master.model_dump()
+    keys = {
+        "cv": _stage_key("cv", jd, analysis_dump, master_dump, language, rewrite_intensity),
+        "letter": _stage_key("letter", jd, analysis_dump, master_dump, language),
+        "message": _stage_key("message", jd, analysis_dump, master_dump, language),
+    }
+    calls = {
+        "cv": lambda cb: provider.tailor_cv(
+            jd, analysis, master, language, rewrite_intensity, on_progress=cb
+        ),
+        "letter": lambda cb: provider.write_letter(jd, analysis, master, language, on_progress=cb),
+        "message": lambda cb: provider.outreach(jd, analysis, master, language, on_progress=cb),
+    }
+    outputs = {stage: _checkpoint(job, stage, key) for stage, key in keys.items()}
+    pending = [stage for stage, value in outputs.items() if value is None]
+    resumed = len(keys) - len(pending)
+
+    # Opt-in memo across jobs: an identical regeneration skips the LLM. BYOK
+    # jobs bypass it both ways.
+    memo_keys: dict[str, str] = {}
+    served: list[str] = []
+    if byok_key is None and aicache.results_enabled():
+        memo_keys = {
+            "cv": aicache.result_key("cv", provider.cache_tag, master_dump, jd, language, rewrite_intensity),
+            "letter": aicache.result_key("letter", provider.cache_tag, master_dump, jd, language),
+            "message": aicache.result_key("message", provider.cache_tag, master_dump, jd, language),
+        }
+        for stage in pending:
+            value = await aicache.load_result(memo_keys[stage])
+            if value is not None:
+                outputs[stage] = value
+                _save_checkpoint(job, stage, keys[stage], value)
+                served.append(stage)
+        pending = [stage for stage in pending if stage not in served]
+
+    if not resumed and not served:
+        await _emit(db, job, "generate", "Tailoring CV, cover letter and outreach in parallel…", 30)
+    else:
+        parts = []
+        if resumed:
+            parts.append(f"Reusing {resumed} of 3 documents from the previous attempt")
+        if served:
+            labels = " and ".join(_STAGE_LABELS[stage] for stage in served)
+            parts.append(f"Served the {labels} from an identical recent generation")
+        if pending:
+            parts.append("writing the rest")
+        await _emit(db, job, "generate", "; ".join(parts) + "…", 30)
+    progress = _GenerateProgress(pending, notice)
+    off_tag: set[str] = set()
+
+    async def run(stage: str):
+        with aicache.watch_off_tag() as answers:
+            result = await calls[stage](progress.callback(stage))
+        if answers:
+            off_tag.add(stage)  # a lite-model answer is not memoized
+        progress.finish(stage)
+        return result
+
+    async with _reporting(db, job, "generate", progress.poll):
+        # return_exceptions: one failed call must not discard its siblings' results.
+        results = await asyncio.gather(*(run(stage) for stage in pending), return_exceptions=True)
+    failure: BaseException | None = None
+    for stage, res in zip(pending, results, strict=True):
+        if isinstance(res, BaseException):
+            failure = failure or res
+            continue
+        outputs[stage] = res.model_dump() if stage != "message" else res
+        _save_checkpoint(job, stage, keys[stage], outputs[stage])
+    if failure is not None:
+        raise failure  # the failure handler's _emit commits the finished stages
+    for stage in pending:
+        if stage in memo_keys and stage not in off_tag:
+            try:
+                await aicache.store_result(memo_keys[stage], outputs[stage])
+            except Exception:
+                log.warning("result cache write failed", exc_info=True)
+    tailored = CVData.model_validate(outputs["cv"])
+    letter = LetterData.model_validate(outputs["letter"])
+    message: str = outputs["message"]
 
     after = ats.score(analysis.keywords, tailored.plain_text())
     await _emit(
@@ -226,7 +472,7 @@ async def _pipeline(
         # The .tex port has no photo (v1); the letter stays on the Typst lane.
         cv_settings_in = {**doc_settings, "compiler": "latex", "show_photo": False}
         cv_result, cv_source = await compile_tex_document(
-            cv_id, tailored.model_dump(), cv_settings_in
+            cv_id, tailored.model_dump(), cv_settings_in, priority="batch"
         )
     else:
         cv_settings_in = doc_settings
@@ -271,7 +517,9 @@ async def _pipeline(
     db.add_all([cv_doc, letter_doc, msg_doc])
 
     job.status = "completed"
+    job.checkpoints = None  # the documents now hold every stage's output
     job.finished_at = datetime.now(UTC)
+    _store_token_usage(job)
     await _emit(db, job, "done", "Documents ready.", 100)
 
 
@@ -285,6 +533,7 @@ def job_snapshot(job: Job, documents: list[Document] | None = None) -> dict:
         "events": job.events or [],
         "error": job.error,
         "created_at": job.created_at.isoformat() if job.created_at else None,
+        "token_usage": job.token_usage or {},
     }
     if documents is not None:
         out["documents"] = [
@@ -44,7 +44,7 @@ async def lifespan(app: FastAPI):
     log.info(
         "cvglowup up — env=%s ai=%s billing=%s latex=%s typst=%s",
         settings.env,
-        "gemini" if settings.ai_enabled else "offline-fake",
+        "replay" if settings.ai_replaying else "gemini" if settings.ai_enabled else "offline-fake",
         settings.billing_enabled,
         settings.latex_enabled,
         settings.typst_command,
@@ -83,11 +83,39 @@ class Job(Base):
     # Inputs needed to re-run this job (master_data, photo_id, template, accent,
     # show_photo). NULL on rows created before retry support.
     gen_params: Mapped[dict | None] = mapped_column(JSON, default=None)
+    # Per-stage outputs of the last run, {stage: {"key": input hash, "value": output}}.
+    # A retry reuses every stage whose input hash still matches.
+    checkpoints: Mapped[dict | None] = mapped_column(JSON, default=None)
+    # Provider tokens spent on this job across all attempts,
+    # {method: {"calls", "prompt", "response", "cached"}} (see ai/usage.py).
+    token_usage: Mapped[dict | None] = mapped_column(JSON, default=None)
     byok: Mapped[bool] = mapped_column(default=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
     finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), default=None)
 
 
+class AnalysisCacheEntry(Base):
+    """A JobAnalysis shared across users and instances: the same posting gets
+    pasted by many people, and analyzing it is the first serial LLM hop."""
+
+    __tablename__ = "analysis_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)  # see aicache.analysis_key
+    analysis: Mapped[dict] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, index=True)
+
+
+class ResultCacheEntry(Base):
+    """Opt-in memo of one generated document (tailored CV, letter, message)
+    for an identical master CV + posting + options; see aicache.result_key."""
+
+    __tablename__ = "result_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[dict | str] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, index=True)
+
+
 class Document(Base):
     """A generated, editable artifact: CV, cover letter, or outreach message."""
 
@@ -1,4 +1,5 @@
 """Master CV management: paste text, upload PDF (parsed by the AI), edit data."""
+import asyncio
 import uuid
 from typing import Annotated
 
@@ -6,7 +7,7 @@ from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..ai import get_provider
+from ..ai import get_provider, release_prompt_cache
 from ..ai.base import AIError
 from ..config import get_settings
 from ..db import get_db
@@ -88,7 +89,8 @@ async def upload_cv(
     # some generators prepend junk, so don't require it at offset 0.
     if b"%PDF" not in content[:1024]:
         raise HTTPException(status_code=415, detail="Only PDF files are accepted.")
-    if not get_settings().ai_enabled and not byok:
+    settings = get_settings()
+    if not (settings.ai_enabled or settings.ai_replaying) and not byok:
         raise HTTPException(
             status_code=422,
             detail="PDF parsing needs the AI service. Paste your CV as text instead (offline mode).",
@@ -115,6 +117,7 @@ async def update_cv(
     cv = await db.get(MasterCV, cv_id)
     if cv is None or cv.user_id != user.id:
         raise HTTPException(status_code=404, detail="CV not found.")
+    old_data = cv.data
     if body.name:
         cv.name = body.name
     if body.data is not None:
@@ -123,6 +126,8 @@ async def update_cv(
         cv.raw_text = body.raw_text
     await db.commit()
     await db.refresh(cv)
+    if old_data and cv.data != old_data:
+        asyncio.create_task(release_prompt_cache(old_data))
     return _cv_payload(cv)
 
 
@@ -150,8 +155,11 @@ async def delete_cv(
     cv = await db.get(MasterCV, cv_id)
     if cv is None or cv.user_id != user.id:
         raise HTTPException(status_code=404, detail="CV not found.")
+    old_data = cv.data
     await db.delete(cv)
     await db.commit()
+    if old_data:
+        asyncio.create_task(release_prompt_cache(old_data))
     return {"ok": True}
 
 
@@ -1,9 +1,11 @@
 """Document editing: structured updates, raw-source compiles, chat edits, PDF."""
+import json
 import re
+from collections.abc import AsyncIterator
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..ai import get_provider
@@ -15,7 +17,7 @@ from ..quota import plan_for
 from ..schemas import ChatIn, CompileIn, CVData, DocumentUpdateIn, LetterData
 from ..security import get_byok_key, get_current_user
 from ..texsvc.activity import touch_latex_activity
-from ..texsvc.client import compile_tex
+from ..texsvc.client import compile_tex, diagnostics, stream_tex
 from ..texsvc.fit import compile_tex_document
 from ..typstsvc import renderer
 
@@ -166,6 +168,32 @@ async def update_document(
     return _doc_payload(doc, result.svgs)
 
 
+def _compile_source(doc: Document, body: CompileIn) -> str:
+    """The source a preview compile runs on, checked for the engine."""
+    if doc.kind == "message":
+        raise HTTPException(status_code=422, detail="Messages are plain text.")
+    source = body.source if body.source is not None else (doc.source or "")
+    if len(source) > _MAX_SOURCE:
+        raise HTTPException(status_code=413, detail="Source too large.")
+    if _is_latex(doc):
+        if re.search(r"\\write18", source):
+            raise HTTPException(status_code=422, detail="Shell escape is not allowed.")
+    elif re.search(r"^\s*#?import\s+\"(?!/typst/)", source, re.M):
+        raise HTTPException(status_code=422, detail="Imports outside /typst/ are not allowed.")
+    return source
+
+
+async def _save_source(db: AsyncSession, doc: Document, body: CompileIn, ok: bool) -> bool:
+    """A posted source that compiled becomes the document (source mode)."""
+    if body.source is None or not ok:
+        return False
+    doc.source = body.source
+    doc.mode = "source"
+    doc.pdf = None
+    await db.commit()
+    return True
+
+
 @router.post("/{doc_id}/compile")
 async def compile_document(
     doc_id: str,
@@ -175,29 +203,14 @@ async def compile_document(
 ):
     """Compile preview. With a source body, validates + saves it (source mode)."""
     doc = await _get_doc(db, doc_id, user)
-    if doc.kind == "message":
-        raise HTTPException(status_code=422, detail="Messages are plain text.")
-
-    source = body.source if body.source is not None else (doc.source or "")
-    if len(source) > _MAX_SOURCE:
-        raise HTTPException(status_code=413, detail="Source too large.")
+    source = _compile_source(doc, body)
     if _is_latex(doc):
-        if re.search(r"\\write18", source):
-            raise HTTPException(status_code=422, detail="Shell escape is not allowed.")
         result, _ = await compile_tex(doc.id, source)
         if result.ok:
             await touch_latex_activity(db)
     else:
-        if re.search(r"^\s*#?import\s+\"(?!/typst/)", source, re.M):
-            raise HTTPException(status_code=422, detail="Imports outside /typst/ are not allowed.")
         result = await renderer.compile_source(source, photo=await _photo_bytes(db, doc), fmt="svg")
-    saved = False
-    if body.source is not None and result.ok:
-        doc.source = body.source
-        doc.mode = "source"
-        doc.pdf = None
-        await db.commit()
-        saved = True
+    saved = await _save_source(db, doc, body, result.ok)
     return {
         "ok": result.ok,
         "pages": result.pages,
@@ -208,6 +221,55 @@ async def compile_document(
     }
 
 
+@router.post("/{doc_id}/compile/stream")
+async def compile_document_stream(
+    doc_id: str,
+    body: CompileIn,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    user: Annotated[User | None, Depends(get_current_user)],
+):
+    """compile_document as NDJSON lines: a status ({ok, pages, diagnostics,
+    saved, mode}), one {page, svg} per page, then {done, ok}. LaTeX pages
+    arrive as latexc converts them, so page 1 shows before the rest; Typst
+    ones come all at once. The save happens before the first line."""
+    doc = await _get_doc(db, doc_id, user)
+    source = _compile_source(doc, body)
+    if _is_latex(doc):
+        frames = stream_tex(doc.id, source)
+        status = (await anext(frames)).status
+        ok, pages, diag = status.ok, status.pages, "" if status.ok else diagnostics(status)
+        if ok:
+            await touch_latex_activity(db)
+        svgs: list[str] = []
+    else:
+        frames = None
+        result = await renderer.compile_source(source, photo=await _photo_bytes(db, doc), fmt="svg")
+        ok, pages, diag, svgs = result.ok, result.pages, result.diagnostics, result.svgs or []
+    saved = await _save_source(db, doc, body, ok)
+    head = {"kind": "status", "ok": ok, "pages": pages, "diagnostics": diag, "saved": saved, "mode": doc.mode}
+
+    async def lines() -> AsyncIterator[str]:
+        yield json.dumps(head) + "\n"
+        for n, svg in enumerate(svgs, 1):
+            yield json.dumps({"kind": "page", "page": n, "svg": svg}) + "\n"
+        done = frames is None or not head["ok"]
+        if frames is not None:
+            try:
+                while head["ok"] and (frame := await anext(frames, None)) is not None:
+                    if frame.kind == "page":
+                        yield json.dumps({"kind": "page", "page": frame.page, "svg": frame.svg}) + "\n"
+                    elif frame.kind == "status" and not frame.status.ok:
+                        head.update(ok=False, diagnostics=diagnostics(frame.status))
+                        yield json.dumps(head) + "\n"
+                    elif frame.kind == "done":
+                        done = True
+            finally:
+                await frames.aclose()  # releases the latexc connection
+        yield json.dumps({"kind": "done", "ok": done and head["ok"]}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @router.post("/{doc_id}/chat")
 async def chat_edit(
     doc_id: str,
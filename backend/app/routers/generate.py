@@ -151,7 +151,8 @@ async def retry_job(
     user: Annotated[User | None, Depends(get_current_user)],
     byok: Annotated[str | None, Depends(get_byok_key)],
 ):
-    """Re-run a failed job in place with its original inputs (same job id)."""
+    """Re-run a failed job in place with its original inputs (same job id).
+    Stages checkpointed by the failed attempt are reused, not regenerated."""
     job = await db.get(Job, job_id)
     if job is None:
         raise HTTPException(status_code=404, detail="Job not found.")
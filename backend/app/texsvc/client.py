@@ -1,122 +1,384 @@
 """HTTP client for services/latexc. Returns the Typst CompileResult shape so
-routers dispatch once and stay engine-agnostic."""
+routers dispatch once and stay engine-agnostic.
+
+Files sync as contract v2 deltas once the service has said it speaks v2:
+a file whose hash matches what this doc last synced goes hash-only, and a
+409 (project evicted, instance replaced) resends the listed files whole.
+
+Every request tells latexc how long it will wait (X-Request-Timeout), so
+work still queued when we give up is dropped there, and who is waiting
+(X-Request-Priority): Studio requests are interactive, generation jobs
+batch. An overloaded service
+answers 503 + Retry-After: a short wait is worth one retry, a longer one
+comes back as "busy" instead of running into our timeout.
+
+With several instances (pool.py) a request goes to its doc's instance and
+moves down the doc's route when that one cannot be reached, or is busy
+and another is left: a cold compile elsewhere beats waiting."""
+import asyncio
 import base64
+import json
 import logging
-import re
+import math
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable
 
 import httpx
-from services.latexc.contract import CompileFile, LatexCompileIn, LatexCompileOut
+from services.latexc import fitloop
+from services.latexc.contract import (
+    CompileFile,
+    CompileFrame,
+    FitAttempt,
+    LatexCompileIn,
+    LatexCompileOut,
+    LatexFitIn,
+    LatexFitOut,
+    Priority,
+    fill_tokens,
+    sha256_hex,
+)
 
-from ..config import get_settings
 from ..typstsvc.renderer import CompileResult
-
-# Emitted by tex_onyx's \AtEndDocument probe; values are TeX pt dimens.
-_FILL_RE = re.compile(r"CVGFILL:([0-9.]+)pt/([0-9.]+)pt")
+from . import pool
+from .pool import COMPILE_TIMEOUT_S, Instance
 
 log = logging.getLogger("cvglowup.latexc")
 
-_client: httpx.AsyncClient | None = None
+# A fit is several warm compiles in one request (a re-fit is typically 2-6);
+# the per-compile 50 s budget would cut off a legitimately long search.
+_FIT_TIMEOUT_S = 150.0
+# Longest Retry-After worth sleeping through before one retry.
+_RETRY_WAIT_MAX_S = 5.0
 
+_SYNCED_DOCS = 512
 
-def _http() -> httpx.AsyncClient:
-    global _client
-    if _client is None:
-        s = get_settings()
-        _client = httpx.AsyncClient(
-            base_url=s.latexc_url,
-            headers={"Authorization": f"Bearer {s.latexc_token}"},
-            timeout=50.0,
-        )
-    return _client
+# doc_id -> (instance url, {path: sha256}) as that instance last accepted
+# them, LRU-capped.
+_synced: OrderedDict[str, tuple[str, dict[str, str]]] = OrderedDict()
+
+
+class _Busy(Exception):
+    """latexc shed the request and its Retry-After is too long to wait out."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"LaTeX service is busy; try again in {math.ceil(retry_after)} s")
 
 
-def _parse_probe(log_tail: str) -> tuple[float, float] | None:
-    """Raw (pagetotal, pagegoal) in pt from the CVGFILL probe line."""
-    m = _FILL_RE.search(log_tail)
-    if not m:
-        return None
+class _PlainRoute(Exception):
+    """The instance has no stream route: compile the plain way."""
+
+
+def _retry_after(resp: httpx.Response) -> float:
     try:
-        return float(m.group(1)), float(m.group(2))
+        return max(0.0, float(resp.headers.get("retry-after", "1")))
     except ValueError:
-        return None
-
-
-def _parse_fill(log_tail: str) -> float | None:
-    """Last-page fill ratio, None when unusable. A \\pagegoal above 10000pt is
-    either maxdimen noise or the continuous measuring canvas, not an A4 goal."""
-    probe = _parse_probe(log_tail)
-    if probe is None:
-        return None
-    total, goal = probe
-    if goal <= 0 or goal > 10_000:
-        return None
-    return min(1.0, total / goal)
-
-
-def _parse_total(log_tail: str) -> float | None:
-    """Raw content height in pt (continuous pass-1 measurement); no goal guard,
-    the measuring canvas goal is deliberately huge."""
-    probe = _parse_probe(log_tail)
-    return probe[0] if probe else None
-
-
-async def compile_tex_measured(
-    doc_id: str, tex_source: str
-) -> tuple[CompileResult, str, float | None, float | None]:
-    """Compile and also report the probe readings: (result, source, fill ratio
-    for the one-page fit loop, raw content height for continuous pass 1)."""
-    body = LatexCompileIn(
-        doc_id=doc_id,
-        files=[CompileFile(
-            path="main.tex",
-            content_b64=base64.b64encode(tex_source.encode("utf-8")).decode(),
-        )],
-    )
+        return 1.0
+
+
+def _headers(timeout_s: float, priority: Priority) -> dict[str, str]:
+    return {"X-Request-Timeout": f"{timeout_s:g}", "X-Request-Priority": priority}
+
+
+async def _send(
+    inst: Instance,
+    path: str,
+    body: dict,
+    timeout_s: float = COMPILE_TIMEOUT_S,
+    priority: Priority = "interactive",
+) -> httpx.Response:
+    """POST with our deadline and priority attached; a 503 is retried once
+    after its Retry-After when that is short, else raises _Busy."""
+    headers = _headers(timeout_s, priority)
+    resp = await inst.http.post(path, json=body, timeout=timeout_s, headers=headers)
+    if resp.status_code == 503:
+        wait = _retry_after(resp)
+        if wait > _RETRY_WAIT_MAX_S:
+            raise _Busy(wait)
+        await asyncio.sleep(wait)
+        resp = await inst.http.post(path, json=body, timeout=timeout_s, headers=headers)
+        if resp.status_code == 503:
+            raise _Busy(_retry_after(resp))
+    return resp
+
+
+async def _post(
+    doc_id: str,
+    path: str,
+    body_for: Callable[[Instance], dict],
+    timeout_s: float = COMPILE_TIMEOUT_S,
+    priority: Priority = "interactive",
+) -> tuple[Instance, httpx.Response]:
+    """_send down the doc's route until an instance takes it. body_for
+    builds the body per instance (delta sync state is per instance)."""
+    candidates = pool.route(doc_id)
+    for inst in candidates:
+        try:
+            resp = await _send(inst, path, body_for(inst), timeout_s, priority)
+        except pool.UNREACHABLE as exc:
+            pool.unreachable(inst, exc)
+            if inst is candidates[-1]:
+                raise
+        except _Busy as exc:
+            if inst is candidates[-1]:
+                raise
+            log.info("latexc %s busy for doc=%s, trying the next instance: %s", inst.url, doc_id, exc)
+        else:
+            inst.breaker.success()
+            return inst, resp
+    raise httpx.ConnectError("no latexc instance configured")
+
+
+def diagnostics(out: LatexCompileOut) -> str:
+    return (out.error_line or "LaTeX compile failed") + "\n\n" + out.log_tail[-4000:]
+
+
+def _failed(out: LatexCompileOut) -> CompileResult:
+    return CompileResult(ok=False, diagnostics=diagnostics(out))
+
+
+def _result(out: LatexCompileOut) -> CompileResult:
+    pdf = base64.b64decode(out.pdf_b64) if out.pdf_b64 else None
+    return CompileResult(ok=True, pages=out.pages, pdf=pdf, svgs=out.svgs)
+
+
+def _files(
+    inst: Instance, doc_id: str, files: dict[str, bytes], resend: frozenset[str] = frozenset()
+) -> list[CompileFile]:
+    url, known = _synced.get(doc_id, ("", {}))
+    if url != inst.url or inst.version == "1":
+        known = {}
+    out = []
+    for path, raw in files.items():
+        digest = sha256_hex(raw)
+        if known.get(path) == digest and path not in resend:
+            out.append(CompileFile(path=path, sha256=digest))
+        else:
+            out.append(CompileFile(path=path, content_b64=base64.b64encode(raw).decode(), sha256=digest))
+    return out
+
+
+def _remember(inst: Instance, doc_id: str, files: dict[str, bytes], version: str) -> None:
+    inst.version = version
+    inst.warm.add(doc_id)
+    _synced[doc_id] = (inst.url, {path: sha256_hex(raw) for path, raw in files.items()})
+    _synced.move_to_end(doc_id)
+    while len(_synced) > _SYNCED_DOCS:
+        _synced.popitem(last=False)
+
+
+async def _post_compile(
+    doc_id: str, files: dict[str, bytes], priority: Priority = "interactive"
+) -> LatexCompileOut:
+    def body(inst: Instance, resend: frozenset[str] = frozenset()) -> dict:
+        inp = LatexCompileIn(doc_id=doc_id, files=_files(inst, doc_id, files, resend))
+        return inp.model_dump(exclude_none=True)
+
+    inst, resp = await _post(doc_id, "/v1/compile", body, priority=priority)
+    if resp.status_code == 409:
+        missing = frozenset(resp.json()["detail"]["missing"])
+        resp = await _send(inst, "/v1/compile", body(inst, missing), priority=priority)
+    resp.raise_for_status()
+    out = LatexCompileOut.model_validate(resp.json())
+    _remember(inst, doc_id, files, out.version)
+    return out
+
+
+async def compile_tex(doc_id: str, tex_source: str) -> tuple[CompileResult, str]:
     try:
-        resp = await _http().post("/v1/compile", json=body.model_dump())
-        resp.raise_for_status()
-        out = LatexCompileOut.model_validate(resp.json())
-    except (httpx.HTTPError, ValueError) as exc:
+        out = await _post_compile(doc_id, {"main.tex": tex_source.encode("utf-8")})
+    except _Busy as exc:
+        log.warning("latexc busy doc=%s: %s", doc_id, exc)
+        return CompileResult(ok=False, diagnostics=str(exc)), tex_source
+    except (httpx.HTTPError, ValueError, KeyError) as exc:
         log.warning("latexc unreachable: %s", exc)
-        return (
-            CompileResult(ok=False, diagnostics=f"LaTeX service unavailable: {exc}"),
-            tex_source,
-            None,
-            None,
-        )
+        return CompileResult(ok=False, diagnostics=f"LaTeX service unavailable: {exc}"), tex_source
     log.info(
         "latex_compile doc=%s cache=%s ok=%s pages=%s total_ms=%s",
         doc_id, out.cache, out.ok, out.pages, out.timings_ms.get("total"),
     )
     if not out.ok:
-        diag = (out.error_line or "LaTeX compile failed") + "\n\n" + out.log_tail[-4000:]
-        return CompileResult(ok=False, diagnostics=diag), tex_source, None, None
-    pdf = base64.b64decode(out.pdf_b64) if out.pdf_b64 else None
-    return (
-        CompileResult(ok=True, pages=out.pages, pdf=pdf, svgs=out.svgs),
-        tex_source,
-        _parse_fill(out.log_tail),
-        _parse_total(out.log_tail),
+        return _failed(out), tex_source
+    return _result(out), tex_source
+
+
+def _failed_frame(error_line: str) -> CompileFrame:
+    return CompileFrame(kind="status", status=LatexCompileOut(ok=False, error_line=error_line))
+
+
+def _unavailable(exc: Exception) -> CompileFrame:
+    log.warning("latexc unreachable: %s", exc)
+    return _failed_frame(f"LaTeX service unavailable: {exc}")
+
+
+async def _stream_from(inst: Instance, doc_id: str, files: dict[str, bytes]) -> AsyncIterator[CompileFrame]:
+    resend: frozenset[str] = frozenset()
+    waited = False
+    for _ in range(3):
+        body = LatexCompileIn(doc_id=doc_id, files=_files(inst, doc_id, files, resend), want_pdf=False)
+        async with inst.http.stream(
+            "POST", "/v1/compile/stream", json=body.model_dump(exclude_none=True),
+            headers=_headers(COMPILE_TIMEOUT_S, "interactive"),
+        ) as resp:
+            if resp.status_code == 409:
+                resend = frozenset(json.loads(await resp.aread())["detail"]["missing"])
+                continue
+            if resp.status_code == 503:
+                wait = _retry_after(resp)
+                if waited or wait > _RETRY_WAIT_MAX_S:
+                    raise _Busy(wait)
+                waited = True
+                await asyncio.sleep(wait)
+                continue
+            if resp.status_code == 404:
+                raise _PlainRoute
+            resp.raise_for_status()
+            inst.breaker.success()
+            async for line in resp.aiter_lines():
+                if not line:
+                    continue
+                frame = CompileFrame.model_validate_json(line)
+                if frame.kind == "status" and frame.status is not None:
+                    _remember(inst, doc_id, files, frame.status.version)
+                    log.info(
+                        "latex_compile_stream doc=%s instance=%s cache=%s ok=%s pages=%s",
+                        doc_id, inst.url, frame.status.cache, frame.status.ok, frame.status.pages,
+                    )
+                yield frame
+            return
+    raise _PlainRoute
+
+
+async def stream_tex(doc_id: str, tex_source: str) -> AsyncIterator[CompileFrame]:
+    """compile_tex for previews, as latexc's frames: the status first (a
+    failed one when the service is down or busy), then each page's SVG as
+    soon as latexc has it, then "done". No PDF. A service without the stream
+    route is compiled the plain way and its result replayed as frames."""
+    files = {"main.tex": tex_source.encode("utf-8")}
+    started = False
+    try:
+        candidates = pool.route(doc_id)
+        for inst in candidates:
+            try:
+                async for frame in _stream_from(inst, doc_id, files):
+                    started = True
+                    yield frame
+                return
+            except _PlainRoute:
+                break
+            except pool.UNREACHABLE as exc:
+                pool.unreachable(inst, exc)
+                if inst is candidates[-1]:
+                    raise
+            except _Busy:
+                if inst is candidates[-1]:
+                    raise
+        out = await _post_compile(doc_id, files)
+    except _Busy as exc:
+        log.warning("latexc busy doc=%s: %s", doc_id, exc)
+        yield _failed_frame(str(exc))
+        return
+    except (httpx.HTTPError, ValueError, KeyError) as exc:
+        if not started:
+            yield _unavailable(exc)
+        else:
+            log.warning("latexc stream broke off: %s", exc)
+        return
+    yield CompileFrame(kind="status", status=out.model_copy(update={"pdf_b64": None, "svgs": []}))
+    for n, svg in enumerate(out.svgs, 1):
+        yield CompileFrame(kind="page", page=n, svg=svg)
+    yield CompileFrame(kind="done", timings_ms=out.timings_ms)
+
+
+async def _fit_by_compiles(body: LatexFitIn, priority: Priority) -> LatexFitOut:
+    """The fit search run here, one /v1/compile per attempt: for an instance
+    on an image from before /v1/fit. Same ladder (fitloop), same sources
+    (fill_tokens); an older server reports the fill only in its log tail."""
+    template = base64.b64decode(body.template_b64).decode("utf-8")
+    extra = {f.path: base64.b64decode(f.content_b64) for f in body.files if f.content_b64 is not None}
+
+    async def compile_(density: str, scale: float, paper: str) -> fitloop.Attempt:
+        started = time.monotonic()
+        source = fill_tokens(template, body.tokens[density], scale, {body.paper_token: paper})
+        out = await _post_compile(body.doc_id, {**extra, body.main: source.encode("utf-8")}, priority)
+        ms = int((time.monotonic() - started) * 1000)
+        if not out.ok:
+            return fitloop.Attempt(ok=False, ms=ms, output=out)
+        fill = out.fill if out.fill is not None else fitloop.fill_from_log(out.log_tail)
+        total = out.probe[0] if out.probe is not None else fitloop.total_from_log(out.log_tail)
+        return fitloop.Attempt(ok=True, pages=out.pages, fill=fill, total=total, ms=ms, output=out)
+
+    search = await fitloop.run(body, compile_)
+    chosen = search.chosen
+    return LatexFitOut(
+        **chosen.output.model_dump(exclude={"fill"}),
+        fill=chosen.fill,
+        density=chosen.density,
+        font_scale=chosen.font_scale,
+        overflowed=search.overflowed,
+        page_height_pt=search.page_height_pt,
+        attempts=[
+            FitAttempt(
+                density=a.density, font_scale=a.font_scale, paper=a.paper,
+                ok=a.ok, pages=a.pages, fill=a.fill, ms=a.ms,
+            )
+            for a in search.attempts
+        ],
     )
 
 
-async def compile_tex(doc_id: str, tex_source: str) -> tuple[CompileResult, str]:
-    result, source, _fill, _total = await compile_tex_measured(doc_id, tex_source)
-    return result, source
+async def fit_tex(
+    body: LatexFitIn, priority: Priority = "interactive"
+) -> tuple[CompileResult, LatexFitOut | None]:
+    """One /v1/fit request: latexc runs the whole fit search (or continuous
+    trim) next to the compiler and returns only the chosen attempt. The
+    LatexFitOut carries where it landed; None when the service is down or
+    busy. priority: "batch" for generation jobs, whose fits queue behind
+    Studio edits. An instance without the fit route (404) gets the search
+    as one compile per attempt instead."""
+    try:
+        inst, resp = await _post(
+            body.doc_id, "/v1/fit", lambda _: body.model_dump(), _FIT_TIMEOUT_S, priority
+        )
+        if resp.status_code == 404:
+            log.info("latexc %s has no /v1/fit; fitting by compiles", inst.url)
+            out = await _fit_by_compiles(body, priority)
+        else:
+            resp.raise_for_status()
+            out = LatexFitOut.model_validate(resp.json())
+            inst.warm.add(body.doc_id)
+    except _Busy as exc:
+        log.warning("latexc busy doc=%s: %s", body.doc_id, exc)
+        return CompileResult(ok=False, diagnostics=str(exc)), None
+    except (httpx.HTTPError, ValueError, KeyError) as exc:
+        log.warning("latexc unreachable: %s", exc)
+        return CompileResult(ok=False, diagnostics=f"LaTeX service unavailable: {exc}"), None
+    log.info(
+        "latex_fit doc=%s mode=%s cache=%s ok=%s pages=%s attempts=%s rung=%s@%s total_ms=%s",
+        body.doc_id, body.mode, out.cache, out.ok, out.pages, len(out.attempts),
+        out.density, out.font_scale, out.timings_ms.get("total"),
+    )
+    if not out.ok:
+        return _failed(out), out
+    return _result(out), out
 
 
 async def service_status() -> bool:
-    """Is the warm service answering right now? Short timeout on purpose."""
-    try:
-        resp = await _http().get("/v1/status", timeout=3.0)
-        return resp.status_code == 200
-    except httpx.HTTPError:
-        return False
+    """Is the warm service answering right now? Short timeout on purpose.
+    With a pool, any instance will do; the answers also refresh routing."""
+    return await pool.refresh()
 
 
-async def clear_project(doc_id: str) -> bool:
+async def _clear(inst: Instance, doc_id: str) -> bool:
+    inst.warm.discard(doc_id)
     try:
-        resp = await _http().delete(f"/v1/project/{doc_id}")
+        resp = await inst.http.delete(f"/v1/project/{doc_id}")
         return resp.status_code in (204, 404)
     except httpx.HTTPError:
         return False
+
+
+async def clear_project(doc_id: str) -> bool:
+    """On every instance: a failover may have left a copy anywhere."""
+    _synced.pop(doc_id, None)
+    return all(await asyncio.gather(*(_clear(i, doc_id) for i in pool.instances())))
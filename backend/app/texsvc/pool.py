@@ -0,0 +1,120 @@
+"""Which latexc instance serves a document.
+
+latexc's value is the warm project dir on one instance's disk, so a
+document has to keep landing on the same instance. LATEXC_URL may list
+several; each doc_id belongs to the instance with the highest rendezvous
+hash of (url, doc_id). Adding or removing an instance moves only the
+documents it gains or loses, about 1/n of them, and every backend process
+agrees on the owner without talking to the others.
+
+An instance that could not be reached is skipped for a cooldown (its
+breaker is open) and its documents go to their next-ranked instance.
+Each instance's /v1/status lists the projects it holds warm, and a
+document goes to the first healthy instance in rank order that holds it;
+to its owner only when none does. So a document that moved during a
+failover, or before an instance was added, stays with its warm state and
+goes home once that copy is evicted, when it would compile cold anyway.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+
+import httpx
+from services.latexc.contract import LatexStatus
+
+from ..ai.health import CircuitBreaker
+from ..config import get_settings
+
+log = logging.getLogger("cvglowup.latexc")
+
+COMPILE_TIMEOUT_S = 50.0
+# An unreachable instance is skipped this long, then one request probes it.
+_COOLDOWN_S = 15.0
+# Warm sets older than this are refreshed in the background.
+_STATUS_TTL_S = 30.0
+# The request never reached the instance: safe to send it elsewhere.
+UNREACHABLE = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+class Instance:
+    def __init__(self, url: str, token: str, transport: httpx.AsyncBaseTransport | None = None) -> None:
+        self.url = url
+        self.http = httpx.AsyncClient(
+            base_url=url,
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=COMPILE_TIMEOUT_S,
+            transport=transport,
+        )
+        self.breaker = CircuitBreaker(threshold=1, cooldown=_COOLDOWN_S)
+        # Until a reply says otherwise the instance is assumed to be v1.
+        self.version = "1"
+        self.warm: set[str] = set()
+
+    def score(self, doc_id: str) -> bytes:
+        return hashlib.sha256(f"{self.url}\x00{doc_id}".encode()).digest()
+
+
+_instances: list[Instance] = []
+_checked_at = 0.0
+_refreshing: asyncio.Task | None = None
+
+
+def instances() -> list[Instance]:
+    if not _instances:
+        s = get_settings()
+        _instances.extend(Instance(url, s.latexc_token) for url in s.latexc_urls)
+    return _instances
+
+
+def route(doc_id: str) -> list[Instance]:
+    """The doc's instances in the order to try them: the one holding it warm
+    (else its owner), the other healthy ones by rank, then those cooling
+    down as a last resort."""
+    ranked = sorted(instances(), key=lambda i: i.score(doc_id), reverse=True)
+    healthy = [i for i in ranked if not i.breaker.open]
+    first = next((i for i in healthy if doc_id in i.warm), healthy[0] if healthy else None)
+    _refresh_soon()
+    return [*([first] if first else []), *(i for i in healthy if i is not first),
+            *(i for i in ranked if i.breaker.open)]
+
+
+def unreachable(inst: Instance, exc: Exception) -> None:
+    log.warning("latexc %s unreachable, skipping it for %.0fs: %s", inst.url, _COOLDOWN_S, exc)
+    inst.breaker.failure()
+
+
+async def _status(inst: Instance) -> bool:
+    try:
+        resp = await inst.http.get("/v1/status", timeout=3.0)
+        resp.raise_for_status()
+        status = LatexStatus.model_validate(resp.json())
+    except UNREACHABLE as exc:
+        unreachable(inst, exc)
+        return False
+    except (httpx.HTTPError, ValueError):
+        # Slow or confused, but up: a busy instance answers status late and
+        # must not lose its documents for a cooldown over it.
+        return False
+    inst.breaker.success()
+    inst.warm = set(status.warm_projects)
+    return True
+
+
+async def refresh() -> bool:
+    """Ask every instance for its status (health and warm set); True if any
+    answered."""
+    global _checked_at
+    _checked_at = time.monotonic()
+    answers = await asyncio.gather(*(_status(i) for i in instances()))
+    return any(answers)
+
+
+def _refresh_soon() -> None:
+    """Routing among several instances wants warm sets no older than
+    _STATUS_TTL_S; fetch them without holding up the request at hand."""
+    global _refreshing
+    if len(instances()) < 2 or time.monotonic() - _checked_at < _STATUS_TTL_S:
+        return
+    if _refreshing is None or _refreshing.done():
+        _refreshing = asyncio.get_running_loop().create_task(refresh())
@@ -9,6 +9,9 @@ Known visual divergences from onyx (deliberate, v1): no contact icons
 (separator-joined links instead), round bullet marker instead of the
 triangle glyph, no photo (settings.show_photo is coerced off for latex).
 """
+from services.latexc.contract import FORMAT_MARKER, fill_tokens
+
+from ..config import REPO_ROOT
 from ..schemas import CVData
 from .escape import esc
 
@@ -47,33 +50,19 @@ _LABELS = {
 
 _FALLBACK_ACCENT = "C2551B"
 
+# Static preamble, shared with latexc (its image dumps it as a precompiled
+# format, services/latexc/formats.py). Nothing in it may depend on the
+# document; fonts cannot be dumped, so they are selected below the marker.
+_HEADER = (REPO_ROOT / "templates" / "latex" / "onyx_header.tex").read_text(encoding="utf-8")
+
 # Token-substituted preamble: LaTeX braces stay literal (no f-string braces).
-_PREAMBLE = r"""\documentclass{article}
-\usepackage[@PAPER@,left=@MX@cm,right=@MX@cm,top=@MY@cm,bottom=@MY@cm]{geometry}
-\usepackage{fontspec}
-\usepackage{xcolor}
-\usepackage[hidelinks]{hyperref}
+_PREAMBLE = _HEADER + FORMAT_MARKER + r"""
+\geometry{@PAPER@,left=@MX@cm,right=@MX@cm,top=@MY@cm,bottom=@MY@cm}
 \setmainfont{IBM Plex Sans}
 \newfontfamily\cvmono{IBM Plex Mono}
-\definecolor{cvink}{HTML}{16181D}
-\definecolor{cvmuted}{HTML}{5C6470}
-\definecolor{cvfaint}{HTML}{6B7280}
 \definecolor{cvaccent}{HTML}{@ACCENT@}
 \colorlet{cvaccentlight}{cvaccent!55!white}
 \colorlet{cvaccentdark}{cvaccent!96!black}
-\colorlet{cvinklight}{cvink!92!white}
-\pagestyle{empty}
-\setlength{\parindent}{0pt}
-\setlength{\parskip}{0pt}
-\raggedright
-\hyphenpenalty=10000
-\exhyphenpenalty=10000
-% A wrapped bullet must not split one line across a page break, and a heading
-% must not strand from the entry under it. Section/entry cohesion is handled
-% by the \nobreak pairs in the macros below.
-\widowpenalty=10000
-\clubpenalty=10000
-\displaywidowpenalty=10000
 \newcommand{\szbase}{\fontsize{@BASE@pt}{@BASELS@pt}\selectfont}
 \newcommand{\szsmall}{\fontsize{@SMALL@pt}{@SMALLLS@pt}\selectfont}
 \newcommand{\szmark}{\fontsize{@MARK@pt}{@MARK@pt}\selectfont}
@@ -113,28 +102,46 @@ _PREAMBLE = r"""\documentclass{article}
 """
 
 
-def _n(v: float) -> str:
-    return f"{round(v, 2):g}"
+def _density(settings: dict) -> str:
+    density = settings.get("density", "normal")
+    return density if density in _DENSITIES else "normal"
 
 
-def _params(settings: dict) -> dict:
-    density = settings.get("density", "normal")
-    p = dict(_DENSITIES.get(density, _DENSITIES["normal"]))
+def _scale(settings: dict) -> float:
     try:
         scale = float(settings.get("font_scale") or 1.0)
     except (TypeError, ValueError):
         scale = 1.0
-    scale = min(max(scale, 0.8), 1.5)
-    # Gaps follow the type in BOTH directions. Clamping them at 1.0 was safe
-    # while nothing ever scaled below 1.0, but it makes the fit loop's
-    # downscale rung nearly inert: fixed pt gaps are ~144pt of an xtight page,
-    # so shrinking glyphs alone barely moves the page count.
-    gap_scale = scale
-    for key in ("base", "small", "name", "headline", "h"):
-        p[key] = p[key] * scale
-    for key in ("sect_above", "sect_below", "entry_gap", "bullet_gap"):
-        p[key] = p[key] * gap_scale
-    return p
+    return min(max(scale, 0.8), 1.5)
+
+
+def _token_table(density: str) -> dict[str, tuple[float, float]]:
+    """Numeric preamble tokens as (offset, slope): the value at font scale s
+    is offset + slope * s. Margins hold still; type and gaps follow the scale.
+
+    Gaps follow the type in BOTH directions. Clamping them at 1.0 was safe
+    while nothing ever scaled below 1.0, but it makes the fit loop's
+    downscale rung nearly inert: fixed pt gaps are ~144pt of an xtight page,
+    so shrinking glyphs alone barely moves the page count."""
+    p = _DENSITIES[density]
+    lead = 1 + p["leading"]
+    return {
+        "@MX@": (p["margin_x"], 0.0), "@MY@": (p["margin_y"], 0.0),
+        "@BASE@": (0.0, p["base"]), "@BASELS@": (0.0, p["base"] * lead),
+        "@SMALL@": (0.0, p["small"]), "@SMALLLS@": (0.0, p["small"] * lead),
+        "@MARK@": (0.0, p["small"] * 0.9),
+        "@NAME@": (0.0, p["name"]), "@NAMELS@": (0.0, p["name"] * 1.05),
+        "@HEADLINE@": (0.0, p["headline"]), "@HEADLINELS@": (0.0, p["headline"] * 1.15),
+        "@H@": (0.0, p["h"]),
+        "@SECTABOVE@": (0.0, p["sect_above"]), "@SECTBELOW@": (0.0, p["sect_below"]),
+        "@ENTRYSEP@": (2.0, p["entry_gap"]), "@BULLETGAP@": (0.0, p["bullet_gap"]),
+    }
+
+
+def fit_tokens() -> dict[str, dict[str, tuple[float, float]]]:
+    """Every density's token table: what latexc's /v1/fit needs to re-render
+    the template at any rung of the fit ladder."""
+    return {density: _token_table(density) for density in _DENSITIES}
 
 
 def _accent_hex(settings: dict) -> str:
@@ -203,6 +210,7 @@ def _contact_line(cv: CVData) -> str:
 # Continuous mode's pass-1 canvas: tall enough for any real CV, under the
 # 200-inch PDF reader convention (508 cm). Pass 2 trims to measured content.
 _CONT_CANVAS = "paperwidth=21cm,paperheight=500cm"
+TRIMMED_PAPER = "paperwidth=21cm,paperheight=@HEIGHT@pt"
 
 
 def _paper(settings: dict, page_height_pt: float | None) -> str:
@@ -210,35 +218,30 @@ def _paper(settings: dict, page_height_pt: float | None) -> str:
         return "a4paper"
     if page_height_pt is None:
         return _CONT_CANVAS  # measuring pass
-    return f"paperwidth=21cm,paperheight={page_height_pt:.2f}pt"
+    return TRIMMED_PAPER.replace("@HEIGHT@", f"{page_height_pt:.2f}")
 
 
 def render_tex(data: dict, settings: dict, page_height_pt: float | None = None) -> str:
     """page_height_pt applies only in continuous page mode: None renders the
     tall measuring canvas, a value renders the trimmed final page (two-pass,
     driven by texsvc.fit)."""
+    settings = settings or {}
+    return fill_tokens(
+        render_template(data, settings),
+        _token_table(_density(settings)),
+        _scale(settings),
+        {"@PAPER@": _paper(settings, page_height_pt)},
+    )
+
+
+def render_template(data: dict, settings: dict) -> str:
+    """The document with its numeric preamble tokens and @PAPER@ left in:
+    density, font scale and paper are the fit loop's to choose (fit_tokens,
+    contract.fill_tokens)."""
     cv = CVData.model_validate(data or {})
-    p = _params(settings or {})
     labels = _labels(settings or {})
 
-    tokens = {
-        "@PAPER@": _paper(settings, page_height_pt),
-        "@MX@": _n(p["margin_x"]), "@MY@": _n(p["margin_y"]),
-        "@ACCENT@": _accent_hex(settings or {}),
-        "@BASE@": _n(p["base"]), "@BASELS@": _n(p["base"] * (1 + p["leading"])),
-        "@SMALL@": _n(p["small"]), "@SMALLLS@": _n(p["small"] * (1 + p["leading"])),
-        "@MARK@": _n(p["small"] * 0.9),
-        "@NAME@": _n(p["name"]), "@NAMELS@": _n(p["name"] * 1.05),
-        "@HEADLINE@": _n(p["headline"]), "@HEADLINELS@": _n(p["headline"] * 1.15),
-        "@H@": _n(p["h"]),
-        "@SECTABOVE@": _n(p["sect_above"]), "@SECTBELOW@": _n(p["sect_below"]),
-        "@ENTRYSEP@": _n(p["entry_gap"] + 2.0), "@BULLETGAP@": _n(p["bullet_gap"]),
-    }
-    preamble = _PREAMBLE
-    for k, v in tokens.items():
-        preamble = preamble.replace(k, v)
-
-    out: list[str] = [preamble, r"\begin{document}"]
+    out: list[str] = [_PREAMBLE.replace("@ACCENT@", _accent_hex(settings or {})), r"\begin{document}"]
 
     # ---- Header ----
     out.append(rf"{{\szname\bfseries\color{{cvink}}{esc(cv.full_name)}}}\par")
@@ -330,8 +333,8 @@ def render_tex(data: dict, settings: dict, page_height_pt: float | None = None)
             out.append(rf"\noindent{{\szsmall\color{{cvmuted}}{joined}}}\par")
 
     # One-page fill probe: \pagetotal/\pagegoal of the last page, typed into
-    # the log at end of document. texsvc.client parses the CVGFILL line for
-    # the fit loop; absent or malformed reads as None (fail open).
+    # the log at end of document. latexc's fit search parses the CVGFILL
+    # line; absent or malformed reads as None (fail open).
     out.append(r"\AtEndDocument{\typeout{CVGFILL:\the\pagetotal/\the\pagegoal}}")
     out.append(r"\end{document}")
     return "\n".join(out) + "\n"
@@ -0,0 +1,533 @@
+"""Layout estimator: how much of the page a CV will fill, before compiling it.
+
+The fit loop in renderer.compile_document discovers overflow by compiling,
+one rung of the density/font-scale ladder at a time. This module predicts
+the content height per section from the CV data alone, so the first compile
+can start on the rung that is likely to fit:
+
+- glyph advances come straight from the IBM Plex TTFs the templates embed
+  (templates/typst/fonts), read with a minimal cmap/hmtx parser;
+- sizes and gaps mirror density-params() in common.typ (a test keeps the
+  two tables identical) and each template's own fixed gaps and columns;
+- lines break greedily at spaces over the column width the template gives
+  each block.
+
+Typst lays a text line out as cap-height above the baseline plus `leading`
+between lines, so a paragraph of n lines at size f is
+n * cap * f + (n - 1) * leading * f. Spacing is summed as the templates write
+it. The estimate is a first guess, not a layout engine: the fit loop still
+compiles and corrects, and evals/eval_layout_estimate.py reports the error
+against real compiles per template (the _CALIBRATION factors come from it).
+"""
+import re
+import struct
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from ..config import get_settings
+
+PT_PER_CM = 72 / 2.54
+PAGE_W_PT = 21 * PT_PER_CM
+PAGE_H_PT = 29.7 * PT_PER_CM
+
+# Mirror of density-params() in templates/typst/common.typ, in pt (margins
+# and photo in cm). test_layout.py parses common.typ and fails on any drift.
+DENSITY_PARAMS: dict[str, dict[str, float]] = {
+    "normal": {
+        "base": 10, "small": 8.9, "name": 23.5, "headline": 11.4, "h": 9.8,
+        "leading": 0.65, "par-gap": 0.62,
+        "sect-above": 13, "sect-below": 6.5, "entry-gap": 9, "bullet-gap": 4.6,
+        "margin-y": 1.1, "margin-x": 1.15, "photo": 2.4,
+    },
+    "tight": {
+        "base": 9.4, "small": 8.4, "name": 21.5, "headline": 10.6, "h": 9.2,
+        "leading": 0.58, "par-gap": 0.54,
+        "sect-above": 10, "sect-below": 5, "entry-gap": 6.5, "bullet-gap": 3.2,
+        "margin-y": 0.95, "margin-x": 1.05, "photo": 2.15,
+    },
+    "xtight": {
+        "base": 8.9, "small": 8, "name": 20, "headline": 10, "h": 8.7,
+        "leading": 0.52, "par-gap": 0.46,
+        "sect-above": 7.5, "sect-below": 4, "entry-gap": 4.6, "bullet-gap": 2.2,
+        "margin-y": 0.85, "margin-x": 0.95, "photo": 2,
+    },
+}
+_TYPE_KEYS = ("base", "small", "name", "headline", "h")
+_GAP_KEYS = ("sect-above", "sect-below", "entry-gap", "bullet-gap")
+
+_FONT_FILES = {
+    "sans": "IBMPlexSans-Regular.ttf",
+    "sans-bold": "IBMPlexSans-SemiBold.ttf",
+    "serif": "IBMPlexSerif-Regular.ttf",
+    "serif-bold": "IBMPlexSerif-SemiBold.ttf",
+    "mono": "IBMPlexMono-Regular.ttf",
+}
+
+# Measured/predicted content height per template, from the accuracy eval
+# (median over fixtures x densities x scales). Typst 0.14 put all three within
+# half a percent of 1.0; re-run the eval after template or typst changes.
+_CALIBRATION = {"onyx": 1.0, "classic": 1.0, "compact": 1.0}
+
+
+# ---------------------------------------------------------------------------
+# Font metrics
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class FontMetrics:
+    units_per_em: int
+    cap_height: int
+    advances: dict[int, int] = field(repr=False)
+    default_advance: int = 0
+
+    def width(self, text: str, size: float) -> float:
+        units = sum(self.advances.get(ord(ch), self.default_advance) for ch in text)
+        return units * size / self.units_per_em
+
+    def cap(self, size: float) -> float:
+        return self.cap_height * size / self.units_per_em
+
+
+def _tables(data: bytes) -> dict[str, tuple[int, int]]:
+    (num_tables,) = struct.unpack_from(">H", data, 4)
+    out = {}
+    for i in range(num_tables):
+        tag, _, offset, length = struct.unpack_from(">4sIII", data, 12 + 16 * i)
+        out[tag.decode("latin-1")] = (offset, length)
+    return out
+
+
+def _cmap_format4(data: bytes, offset: int) -> dict[int, int]:
+    seg_x2 = struct.unpack_from(">H", data, offset + 6)[0]
+    segs = seg_x2 // 2
+    ends = struct.unpack_from(f">{segs}H", data, offset + 14)
+    starts = struct.unpack_from(f">{segs}H", data, offset + 16 + seg_x2)
+    deltas = struct.unpack_from(f">{segs}h", data, offset + 16 + 2 * seg_x2)
+    range_base = offset + 16 + 3 * seg_x2
+    range_offsets = struct.unpack_from(f">{segs}H", data, range_base)
+    out = {}
+    for i in range(segs):
+        for code in range(starts[i], ends[i] + 1):
+            if code == 0xFFFF:
+                continue
+            if range_offsets[i] == 0:
+                glyph = (code + deltas[i]) & 0xFFFF
+            else:
+                at = range_base + 2 * i + range_offsets[i] + 2 * (code - starts[i])
+                glyph = struct.unpack_from(">H", data, at)[0]
+                if glyph:
+                    glyph = (glyph + deltas[i]) & 0xFFFF
+            if glyph:
+                out[code] = glyph
+    return out
+
+
+def parse_ttf(data: bytes) -> FontMetrics:
+    """Advance widths per code point and the cap height; nothing else."""
+    tables = _tables(data)
+    units_per_em = struct.unpack_from(">H", data, tables["head"][0] + 18)[0]
+    num_hmetrics = struct.unpack_from(">H", data, tables["hhea"][0] + 34)[0]
+    hmtx = tables["hmtx"][0]
+    glyph_advance = [struct.unpack_from(">H", data, hmtx + 4 * i)[0] for i in range(num_hmetrics)]
+
+    cmap = tables["cmap"][0]
+    (num_subtables,) = struct.unpack_from(">H", data, cmap + 2)
+    code_to_glyph: dict[int, int] = {}
+    for i in range(num_subtables):
+        platform, encoding, sub = struct.unpack_from(">HHI", data, cmap + 4 + 8 * i)
+        if (platform, encoding) in ((3, 1), (0, 3)) and struct.unpack_from(">H", data, cmap + sub)[0] == 4:
+            code_to_glyph = _cmap_format4(data, cmap + sub)
+            break
+
+    os2 = tables.get("OS/2")
+    cap_height = int(units_per_em * 0.7)
+    if os2 and struct.unpack_from(">H", data, os2[0])[0] >= 2:
+        cap_height = struct.unpack_from(">h", data, os2[0] + 88)[0]
+
+    last = glyph_advance[-1]
+    advances = {
+        code: glyph_advance[g] if g < num_hmetrics else last for code, g in code_to_glyph.items()
+    }
+    return FontMetrics(units_per_em, cap_height, advances, advances.get(ord("n"), units_per_em // 2))
+
+
+@lru_cache(maxsize=8)
+def font(kind: str) -> FontMetrics:
+    path = get_settings().templates_dir / "typst" / "fonts" / _FONT_FILES[kind]
+    return parse_ttf(path.read_bytes())
+
+
+# ---------------------------------------------------------------------------
+# Text blocks
+# ---------------------------------------------------------------------------
+
+_SPACES = re.compile(r"\s+")
+# How far a justified line may squeeze its spaces (Typst's justification
+# allows shrinking to about two thirds of the natural width).
+_JUSTIFY_SPACE_SHRINK = 0.67
+
+
+def line_count(text: str, kind: str, size: float, width: float, justify: bool = False) -> int:
+    """Greedy line breaking at spaces; a word wider than the column takes
+    as many lines as it needs (Typst hyphenates or breaks it). Justified
+    text may shrink its spaces and hyphenates (Typst's defaults once
+    justify is on), so more of a line is usable."""
+    words = [w for w in _SPACES.split(text.strip()) if w]
+    if not words:
+        return 0
+    metrics = font(kind)
+    space = metrics.width(" ", size) * (_JUSTIFY_SPACE_SHRINK if justify else 1.0)
+    hyphen = metrics.width("-", size)
+    lines, used = 1, 0.0
+    for word in words:
+        w = metrics.width(word, size)
+        if used == 0.0:
+            extra = w
+        elif used + space + w <= width:
+            used += space + w
+            continue
+        else:
+            lines += 1
+            extra = w
+            if justify and len(word) >= 5:
+                room = width - used - space - hyphen
+                head = max((n for n in range(2, len(word) - 2) if metrics.width(word[:n], size) <= room),
+                           default=0)
+                if head:
+                    extra = metrics.width(word[head:], size)
+        while extra > width:
+            lines += 1
+            extra -= width
+        used = extra
+    return lines
+
+
+def para_height(lines: int, kind: str, size: float, leading: float) -> float:
+    if lines <= 0:
+        return 0.0
+    return lines * font(kind).cap(size) + (lines - 1) * leading * size
+
+
+def text_height(text: str, kind: str, size: float, width: float, leading: float,
+                justify: bool = False) -> float:
+    return para_height(line_count(text, kind, size, width, justify), kind, size, leading)
+
+
+# ---------------------------------------------------------------------------
+# Templates
+# ---------------------------------------------------------------------------
+
+
+def params(density: str, font_scale: float) -> dict[str, float]:
+    """density-params() in pt: type and fixed gaps follow font_scale,
+    leading/par-gap stay in em, margins and photo stay put."""
+    base = DENSITY_PARAMS.get(density, DENSITY_PARAMS["normal"])
+    p = dict(base)
+    for key in (*_TYPE_KEYS, *_GAP_KEYS):
+        p[key] = base[key] * font_scale
+    for key in ("margin-y", "margin-x", "photo"):
+        p[key] = base[key] * PT_PER_CM
+    return p
+
+
+def _join(items, sep: str = "  ·  ") -> str:
+    return sep.join(str(i) for i in items if i)
+
+
+def _display_url(value: str) -> str:
+    return value.replace("https://", "").replace("http://", "").replace("www.", "").strip("/")
+
+
+class _Page:
+    """Heights of the blocks a template stacks, at one rung of the ladder."""
+
+    def __init__(self, p: dict[str, float], width: float, body: str, bold: str, justify: bool) -> None:
+        self.p, self.width, self.body, self.bold, self.justify = p, width, body, bold, justify
+
+    def cap(self, size: str, kind: str = "") -> float:
+        return font(kind or self.body).cap(self.p[size])
+
+    def text(self, text: str, size: str, width: float | None = None, kind: str = "") -> float:
+        return text_height(text, kind or self.body, self.p[size], width or self.width, self.p["leading"],
+                           self.justify)
+
+    def lines(self, text: str, size: str, width: float | None = None, kind: str = "") -> int:
+        return line_count(text, kind or self.body, self.p[size], width or self.width, self.justify)
+
+    def para(self, lines: int, size: str = "base", kind: str = "") -> float:
+        return para_height(lines, kind or self.body, self.p[size], self.p["leading"])
+
+    def contacts(self, contacts: dict, gap_em: float) -> float:
+        """common.typ contact-row: one line, or two balanced rows once the
+        items (icon + text each) overflow the column."""
+        items = [(k, v) for k, v in contacts.items() if v]
+        if not items:
+            return 0.0
+        size = self.p["small"]
+        metrics = font(self.body)
+        width = sum(
+            metrics.width(_display_url(v) if k in ("linkedin", "github", "website") else v, size) + 1.24 * size
+            for k, v in items
+        ) + (len(items) - 1) * gap_em * size
+        rows = 1 if len(items) < 3 or width <= self.width else 2
+        # Icons are 0.92em boxes lowered 14%: their top stands above the
+        # cap height, so each row is taller than a plain text line.
+        icon_top = 0.92 * 0.86 * size
+        return self.para(rows, "small") + rows * max(0.0, icon_top - self.cap("small"))
+
+
+def _onyx(data: dict, page: _Page, has_photo: bool) -> dict[str, float]:
+    p = page.p
+    section = p["sect-above"] + page.cap("h", page.bold) + p["sect-below"]
+    entry_sep = p["entry-gap"] + 2
+
+    def bullets(items: list[str]) -> float:
+        return sum(
+            p["bullet-gap"] + (1.6 if i == 0 else 0.0) + page.text(b, "base", page.width - 11)
+            for i, b in enumerate(items)
+        )
+
+    def entry_head(title: str, right: str, sub: str, right_sub: str) -> float:
+        right_w = font(page.body).width(right, p["small"]) + 8
+        h = page.text(title, "base", page.width - right_w, page.bold)
+        return h + (2.4 + page.cap("small") if sub or right_sub else 0.0)
+
+    out = {}
+    header = page.cap("name", page.bold)
+    if data.get("headline"):
+        header += 3.2 + page.text(data["headline"], "headline")
+    contacts = page.contacts(data.get("contacts") or {}, 0.85)
+    header += 5.5 + contacts if contacts else 0.0
+    if has_photo:
+        header = max(header, p["photo"])
+    out["header"] = header + 4 + 1.1
+
+    if (data.get("summary") or "").strip():
+        out["summary"] = section + page.text(data["summary"], "base")
+    if data.get("experience"):
+        out["experience"] = section + sum(
+            (entry_sep if i else 0.0)
+            + entry_head(job.get("title", ""), _join([job.get("start"), job.get("end")], " – "),
+                         job.get("company", ""), job.get("location", ""))
+            + bullets(job.get("bullets") or [])
+            for i, job in enumerate(data["experience"])
+        )
+    if data.get("projects"):
+        out["projects"] = section + sum(
+            (entry_sep if i else 0.0) + page.cap("base", page.bold)
+            + (bullets([proj["description"]]) if (proj.get("description") or "").strip() else 0.0)
+            for i, proj in enumerate(data["projects"])
+        )
+    if data.get("education"):
+        out["education"] = section + sum(
+            (entry_sep if i else 0.0)
+            + entry_head(ed.get("degree", ""), _join([ed.get("start"), ed.get("end")], " – "),
+                         ed.get("school", ""), ed.get("location", ""))
+            + (1.8 + page.text(_join(ed["details"]), "small") if ed.get("details") else 0.0)
+            for i, ed in enumerate(data["education"])
+        )
+    if data.get("skills"):
+        out["skills"] = section + sum(
+            (2.6 if i else 0.0) + page.text(
+                _join(group.get("items") or []), "small",
+                page.width - font(page.bold).width(group.get("category", ""), p["small"]) - 8,
+            )
+            for i, group in enumerate(data["skills"])
+        )
+    if data.get("certifications"):
+        lines = sum(
+            page.lines(_join([c.get("name"), c.get("issuer"), c.get("year")]), "small")
+            for c in data["certifications"]
+        )
+        out["certifications"] = section + page.para(lines, "small")
+    langs, interests = data.get("languages") or [], data.get("interests") or []
+    if langs or interests:
+        h = section
+        if langs:
+            h += page.text(_join([_join([lang.get("name"), lang.get("level")], " (") for lang in langs],
+                                 "   ·   "), "small")
+        if interests:
+            h += (2.6 if langs else 0.0) + page.text(_join(interests), "small")
+        out["languages"] = h
+    return out
+
+
+def _classic(data: dict, page: _Page, has_photo: bool) -> dict[str, float]:
+    p = page.p
+    section = p["sect-above"] + page.cap("h", page.bold) + 2.5 + 0.5 + p["sect-below"]
+    col = page.width - 3 * PT_PER_CM - 10  # date column + gutter
+
+    def titled(title: str, sub: str) -> float:
+        # title, linebreak, italic org line: one paragraph at base leading
+        lines = page.lines(title, "base", col, page.bold)
+        h = page.para(lines, "base", page.bold)
+        if sub:
+            h += p["leading"] * p["base"] + page.cap("small")
+        return h
+
+    out = {}
+    header = page.text(data.get("full_name", ""), "name", kind=page.bold)
+    if data.get("headline"):
+        header += 3.5 + page.text(data["headline"], "headline")
+    contacts = page.contacts(data.get("contacts") or {}, 0.8)
+    header += 5 + contacts if contacts else 0.0
+    if has_photo:
+        header = max(header, p["photo"])
+    out["header"] = header + 5 + 0.9 + 1.4 + 0.4
+
+    if (data.get("summary") or "").strip():
+        out["summary"] = section + page.text(data["summary"], "base")
+    if data.get("experience"):
+        out["experience"] = section + sum(
+            (p["entry-gap"] if i else 0.0)
+            + titled(job.get("title", ""), _join([job.get("company"), job.get("location")]))
+            + sum(p["bullet-gap"] + page.text(b, "base", col - 10) for b in job.get("bullets") or [])
+            for i, job in enumerate(data["experience"])
+        )
+    if data.get("education"):
+        out["education"] = section + sum(
+            (p["entry-gap"] if i else 0.0)
+            + titled(ed.get("degree", ""), _join([ed.get("school"), ed.get("location")]))
+            + (1.6 + page.text(_join(ed["details"]), "small", col) if ed.get("details") else 0.0)
+            for i, ed in enumerate(data["education"])
+        )
+    if data.get("projects"):
+        out["projects"] = section + sum(
+            (p["entry-gap"] * 0.7 if i else 0.0)
+            + page.para(1 + page.lines(proj.get("description") or "", "base", col), "base")
+            for i, proj in enumerate(data["projects"])
+        )
+    if data.get("skills"):
+        out["skills"] = section + sum(
+            (2.4 if i else 0.0) + page.text(_join(group.get("items") or []), "base", col)
+            for i, group in enumerate(data["skills"])
+        )
+    if data.get("certifications"):
+        lines = sum(
+            page.lines(_join([c.get("name"), c.get("issuer"), c.get("year")]), "small")
+            for c in data["certifications"]
+        )
+        out["certifications"] = section + page.para(lines, "small")
+    if data.get("languages"):
+        text = _join([_join([lang.get("name"), lang.get("level")], " (") for lang in data["languages"]],
+                     "    ·    ")
+        out["languages"] = section + page.text(text, "base")
+    if data.get("interests"):
+        out["interests"] = section + page.text(_join(data["interests"]), "base")
+    return out
+
+
+def _compact(data: dict, page: _Page, has_photo: bool) -> dict[str, float]:
+    p = page.p
+    section = 0.9 * (p["sect-above"] + p["sect-below"]) + page.cap("h", page.bold)
+    mono = p["small"] * 0.95
+
+    def head(left: str, right: str) -> float:
+        right_w = font("mono").width(right, mono) + 8
+        return page.text(left, "base", page.width - right_w, page.bold)
+
+    out = {}
+    header = font(page.bold).cap(p["name"] * 0.92)
+    contacts = page.contacts(data.get("contacts") or {}, 0.75)
+    header += 4.5 + contacts if contacts else 0.0
+    if has_photo:
+        header = max(header, p["photo"] * 0.82)
+    out["header"] = header + 3 + 1
+
+    if (data.get("summary") or "").strip():
+        out["summary"] = p["sect-below"] + page.text(data["summary"], "base")
+    if data.get("experience"):
+        out["experience"] = section + sum(
+            (p["entry-gap"] * 0.85 if i else 0.0)
+            + head(_join([job.get("title"), job.get("company")], "  @ "),
+                   _join([_join([job.get("start"), job.get("end")], " – "), job.get("location")], " · "))
+            + sum(p["bullet-gap"] + page.text(b, "base", page.width - 10) for b in job.get("bullets") or [])
+            for i, job in enumerate(data["experience"])
+        )
+    if data.get("projects"):
+        out["projects"] = section + sum(
+            (p["entry-gap"] * 0.7 if i else 0.0) + head(proj.get("name", ""), proj.get("tech", ""))
+            + (1.3 + page.text(proj["description"], "base") if (proj.get("description") or "").strip() else 0.0)
+            for i, proj in enumerate(data["projects"])
+        )
+    if data.get("skills"):
+        out["skills"] = section + sum(
+            (2.2 if i else 0.0) + page.text(
+                _join(group.get("items") or [], " · "), "small",
+                page.width - font("mono").width(group.get("category", "") + ":", mono) - 7,
+            )
+            for i, group in enumerate(data["skills"])
+        )
+    if data.get("education"):
+        out["education"] = section + sum(
+            (p["entry-gap"] * 0.7 if i else 0.0)
+            + head(_join([ed.get("degree"), ed.get("school")], " · "),
+                   _join([_join([ed.get("start"), ed.get("end")], " – "), ed.get("location")], " · "))
+            + (1.3 + page.text(_join(ed["details"]), "small") if ed.get("details") else 0.0)
+            for i, ed in enumerate(data["education"])
+        )
+    certs = data.get("certifications") or []
+    langs, interests = data.get("languages") or [], data.get("interests") or []
+    if certs or langs or interests:
+        rows = []
+        if certs:
+            rows.append(_join([_join([c.get("name"), c.get("year")], " ") for c in certs]))
+        if langs:
+            rows.append(_join([_join([lang.get("name"), lang.get("level")], " (") for lang in langs]))
+        if interests:
+            rows.append(_join(interests))
+        out["footer"] = section + sum(page.text(r, "small") for r in rows) + 2.2 * (len(rows) - 1)
+    return out
+
+
+_TEMPLATES = {
+    # template: (layout, body font, bold font, justify, extra margin-x, extra margin-y), margins in pt
+    "onyx": (_onyx, "sans", "sans-bold", False, 0.0, 0.0),
+    "classic": (_classic, "serif", "serif-bold", True, 0.25 * PT_PER_CM, 0.0),
+    "compact": (_compact, "sans", "sans-bold", False, -0.1 * PT_PER_CM, -0.05 * PT_PER_CM),
+}
+
+
+@dataclass
+class Estimate:
+    template: str
+    density: str
+    font_scale: float
+    content_pt: float                # page top to the end-of-content anchor
+    sections: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def fill(self) -> float:
+        """Predicted <cvg-end> y over the page height, uncapped: 1.1 means
+        the content runs a tenth of a page past the sheet."""
+        return self.content_pt / PAGE_H_PT
+
+
+def estimate(template_id: str, data: dict, density: str = "normal", font_scale: float = 1.0,
+             has_photo: bool = False) -> Estimate:
+    """Predicted height of a CV rendered with `template_id` at one rung of
+    the fit ladder. `data` is the CVData dict the renderer embeds; unknown
+    templates are estimated as onyx."""
+    template = template_id if template_id in _TEMPLATES else "onyx"
+    flow, body, bold, justify, margin_x, margin_y = _TEMPLATES[template]
+    p = params(density, font_scale)
+    page = _Page(p, PAGE_W_PT - 2 * (p["margin-x"] + margin_x), body, bold, justify)
+    sections = flow(data, page, has_photo)
+    content = (p["margin-y"] + margin_y + sum(sections.values())) * _CALIBRATION[template]
+    return Estimate(template, density, font_scale, content, sections)
+
+
+def scale_for_fill(template_id: str, data: dict, density: str, target: float, lo: float, hi: float,
+                   has_photo: bool = False) -> float:
+    """Largest font_scale in [lo, hi] whose predicted fill stays at or under
+    target (bisection; fill grows monotonically with the scale)."""
+    if estimate(template_id, data, density, hi, has_photo).fill <= target:
+        return hi
+    for _ in range(12):
+        mid = (lo + hi) / 2
+        if estimate(template_id, data, density, mid, has_photo).fill <= target:
+            lo = mid
+        else:
+            hi = mid
+    return round(lo, 2)
@@ -12,6 +12,9 @@ Design notes:
   the page empty are retried with a larger font_scale until the page reads
   full. Underfull detection asks Typst itself (`typst query` on an appended
   end-of-content marker) instead of guessing from the SVG.
+- The fit loop's first compile starts on the rung the layout estimator
+  (typstsvc.layout) predicts will fit, so most fits take one or two
+  compiles instead of walking the ladder from the stored density.
 - Continuous page mode (settings.page_mode == "continuous") is compiled with
   fit_one_page=False by all callers; the fit loop and measure_fill are
   A4-only by design.
@@ -25,6 +28,7 @@ from dataclasses import dataclass, field
 from pathlib import Path
 
 from ..config import get_settings
+from . import layout
 
 _IDENT = re.compile(r"^[a-zA-Z_][a-zA-Z0-9_-]*$")
 _DENSITIES = ["normal", "tight", "xtight"]
@@ -39,6 +43,12 @@ _MAX_FONT_SCALE = 1.5
 # buys page count by making the CV worse, so overflow is reported instead.
 _MIN_FONT_SCALE = 0.9
 _DOWNSCALE_STEP = 0.04
+# Layout-estimate first rung: skip a rung only when it is predicted to
+# overflow by more than this (a wrong skip costs quality, a missed one only a
+# compile), and aim upscales below the fill target so the first guess stays
+# on one page; the underflow loop closes the rest with a measurement.
+_SKIP_MARGIN = 0.03
+_UPSCALE_AIM = 0.92
 
 _semaphore: asyncio.Semaphore | None = None
 
@@ -202,14 +212,12 @@ async def compile_source(
         shutil.rmtree(workdir, ignore_errors=True)
 
 
-async def measure_fill(source: str, photo: bytes | None = None) -> float | None:
-    """How much of the (last) page the content occupies, 0..1.
-
-    Every CV template drops an invisible <cvg-end> anchor (common.typ
-    end-anchor()) at the end of its content; `typst query` reads its page/y.
-    Returns None when the anchor is missing or the query fails; callers treat
-    that as "don't adjust". Content that spills past page 1 reports 1.0.
-    """
+async def content_end(source: str, photo: bytes | None = None) -> tuple[int, float] | None:
+    """(page, y in pt) of the <cvg-end> anchor every CV template drops at the
+    end of its content (common.typ end-anchor()), read with `typst query`.
+    None when the anchor is missing or the query fails. With
+    page_mode "continuous" the page grows with the content, so y is the full
+    content height even for CVs that would spill past one A4 sheet."""
     settings = get_settings()
     jail_root = settings.templates_dir
     workdir = jail_root / ".compile" / uuid.uuid4().hex
@@ -234,15 +242,61 @@ async def measure_fill(source: str, photo: bytes | None = None) -> float | None:
         if code != 0:
             return None
         value = json.loads(stdout)
-        if int(value.get("page", 1)) > 1:
-            return 1.0
-        return min(1.0, float(value["y"]) / _PAGE_H_PT)
+        return int(value.get("page", 1)), float(value["y"])
     except (ValueError, KeyError, TypeError):
         return None
     finally:
         shutil.rmtree(workdir, ignore_errors=True)
 
 
+async def measure_fill(source: str, photo: bytes | None = None) -> float | None:
+    """How much of the (last) page the content occupies, 0..1.
+
+    Returns None when the end anchor cannot be read; callers treat that as
+    "don't adjust". Content that spills past page 1 reports 1.0.
+    """
+    end = await content_end(source, photo)
+    if end is None:
+        return None
+    page, y = end
+    if page > 1:
+        return 1.0
+    return min(1.0, y / _PAGE_H_PT)
+
+
+def _first_rung(template_id: str, data: dict, d_idx: int, scale: float, has_photo: bool) -> tuple[int, float]:
+    """The rung of the fit ladder to compile first, from the layout estimate.
+
+    Walks the ladder compile_document walks (drop any upscale, tighten
+    density, shrink type toward the floor) and stops at the first rung not
+    predicted to overflow; a stored rung predicted to read empty is scaled
+    up instead. Never loosens the stored density: that stays the user's."""
+
+    def fill(d: int, s: float) -> float:
+        return layout.estimate(template_id, data, _DENSITIES[d], s, has_photo).fill
+
+    if fill(d_idx, scale) <= 1 + _SKIP_MARGIN:
+        if fill(d_idx, scale) >= _FILL_MIN or scale >= _MAX_FONT_SCALE:
+            return d_idx, scale
+        aim = layout.scale_for_fill(
+            template_id, data, _DENSITIES[d_idx], _UPSCALE_AIM, scale, _MAX_FONT_SCALE, has_photo
+        )
+        return d_idx, max(scale, aim)
+    if scale > 1.0:
+        scale = 1.0
+        if fill(d_idx, scale) <= 1 + _SKIP_MARGIN:
+            return d_idx, scale
+    while d_idx + 1 < len(_DENSITIES):
+        d_idx += 1
+        if fill(d_idx, scale) <= 1 + _SKIP_MARGIN:
+            return d_idx, scale
+    while scale > _MIN_FONT_SCALE:
+        scale = max(_MIN_FONT_SCALE, round(scale - _DOWNSCALE_STEP, 2))
+        if fill(d_idx, scale) <= 1 + _SKIP_MARGIN:
+            break
+    return d_idx, scale
+
+
 async def compile_document(
     kind: str,
     template_id: str,
@@ -272,6 +326,8 @@ async def compile_document(
         res.font_scale_used = s
         return res, src
 
+    if kind == "cv" and fit_one_page and get_settings().typst_layout_estimate:
+        d_idx, scale = _first_rung(template_id, data, d_idx, scale, photo is not None)
     result, source = await attempt(_DENSITIES[d_idx], scale)
 
     if kind == "cv" and fit_one_page and result.ok:
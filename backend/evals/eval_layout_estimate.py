@@ -0,0 +1,107 @@
+"""Periodic eval, free lane (local typst compiles, no API calls).
+
+Checks the layout estimator (backend/app/typstsvc/layout.py) against real
+compiles:
+
+1. accuracy: predicted vs measured content height for every template x
+   density x fixture, measured in continuous page mode so overflowing
+   fixtures report their full height. Prints the median measured/predicted
+   ratio per template, which is what layout._CALIBRATION should hold.
+2. fit cost: compile_document on the fit fixtures with the estimate on and
+   off, counting compiles per fit. The estimate must not cost compiles,
+   must not change the page count, and must save compiles overall.
+
+Run: python -m backend.evals.eval_layout_estimate
+Exit 0 = pass (or typst not installed, printed as SKIPPED), 1 = fail.
+"""
+import asyncio
+import shutil
+import statistics
+import sys
+
+from backend.app.config import get_settings
+from backend.app.typstsvc import layout, renderer
+from backend.evals.renderer_bench.bench import CompileCounter
+from backend.evals.renderer_bench.cases import FIT_FIXTURES, SETTINGS, large_cv
+
+TEMPLATES = ("onyx", "classic", "compact")
+SCALES = (0.9, 1.0, 1.2)
+# |measured - predicted| content height as a share of the page, mean and worst.
+MAX_MEAN_ERROR = 0.02
+MAX_ABS_ERROR = 0.05
+
+
+def _check(name: str, ok: bool, detail: str) -> bool:
+    print(f"  {'PASS' if ok else 'FAIL'}  {name}: {detail}")
+    return ok
+
+
+async def accuracy() -> dict[str, list[tuple[str, float, float]]]:
+    fixtures = {**{k: f() for k, f in FIT_FIXTURES.items()}, "large": large_cv()}
+    out: dict[str, list[tuple[str, float, float]]] = {}
+    for template in TEMPLATES:
+        rows = out.setdefault(template, [])
+        for name, data in fixtures.items():
+            for density in ("normal", "tight", "xtight"):
+                for scale in SCALES:
+                    merged = {**SETTINGS, "template": template, "density": density,
+                              "font_scale": scale, "page_mode": "continuous"}
+                    src = renderer.render_source("cv", template, data, merged, has_photo=False)
+                    end = await renderer.content_end(src)
+                    if end is None:
+                        print(f"  FAIL  {template}/{name}/{density}@{scale}: no end anchor")
+                        continue
+                    predicted = layout.estimate(template, data, density, scale).content_pt
+                    rows.append((f"{name}/{density}@{scale}", predicted, end[1]))
+    return out
+
+
+async def fit_cost(template: str, data: dict, enabled: bool) -> tuple[int, int, str, float]:
+    get_settings().typst_layout_estimate = enabled
+    counter = CompileCounter()
+    with counter.installed():
+        result, _ = await renderer.compile_document("cv", template, data, {**SETTINGS, "template": template})
+    return counter.compiles, result.pages, result.density_used, result.font_scale_used
+
+
+async def main() -> int:
+    settings = get_settings()
+    if shutil.which(settings.typst_command) is None:
+        print("SKIPPED: typst not installed")
+        return 0
+    passed = True
+
+    print("accuracy (content height, share of an A4 page):")
+    for template, rows in (await accuracy()).items():
+        errors = {label: (measured - predicted) / layout.PAGE_H_PT for label, predicted, measured in rows}
+        ratio = statistics.median(measured / predicted for _, predicted, measured in rows)
+        raw = ratio * layout._CALIBRATION[template]
+        mean = statistics.fmean(abs(e) for e in errors.values())
+        worst_at = max(errors, key=lambda label: abs(errors[label]))
+        worst = errors[worst_at]
+        print(f"  {template:<8} n={len(rows)}  mean |err| {mean:.3f}  worst {worst:+.3f} ({worst_at})  "
+              f"measured/predicted {ratio:.3f} (uncalibrated {raw:.3f})")
+        passed &= _check(f"{template} mean error", mean <= MAX_MEAN_ERROR, f"{mean:.3f} <= {MAX_MEAN_ERROR}")
+        passed &= _check(f"{template} worst error", abs(worst) <= MAX_ABS_ERROR,
+                         f"{abs(worst):.3f} <= {MAX_ABS_ERROR}")
+
+    print("\nfit cost (compiles per compile_document):")
+    total_on = total_off = 0
+    try:
+        for template in TEMPLATES:
+            for name, fixture in FIT_FIXTURES.items():
+                off = await fit_cost(template, fixture(), False)
+                on = await fit_cost(template, fixture(), True)
+                total_on, total_off = total_on + on[0], total_off + off[0]
+                print(f"  {template:<8} {name:<10} off {off[0]} -> on {on[0]}  "
+                      f"rung {off[2]}@{off[3]} -> {on[2]}@{on[3]}")
+                passed &= _check(f"{template}/{name} pages", on[1] == off[1], f"{off[1]} -> {on[1]}")
+                passed &= _check(f"{template}/{name} compiles", on[0] <= off[0], f"{off[0]} -> {on[0]}")
+    finally:
+        settings.typst_layout_estimate = True
+    passed &= _check("total compiles", total_on < total_off, f"{total_off} -> {total_on}")
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
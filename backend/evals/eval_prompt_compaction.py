@@ -0,0 +1,104 @@
+"""Periodic eval, paid lane (four flash calls per run).
+
+Checks that compact prompt inputs (backend/app/ai/compact.py) cut input
+tokens without costing output quality: the same analyze + tailor_cv run is
+made with GEMINI_COMPACT_PROMPTS on and off, token counts come from the
+provider's usage metadata, and the tailored CVs are scored with the
+deterministic metrics of eval_tailor_boost. The offline size comparison of
+the serialized master CV is printed first and needs no key.
+
+Run: python -m backend.evals.eval_prompt_compaction
+Exit 0 = pass (or no key configured, printed as SKIPPED), 1 = fail.
+"""
+import asyncio
+import json
+import sys
+
+from backend.app.ai import compact, ctxcache, get_provider, usage
+from backend.app.config import get_settings
+from backend.app.schemas import CVData
+from backend.evals import metrics
+from backend.evals.eval_tailor_boost import FIXTURES, JD
+
+# Compact tailor prompts must send at least this much less input; quality may
+# not drop by more than the tolerances below against the verbose run.
+MIN_PROMPT_SAVING = 0.08
+MAX_NOVELTY_DROP = 0.10
+MAX_KEYWORD_DROP = 1
+
+
+def _check(name: str, ok: bool, detail: str) -> bool:
+    print(f"  {'PASS' if ok else 'FAIL'}  {name}: {detail}")
+    return ok
+
+
+def offline_sizes(master: CVData) -> None:
+    verbose = master.model_dump_json(indent=1)
+    for name, text in (("context_json", compact.context_json(master)), ("document_json", compact.document_json(master))):
+        saved = 1 - len(text) / len(verbose)
+        print(f"  {name}: {ctxcache.estimate_tokens(text)} est. tokens vs "
+              f"{ctxcache.estimate_tokens(verbose)} verbose ({saved:.0%} smaller)")
+
+
+async def run_mode(provider, master: CVData, enabled: bool) -> dict:
+    get_settings().gemini_compact_prompts = enabled
+    log = usage.UsageLog()
+    token = usage.current.set(log)
+    try:
+        analysis = await provider.analyze(JD, master.plain_text(), "en")
+        tailored = await provider.tailor_cv(JD, analysis, master, "en")
+    finally:
+        usage.current.reset(token)
+
+    master_bullets = [b for job in master.experience for b in job.bullets]
+    bullets = [b for job in tailored.experience for b in job.bullets]
+    novelties = [metrics.bullet_novelty(b, master_bullets) for b in bullets] or [0.0]
+    tailored_text = json.dumps(tailored.model_dump(), ensure_ascii=False)
+    fabricated = metrics.fabricated_numbers(
+        tailored_text, [json.dumps(master.model_dump(), ensure_ascii=False), JD]
+    )
+    low_text = tailored_text.lower()
+    kw_hits = sum(1 for k in analysis.keywords[:10] if k.term.lower() in low_text)
+    spent = log.as_dict()
+    result = {
+        "tailor_prompt": spent.get("tailor_cv", {}).get("prompt", 0),
+        "total_prompt": sum(entry["prompt"] for entry in spent.values()),
+        "novelty": sum(novelties) / len(novelties),
+        "fabricated": fabricated,
+        "kw_hits": kw_hits,
+    }
+    print(f"  compact={'on' if enabled else 'off'}: {result}")
+    return result
+
+
+async def main() -> int:
+    master = CVData.model_validate_json((FIXTURES / "sample_cv.json").read_text(encoding="utf-8"))
+    print("offline sizes")
+    offline_sizes(master)
+    settings = get_settings()
+    if not settings.ai_enabled:
+        print("SKIPPED: no Gemini key/Vertex configured.")
+        return 0
+    provider = get_provider()
+    original = settings.gemini_compact_prompts
+    try:
+        verbose = await run_mode(provider, master, False)
+        compacted = await run_mode(provider, master, True)
+    finally:
+        settings.gemini_compact_prompts = original
+
+    saving = 1 - compacted["tailor_prompt"] / max(verbose["tailor_prompt"], 1)
+    ok = True
+    ok &= _check("tailor prompt tokens", saving >= MIN_PROMPT_SAVING,
+                 f"{compacted['tailor_prompt']} vs {verbose['tailor_prompt']} "
+                 f"({saving:.0%} saved, min {MIN_PROMPT_SAVING:.0%})")
+    ok &= _check("novelty held", compacted["novelty"] >= verbose["novelty"] - MAX_NOVELTY_DROP,
+                 f"{compacted['novelty']:.2f} vs {verbose['novelty']:.2f} (max drop {MAX_NOVELTY_DROP})")
+    ok &= _check("no fabricated numbers", not compacted["fabricated"], f"{compacted['fabricated'] or 'none'}")
+    ok &= _check("keyword coverage held", compacted["kw_hits"] >= verbose["kw_hits"] - MAX_KEYWORD_DROP,
+                 f"{compacted['kw_hits']} vs {verbose['kw_hits']} of top 10 terms")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
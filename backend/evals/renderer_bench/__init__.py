@@ -0,0 +1 @@
+"""Renderer benchmark suite: python -m backend.evals.renderer_bench."""
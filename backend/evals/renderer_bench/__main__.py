@@ -0,0 +1,129 @@
+"""Renderer benchmark CLI: the production Typst/LaTeX rendering paths.
+
+Free and offline. The pure-Python cases (typst_literal, render_source,
+render_tex) always run; the compile cases need the typst binary and print
+SKIP without it.
+
+Examples:
+  python -m backend.evals.renderer_bench                          # all cases
+  python -m backend.evals.renderer_bench --cases render_source,compile_document
+  python -m backend.evals.renderer_bench --save-baseline laptop   # baselines/laptop.json
+  python -m backend.evals.renderer_bench --compare laptop         # exit 1 on regression
+  python -m backend.evals.renderer_bench --compare reference --counts-only
+
+Timings do not transfer between machines or typst builds (compiles-per-fit
+does): a baseline whose meta.machine or meta.typst differs from this run is
+compared on its counts only.
+"""
+import argparse
+import asyncio
+import datetime as dt
+import json
+import platform
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+from backend.app.config import get_settings
+
+from . import bench
+from .cases import cases
+
+PKG = Path(__file__).resolve().parent
+BASELINES = PKG / "baselines"
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(prog="renderer_bench")
+    ap.add_argument("--cases", default="", help="comma list of case-name prefixes (default: all)")
+    ap.add_argument("--runs", type=int, default=0, help="samples per case (default 30 micro, 7 macro)")
+    ap.add_argument("--save-baseline", default="", metavar="NAME", help="write baselines/NAME.json")
+    ap.add_argument("--compare", default="", metavar="NAME|PATH", help="baseline to compare against")
+    ap.add_argument("--counts-only", action="store_true",
+                    help="judge compiles/fills per fit only, not wall times")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed p50 slowdown (0.15 = 15%%)")
+    ap.add_argument("--out", default="", help="also write the JSON report here")
+    return ap.parse_args(argv)
+
+
+def _typst_version(command: str) -> str | None:
+    if shutil.which(command) is None and not Path(command).exists():
+        return None
+    proc = subprocess.run([command, "--version"], capture_output=True, text=True)
+    return proc.stdout.strip() or "unknown"
+
+
+def _baseline_path(ref: str) -> Path:
+    path = Path(ref)
+    return path if path.suffix == ".json" else BASELINES / f"{ref}.json"
+
+
+async def measure(args: argparse.Namespace, typst: str | None) -> dict:
+    wanted = [w.strip() for w in args.cases.split(",") if w.strip()]
+    report = {
+        "meta": {
+            "recorded_at": dt.datetime.now(dt.UTC).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()} {platform.processor()}".strip(),
+            "typst": typst,
+        },
+        "cases": {},
+    }
+    for case in cases():
+        if wanted and not any(case.name.startswith(w) for w in wanted):
+            continue
+        if case.needs_typst and typst is None:
+            print(f"  SKIP  {case.name}: typst not installed")
+            continue
+        runs = args.runs or (7 if case.macro else 30)
+        row = await bench.run_case(case, runs)
+        report["cases"][case.name] = row
+        if "error" in row:
+            print(f"  FAIL  {case.name}: {row['error'][:200]}")
+            continue
+        line = f"  {case.name:<28} p50 {row['p50_ms']:>10.3f}ms  p95 {row['p95_ms']:>10.3f}ms  n={row['runs']}"
+        if "compiles_per_fit" in row:
+            line += (f"  compiles/fit {row['compiles_per_fit']:.1f}  fills/fit {row['fills_per_fit']:.1f}"
+                     f"  branch {row['branch']}")
+            if row["branch"] != row["expected_branch"]:
+                line += f" (fixture meant for {row['expected_branch']})"
+        print(line)
+    return report
+
+
+def main(argv: list[str]) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(measure(args, _typst_version(get_settings().typst_command)))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        BASELINES.mkdir(exist_ok=True)
+        path = _baseline_path(args.save_baseline)
+        path.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"\nbaseline written: {path}")
+
+    failed = any("error" in row for row in report["cases"].values())
+    if args.compare:
+        path = _baseline_path(args.compare)
+        if not path.exists():
+            print(f"\nno baseline at {path}")
+            return 2
+        baseline = json.loads(path.read_text(encoding="utf-8"))
+        counts_only = args.counts_only or not bench.same_setup(report, baseline)
+        gate = "counts only" if counts_only else f"tolerance {args.tolerance:.0%}"
+        print(f"\ncompared with {path.name} ({baseline['meta'].get('recorded_at')}, {gate})")
+        if counts_only and not args.counts_only:
+            meta = baseline["meta"]
+            print(f"  recorded on {meta.get('machine')} / {meta.get('typst')}: wall times not compared")
+        rows = bench.compare(report, baseline, args.tolerance, counts_only)
+        for row in rows:
+            detail = "; ".join(row["reasons"])
+            print(f"  {row['verdict']:<10} {row['case']:<28} x{row['ratio']:.2f}  {detail}")
+        if any(row["verdict"] == "REGRESSED" for row in rows):
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
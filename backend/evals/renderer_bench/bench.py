@@ -0,0 +1,148 @@
+"""Timing, compile counting and baseline comparison.
+
+Micro cases (pure Python) are timed in batches sized to ~20ms so the clock
+resolution does not matter; each batch yields one per-call sample. Macro
+cases (typst subprocesses) are timed per call after one discarded warmup.
+compile_document cases also count compile_source and measure_fill calls per
+fit: those counts are deterministic, so any increase is a regression
+regardless of timing noise.
+"""
+import statistics
+import time
+from contextlib import contextmanager
+
+from backend.app.typstsvc import renderer
+
+from .cases import Case
+
+_BATCH_S = 0.02
+
+
+def _summary(samples_s: list[float]) -> dict:
+    ordered = sorted(samples_s)
+    return {
+        "runs": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 4),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 4),
+        "min_ms": round(ordered[0] * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+    }
+
+
+def time_micro(fn, runs: int) -> dict:
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - started >= _BATCH_S or loops >= 1 << 20:
+            break
+        loops *= 2
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - started) / loops)
+    return {**_summary(samples), "loops": loops}
+
+
+class CompileCounter:
+    """Counts renderer.compile_source / measure_fill calls while installed."""
+
+    def __init__(self) -> None:
+        self.compiles = 0
+        self.fills = 0
+
+    @contextmanager
+    def installed(self):
+        real_compile, real_fill = renderer.compile_source, renderer.measure_fill
+
+        async def compile_source(*args, **kwargs):
+            self.compiles += 1
+            return await real_compile(*args, **kwargs)
+
+        async def measure_fill(*args, **kwargs):
+            self.fills += 1
+            return await real_fill(*args, **kwargs)
+
+        renderer.compile_source, renderer.measure_fill = compile_source, measure_fill
+        try:
+            yield self
+        finally:
+            renderer.compile_source, renderer.measure_fill = real_compile, real_fill
+
+
+def fit_branch(result) -> str:
+    """Which branch of compile_document produced this result."""
+    if result.density_used != "normal" or result.font_scale_used < 1.0:
+        return "overflow"
+    if result.font_scale_used > 1.0:
+        return "underflow"
+    return "exact"
+
+
+async def time_macro(case: Case, runs: int) -> dict:
+    await case.run()  # warmup: typst's font cache, first-import costs
+    samples: list[float] = []
+    counter = CompileCounter()
+    last = None
+    with counter.installed():
+        for _ in range(runs):
+            started = time.perf_counter()
+            last = await case.run()
+            samples.append(time.perf_counter() - started)
+    row = _summary(samples)
+    if case.fit:
+        result = last[0]
+        if not result.ok:
+            return {"error": result.diagnostics[:500]}
+        row.update({
+            "compiles_per_fit": counter.compiles / runs,
+            "fills_per_fit": counter.fills / runs,
+            "branch": fit_branch(result),
+            "expected_branch": case.fit,
+            "pages": result.pages,
+            "density": result.density_used,
+            "font_scale": result.font_scale_used,
+        })
+    elif hasattr(last, "ok") and not last.ok:
+        return {"error": last.diagnostics[:500]}
+    return row
+
+
+async def run_case(case: Case, runs: int) -> dict:
+    if case.macro:
+        return await time_macro(case, runs)
+    return time_micro(case.run, runs)
+
+
+def same_setup(current: dict, baseline: dict) -> bool:
+    """Both runs came from the same machine and typst build: only then do
+    their wall times compare."""
+    now, base = current.get("meta", {}), baseline.get("meta", {})
+    return all(now.get(key) == base.get(key) for key in ("machine", "typst"))
+
+
+def compare(current: dict, baseline: dict, tolerance: float, counts_only: bool = False) -> list[dict]:
+    """One row per case present in both: p50 ratio and verdict. A case
+    regresses when its p50 grows past the tolerance, or when a fit needs
+    more compiles or fill measurements than the baseline did. counts_only
+    (a baseline from another setup) judges the counts alone; the ratio is
+    still reported."""
+    rows = []
+    for name, base in baseline.get("cases", {}).items():
+        now = current.get("cases", {}).get(name)
+        if not now or "p50_ms" not in now or "p50_ms" not in base:
+            continue
+        ratio = now["p50_ms"] / base["p50_ms"] if base["p50_ms"] else 1.0
+        reasons = []
+        if ratio > 1 + tolerance and not counts_only:
+            reasons.append(f"p50 {base['p50_ms']}ms -> {now['p50_ms']}ms (+{ratio - 1:.0%})")
+        for key in ("compiles_per_fit", "fills_per_fit"):
+            if key in base and now.get(key, 0) > base[key]:
+                reasons.append(f"{key} {base[key]} -> {now[key]}")
+        faster = ratio < 1 - tolerance and not counts_only
+        verdict = "REGRESSED" if reasons else "improved" if faster else "same"
+        rows.append({"case": name, "ratio": round(ratio, 3), "verdict": verdict, "reasons": reasons})
+    return rows
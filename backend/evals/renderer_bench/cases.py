@@ -0,0 +1,98 @@
+"""Benchmark fixtures and the case registry.
+
+Fixtures derive from the golden CV (tests/fixtures/sample_cv.json) so they
+track the schema. Three fit fixtures aim at each branch of
+renderer.compile_document: `exact` is the golden CV, `overflow` roughly
+doubles it, `underflow` keeps one role. The bench reports the branch each
+fit actually took, so a template change that moves a fixture to another
+branch shows up instead of silently changing what is measured.
+"""
+import copy
+import json
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+from backend.app.texsvc import tex_onyx
+from backend.app.typstsvc import renderer
+
+FIXTURES = Path(__file__).resolve().parents[2] / "tests" / "fixtures"
+
+SETTINGS = {
+    "template": "onyx", "accent": "#0F62FE", "density": "normal",
+    "show_photo": False, "font_scale": 1.0, "lang": "en",
+}
+
+
+def golden_cv() -> dict:
+    return json.loads((FIXTURES / "sample_cv.json").read_text(encoding="utf-8"))
+
+
+def overflow_cv() -> dict:
+    cv = golden_cv()
+    extra = copy.deepcopy(cv["experience"])
+    for n, job in enumerate(extra):
+        job["company"] = f"{job['company']} ({n + 2})"
+        job["bullets"] = job["bullets"] + [b + " Extended to a second product line." for b in job["bullets"]]
+    cv["experience"] += extra
+    cv["projects"] += copy.deepcopy(cv["projects"])
+    return cv
+
+
+def underflow_cv() -> dict:
+    cv = golden_cv()
+    cv["experience"] = [{**cv["experience"][0], "bullets": cv["experience"][0]["bullets"][:2]}]
+    cv["education"] = cv["education"][:1]
+    cv["projects"] = []
+    cv["certifications"] = []
+    cv["interests"] = []
+    return cv
+
+
+def large_cv() -> dict:
+    """Worst realistic input for the pure-Python renderers: the overflow CV
+    doubled again."""
+    cv = overflow_cv()
+    cv["experience"] += copy.deepcopy(cv["experience"])
+    cv["skills"] += copy.deepcopy(cv["skills"])
+    return cv
+
+
+FIT_FIXTURES: dict[str, Callable[[], dict]] = {
+    "exact": golden_cv,
+    "overflow": overflow_cv,
+    "underflow": underflow_cv,
+}
+
+
+@dataclass
+class Case:
+    name: str
+    run: Callable[[], object] | Callable[[], Awaitable[object]]
+    macro: bool = False       # async, one wall-clock sample per call
+    needs_typst: bool = False
+    fit: str = ""             # expected fit branch for compile_document cases
+
+
+def cases() -> list[Case]:
+    large = large_cv()
+    golden = golden_cv()
+    golden_source = renderer.render_source("cv", "onyx", golden, SETTINGS, has_photo=False)
+    out = [
+        Case("typst_literal[large]", lambda: renderer.typst_literal(large)),
+        Case("render_source[large]", lambda: renderer.render_source("cv", "onyx", large, SETTINGS, False)),
+        Case("render_tex[large]", lambda: tex_onyx.render_tex(large, SETTINGS)),
+        Case("compile_source[svg]", lambda: renderer.compile_source(golden_source, fmt="svg"),
+             macro=True, needs_typst=True),
+        Case("compile_source[pdf]", lambda: renderer.compile_source(golden_source, fmt="pdf"),
+             macro=True, needs_typst=True),
+        Case("measure_fill", lambda: renderer.measure_fill(golden_source), macro=True, needs_typst=True),
+    ]
+    for branch, fixture in FIT_FIXTURES.items():
+        data = fixture()
+        out.append(Case(
+            f"compile_document[{branch}]",
+            lambda data=data: renderer.compile_document("cv", "onyx", data, SETTINGS, fmt="svg"),
+            macro=True, needs_typst=True, fit=branch,
+        ))
+    return out
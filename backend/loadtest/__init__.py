@@ -0,0 +1 @@
+"""End-to-end load test of the FastAPI app: python -m backend.loadtest."""
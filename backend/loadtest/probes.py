@@ -0,0 +1,158 @@
+"""In-process instrumentation for the load test.
+
+The app runs in the harness's own process (uvicorn on a loopback port), so
+the probes read its internals directly: every SQL statement on the engine,
+every wait on the Typst compile semaphore, and the process RSS.
+"""
+import asyncio
+import os
+import resource
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from sqlalchemy import event
+
+
+def percentiles(samples: list[float]) -> dict:
+    """count/p50/p95/p99/max in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def at(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+    return {
+        "count": len(ordered),
+        "p50": at(0.50),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "max": round(ordered[-1] * 1000, 1),
+        "mean": round(statistics.fmean(ordered) * 1000, 1),
+    }
+
+
+class Latencies:
+    """Request timings and non-2xx statuses per endpoint label."""
+
+    def __init__(self) -> None:
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, Counter] = defaultdict(Counter)
+
+    def add(self, label: str, seconds: float, status: int = 200) -> None:
+        self.samples[label].append(seconds)
+        self.statuses[label][status] += 1
+
+    def report(self) -> dict:
+        out = {}
+        for label in sorted(self.samples):
+            errors = {str(code): n for code, n in self.statuses[label].items() if code >= 400}
+            out[label] = {**percentiles(self.samples[label]), "errors": errors}
+        return out
+
+
+class QueryCounter:
+    """Counts statements on the engine by verb (SELECT, INSERT, ...)."""
+
+    def __init__(self, engine) -> None:
+        self.verbs: Counter = Counter()
+        self._engine = engine.sync_engine
+        event.listen(self._engine, "before_cursor_execute", self._seen)
+
+    def _seen(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.verbs[statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"] += 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.verbs.values())
+
+    def close(self) -> None:
+        event.remove(self._engine, "before_cursor_execute", self._seen)
+
+
+class TimedSemaphore(asyncio.Semaphore):
+    """asyncio.Semaphore that records how long each acquire waited."""
+
+    def __init__(self, value: int) -> None:
+        super().__init__(value)
+        self.capacity = value
+        self.waits: list[float] = []
+
+    async def acquire(self):
+        started = time.monotonic()
+        try:
+            return await super().acquire()
+        finally:
+            self.waits.append(time.monotonic() - started)
+
+    def report(self) -> dict:
+        queued = [w for w in self.waits if w > 0.001]
+        return {"capacity": self.capacity, **percentiles(self.waits), "queued": len(queued)}
+
+
+def rss_mb() -> float:
+    """Current resident set size. /proc on Linux, peak RSS elsewhere."""
+    statm = Path("/proc/self/statm")
+    if statm.exists():
+        pages = int(statm.read_text().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+class RssSampler:
+    def __init__(self, interval: float = 0.25) -> None:
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        while True:
+            self.samples.append(rss_mb())
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self.samples.append(rss_mb())
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self.samples.append(rss_mb())
+        return {
+            "start_mb": round(self.samples[0], 1),
+            "peak_mb": round(max(self.samples), 1),
+            "end_mb": round(self.samples[-1], 1),
+        }
+
+
+# A one-page CV preview is ~60-120 KB of SVG and ~40 KB of PDF; the stub
+# returns payloads of that order so response sizes stay realistic.
+_STUB_SVG = '<svg xmlns="http://www.w3.org/2000/svg">' + "<path d='M0 0L1 1'/>" * 4000 + "</svg>"
+_STUB_PDF = b"%PDF-1.7\n" + b"0" * 40_000 + b"\n%%EOF"
+
+
+def _write_output(out: str) -> None:
+    if "{p}" in out:
+        Path(out.replace("{p}", "1")).write_text(_STUB_SVG, encoding="utf-8")
+    else:
+        Path(out).write_bytes(_STUB_PDF)
+
+
+def stub_typst(compile_ms: float):
+    """Stand-in for renderer._run_typst when no typst binary is installed:
+    holds the compile semaphore for compile_ms and writes outputs of
+    realistic size, so the queueing in front of the compiler is real."""
+
+    async def run(args: list[str]) -> tuple[int, str, str]:
+        await asyncio.sleep(compile_ms / 1000)
+        if args[0] == "query":
+            return 0, '{"page": 1, "y": 800}', ""
+        _write_output(args[6])
+        return 0, "", ""
+
+    return run
@@ -0,0 +1,110 @@
+"""Boot create_app() under uvicorn in this process, seed the virtual users,
+drive the workload and assemble the report.
+
+Settings are read from the environment the CLI pinned before this module
+was imported (database, provider, concurrency knobs).
+"""
+import asyncio
+import logging
+import platform
+import socket
+import time
+
+import uvicorn
+
+from backend.app.config import get_settings
+from backend.app.db import get_engine
+from backend.app.main import create_app
+from backend.app.typstsvc import renderer
+from backend.scripts.grant_plan import apply
+
+from .probes import QueryCounter, RssSampler, TimedSemaphore, percentiles, stub_typst
+from .workloads import PASSWORD, Scenario, drive
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _seed(users: int) -> None:
+    emails = [f"loadtest-{n}@loadtest.dev" for n in range(users)]
+    await apply(emails, "pro", dict.fromkeys(emails, PASSWORD), set_password=True)
+
+
+async def run(scenario: Scenario, *, stub_compile_ms: float | None = None, limit_concurrency: int = 0) -> dict:
+    """stub_compile_ms: replace the typst binary with a fixed-time stand-in
+    (None = compile for real). limit_concurrency mirrors Cloud Run's
+    per-instance request concurrency (0 = unlimited)."""
+    settings = get_settings()
+    # One INFO line per request would drown the report.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    await _seed(scenario.users)
+    real_typst, real_semaphore = renderer._run_typst, renderer._semaphore
+    if stub_compile_ms is not None:
+        renderer._run_typst = stub_typst(stub_compile_ms)
+    semaphore = TimedSemaphore(settings.compile_concurrency)
+    renderer._semaphore = semaphore
+    queries = QueryCounter(get_engine())
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        create_app(), host="127.0.0.1", port=port, log_level="warning",
+        limit_concurrency=limit_concurrency or None,
+    ))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.05)
+
+    rss = RssSampler()
+    rss.start()
+    started = time.monotonic()
+    try:
+        outcome = await drive(f"http://127.0.0.1:{port}", scenario)
+    finally:
+        wall = time.monotonic() - started
+        memory = await rss.stop()
+        server.should_exit = True
+        await serving
+        queries.close()
+        renderer._run_typst, renderer._semaphore = real_typst, real_semaphore
+
+    requests = sum(len(v) for v in outcome.latencies.samples.values())
+    return {
+        "scenario": vars(scenario),
+        "environment": {
+            "python": platform.python_version(),
+            "database": settings.sqlalchemy_url.split("://", 1)[0],
+            "provider": (
+                "replay" if settings.ai_replaying else "gemini" if settings.ai_enabled else "fake"
+            ),
+            "replay_latency_scale": settings.cvg_replay_latency_scale if settings.ai_replaying else None,
+            "render": "stub" if stub_compile_ms is not None else "typst",
+            "stub_compile_ms": stub_compile_ms,
+            "job_concurrency": settings.job_concurrency,
+            "compile_concurrency": settings.compile_concurrency,
+            "limit_concurrency": limit_concurrency or None,
+        },
+        "wall_s": round(wall, 2),
+        "jobs": {
+            "completed": outcome.completed,
+            "failed": outcome.failed,
+            "per_minute": round(outcome.completed / (wall / 60), 2) if wall else 0.0,
+            "duration": percentiles(outcome.job_seconds),
+            "sse_first_event": percentiles(outcome.first_event_seconds),
+            "sse_events": outcome.sse_events,
+        },
+        "endpoints": outcome.latencies.report(),
+        "compile_semaphore_wait": semaphore.report(),
+        "db": {
+            "statements": queries.total,
+            "per_request": round(queries.total / requests, 1) if requests else 0.0,
+            "per_job": round(queries.total / outcome.completed, 1) if outcome.completed else None,
+            "by_verb": dict(queries.verbs.most_common()),
+        },
+        "rss": memory,
+        "errors": outcome.errors[:50],
+    }
@@ -0,0 +1,173 @@
+"""Virtual users and the mixed workload they drive.
+
+Each virtual user is a pro-plan account with its own cookie jar and client
+IP (X-Forwarded-For, so the per-IP limiter sees distinct clients, as it
+would in production). A user repeats: submit a batch to /api/generate,
+follow every job over SSE (plus extra subscribers: open tabs), then burst
+Studio compiles on each finished CV and download the PDFs. Users run
+concurrently, so the four traffic kinds overlap.
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import httpx
+
+from .probes import Latencies
+
+FIXTURE = Path(__file__).resolve().parents[1] / "tests" / "fixtures" / "sample_cv.json"
+PASSWORD = "loadtest-password"
+
+_ROLES = ["Machine Learning Engineer", "Backend Engineer", "Data Engineer", "Platform Engineer", "MLOps Lead"]
+_COMPANIES = ["Lumina AI", "Northwind", "Helix Labs", "Quanta Systems", "Orbital Data"]
+_STACKS = [
+    "python, pytorch and airflow", "go, kafka and postgres", "spark, dbt and gcp",
+    "kubernetes, terraform and docker", "typescript, node and react",
+]
+
+
+def job_description(n: int) -> str:
+    """A distinct, plausible posting per n (a shared JD would turn every job
+    after the first into an aicache hit)."""
+    role, company = _ROLES[n % len(_ROLES)], _COMPANIES[(n // len(_ROLES)) % len(_COMPANIES)]
+    stack = _STACKS[(n // 3) % len(_STACKS)]
+    return (
+        f"We are hiring a {role} at {company} in Paris (posting #{n}). You will design and run "
+        f"production systems with {stack}, own them end to end (monitoring, on-call, rollback) and "
+        "mentor two engineers. Strong written communication and a habit of measuring before "
+        "optimizing are required. Hybrid, three days on site."
+    )
+
+
+@dataclass
+class Scenario:
+    users: int = 4
+    batches: int = 2          # batches per user, sequential
+    batch_size: int = 3       # job descriptions per batch
+    subscribers: int = 2      # SSE connections per job
+    burst: int = 5            # concurrent Studio compiles per CV
+    downloads: int = 2        # PDF downloads per document
+
+
+@dataclass
+class Outcome:
+    latencies: Latencies = field(default_factory=Latencies)
+    job_seconds: list[float] = field(default_factory=list)
+    first_event_seconds: list[float] = field(default_factory=list)
+    sse_events: int = 0
+    completed: int = 0
+    failed: int = 0
+    errors: list[str] = field(default_factory=list)
+
+
+class VirtualUser:
+    def __init__(self, n: int, base_url: str, outcome: Outcome, scenario: Scenario, jd_offset: int):
+        self.n = n
+        self.email = f"loadtest-{n}@loadtest.dev"
+        self.outcome = outcome
+        self.scenario = scenario
+        self._jd = jd_offset
+        self.client = httpx.AsyncClient(
+            base_url=base_url, timeout=httpx.Timeout(900.0, connect=10.0),
+            headers={"x-forwarded-for": f"10.77.{n // 250}.{n % 250 + 1}"},
+        )
+
+    async def _timed(self, label: str, method: str, url: str, **kwargs) -> httpx.Response:
+        started = time.monotonic()
+        resp = await self.client.request(method, url, **kwargs)
+        self.outcome.latencies.add(label, time.monotonic() - started, resp.status_code)
+        return resp
+
+    async def setup(self) -> int:
+        resp = await self._timed("POST /api/auth/login", "POST", "/api/auth/login",
+                                 json={"email": self.email, "password": PASSWORD})
+        resp.raise_for_status()
+        data = json.loads(FIXTURE.read_text(encoding="utf-8"))
+        resp = await self._timed("POST /api/cvs", "POST", "/api/cvs", json={"name": "Load test", "data": data})
+        resp.raise_for_status()
+        return resp.json()["id"]
+
+    async def follow(self, job_id: str, submitted: float) -> dict:
+        """One SSE subscriber: time to first event, events seen, final snapshot."""
+        started = time.monotonic()
+        first = None
+        last: dict = {}
+        async with self.client.stream("GET", f"/api/jobs/{job_id}/events") as resp:
+            async for line in resp.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                if first is None:
+                    first = time.monotonic() - started
+                self.outcome.sse_events += 1
+                last = json.loads(line[6:])
+        self.outcome.latencies.add("GET /api/jobs/{id}/events (stream)", time.monotonic() - started, resp.status_code)
+        if first is not None:
+            self.outcome.first_event_seconds.append(first)
+        last["_elapsed"] = time.monotonic() - submitted
+        return last
+
+    async def batch(self, master_cv_id: int) -> list[tuple[str, str]]:
+        """Submit one batch and follow it to the end -> [(doc id, kind)]."""
+        jds = [job_description(self._jd + i) for i in range(self.scenario.batch_size)]
+        self._jd += len(jds)
+        submitted = time.monotonic()
+        resp = await self._timed("POST /api/generate", "POST", "/api/generate",
+                                 json={"job_descriptions": jds, "master_cv_id": master_cv_id})
+        if resp.status_code != 200:
+            self.outcome.errors.append(f"generate {resp.status_code}: {resp.text[:200]}")
+            return []
+        job_ids = resp.json()["jobs"]
+        follows = [
+            self.follow(job_id, submitted) for job_id in job_ids for _ in range(self.scenario.subscribers)
+        ]
+        finals = await asyncio.gather(*follows)
+        docs: list[tuple[str, str]] = []
+        for job_id in job_ids:
+            # Every subscriber of a job sees the same end; count the job once.
+            final = next((f for f in finals if f.get("id") == job_id), {})
+            if final.get("status") == "completed":
+                self.outcome.completed += 1
+                self.outcome.job_seconds.append(final["_elapsed"])
+                resp = await self._timed("GET /api/jobs/{id}", "GET", f"/api/jobs/{job_id}")
+                docs += [(d["id"], d["kind"]) for d in resp.json().get("documents", []) if d["kind"] != "message"]
+            else:
+                self.outcome.failed += 1
+                self.outcome.errors.append(f"job {job_id} {final.get('status')}: {final.get('error')}")
+        return docs
+
+    async def studio(self, doc_id: str) -> None:
+        """A burst of preview compiles, as an editor firing on keystrokes."""
+        resp = await self._timed("GET /api/documents/{id}", "GET", f"/api/documents/{doc_id}")
+        source = resp.json().get("source") or ""
+        await asyncio.gather(*(
+            self._timed("POST /api/documents/{id}/compile", "POST", f"/api/documents/{doc_id}/compile",
+                        json={"source": f"{source}\n// edit {i}"})
+            for i in range(self.scenario.burst)
+        ))
+
+    async def download(self, doc_id: str) -> None:
+        for _ in range(self.scenario.downloads):
+            await self._timed("GET /api/documents/{id}/pdf", "GET", f"/api/documents/{doc_id}/pdf")
+
+    async def run(self) -> None:
+        try:
+            master_cv_id = await self.setup()
+            for _ in range(self.scenario.batches):
+                docs = await self.batch(master_cv_id)
+                if self.scenario.burst:
+                    await asyncio.gather(*(self.studio(doc_id) for doc_id, kind in docs if kind == "cv"))
+                await asyncio.gather(*(self.download(doc_id) for doc_id, _ in docs))
+        except httpx.HTTPError as exc:
+            self.outcome.errors.append(f"user {self.n}: {type(exc).__name__}: {exc}")
+        finally:
+            await self.client.aclose()
+
+
+async def drive(base_url: str, scenario: Scenario) -> Outcome:
+    outcome = Outcome()
+    per_user = scenario.batches * scenario.batch_size
+    users = [VirtualUser(n, base_url, outcome, scenario, n * per_user) for n in range(scenario.users)]
+    await asyncio.gather(*(u.run() for u in users))
+    return outcome
@@ -19,10 +19,29 @@ os.environ["STRIPE_WEBHOOK_SECRET"] = "whsec_testsecret"
 
 import httpx  # noqa: E402
 import pytest  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
 
 from backend.app import main as app_main  # noqa: E402
-from backend.app.db import dispose_db, init_db  # noqa: E402
+from backend.app.ai import ctxcache, health, ratelimit  # noqa: E402
+from backend.app.db import dispose_db, init_db, session_factory  # noqa: E402
 from backend.app.main import create_app  # noqa: E402
+from backend.app.models import AnalysisCacheEntry, ResultCacheEntry  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _reset_ai_limiters():
+    # A 429 scripted by one test pauses its credential in real time, and
+    # scripted latencies/failures feed the model health stats; the next test
+    # using the same fake key must not inherit either.
+    ratelimit._limiters.clear()
+    health.reset()
+    ctxcache.registry.clear()
+    ctxcache.local.clear()
+    yield
+    ratelimit._limiters.clear()
+    health.reset()
+    ctxcache.registry.clear()
+    ctxcache.local.clear()
 
 
 @pytest.fixture
@@ -31,6 +50,12 @@ async def client():
     # The per-IP rate limiter is a module global; every test shares one "IP",
     # so leftovers from earlier tests would 429 later ones.
     app_main._hits.clear()
+    # Same for the shared LLM caches: tests that script provider methods
+    # must not be served another test's result for the same SAMPLE_JD.
+    async with session_factory()() as db:
+        await db.execute(delete(AnalysisCacheEntry))
+        await db.execute(delete(ResultCacheEntry))
+        await db.commit()
     app = create_app()
     transport = httpx.ASGITransport(app=app)
     async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
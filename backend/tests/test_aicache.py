@@ -0,0 +1,219 @@
+"""Shared JobAnalysis cache: key normalization, TTL/size eviction, and the
+in-flight dedup that collapses identical postings into one provider call."""
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import func, select
+
+from backend.app import aicache
+from backend.app.ai.fake import FakeProvider
+from backend.app.config import get_settings
+from backend.app.db import session_factory
+from backend.app.models import AnalysisCacheEntry, ResultCacheEntry
+
+from .conftest import SAMPLE_JD
+
+
+class _CountingProvider(FakeProvider):
+    def __init__(self):
+        self.calls = 0
+
+    async def analyze(self, jd, cv_text, language):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return await super().analyze(jd, cv_text, language)
+
+
+def test_key_ignores_layout_whitespace_but_not_language():
+    spaced = "  " + SAMPLE_JD.replace(" ", "  \n") + "\n\n"
+    assert aicache.analysis_key("fake", spaced, "en") == aicache.analysis_key("fake", SAMPLE_JD, "en")
+    assert aicache.analysis_key("fake", SAMPLE_JD, "fr") != aicache.analysis_key("fake", SAMPLE_JD, "en")
+    assert aicache.analysis_key("fake", SAMPLE_JD.lower(), "en") != aicache.analysis_key("fake", SAMPLE_JD, "en")
+
+
+async def test_second_analysis_is_served_from_the_db(client):
+    provider = _CountingProvider()
+    first, cached = await aicache.analyze(provider, SAMPLE_JD, "cv", "en")
+    assert not cached
+    second, cached = await aicache.analyze(provider, SAMPLE_JD + "\n", "other cv", "en")
+    assert cached and provider.calls == 1
+    assert second == first
+
+
+async def test_identical_concurrent_postings_share_one_call(client):
+    provider = _CountingProvider()
+    results = await asyncio.gather(
+        *(aicache.analyze(provider, SAMPLE_JD, "cv", "en") for _ in range(3))
+    )
+    assert provider.calls == 1
+    assert [cached for _, cached in results].count(False) == 1
+    assert len({r.model_dump_json() for r, _ in results}) == 1
+
+
+async def test_expired_entries_miss_and_are_purged(client):
+    provider = _CountingProvider()
+    await aicache.analyze(provider, SAMPLE_JD, "cv", "en")
+    key = aicache.analysis_key("fake", SAMPLE_JD, "en")
+    async with session_factory()() as db:
+        row = await db.get(AnalysisCacheEntry, key)
+        row.created_at = datetime.now(UTC) - timedelta(hours=get_settings().analysis_cache_ttl_hours + 1)
+        await db.commit()
+    _, cached = await aicache.analyze(provider, SAMPLE_JD, "cv", "en")
+    assert not cached and provider.calls == 2
+
+
+async def test_size_cap_evicts_oldest(client, monkeypatch):
+    monkeypatch.setattr(get_settings(), "analysis_cache_max_entries", 2)
+    provider = _CountingProvider()
+    jds = [f"{SAMPLE_JD} Posting number {i}." for i in range(3)]
+    for jd in jds:
+        await aicache.analyze(provider, jd, "cv", "en")
+    async with session_factory()() as db:
+        oldest = await db.get(AnalysisCacheEntry, aicache.analysis_key("fake", jds[0], "en"))
+        newest = await db.get(AnalysisCacheEntry, aicache.analysis_key("fake", jds[2], "en"))
+    assert oldest is None and newest is not None
+
+
+async def test_ttl_zero_disables_the_cache(client, monkeypatch):
+    monkeypatch.setattr(get_settings(), "analysis_cache_ttl_hours", 0)
+    provider = _CountingProvider()
+    await aicache.analyze(provider, SAMPLE_JD, "cv", "en")
+    _, cached = await aicache.analyze(provider, SAMPLE_JD, "cv", "en")
+    assert not cached and provider.calls == 2
+
+
+def test_result_key_covers_every_input(monkeypatch):
+    from backend.app.ai import prompts
+
+    master = {"full_name": "Alex", "summary": "ML engineer"}
+    base = aicache.result_key("cv", "fake", master, SAMPLE_JD, "en", "major")
+    assert aicache.result_key("cv", "fake", dict(reversed(master.items())), SAMPLE_JD + " ", "en", "major") == base
+    assert aicache.result_key("cv", "fake", {**master, "summary": "x"}, SAMPLE_JD, "en", "major") != base
+    assert aicache.result_key("cv", "fake", master, SAMPLE_JD, "en", "minor") != base
+    assert aicache.result_key("cv", "fake", master, SAMPLE_JD, "fr", "major") != base
+    assert aicache.result_key("letter", "fake", master, SAMPLE_JD, "en", "major") != base
+    monkeypatch.setattr(get_settings(), "gemini_compact_prompts", not get_settings().gemini_compact_prompts)
+    assert aicache.result_key("cv", "fake", master, SAMPLE_JD, "en", "major") != base
+    monkeypatch.undo()
+    monkeypatch.setattr(prompts, "PROMPT_VERSION", prompts.PROMPT_VERSION + "-next")
+    assert aicache.result_key("cv", "fake", master, SAMPLE_JD, "en", "major") != base
+
+
+async def _generate_twice(client, monkeypatch, headers=None) -> tuple[list[str], dict]:
+    from backend.app.typstsvc import renderer
+    from backend.app.typstsvc.renderer import CompileResult
+
+    from .conftest import SAMPLE_CV_TEXT
+    from .test_api import _count_provider_calls, _register, _wait_job
+
+    async def fake_render(*args, **kwargs):
+        return CompileResult(ok=True, pages=1, pdf=b"%PDF-fake"), "// source"
+
+    monkeypatch.setattr(renderer, "compile_document", fake_render)
+    calls = _count_provider_calls(monkeypatch)
+    await _register(client)
+    r = await client.post("/api/cvs", json={"name": "Main", "raw_text": SAMPLE_CV_TEXT})
+    body = {"job_descriptions": [SAMPLE_JD], "master_cv_id": r.json()["id"], "language": "en"}
+    snap = {}
+    for _ in range(2):
+        calls.clear()
+        r = await client.post("/api/generate", json=body, headers=headers or {})
+        assert r.status_code == 200, r.text
+        snap = await _wait_job(client, r.json()["jobs"][0])
+        assert snap["status"] == "completed", snap.get("error")
+    return calls, snap
+
+
+async def test_identical_regeneration_is_served_from_the_memo(client, monkeypatch):
+    monkeypatch.setattr(get_settings(), "result_cache_ttl_hours", 24)
+    calls, snap = await _generate_twice(client, monkeypatch)
+    assert calls == []
+    assert any("identical recent generation" in ev["message"] for ev in snap["events"])
+
+
+async def test_memo_is_off_by_default(client, monkeypatch):
+    calls, snap = await _generate_twice(client, monkeypatch)
+    assert sorted(calls) == ["outreach", "tailor_cv", "write_letter"]
+    assert not any("identical recent generation" in ev["message"] for ev in snap["events"])
+
+
+async def test_byok_jobs_never_use_the_memo(client, monkeypatch):
+    from backend.app import jobs
+
+    monkeypatch.setattr(get_settings(), "result_cache_ttl_hours", 24)
+    monkeypatch.setattr(jobs, "get_provider", lambda byok_key=None: FakeProvider())
+    calls, _ = await _generate_twice(client, monkeypatch, headers={"X-User-Gemini-Key": "AIzaFakeKey123"})
+    assert sorted(calls) == ["outreach", "tailor_cv", "write_letter"]
+    async with session_factory()() as db:
+        assert (await db.execute(select(func.count(ResultCacheEntry.key)))).scalar_one() == 0
+
+
+class _ByokGemini(FakeProvider):
+    """Stands in for a BYOK GeminiProvider: a different model answers."""
+
+    cache_tag = "gemini-test"
+
+
+async def test_byok_and_offline_jobs_do_not_share_analyses(client, monkeypatch):
+    from backend.app import jobs
+    from backend.app.typstsvc import renderer
+    from backend.app.typstsvc.renderer import CompileResult
+
+    from .conftest import SAMPLE_CV_TEXT
+    from .test_api import _count_provider_calls, _register, _wait_job
+
+    async def fake_render(*args, **kwargs):
+        return CompileResult(ok=True, pages=1, pdf=b"%PDF-fake"), "// source"
+
+    monkeypatch.setattr(renderer, "compile_document", fake_render)
+    monkeypatch.setattr(jobs, "get_provider", lambda byok_key=None: _ByokGemini() if byok_key else FakeProvider())
+    calls = _count_provider_calls(monkeypatch)
+    await _register(client)
+    r = await client.post("/api/cvs", json={"name": "Main", "raw_text": SAMPLE_CV_TEXT})
+    body = {"job_descriptions": [SAMPLE_JD], "master_cv_id": r.json()["id"], "language": "en"}
+
+    async def analyze_calls(headers: dict) -> int:
+        calls.clear()
+        r = await client.post("/api/generate", json=body, headers=headers)
+        snap = await _wait_job(client, r.json()["jobs"][0])
+        assert snap["status"] == "completed", snap.get("error")
+        return calls.count("analyze")
+
+    assert await analyze_calls({"X-User-Gemini-Key": "AIzaFakeKey123"}) == 1
+    assert await analyze_calls({}) == 1, "a BYOK Gemini analysis was served to an offline job"
+    assert await analyze_calls({}) == 0  # same provider, same posting: cached
+    assert await analyze_calls({"X-User-Gemini-Key": "AIzaFakeKey123"}) == 0
+
+
+async def test_lite_fallback_analyses_are_not_stored(client, monkeypatch):
+    from types import SimpleNamespace
+
+    from backend.app.ai import gemini
+    from backend.app.ai.gemini import GeminiProvider
+
+    from .test_gemini_hedging import _Fake503
+
+    monkeypatch.setattr(get_settings(), "gemini_api_key", "test-server-key")
+    provider = GeminiProvider(api_key="test-server-key")
+    answer = await FakeProvider().analyze(SAMPLE_JD, "", "en")
+    models: list[str] = []
+
+    async def fake_generate_content(model, contents, config):
+        models.append(model)
+        if model == provider._model and len(models) == 1:
+            raise _Fake503()
+        return SimpleNamespace(text=answer.model_dump_json(), parsed=answer)
+
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(provider._client.aio.models, "generate_content", fake_generate_content)
+    monkeypatch.setattr(gemini.asyncio, "sleep", no_sleep)
+    _, cached = await aicache.analyze(provider, SAMPLE_JD, "", "en")
+    assert not cached and models == [provider._model, provider._model_lite]
+    # The lite answer was not filed under the primary model's tag: the next
+    # job asks the primary again, and that answer is kept.
+    _, cached = await aicache.analyze(provider, SAMPLE_JD, "", "en")
+    assert not cached and models[-1] == provider._model
+    _, cached = await aicache.analyze(provider, SAMPLE_JD, "", "en")
+    assert cached and len(models) == 3
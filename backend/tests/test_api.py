@@ -1,5 +1,6 @@
 """End-to-end API flow against the offline provider and real Typst engine."""
 import asyncio
+import json
 
 from .conftest import SAMPLE_CV_TEXT, SAMPLE_JD, unique_email
 
@@ -242,6 +243,93 @@ async def test_retry_failed_job(client, monkeypatch):
     assert r.status_code == 409
 
 
+def _count_provider_calls(monkeypatch) -> list[str]:
+    from backend.app.ai.fake import FakeProvider
+
+    calls: list[str] = []
+    for name in ("analyze", "tailor_cv", "write_letter", "outreach"):
+        real = getattr(FakeProvider, name)
+
+        def counted(real=real, name=name):
+            async def wrapper(self, *args, **kwargs):
+                calls.append(name)
+                return await real(self, *args, **kwargs)
+
+            return wrapper
+
+        monkeypatch.setattr(FakeProvider, name, counted())
+    return calls
+
+
+async def test_retry_after_render_failure_skips_llm_stages(client, monkeypatch):
+    """Every LLM stage finished before the render step broke, so the retry
+    resumes at render without a single provider call."""
+    from backend.app.typstsvc import renderer
+    from backend.app.typstsvc.renderer import CompileResult
+
+    calls = _count_provider_calls(monkeypatch)
+
+    async def broken_render(*args, **kwargs):
+        return CompileResult(ok=False, diagnostics="render exploded"), ""
+
+    async def fake_render(*args, **kwargs):
+        return CompileResult(ok=True, pages=1, pdf=b"%PDF-fake"), "// source"
+
+    await _register(client)
+    monkeypatch.setattr(renderer, "compile_document", broken_render)
+    r = await client.post(
+        "/api/generate",
+        json={"job_descriptions": [SAMPLE_JD], "cv_text": SAMPLE_CV_TEXT, "language": "en"},
+    )
+    job_id = r.json()["jobs"][0]
+    snap = await _wait_job(client, job_id)
+    assert snap["status"] == "failed"
+    assert sorted(calls) == ["analyze", "outreach", "tailor_cv", "write_letter"]
+
+    calls.clear()
+    monkeypatch.setattr(renderer, "compile_document", fake_render)
+    r = await client.post(f"/api/jobs/{job_id}/retry")
+    assert r.status_code == 200, r.text
+    snap = await _wait_job(client, job_id)
+    assert snap["status"] == "completed", snap.get("error")
+    assert calls == []
+    assert any("Reusing" in ev["message"] for ev in snap["events"])
+
+
+async def test_retry_regenerates_only_the_failed_stage(client, monkeypatch):
+    from backend.app.ai.base import AIError
+    from backend.app.ai.fake import FakeProvider
+    from backend.app.typstsvc import renderer
+    from backend.app.typstsvc.renderer import CompileResult
+
+    calls = _count_provider_calls(monkeypatch)
+    counted_letter = FakeProvider.write_letter
+
+    async def rate_limited(self, jd, analysis, cv, language, on_progress=None):
+        raise AIError("429 on the letter")
+
+    async def fake_render(*args, **kwargs):
+        return CompileResult(ok=True, pages=1, pdf=b"%PDF-fake"), "// source"
+
+    await _register(client)
+    monkeypatch.setattr(renderer, "compile_document", fake_render)
+    monkeypatch.setattr(FakeProvider, "write_letter", rate_limited)
+    r = await client.post(
+        "/api/generate",
+        json={"job_descriptions": [SAMPLE_JD], "cv_text": SAMPLE_CV_TEXT, "language": "en"},
+    )
+    job_id = r.json()["jobs"][0]
+    snap = await _wait_job(client, job_id)
+    assert snap["status"] == "failed" and "429" in snap["error"]
+
+    calls.clear()
+    monkeypatch.setattr(FakeProvider, "write_letter", counted_letter)
+    r = await client.post(f"/api/jobs/{job_id}/retry")
+    snap = await _wait_job(client, job_id)
+    assert snap["status"] == "completed", snap.get("error")
+    assert calls == ["write_letter"]
+
+
 async def test_retry_guards(client, monkeypatch):
     """Retry 404s on unknown jobs and is owner-only for account jobs."""
     from backend.app.ai.base import AIError
@@ -359,3 +447,43 @@ async def test_page_mode_continuous_roundtrip(client):
     r = await client.put(f"/api/documents/{cv_doc['id']}", json={"settings": junk})
     assert r.status_code == 200, r.text
     assert r.json()["settings"]["page_mode"] == "paged"
+
+
+async def test_compile_stream_sends_status_then_pages(client, monkeypatch):
+    """LaTeX previews stream: the status (and the save) first, then each
+    page as latexc converts it, then done."""
+    from services.latexc.contract import CompileFrame, LatexCompileOut
+
+    from backend.app.db import session_factory
+    from backend.app.models import Document
+    from backend.app.routers import documents
+
+    async with session_factory()() as db:
+        db.add(Document(id="latexstream1", kind="cv", settings={"compiler": "latex"}, source="old"))
+        await db.commit()
+
+    async def fake_stream(doc_id, source):
+        yield CompileFrame(kind="status", status=LatexCompileOut(ok=True, pages=2))
+        yield CompileFrame(kind="page", page=2, svg="<svg>2</svg>")
+        yield CompileFrame(kind="page", page=1, svg="<svg>1</svg>")
+        yield CompileFrame(kind="done")
+
+    monkeypatch.setattr(documents, "stream_tex", fake_stream)
+    r = await client.post("/api/documents/latexstream1/compile/stream", json={"source": "new"})
+    assert r.status_code == 200 and r.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines[0] == {
+        "kind": "status", "ok": True, "pages": 2, "diagnostics": "", "saved": True, "mode": "source",
+    }
+    assert [(ln["kind"], ln.get("page")) for ln in lines[1:]] == [("page", 2), ("page", 1), ("done", None)]
+    assert lines[-1]["ok"] is True
+
+    async def broken_stream(doc_id, source):
+        yield CompileFrame(kind="status", status=LatexCompileOut(ok=False, error_line="! Undefined"))
+
+    monkeypatch.setattr(documents, "stream_tex", broken_stream)
+    r = await client.post("/api/documents/latexstream1/compile/stream", json={"source": "bad"})
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines[0]["ok"] is False and lines[0]["saved"] is False
+    assert "Undefined" in lines[0]["diagnostics"]
+    assert lines[-1] == {"kind": "done", "ok": False}
@@ -0,0 +1,101 @@
+"""Compact prompt inputs and per-method token usage on jobs.
+
+Root cause this guards: every prompt embedded `model_dump_json(indent=1)` of
+the CV, so whitespace, empty schema fields and long repeated key names were
+billed as input tokens on every call, and nothing recorded where the tokens
+of a job went.
+"""
+import json
+
+from backend.app.ai import compact, usage
+from backend.app.ai.fake import FakeProvider
+from backend.app.config import get_settings
+from backend.app.schemas import CVData, ExperienceItem
+
+from .conftest import SAMPLE_CV_TEXT, SAMPLE_JD
+
+
+def _cv(roles: int = 6) -> CVData:
+    return CVData(
+        full_name="Ada Lovelace",
+        summary="Analyst.",
+        experience=[
+            ExperienceItem(title="Engineer", company="Babbage & Co", bullets=["Built the engine", ""])
+            for _ in range(roles)
+        ],
+    )
+
+
+def test_context_json_prunes_and_abbreviates_with_a_legend():
+    cv = _cv()
+    out = compact.context_json(cv)
+    legend, body = out.split("\n", 1)
+    assert legend.startswith("(keys abbreviated: ") and "xp=experience" in legend and "b=bullets" in legend
+    data = json.loads(body)
+    assert data["fn"] == "Ada Lovelace"
+    assert data["xp"][0] == {"t": "Engineer", "co": "Babbage & Co", "b": ["Built the engine"]}
+    assert "ed" not in data and "education" not in data, "empty fields are dropped"
+    assert len(out) < len(cv.model_dump_json(indent=1)) / 2
+
+
+def test_short_context_keeps_real_keys_when_the_legend_would_cost_more():
+    data = json.loads(compact.context_json(_cv(roles=1)))
+    assert data["experience"][0]["bullets"] == ["Built the engine"]
+
+
+def test_document_json_keeps_the_real_keys():
+    cv = _cv()
+    data = json.loads(compact.document_json(cv))
+    assert data["experience"][0]["bullets"] == ["Built the engine"]
+    assert CVData.model_validate(data).full_name == "Ada Lovelace"
+
+
+def test_text_collapses_whitespace_only():
+    assert compact.text("  Senior   role\t in Paris \n\n\n\n- python  \n") == "Senior role in Paris\n\n- python"
+
+
+def test_disabled_restores_the_verbose_form(monkeypatch):
+    monkeypatch.setattr(get_settings(), "gemini_compact_prompts", False)
+    cv = _cv()
+    assert compact.context_json(cv) == cv.model_dump_json(indent=1)
+    assert compact.document_json(cv) == cv.model_dump_json(indent=1)
+    assert compact.text("a   b\n\n\n\nc") == "a   b\n\n\n\nc"
+
+
+async def test_usage_log_collects_per_method_counts():
+    log = usage.UsageLog({"analyze": {"calls": 1, "prompt": 10, "response": 5, "cached": 0}})
+    token = usage.current.set(log)
+    try:
+        fake = FakeProvider()
+        master = await fake.parse_cv(SAMPLE_CV_TEXT, None, "en")
+        analysis = await fake.analyze(SAMPLE_JD, master.plain_text(), "en")
+        await fake.tailor_cv(SAMPLE_JD, analysis, master, "en")
+    finally:
+        usage.current.reset(token)
+    counts = log.as_dict()
+    assert counts["analyze"]["calls"] == 2 and counts["analyze"]["prompt"] > 10
+    assert counts["tailor_cv"]["calls"] == 1 and counts["tailor_cv"]["response"] > 0
+
+
+async def test_pipeline_stores_token_usage_on_the_job(client, monkeypatch):
+    from backend.app import jobs
+    from backend.app.typstsvc import renderer
+    from backend.app.typstsvc.renderer import CompileResult
+
+    from .test_api import _register, _wait_job
+
+    async def fake_render(*args, **kwargs):
+        return CompileResult(ok=True, pages=1, pdf=b"%PDF-fake"), "// source"
+
+    monkeypatch.setattr(renderer, "compile_document", fake_render)
+    monkeypatch.setattr(jobs, "get_provider", lambda byok_key=None: FakeProvider())
+    await _register(client)
+    r = await client.post(
+        "/api/generate",
+        json={"job_descriptions": [SAMPLE_JD], "cv_text": SAMPLE_CV_TEXT, "language": "en"},
+    )
+    snap = await _wait_job(client, r.json()["jobs"][0])
+    assert snap["status"] == "completed", snap.get("error")
+    spent = snap["token_usage"]
+    assert {"analyze", "tailor_cv", "write_letter", "outreach"} <= spent.keys()
+    assert all(entry["prompt"] > 0 and entry["calls"] >= 1 for entry in spent.values())
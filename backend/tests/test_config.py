@@ -72,3 +72,12 @@ def test_ai_enabled_via_vertex_without_key():
     assert Settings(gemini_api_key="", gemini_use_vertex=True, cvg_fake_ai=False).ai_enabled
     assert not Settings(gemini_api_key="", gemini_use_vertex=False, cvg_fake_ai=False).ai_enabled
     assert not Settings(gemini_api_key="", gemini_use_vertex=True, cvg_fake_ai=True).ai_enabled
+
+
+def test_replay_mode_typo_fails_at_startup():
+    """Anything but replay/record used to mean replay, so a misspelled
+    CVG_REPLAY_MODE=record silently replayed an empty cassette."""
+    assert Settings(cvg_replay_cassette="c.jsonl", cvg_replay_mode="replay").ai_replaying
+    assert not Settings(cvg_replay_cassette="c.jsonl", cvg_replay_mode="record").ai_replaying
+    with pytest.raises(ValueError):
+        Settings(cvg_replay_mode="recrod")
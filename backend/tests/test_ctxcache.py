@@ -0,0 +1,196 @@
+"""Cacheable prompt prefix: instructions + master CV first, posting last.
+
+Root cause this guards: every generation prompt embedded the master CV after
+the job description, so a 10-posting batch paid for the same master CV 30
+times and no provider cache could ever match.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from google.genai import errors as genai_errors
+
+from backend.app.ai import compact, ctxcache, prompts
+from backend.app.ai.fake import FakeProvider
+from backend.app.ai.gemini import GeminiProvider
+from backend.app.config import get_settings
+
+from .conftest import SAMPLE_CV_TEXT, SAMPLE_JD
+
+_CACHE_NAME = "cachedContents/abc123"
+
+
+@pytest.fixture(autouse=True)
+def _fresh_ledger():
+    ctxcache.ledger.reset()
+    yield
+    ctxcache.ledger.reset()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(get_settings(), "gemini_api_key", "test-server-key")
+    return GeminiProvider(api_key="test-server-key")
+
+
+def _api_error(code: int, message: str) -> genai_errors.APIError:
+    exc = genai_errors.APIError.__new__(genai_errors.APIError)
+    Exception.__init__(exc, message)
+    exc.code = code
+    return exc
+
+
+def _script(monkeypatch, provider, *, refuse=False, stale=False, unavailable=False):
+    seen = {"creates": 0, "calls": [], "deletes": []}
+
+    async def fake_create(model, config):
+        seen["creates"] += 1
+        await asyncio.sleep(0.01)
+        if refuse:
+            raise _api_error(400, "400 Cached content is too small")
+        if unavailable:
+            raise _api_error(503, "503 UNAVAILABLE")
+        return SimpleNamespace(name=_CACHE_NAME)
+
+    async def fake_generate_content(model, contents, config):
+        cached = getattr(config, "cached_content", None)
+        seen["calls"].append((contents, cached))
+        if stale and cached:
+            raise _api_error(404, "404 cached content not found")
+        usage = SimpleNamespace(prompt_token_count=1500, cached_content_token_count=1200 if cached else 0)
+        return SimpleNamespace(text="ok", parsed=None, usage_metadata=usage)
+
+    async def fake_delete(name):
+        seen["deletes"].append(name)
+
+    monkeypatch.setattr(provider._client.aio.caches, "create", fake_create)
+    monkeypatch.setattr(provider._client.aio.caches, "delete", fake_delete)
+    monkeypatch.setattr(provider._client.aio.models, "generate_content", fake_generate_content)
+    return seen
+
+
+def test_prefix_is_identical_across_postings():
+    a_prefix, a_suffix = prompts.tailor_cv_parts("JD one", "notes 1", ["python"], '{"x": 1}', "en")
+    b_prefix, b_suffix = prompts.tailor_cv_parts("JD two", "notes 2", ["gcp"], '{"x": 1}', "en")
+    assert a_prefix == b_prefix
+    assert '{"x": 1}' in a_prefix and "JD one" not in a_prefix and "python" not in a_prefix
+    assert "JD one" in a_suffix and "python" in a_suffix
+    for parts in (
+        prompts.letter_parts("JD one", "notes", '{"x": 1}', "fr"),
+        prompts.outreach_parts("JD one", '{"x": 1}', "fr"),
+    ):
+        assert parts[0].rstrip().endswith('{"x": 1}') and "JD one" in parts[1]
+    assert prompts.tailor_cv_prompt("JD one", "notes 1", ["python"], '{"x": 1}', "en") == a_prefix + a_suffix
+
+
+async def test_parallel_calls_share_one_cache_entry(monkeypatch, server):
+    seen = _script(monkeypatch, server)
+    prefix = "INSTRUCTIONS + MASTER CV " * 300
+    results = await asyncio.gather(*(
+        server._generate(f"posting {n}", method="tailor_cv", prefix=prefix, master_hash="m1")
+        for n in range(3)
+    ))
+    assert results == ["ok"] * 3
+    assert seen["creates"] == 1
+    assert sorted(seen["calls"]) == [(f"posting {n}", _CACHE_NAME) for n in range(3)]
+    assert await ctxcache.registry.release(server._client, server._cred, "other") == 0
+    assert ctxcache.ledger.snapshot() == {
+        "calls": 3, "prompt_tokens": 4500, "cached_tokens": 3600, "billed_tokens": 900,
+    }
+
+
+async def test_short_or_refused_prefixes_go_inline(monkeypatch, server):
+    seen = _script(monkeypatch, server, refuse=True)
+    prefix = "P" * 8000
+    for _ in range(2):
+        assert await server._generate("suffix", method="analyze", prefix=prefix) == "ok"
+    assert seen["creates"] == 1, "a refused prefix is not retried every call"
+    assert seen["calls"] == [(prefix + "suffix", None)] * 2
+    await server._generate("suffix", method="analyze", prefix="short ")
+    assert seen["creates"] == 1 and seen["calls"][-1] == ("short suffix", None)
+
+
+async def test_transient_create_failure_backs_off_briefly(monkeypatch, server):
+    seen = _script(monkeypatch, server, unavailable=True)
+    prefix = "P" * 8000
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(ctxcache, "time", SimpleNamespace(monotonic=lambda: clock["now"]))
+    assert await server._generate("suffix", method="analyze", prefix=prefix) == "ok"
+    assert await server._generate("suffix", method="analyze", prefix=prefix) == "ok"
+    assert seen["creates"] == 1
+    # A 503 is not a refusal: the prefix is offered again within minutes,
+    # not after the whole TTL.
+    clock["now"] += ctxcache._RETRY_AFTER_S + 1
+    assert await server._generate("suffix", method="analyze", prefix=prefix) == "ok"
+    assert seen["creates"] == 2
+
+
+async def test_stale_handle_falls_back_inline(monkeypatch, server):
+    seen = _script(monkeypatch, server, stale=True)
+    prefix = "P" * 8000
+    assert await server._generate("suffix", method="outreach", prefix=prefix) == "ok"
+    assert seen["calls"] == [("suffix", _CACHE_NAME), (prefix + "suffix", None)]
+    assert await ctxcache.registry.release(server._client, server._cred, "") == 0
+    assert seen["deletes"] == []
+
+
+async def test_changed_master_cv_releases_its_caches(monkeypatch, server):
+    seen = _script(monkeypatch, server)
+    master = await FakeProvider().parse_cv(SAMPLE_CV_TEXT, None, "en")
+    prefix = "P" * 8000
+    await server._generate(
+        "suffix", method="tailor_cv", prefix=prefix, master_hash=ctxcache.digest(compact.context_json(master)),
+    )
+    assert await server.release_context(master) == 1
+    assert seen["deletes"] == [_CACHE_NAME]
+    # the next call for that prefix builds a fresh entry
+    await server._generate("suffix", method="tailor_cv", prefix=prefix, master_hash="m2")
+    assert seen["creates"] == 2
+
+
+async def test_byok_never_creates_caches(monkeypatch):
+    byok = GeminiProvider(api_key="AIza-user-key")
+    seen = _script(monkeypatch, byok)
+    prefix = "P" * 8000
+    assert await byok._generate("suffix", method="outreach", prefix=prefix) == "ok"
+    assert seen["creates"] == 0 and seen["calls"] == [(prefix + "suffix", None)]
+
+
+async def test_local_stand_in_counts_the_batch_saving():
+    fake = FakeProvider()
+    master = await fake.parse_cv(SAMPLE_CV_TEXT, None, "en")
+    analysis = await fake.analyze(SAMPLE_JD, master.plain_text(), "en")
+    ctxcache.ledger.reset()
+    for n in range(3):
+        await fake.tailor_cv(f"{SAMPLE_JD}\nposting {n}", analysis, master, "en")
+    ledger = ctxcache.ledger
+    assert ledger.calls == 3
+    # The first posting pays for the prefix; the next two read it from cache.
+    prefix, _ = prompts.tailor_cv_parts(
+        compact.text(SAMPLE_JD), analysis.notes, [k.term for k in analysis.keywords],
+        compact.context_json(master), "en",
+    )
+    assert ledger.cached_tokens == 2 * ctxcache.estimate_tokens(prefix)
+    assert ledger.billed_tokens < ledger.prompt_tokens / 2
+
+
+async def test_editing_or_deleting_a_master_cv_releases_its_caches(client, monkeypatch):
+    from backend.app.routers import cvs
+
+    from .test_cvs import _create_cv, _register
+
+    released = []
+
+    async def record(data):
+        released.append(data["full_name"])
+
+    monkeypatch.setattr(cvs, "release_prompt_cache", record)
+    await _register(client)
+    cv = await _create_cv(client)
+    r = await client.put(f"/api/cvs/{cv['id']}", json={"name": "Renamed"})
+    assert r.status_code == 200 and released == []  # same content, same prefix
+    data = {**r.json()["data"], "summary": "Edited summary."}
+    assert (await client.put(f"/api/cvs/{cv['id']}", json={"data": data})).status_code == 200
+    assert (await client.delete(f"/api/cvs/{cv['id']}")).status_code == 200
+    await asyncio.sleep(0)
+    assert released == [cv["data"]["full_name"]] * 2
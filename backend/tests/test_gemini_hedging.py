@@ -0,0 +1,200 @@
+"""Tail-latency handling in GeminiProvider._generate: per-method budgets,
+p95-hedged second requests, lite-model fallback and the per-model breaker.
+
+Root cause this guards: one slow or erroring call held the whole job (and its
+job_concurrency slot) for up to 90s plus fixed 1.5s retries.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from google.genai import errors as genai_errors
+
+from backend.app.ai import gemini, health
+from backend.app.ai.base import AIError
+from backend.app.ai.gemini import GeminiProvider
+from backend.app.config import get_settings
+
+
+class _Fake503(genai_errors.APIError):
+    def __init__(self):
+        Exception.__init__(self, "503 UNAVAILABLE")
+        self.code = 503
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    # Server traffic: hedging is off for BYOK keys.
+    monkeypatch.setattr(get_settings(), "gemini_api_key", "test-server-key")
+    monkeypatch.setattr(health, "_MIN_HEDGE_S", 0.0)
+    return GeminiProvider(api_key="test-server-key")
+
+
+def _script(monkeypatch, provider, handler):
+    """Route generate_content through handler(model, n) and log the models used."""
+    models: list[str] = []
+
+    async def fake_generate_content(model, contents, config):
+        models.append(model)
+        return await handler(model, len(models))
+
+    monkeypatch.setattr(provider._client.aio.models, "generate_content", fake_generate_content)
+    return models
+
+
+def _learn(provider, method: str, seconds: float = 0.05):
+    for _ in range(health._MIN_SAMPLES):
+        health.window(provider._model, method).record(seconds)
+
+
+async def _ok(text="ok"):
+    return SimpleNamespace(text=text, parsed=None)
+
+
+async def test_slow_call_is_hedged_and_the_fast_answer_wins(monkeypatch, provider):
+    _learn(provider, "edit_source")
+
+    async def handler(model, n):
+        if n == 1:
+            await asyncio.sleep(5)  # stuck primary
+        return await _ok(f"answer {n}")
+
+    models = _script(monkeypatch, provider, handler)
+    started = time.monotonic()
+    out = await provider._generate("p", method="edit_source")
+    assert out == "answer 2"
+    assert time.monotonic() - started < 1
+    # edit_source is not lite-tolerant: the hedge goes to the same model.
+    assert models == [provider._model, provider._model]
+
+
+async def test_lite_tolerant_methods_hedge_on_the_lite_model(monkeypatch, provider):
+    _learn(provider, "outreach")
+
+    async def handler(model, n):
+        if n == 1:
+            await asyncio.sleep(5)
+        return await _ok()
+
+    models = _script(monkeypatch, provider, handler)
+    assert await provider._generate("p", method="outreach") == "ok"
+    assert models == [provider._model, provider._model_lite]
+
+
+async def test_no_hedge_without_a_learned_p95_or_for_byok(monkeypatch, provider):
+    async def handler(model, n):
+        await asyncio.sleep(0.1)
+        return await _ok()
+
+    models = _script(monkeypatch, provider, handler)
+    assert await provider._generate("p", method="edit_source") == "ok"
+    byok = GeminiProvider(api_key="AIza-user-key")
+    _learn(byok, "edit_source", seconds=0.01)
+    byok_models = _script(monkeypatch, byok, handler)
+    assert await byok._generate("p", method="edit_source") == "ok"
+    assert len(models) == 1 and len(byok_models) == 1
+
+
+async def test_primary_error_falls_back_to_lite_without_waiting(monkeypatch, provider):
+    async def handler(model, n):
+        if model == provider._model:
+            raise _Fake503()
+        return await _ok()
+
+    sleeps: list[float] = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    models = _script(monkeypatch, provider, handler)
+    monkeypatch.setattr(gemini.asyncio, "sleep", fake_sleep)
+    assert await provider._generate("p", method="analyze") == "ok"
+    assert models == [provider._model, provider._model_lite]
+    assert sleeps == []
+
+
+async def test_cv_rewrite_never_falls_back_to_lite(monkeypatch, provider):
+    async def handler(model, n):
+        if n == 1:
+            raise _Fake503()
+        return await _ok()
+
+    async def instant_sleep(seconds):
+        pass
+
+    models = _script(monkeypatch, provider, handler)
+    monkeypatch.setattr(gemini.asyncio, "sleep", instant_sleep)
+    assert await provider._generate("p", method="tailor_cv") == "ok"
+    assert models == [provider._model, provider._model]
+
+
+async def test_open_breaker_routes_straight_to_lite(monkeypatch, provider):
+    for _ in range(health.breaker(provider._model).threshold):
+        health.breaker(provider._model).failure()
+    models = _script(monkeypatch, provider, lambda model, n: _ok())
+    assert await provider._generate("p", method="analyze") == "ok"
+    assert models == [provider._model_lite]
+
+
+def test_breaker_probes_after_cooldown(monkeypatch):
+    clock = {"now": 100.0}
+    monkeypatch.setattr(health.time, "monotonic", lambda: clock["now"])
+    breaker = health.CircuitBreaker(threshold=2, cooldown=30)
+    breaker.failure()
+    assert not breaker.open
+    breaker.failure()
+    assert breaker.open
+    clock["now"] += 31
+    assert not breaker.open  # probe allowed
+    breaker.failure()
+    assert breaker.open  # the failed probe re-opens at once
+    breaker.success()
+    assert not breaker.open
+
+
+def test_half_open_breaker_admits_a_single_probe(monkeypatch):
+    clock = {"now": 100.0}
+    monkeypatch.setattr(health.time, "monotonic", lambda: clock["now"])
+    breaker = health.CircuitBreaker(threshold=1, cooldown=30)
+    breaker.failure()
+    assert not breaker.admit()
+    clock["now"] += 31
+    # A burst right after the outage: one trial call, the rest on the fallback.
+    assert [breaker.admit() for _ in range(4)] == [True, False, False, False]
+    breaker.success()
+    assert breaker.admit() and breaker.admit()
+
+    breaker.failure()
+    clock["now"] += 31
+    assert breaker.admit()
+    clock["now"] += 31  # the probe never reported back: free the slot
+    assert breaker.admit() and not breaker.admit()
+
+
+async def test_burst_after_cooldown_sends_one_probe_to_the_primary(monkeypatch, provider):
+    breaker = health.breaker(provider._model)
+    for _ in range(breaker.threshold):
+        breaker.failure()
+    monkeypatch.setattr(breaker, "_opened_at", breaker._opened_at - breaker.cooldown - 1)
+
+    async def handler(model, n):
+        await asyncio.sleep(0.05)
+        return await _ok()
+
+    models = _script(monkeypatch, provider, handler)
+    await asyncio.gather(*(provider._generate("p", method="analyze") for _ in range(4)))
+    assert sorted(models) == sorted([provider._model] + [provider._model_lite] * 3)
+
+
+async def test_budget_caps_a_hung_call(monkeypatch, provider):
+    monkeypatch.setitem(gemini._BUDGETS, "analyze", 0.2)
+
+    async def handler(model, n):
+        await asyncio.sleep(5)
+
+    _script(monkeypatch, provider, handler)
+    started = time.monotonic()
+    with pytest.raises(AIError, match="too long"):
+        await provider._generate("p", method="analyze")
+    assert time.monotonic() - started < 1
@@ -0,0 +1,104 @@
+"""Gemini client pool: one genai.Client per credential, reused across requests.
+
+Building a client per request redid connection setup on every chat edit and
+key validation. Server credentials stay pooled for the process; BYOK clients
+expire when idle and are capped, and only a digest of the key is kept as the
+pool/cache key.
+"""
+import pytest
+
+from backend.app.ai import gemini
+from backend.app.ai.gemini import GeminiProvider
+
+
+@pytest.fixture(autouse=True)
+def _fresh_pool():
+    gemini._pool.clear()
+    gemini._validated.clear()
+    yield
+    gemini._pool.clear()
+    gemini._validated.clear()
+
+
+def test_same_byok_key_reuses_client():
+    a = GeminiProvider(api_key="AIza-user-one")
+    b = GeminiProvider(api_key="AIza-user-one")
+    c = GeminiProvider(api_key="AIza-user-two")
+    assert a._client is b._client
+    assert a._client is not c._client
+    assert a._byok and c._byok
+
+
+def test_pool_never_keys_on_raw_secret():
+    GeminiProvider(api_key="AIza-very-secret")
+    keys = list(gemini._pool._byok) + list(gemini._pool._server)
+    assert keys and all("AIza-very-secret" not in k for k in keys)
+
+
+def test_idle_byok_clients_expire(monkeypatch):
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(gemini.time, "monotonic", lambda: clock["now"])
+    first = GeminiProvider(api_key="AIza-idle")._client
+    clock["now"] += gemini._ClientPool.BYOK_IDLE_S + 1
+    assert GeminiProvider(api_key="AIza-idle")._client is not first
+
+
+def test_byok_pool_is_bounded(monkeypatch):
+    monkeypatch.setattr(gemini._ClientPool, "BYOK_MAX", 2)
+    oldest = GeminiProvider(api_key="AIza-1")._client
+    GeminiProvider(api_key="AIza-2")
+    GeminiProvider(api_key="AIza-3")
+    assert len(gemini._pool._byok) == 2
+    assert GeminiProvider(api_key="AIza-1")._client is not oldest
+
+
+async def test_evicted_byok_clients_are_closed_after_a_grace_period(monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(gemini._ClientPool, "BYOK_MAX", 1)
+    monkeypatch.setattr(gemini._ClientPool, "RETIRE_AFTER_S", 0.05)
+    evicted = GeminiProvider(api_key="AIza-1")._client
+    closed = []
+
+    async def aclose():
+        closed.append(evicted)
+
+    monkeypatch.setattr(evicted.aio, "aclose", aclose)
+    GeminiProvider(api_key="AIza-2")
+    assert closed == [], "a call may still be running on it"
+    await asyncio.sleep(0.1)
+    assert closed == [evicted]
+
+
+async def test_validate_key_result_is_cached(monkeypatch):
+    provider = GeminiProvider(api_key="AIza-validate")
+    calls = {"n": 0}
+
+    async def fake_generate_content(model, contents, config):
+        calls["n"] += 1
+        return None
+
+    monkeypatch.setattr(provider._client.aio.models, "generate_content", fake_generate_content)
+    assert await provider.validate_key()
+    assert await GeminiProvider(api_key="AIza-validate").validate_key()
+    assert calls["n"] == 1
+
+
+async def test_failed_validation_is_retried_soon(monkeypatch):
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(gemini.time, "monotonic", lambda: clock["now"])
+    provider = GeminiProvider(api_key="AIza-flaky")
+    calls = {"n": 0}
+
+    async def flaky(model, contents, config):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise TimeoutError
+        return None
+
+    monkeypatch.setattr(provider._client.aio.models, "generate_content", flaky)
+    assert not await provider.validate_key()
+    assert not await provider.validate_key()
+    clock["now"] += gemini._VALIDATED_FAIL_S + 1
+    assert await provider.validate_key()
+    assert calls["n"] == 2
@@ -0,0 +1,232 @@
+"""Per-credential limiter: a 429 on one call pauses every caller on that key.
+
+Root cause this guards: the parallel generate calls of a job (and other jobs
+on the same BYOK key) kept firing while one of them slept out a 429, so a
+free-tier batch turned into a cascade of failed retries.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from backend.app.ai import ratelimit
+from backend.app.ai.gemini import GeminiProvider
+from backend.app.ai.ratelimit import CredentialLimiter
+
+from .conftest import SAMPLE_CV_TEXT, SAMPLE_JD
+from .test_gemini_retry import _Fake429
+
+
+@pytest.fixture
+def fake_sleep(monkeypatch):
+    sleeps: list[float] = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+        await real_sleep(0)
+
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", sleep)
+    return sleeps
+
+
+async def test_pause_holds_every_caller_in_arrival_order():
+    limiter = CredentialLimiter()
+    limiter.pause(0.05)
+    order: list[int] = []
+
+    async def caller(n: int):
+        await limiter.acquire()
+        order.append(n)
+
+    tasks = [asyncio.create_task(caller(n)) for n in range(5)]
+    await asyncio.sleep(0.02)
+    assert order == []
+    await asyncio.gather(*tasks)
+    assert order == [0, 1, 2, 3, 4]
+
+
+async def test_rpm_bucket_queues_the_overflow(fake_sleep):
+    limiter = CredentialLimiter(rpm=2)
+    for _ in range(3):
+        await limiter.acquire()
+    # Two requests fit the bucket; the third waits one refill (60s / 2).
+    assert fake_sleep == [pytest.approx(30.0, abs=0.5)]
+
+
+async def test_a_429_pauses_the_sibling_calls(monkeypatch):
+    first, sibling = GeminiProvider(api_key="test-key-not-used"), GeminiProvider(api_key="test-key-not-used")
+    calls = {"n": 0}
+
+    async def fake_generate_content(model, contents, config):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise _Fake429()
+        return SimpleNamespace(text="ok", parsed=None)
+
+    sleeps: list[float] = []
+    siblings: list[asyncio.Future] = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+        if not siblings:
+            # The sibling call arrives while the first one sits out its 429.
+            siblings.append(asyncio.ensure_future(sibling._generate("b")))
+        await real_sleep(0)
+
+    monkeypatch.setattr(first._client.aio.models, "generate_content", fake_generate_content)
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", sleep)
+    announced: list[float] = []
+    ratelimit.wait_listener.set(announced.append)
+
+    assert await first._generate("a") == "ok"
+    assert await siblings[0] == "ok"
+    # One 429, then both the retry and the untouched sibling waited out the
+    # server's hint instead of firing into the closed window.
+    assert calls["n"] == 3
+    assert sleeps == [pytest.approx(29.343756161, abs=0.5)] * 2
+    # The sibling announces as it queues behind the sleeper, then again on
+    # its own turn.
+    assert announced == [pytest.approx(29.343756161, abs=0.5)] * 3
+
+
+async def test_byok_keys_get_their_own_limiter(monkeypatch):
+    monkeypatch.setattr("backend.app.ai.ratelimit.get_settings", lambda: SimpleNamespace(
+        gemini_rpm=0, gemini_byok_rpm=5,
+    ))
+    a = ratelimit.limiter_for("cred-a", byok=True)
+    assert a is ratelimit.limiter_for("cred-a", byok=True)
+    assert a is not ratelimit.limiter_for("cred-b", byok=True)
+    assert a.rpm == 5 and ratelimit.limiter_for("vertex:x:global", byok=False).rpm == 0
+
+
+async def test_pipeline_reports_the_rate_limit_wait(client, monkeypatch):
+    from backend.app import jobs
+    from backend.app.ai.fake import FakeProvider
+    from backend.app.typstsvc import renderer
+    from backend.app.typstsvc.renderer import CompileResult
+
+    from .test_api import _register, _wait_job
+
+    real_sleep = asyncio.sleep
+
+    async def short_sleep(seconds):
+        await real_sleep(0.05)
+
+    class PausedProvider(FakeProvider):
+        async def analyze(self, jd, cv_text, language):
+            limiter = CredentialLimiter()
+            limiter.pause(20)
+            await limiter.acquire()
+            return await super().analyze(jd, cv_text, language)
+
+    async def fake_render(*args, **kwargs):
+        return CompileResult(ok=True, pages=1, pdf=b"%PDF-fake"), "// source"
+
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", short_sleep)
+    monkeypatch.setattr(renderer, "compile_document", fake_render)
+    monkeypatch.setattr(jobs, "get_provider", lambda byok_key=None: PausedProvider())
+    monkeypatch.setattr(jobs, "_PROGRESS_INTERVAL", 0)
+    await _register(client)
+    r = await client.post(
+        "/api/generate",
+        json={"job_descriptions": [SAMPLE_JD], "cv_text": SAMPLE_CV_TEXT, "language": "en"},
+    )
+    snap = await _wait_job(client, r.json()["jobs"][0])
+    assert snap["status"] == "completed", snap.get("error")
+    waits = [ev for ev in snap["events"] if "rate limit" in ev["message"]]
+    assert waits and waits[0]["step"] == "analyze"
+    assert "about 20s" in waits[0]["message"]
+
+
+async def test_a_caller_queued_behind_a_pause_hears_the_wait():
+    limiter = CredentialLimiter()
+    limiter.pause(20)
+    release = asyncio.Event()
+    heard: dict[str, list[float]] = {"first": [], "second": []}
+    real_sleep = asyncio.sleep
+
+    async def caller(name: str):
+        ratelimit.wait_listener.set(heard[name].append)
+        await limiter.acquire()
+
+    async def sleep(seconds):
+        await release.wait()
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(ratelimit.asyncio, "sleep", sleep)
+        first = asyncio.create_task(caller("first"))
+        await real_sleep(0)
+        second = asyncio.create_task(caller("second"))
+        await real_sleep(0)
+        # Still blocked on the lock, yet told how long the line will take.
+        assert heard["second"] == [pytest.approx(20, abs=0.5)]
+        release.set()
+        await asyncio.gather(first, second)
+    assert heard["first"] == [pytest.approx(20, abs=0.5)]
+
+
+async def test_second_job_on_a_paused_key_reports_the_wait(client, monkeypatch):
+    from backend.app import jobs
+    from backend.app.ai.fake import FakeProvider
+    from backend.app.typstsvc import renderer
+    from backend.app.typstsvc.renderer import CompileResult
+
+    from .conftest import unique_email
+    from .test_api import _register
+    from .test_latex_integration import _upgrade
+
+    real_sleep = asyncio.sleep
+    shared = CredentialLimiter()
+    shared.pause(20)
+    gate = asyncio.Event()
+
+    async def held_sleep(seconds):
+        # The pause holds until both jobs have reported; other sleeps run.
+        if seconds >= 10:
+            await gate.wait()
+        else:
+            await real_sleep(seconds)
+
+    class SharedKeyProvider(FakeProvider):
+        async def analyze(self, jd, cv_text, language):
+            await shared.acquire()
+            return await super().analyze(jd, cv_text, language)
+
+    async def fake_render(*args, **kwargs):
+        return CompileResult(ok=True, pages=1, pdf=b"%PDF-fake"), "// source"
+
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", held_sleep)
+    monkeypatch.setattr(renderer, "compile_document", fake_render)
+    monkeypatch.setattr(jobs, "get_provider", lambda byok_key=None: SharedKeyProvider())
+    monkeypatch.setattr(jobs, "_PROGRESS_INTERVAL", 0)
+    email = unique_email()
+    await _register(client, email)
+    await _upgrade(email, "plus")  # two jobs at once, like a BYOK batch
+    r = await client.post(
+        "/api/generate",
+        json={
+            "job_descriptions": [SAMPLE_JD, SAMPLE_JD + "\nAlso: Kubernetes."],
+            "cv_text": SAMPLE_CV_TEXT,
+            "language": "en",
+        },
+    )
+    job_ids = r.json()["jobs"]
+
+    async def waits(job_id: str) -> list[dict]:
+        snap = (await client.get(f"/api/jobs/{job_id}")).json()
+        return [ev for ev in snap["events"] if "rate limit" in ev["message"]]
+
+    try:
+        # One job sleeps out the pause holding the key; the other queues
+        # behind it and must hear the wait before its turn comes.
+        for _ in range(100):
+            heard = [await waits(j) for j in job_ids]
+            if all(heard):
+                break
+            await real_sleep(0.05)
+        assert all(heard), "the queued job was not told about the wait"
+        assert all(w[0]["step"] == "analyze" and "about 20s" in w[0]["message"] for w in heard)
+    finally:
+        gate.set()
@@ -8,6 +8,7 @@ the retry failed inside the same window and killed the job.
 import asyncio
 from types import SimpleNamespace
 
+import pytest
 from google.genai import errors as genai_errors
 
 from backend.app.ai.gemini import GeminiProvider, _retry_delay_seconds
@@ -68,7 +69,9 @@ async def test_429_retries_with_server_delay(monkeypatch):
     assert result == "ok"
     assert calls["n"] == 3
     # Both waits honored the server's ~28s hint (+1s cushion), not a fixed 3s.
-    assert sleeps == [29.343756161, 29.343756161]
+    # The credential's limiter sleeps out the remaining pause, so allow for
+    # the few microseconds already elapsed.
+    assert sleeps == [pytest.approx(29.343756161, abs=0.5)] * 2
 
 
 async def test_429_gives_up_after_retries(monkeypatch):
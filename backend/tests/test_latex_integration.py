@@ -4,6 +4,8 @@ monkeypatched (real compiles live in services/latexc/tests)."""
 import asyncio
 
 import pytest
+from services.latexc import fitloop
+from services.latexc.contract import LatexFitOut
 from sqlalchemy import select
 
 from backend.app.config import get_settings
@@ -24,22 +26,28 @@ def latex_env(monkeypatch):
 
     calls = {"n": 0}
 
-    async def fake_compile_tex_measured(doc_id: str, tex_source: str):
-        # One page at a healthy fill: the fit loop settles on the first attempt,
-        # and continuous mode trims once (total in pt).
+    async def fake_compile_tex(doc_id: str, tex_source: str):
         calls["n"] += 1
-        return (
-            CompileResult(ok=True, pages=1, pdf=b"%PDF-fake", svgs=[FAKE_SVG]),
-            tex_source,
-            0.95,
-            700.0,
+        return CompileResult(ok=True, pages=1, pdf=b"%PDF-fake", svgs=[FAKE_SVG]), tex_source
+
+    async def fake_fit_tex(body, priority="interactive"):
+        # One page at a healthy fill: the fit search settles on the first
+        # attempt, and continuous mode trims once (total in pt).
+        async def compile_(density: str, scale: float, paper: str) -> fitloop.Attempt:
+            calls["n"] += 1
+            return fitloop.Attempt(ok=True, pages=1, fill=0.95, total=700.0)
+
+        search = await fitloop.run(body, compile_)
+        out = LatexFitOut(
+            ok=True, pages=1, density=search.chosen.density, font_scale=search.chosen.font_scale,
+            page_height_pt=search.page_height_pt, attempts=[],
         )
+        return CompileResult(ok=True, pages=1, pdf=b"%PDF-fake", svgs=[FAKE_SVG]), out
 
-    # The single choke point: the compile_tex wrapper, the fit loop, and the
-    # job pipeline all route through client.compile_tex_measured.
-    monkeypatch.setattr(
-        "backend.app.texsvc.client.compile_tex_measured", fake_compile_tex_measured
-    )
+    # The two choke points: source-mode compiles go through compile_tex (the
+    # documents router imports it by name), fits through client.fit_tex.
+    monkeypatch.setattr("backend.app.routers.documents.compile_tex", fake_compile_tex)
+    monkeypatch.setattr("backend.app.texsvc.client.fit_tex", fake_fit_tex)
     return calls
 
 
@@ -1,5 +1,7 @@
 """Cross-service parity gate: the backend must be able to import and round-trip
 the latexc wire contract with zero service code present."""
+import json
+
 from services.latexc.contract import (
     CONTRACT_VERSION,
     CompileFile,
@@ -9,7 +11,7 @@ from services.latexc.contract import (
 
 
 def test_contract_version_pinned():
-    assert CONTRACT_VERSION == "1"
+    assert CONTRACT_VERSION == "2"
 
 
 def test_compile_in_roundtrip():
@@ -20,6 +22,7 @@ def test_compile_in_roundtrip():
     again = LatexCompileIn.model_validate(inp.model_dump())
     assert again.engine == "xelatex" and again.main == "main.tex"
     assert again.timeout_s == 40 and again.want_svgs is True
+    assert again.measure_only is False
 
 
 def test_compile_in_rejects_bad_paths():
@@ -34,3 +37,252 @@ def test_compile_in_rejects_bad_paths():
 def test_compile_out_defaults():
     out = LatexCompileOut(ok=False)
     assert out.cache == "cold" and out.svgs == [] and out.timings_ms == {}
+    assert out.probe is None
+
+
+def _fit_in(**over):
+    from services.latexc.contract import LatexFitIn
+
+    body = {
+        "doc_id": "abc123", "template_b64": "eA==",
+        "tokens": {"normal": {"@BASE@": (0.0, 10.0)}, "tight": {"@BASE@": (0.0, 9.4)}},
+        "ladder": {"densities": ["normal", "tight"], "fill_min": 0.88, "fill_target": 0.95,
+                   "min_scale": 0.9, "max_scale": 1.5, "downscale_step": 0.04},
+    }
+    body.update(over)
+    return LatexFitIn.model_validate(body)
+
+
+def test_fit_in_roundtrip_and_validation():
+    import pytest
+    from pydantic import ValidationError
+
+    inp = _fit_in()
+    again = type(inp).model_validate(inp.model_dump())
+    assert again.mode == "fit" and again.paper == "a4paper" and again.files == []
+    assert again.tokens["tight"]["@BASE@"] == (0.0, 9.4)
+
+    for bad in (
+        {"density": "xtight"},  # no token table for the starting rung
+        {"tokens": {"normal": {"BASE": (0.0, 1.0)}, "tight": {}}},  # not @TOKEN@
+        {"mode": "continuous", "canvas_paper": "a4paper", "trimmed_paper": "a4paper"},
+    ):
+        with pytest.raises(ValidationError):
+            _fit_in(**bad)
+
+
+def test_fill_tokens_only_touches_the_preamble():
+    from services.latexc.contract import fill_tokens
+
+    src = "\\fontsize{@BASE@pt}{1em}@PAPER@\n\\begin{document}\nliteral @BASE@ and @PAPER@\n"
+    out = fill_tokens(src, {"@BASE@": (2.0, 8.0)}, 1.1, {"@PAPER@": "a4paper"})
+    assert out.startswith("\\fontsize{10.8pt}{1em}a4paper\n")
+    assert out.endswith("literal @BASE@ and @PAPER@\n")
+
+
+def test_compile_file_needs_content_or_hash():
+    import pytest
+    from pydantic import ValidationError
+    from services.latexc.contract import file_sha256, sha256_hex
+
+    with pytest.raises(ValidationError):
+        CompileFile(path="main.tex")
+    with pytest.raises(ValidationError):
+        CompileFile(path="main.tex", sha256="ABC")
+    digest = sha256_hex(b"hello")
+    assert file_sha256(CompileFile(path="main.tex", content_b64="aGVsbG8=")) == digest
+    assert file_sha256(CompileFile(path="main.tex", sha256=digest)) == digest
+
+
+def _pool(monkeypatch, handler, *urls: str, version: str = "1"):
+    """Point the latexc client at MockTransport instances."""
+    from collections import OrderedDict
+
+    import httpx
+
+    from backend.app.texsvc import client, pool
+
+    insts = [pool.Instance(url, "t", transport=httpx.MockTransport(handler))
+             for url in urls or ("http://latexc",)]
+    for inst in insts:
+        inst.version = version
+    monkeypatch.setattr(pool, "_instances", insts)
+    monkeypatch.setattr(client, "_synced", OrderedDict())
+    return insts
+
+
+async def test_client_sends_unchanged_files_by_hash(monkeypatch):
+    import httpx
+
+    from backend.app.texsvc import client
+
+    bodies, held = [], {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        bodies.append(body)
+        missing = [f["path"] for f in body["files"] if "content_b64" not in f and f["path"] not in held]
+        if missing:
+            return httpx.Response(409, json={"detail": {"missing": missing}})
+        held.update((f["path"], f["sha256"]) for f in body["files"])
+        return httpx.Response(200, json={"ok": True, "pages": 1, "version": "2"})
+
+    _pool(monkeypatch, handler, version="2")
+
+    await client.compile_tex("d1", "A")
+    await client.compile_tex("d1", "A")
+    assert "content_b64" in bodies[0]["files"][0]
+    assert "content_b64" not in bodies[1]["files"][0]
+
+    held.clear()  # the service lost the project: one 409, then a full resend
+    res, _ = await client.compile_tex("d1", "A")
+    assert res.ok and len(bodies) == 4
+    assert "content_b64" in bodies[3]["files"][0]
+
+
+async def test_client_sends_content_to_a_v1_service(monkeypatch):
+    import httpx
+
+    from backend.app.texsvc import client
+
+    bodies = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        bodies.append(json.loads(request.content))
+        return httpx.Response(200, json={"ok": True, "pages": 1})  # no version: v1
+
+    _pool(monkeypatch, handler)
+
+    await client.compile_tex("d1", "A")
+    await client.compile_tex("d1", "A")
+    assert all("content_b64" in b["files"][0] for b in bodies)
+
+
+def _frames(*frames: dict) -> str:
+    return "".join(json.dumps(f) + "\n" for f in frames)
+
+
+async def test_stream_tex_relays_frames_and_falls_back(monkeypatch):
+    import httpx
+
+    from backend.app.texsvc import client
+
+    routes = {"/v1/compile/stream"}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path not in routes:
+            return httpx.Response(404)
+        if request.url.path == "/v1/compile":
+            return httpx.Response(200, json={"ok": True, "pages": 2, "svgs": ["<a/>", "<b/>"], "version": "2"})
+        assert json.loads(request.content)["want_pdf"] is False
+        return httpx.Response(200, content=_frames(
+            {"kind": "status", "status": {"ok": True, "pages": 2, "version": "2"}},
+            {"kind": "page", "page": 1, "svg": "<a/>"},
+            {"kind": "page", "page": 2, "svg": "<b/>"},
+            {"kind": "done"},
+        ))
+
+    _pool(monkeypatch, handler)
+
+    frames = [f async for f in client.stream_tex("d1", "A")]
+    assert [f.kind for f in frames] == ["status", "page", "page", "done"]
+    assert frames[0].status.pages == 2 and frames[1].svg == "<a/>"
+
+    routes = {"/v1/compile"}  # an older service without the stream route
+    frames = [f async for f in client.stream_tex("d1", "B")]
+    assert [(f.kind, f.page) for f in frames] == [("status", 0), ("page", 1), ("page", 2), ("done", 0)]
+
+    routes = set()
+    frames = [f async for f in client.stream_tex("d1", "C")]
+    assert len(frames) == 1 and not frames[0].status.ok
+    assert "unavailable" in frames[0].status.error_line
+
+
+async def test_client_honours_retry_after(monkeypatch):
+    import httpx
+
+    from backend.app.texsvc import client
+
+    waits, seen, answers = [], [], []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers.get("x-request-timeout"))
+        return answers.pop(0)
+
+    async def sleep(s: float) -> None:
+        waits.append(s)
+
+    monkeypatch.setattr(client.asyncio, "sleep", sleep)
+    _pool(monkeypatch, handler)
+
+    # a short wait is slept through and retried once
+    answers[:] = [httpx.Response(503, headers={"Retry-After": "2"}), httpx.Response(200, json={"ok": True})]
+    res, _ = await client.compile_tex("d1", "A")
+    assert res.ok and waits == [2.0] and seen == ["50", "50"]
+
+    # a long one comes straight back as busy, without waiting
+    answers[:] = [httpx.Response(503, headers={"Retry-After": "30"})]
+    res, _ = await client.compile_tex("d1", "A")
+    assert not res.ok and "busy; try again in 30 s" in res.diagnostics and waits == [2.0]
+
+    answers[:] = [httpx.Response(503, headers={"Retry-After": "30"})]
+    frames = [f async for f in client.stream_tex("d1", "A")]
+    assert len(frames) == 1 and "busy" in frames[0].status.error_line
+
+    seen.clear()
+    answers[:] = [httpx.Response(503, headers={"Retry-After": "1"})] * 2
+    res, fit = await client.fit_tex(_fit_in())
+    assert fit is None and "busy" in res.diagnostics and seen == ["150", "150"]
+
+
+async def test_client_says_who_is_waiting(monkeypatch):
+    import httpx
+
+    from backend.app.texsvc import client, fit
+
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.url.path, request.headers.get("x-request-priority")))
+        return httpx.Response(200, json={"ok": True, "pages": 1, "version": "2"})
+
+    _pool(monkeypatch, handler)
+    await client.compile_tex("d1", "A")
+    await client.fit_tex(_fit_in())
+    # what generation jobs send: their fits queue behind Studio edits
+    settings = {"template": "onyx", "density": "normal", "compiler": "latex"}
+    await fit.compile_tex_document("d2", {"full_name": "Ada"}, settings, priority="batch")
+    assert seen == [("/v1/compile", "interactive"), ("/v1/fit", "interactive"), ("/v1/fit", "batch")]
+
+
+async def test_fit_on_an_instance_without_the_fit_route(monkeypatch):
+    """An image from before /v1/fit answers 404: the ladder runs here over
+    /v1/compile instead of failing every LaTeX render."""
+    import base64
+
+    import httpx
+
+    from backend.app.texsvc import client
+
+    template = "\\def\\base{@BASE@}\\begin{document}x\\end{document}"
+    compiled = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/v1/fit":
+            return httpx.Response(404, json={"detail": "Not Found"})
+        body = json.loads(request.content)
+        source = base64.b64decode(body["files"][0]["content_b64"]).decode()
+        compiled.append(source)
+        # 10pt spills onto a second page; the tight rung fits, 90% full,
+        # reported the v1 way: only in the log tail.
+        pages = 2 if "{10}" in source else 1
+        log_tail = "CVGFILL:630.0pt/700.0pt\n"
+        return httpx.Response(200, json={"ok": True, "pages": pages, "log_tail": log_tail, "pdf_b64": "JVBERg=="})
+
+    _pool(monkeypatch, handler)
+    body = _fit_in(template_b64=base64.b64encode(template.encode()).decode())
+    res, fit = await client.fit_tex(body)
+    assert res.ok and res.pages == 1 and res.pdf == b"%PDF"
+    assert fit.density == "tight" and fit.font_scale == 1.0 and fit.fill == 0.9
+    assert [a.pages for a in fit.attempts] == [2, 1]
+    assert compiled[-1] == template.replace("@BASE@", "9.4")
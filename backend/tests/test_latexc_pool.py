@@ -0,0 +1,156 @@
+"""latexc pool: documents stick to one instance (rendezvous hashing on
+doc_id), move only when their instance is added, removed, unreachable or
+busy, and stay where their warm state is. No latexc needed: every instance
+is a MockTransport keyed by host.
+"""
+import json
+import time
+from collections import OrderedDict
+
+import httpx
+import pytest
+
+from backend.app.texsvc import client, pool
+
+URLS = ("http://a", "http://b", "http://c")
+
+
+def _instances(monkeypatch, handler, *urls: str) -> list[pool.Instance]:
+    insts = [pool.Instance(url, "t", transport=httpx.MockTransport(handler)) for url in urls]
+    monkeypatch.setattr(pool, "_instances", insts)
+    monkeypatch.setattr(pool, "_checked_at", time.monotonic())  # no background refresh
+    monkeypatch.setattr(client, "_synced", OrderedDict())
+    return insts
+
+
+def _owner(doc_id: str, insts: list[pool.Instance]) -> str:
+    return max(insts, key=lambda i: i.score(doc_id)).url
+
+
+@pytest.fixture()
+def served():
+    """Host -> request paths, and a handler that answers every route."""
+    log: dict[str, list[str]] = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        log.setdefault(request.url.host, []).append(request.url.path)
+        if request.url.path == "/v1/status":
+            return httpx.Response(200, json={"ok": True, "version": "2"})
+        return httpx.Response(200, json={"ok": True, "pages": 1, "version": "2"})
+
+    return log, handler
+
+
+def test_adding_an_instance_moves_only_its_share():
+    three = [pool.Instance(u, "t") for u in URLS]
+    four = [*three, pool.Instance("http://d", "t")]
+    docs = [f"doc-{n}" for n in range(2000)]
+    before = {d: _owner(d, three) for d in docs}
+    after = {d: _owner(d, four) for d in docs}
+    moved = [d for d in docs if before[d] != after[d]]
+    assert all(after[d] == "http://d" for d in moved)
+    assert 0.18 < len(moved) / len(docs) < 0.32
+    assert {before[d] for d in docs} == set(URLS)  # every instance owns some
+
+
+async def test_unreachable_instance_is_skipped_then_probed(monkeypatch, served):
+    log, answer = served
+    down = {"a"}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host in down:
+            raise httpx.ConnectError("refused")
+        return answer(request)
+
+    insts = _instances(monkeypatch, handler, *URLS)
+    doc = next(f"doc-{n}" for n in range(100) if _owner(f"doc-{n}", insts) == "http://a")
+
+    res, _ = await client.compile_tex(doc, "A")
+    assert res.ok and insts[0].breaker.open
+    res, _ = await client.compile_tex(doc, "A")  # straight to the fallback
+    assert res.ok and "a" not in log
+    fallback = pool.route(doc)[0]
+    assert fallback.url != "http://a" and doc in fallback.warm
+
+    # a is back after its cooldown; the doc stays with its warm copy
+    down.clear()
+    insts[0].breaker.success()
+    assert pool.route(doc)[0] is fallback
+    fallback.warm.discard(doc)  # evicted there: home again
+    assert pool.route(doc)[0].url == "http://a"
+
+
+async def test_hash_only_files_go_only_to_the_instance_that_has_them(monkeypatch, served):
+    log, answer = served
+    bodies: list[tuple[str, dict]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/v1/compile":
+            bodies.append((request.url.host, json.loads(request.content)))
+        return answer(request)
+
+    insts = _instances(monkeypatch, handler, *URLS)
+    for inst in insts:
+        inst.version = "2"
+    doc = "doc-delta"
+    await client.compile_tex(doc, "A")
+    await client.compile_tex(doc, "A")
+    assert "content_b64" not in bodies[1][1]["files"][0]
+
+    first = pool.route(doc)[0]
+    first.breaker.failure()  # the doc moves
+    await client.compile_tex(doc, "A")
+    host, body = bodies[2]
+    assert host != first.url.removeprefix("http://")
+    assert "content_b64" in body["files"][0]
+
+
+async def test_busy_instance_spills_to_the_next(monkeypatch, served):
+    log, answer = served
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "a" and request.url.path == "/v1/compile":
+            return httpx.Response(503, headers={"Retry-After": "30"})
+        return answer(request)
+
+    insts = _instances(monkeypatch, handler, "http://a", "http://b")
+    doc = next(f"doc-{n}" for n in range(100) if _owner(f"doc-{n}", insts) == "http://a")
+    res, _ = await client.compile_tex(doc, "A")
+    assert res.ok and log["b"] == ["/v1/compile"]
+    assert not insts[0].breaker.open  # busy is not down
+
+    monkeypatch.setattr(pool, "_instances", insts[:1])
+    res, _ = await client.compile_tex(doc, "A")
+    assert not res.ok and "busy" in res.diagnostics
+
+
+async def test_status_fills_warm_sets_and_clear_reaches_every_instance(monkeypatch):
+    deleted = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "DELETE":
+            deleted.append(request.url.host)
+            return httpx.Response(204)
+        warm = ["doc-x"] if request.url.host == "c" else []
+        return httpx.Response(200, json={"ok": True, "warm_projects": warm})
+
+    insts = _instances(monkeypatch, handler, *URLS)
+    assert await client.service_status()
+    assert pool.route("doc-x")[0] is insts[2]
+
+    assert await client.clear_project("doc-x")
+    assert sorted(deleted) == ["a", "b", "c"]
+    assert "doc-x" not in insts[2].warm
+
+
+async def test_slow_status_does_not_take_an_instance_out(monkeypatch):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "a":
+            raise httpx.ReadTimeout("busy compiling", request=request)
+        if request.url.host == "b":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json={"ok": True, "warm_projects": []})
+
+    insts = _instances(monkeypatch, handler, *URLS)
+    assert await pool.refresh()
+    assert [i.breaker.open for i in insts] == [False, True, False]
@@ -0,0 +1,110 @@
+"""Layout estimator: font metrics, line breaking, predicted fill and the
+first rung it hands the fit loop. Pure Python; accuracy against real
+compiles is evals/eval_layout_estimate.py."""
+import json
+import re
+from pathlib import Path
+
+from backend.app.config import get_settings
+from backend.app.typstsvc import layout, renderer
+from backend.app.typstsvc.renderer import CompileResult
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def _cv_data() -> dict:
+    return json.loads((FIXTURES / "sample_cv.json").read_text(encoding="utf-8"))
+
+
+def _long_cv() -> dict:
+    cv = _cv_data()
+    cv["experience"] = cv["experience"] * 3
+    cv["projects"] = cv["projects"] * 2
+    return cv
+
+
+def _short_cv() -> dict:
+    cv = _cv_data()
+    cv["experience"] = cv["experience"][:1]
+    cv["projects"] = cv["certifications"] = cv["interests"] = []
+    return cv
+
+
+def test_density_params_mirror_common_typ():
+    common = (get_settings().templates_dir / "typst" / "common.typ").read_text(encoding="utf-8")
+    body = common[common.index("#let density-params"):common.index("let gap-scale")]
+    blocks = re.findall(r"\(\s*(base:.*?)\)", body, re.S)
+    parsed = [
+        {k: float(v) for k, v in re.findall(r"([a-z-]+):\s*([\d.]+)(?:pt|em|cm)", block)}
+        for block in blocks
+    ]
+    # common.typ order: tight, xtight, normal (the else branch)
+    assert parsed == [layout.DENSITY_PARAMS[d] for d in ("tight", "xtight", "normal")]
+
+
+def test_font_metrics_from_the_template_fonts():
+    sans = layout.font("sans")
+    assert sans.units_per_em == 1000 and 600 < sans.cap_height < 750
+    assert sans.width("MMMM", 10) > sans.width("iiii", 10) > 0
+    assert layout.font("mono").width("iiii", 10) == layout.font("mono").width("MMMM", 10)
+
+
+def test_line_count_wraps_by_width():
+    text = " ".join(["measurement"] * 40)
+    wide = layout.line_count(text, "sans", 10, 500)
+    narrow = layout.line_count(text, "sans", 10, 250)
+    assert 1 < wide < narrow
+    assert layout.line_count("", "sans", 10, 500) == 0
+    assert layout.line_count(text, "serif", 10, 250, justify=True) <= layout.line_count(text, "serif", 10, 250)
+
+
+def test_fill_follows_density_scale_and_content():
+    for template in ("onyx", "classic", "compact"):
+        fills = [layout.estimate(template, _cv_data(), d).fill for d in ("normal", "tight", "xtight")]
+        assert fills == sorted(fills, reverse=True)
+        assert layout.estimate(template, _cv_data(), "normal", 1.2).fill > fills[0]
+        assert layout.estimate(template, _long_cv()).fill > fills[0] > layout.estimate(template, _short_cv()).fill
+
+
+def test_estimate_reports_sections_and_unknown_templates_fall_back():
+    est = layout.estimate("nope", _cv_data())
+    assert est.template == "onyx"
+    assert {"header", "experience", "education", "skills"} <= set(est.sections)
+    assert est.content_pt > sum(est.sections.values())  # plus the top margin
+
+
+def test_first_rung_skips_rungs_predicted_to_overflow():
+    d_idx, scale = renderer._first_rung("onyx", _long_cv(), 0, 1.0, has_photo=False)
+    assert d_idx > 0
+    assert layout.estimate("onyx", _long_cv(), renderer._DENSITIES[d_idx], scale).fill <= 1.03
+
+
+def test_first_rung_scales_up_a_sparse_cv_and_never_loosens_density():
+    d_idx, scale = renderer._first_rung("onyx", _short_cv(), 0, 1.0, has_photo=False)
+    assert d_idx == 0 and scale > 1.0
+    fill = layout.estimate("onyx", _short_cv(), "normal", scale).fill
+    assert fill <= renderer._UPSCALE_AIM + 0.01 or scale == renderer._MAX_FONT_SCALE
+    assert renderer._first_rung("onyx", _short_cv(), 2, 1.0, has_photo=False)[0] == 2
+
+
+async def test_compile_document_starts_at_the_estimated_rung(monkeypatch):
+    attempts = []
+
+    async def fake_compile(source, photo=None, fmt="svg"):
+        attempts.append(re.search(r'density: "(\w+)"', source).group(1))
+        return CompileResult(ok=True, pages=1, svgs=["<svg/>"])
+
+    async def fake_fill(source, photo=None):
+        return 0.95
+
+    monkeypatch.setattr(renderer, "compile_source", fake_compile)
+    monkeypatch.setattr(renderer, "measure_fill", fake_fill)
+    doc = {"template": "onyx", "density": "normal", "font_scale": 1.0, "lang": "en"}
+
+    result, _ = await renderer.compile_document("cv", "onyx", _long_cv(), doc)
+    assert attempts == [result.density_used] and result.density_used != "normal"
+
+    attempts.clear()
+    monkeypatch.setattr(get_settings(), "typst_layout_estimate", False)
+    await renderer.compile_document("cv", "onyx", _long_cv(), doc)
+    assert attempts == ["normal"]
@@ -0,0 +1,34 @@
+"""The load-test harness runs end to end: a tiny scenario against the real
+app (uvicorn on a loopback port), fake AI and the stub compiler."""
+from backend.app.typstsvc import renderer
+from backend.loadtest import runner
+from backend.loadtest.probes import percentiles
+from backend.loadtest.workloads import Scenario, job_description
+
+
+def test_percentiles_in_ms():
+    row = percentiles([i / 1000 for i in range(1, 101)])
+    assert (row["count"], row["p50"], row["p95"], row["p99"], row["max"]) == (100, 51.0, 96.0, 100.0, 100.0)
+    assert percentiles([]) == {"count": 0}
+
+
+def test_postings_are_distinct_and_valid():
+    jds = {job_description(n) for n in range(40)}
+    assert len(jds) == 40 and all(len(jd) >= 80 for jd in jds)
+
+
+async def test_small_scenario_reports_every_metric():
+    real_typst = renderer._run_typst
+    report = await runner.run(
+        Scenario(users=2, batches=1, batch_size=1, subscribers=2, burst=2, downloads=1), stub_compile_ms=5,
+    )
+    assert renderer._run_typst is real_typst, "the stub compiler is removed afterwards"
+    assert report["errors"] == []
+    assert report["jobs"]["completed"] == 2 and report["jobs"]["per_minute"] > 0
+    endpoints = report["endpoints"]
+    assert endpoints["POST /api/generate"]["count"] == 2
+    assert endpoints["GET /api/jobs/{id}/events (stream)"]["count"] == 4
+    assert endpoints["POST /api/documents/{id}/compile"]["count"] == 4
+    assert endpoints["GET /api/documents/{id}/pdf"]["count"] == 4
+    assert report["compile_semaphore_wait"]["count"] > 0
+    assert report["db"]["statements"] > 0 and report["rss"]["peak_mb"] > 0
@@ -58,6 +58,8 @@ async def test_unique_emails_isolated():
 class _ExplodingProvider:
     """Provider whose first pipeline call fails like a Gemini outage."""
 
+    cache_tag = "exploding"
+
     async def analyze(self, jd, cv_text, language):
         from backend.app.ai.base import AIError
 
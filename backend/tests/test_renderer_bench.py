@@ -0,0 +1,62 @@
+"""Gate tests for the renderer benchmark (pure logic; no typst needed)."""
+from backend.app.schemas import CVData
+from backend.app.typstsvc.renderer import CompileResult
+from backend.evals.renderer_bench import bench
+from backend.evals.renderer_bench.cases import FIT_FIXTURES, cases, large_cv
+
+
+def _report(**rows) -> dict:
+    return {"cases": rows}
+
+
+def test_compare_flags_p50_regression_beyond_tolerance():
+    base = _report(a={"p50_ms": 10.0}, b={"p50_ms": 10.0})
+    now = _report(a={"p50_ms": 11.0}, b={"p50_ms": 12.0})
+    verdicts = {r["case"]: r["verdict"] for r in bench.compare(now, base, 0.15)}
+    assert verdicts == {"a": "same", "b": "REGRESSED"}
+
+
+def test_compare_flags_extra_compiles_even_when_faster():
+    base = _report(fit={"p50_ms": 100.0, "compiles_per_fit": 2.0, "fills_per_fit": 1.0})
+    now = _report(fit={"p50_ms": 50.0, "compiles_per_fit": 3.0, "fills_per_fit": 1.0})
+    (row,) = bench.compare(now, base, 0.15)
+    assert row["verdict"] == "REGRESSED" and "compiles_per_fit" in row["reasons"][0]
+
+
+def test_compare_reports_improvement_and_skips_missing_cases():
+    base = _report(a={"p50_ms": 10.0}, gone={"p50_ms": 1.0})
+    now = _report(a={"p50_ms": 5.0}, new={"p50_ms": 1.0})
+    assert [(r["case"], r["verdict"]) for r in bench.compare(now, base, 0.15)] == [("a", "improved")]
+
+
+def test_compare_across_setups_judges_counts_only():
+    base = {"meta": {"machine": "A", "typst": "typst 0.14.2 (typst-py)"},
+            "cases": {"a": {"p50_ms": 10.0}, "fit": {"p50_ms": 10.0, "compiles_per_fit": 1.0}}}
+    now = {"meta": {"machine": "B", "typst": "typst 0.14.2"},
+           "cases": {"a": {"p50_ms": 30.0}, "fit": {"p50_ms": 5.0, "compiles_per_fit": 2.0}}}
+    assert not bench.same_setup(now, base)
+    rows = bench.compare(now, base, 0.15, counts_only=True)
+    assert [(r["case"], r["verdict"]) for r in rows] == [("a", "same"), ("fit", "REGRESSED")]
+
+
+def test_fit_branch():
+    assert bench.fit_branch(CompileResult(ok=True)) == "exact"
+    assert bench.fit_branch(CompileResult(ok=True, density_used="compact")) == "overflow"
+    assert bench.fit_branch(CompileResult(ok=True, font_scale_used=0.95)) == "overflow"
+    assert bench.fit_branch(CompileResult(ok=True, font_scale_used=1.05)) == "underflow"
+
+
+def test_time_micro_batches_fast_calls():
+    row = bench.time_micro(lambda: None, 5)
+    assert row["runs"] == 5 and row["loops"] > 1 and row["min_ms"] <= row["p50_ms"] <= row["max_ms"]
+
+
+def test_fixtures_are_valid_and_ordered_by_size():
+    sizes = {}
+    for branch, fixture in FIT_FIXTURES.items():
+        cv = CVData.model_validate(fixture())
+        sizes[branch] = sum(len(job.bullets) for job in cv.experience)
+    assert sizes["underflow"] < sizes["exact"] < sizes["overflow"]
+    assert len(CVData.model_validate(large_cv()).experience) > len(FIT_FIXTURES["overflow"]().get("experience"))
+    names = [case.name for case in cases()]
+    assert len(names) == len(set(names))
@@ -0,0 +1,101 @@
+"""Record/replay provider: real payloads and latencies, offline.
+
+Root cause this guards: load tests of /api/generate could only run against
+the FakeProvider, whose 10ms heuristic answers hide both the payload sizes
+and the seconds each model call holds a job.
+"""
+import json
+
+import pytest
+
+from backend.app import ai
+from backend.app.ai import get_provider, replay, usage
+from backend.app.ai.base import AIError
+from backend.app.ai.fake import FakeProvider
+from backend.app.ai.replay import Cassette, ReplayProvider
+from backend.app.config import get_settings
+
+from .conftest import SAMPLE_CV_TEXT, SAMPLE_JD
+
+
+def _capture_sleeps(monkeypatch) -> list[float]:
+    """Patched after recording: the fake's own ticks sleep too."""
+    seen: list[float] = []
+
+    async def fake_sleep(seconds):
+        seen.append(seconds)
+
+    monkeypatch.setattr(replay.asyncio, "sleep", fake_sleep)
+    return seen
+
+
+async def _record(path):
+    recorder = ReplayProvider(Cassette(path), inner=FakeProvider())
+    master = await recorder.parse_cv(SAMPLE_CV_TEXT, None, "en")
+    analysis = await recorder.analyze(SAMPLE_JD, master.plain_text(), "en")
+    tailored = await recorder.tailor_cv(SAMPLE_JD, analysis, master, "en")
+    message = await recorder.outreach(SAMPLE_JD, analysis, tailored, "en")
+    return master, analysis, tailored, message
+
+
+async def test_recorded_answers_replay_from_disk(tmp_path, monkeypatch):
+    path = tmp_path / "cassette.jsonl"
+    master, analysis, tailored, message = await _record(path)
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["method"] for line in lines] == ["parse_cv", "analyze", "tailor_cv", "outreach"]
+    assert all(line["latency_s"] >= 0 and line["usage"]["prompt"] >= 0 for line in lines)
+
+    sleeps = _capture_sleeps(monkeypatch)
+    player = ReplayProvider(Cassette(path), latency_scale=2.0)
+    assert await player.parse_cv(SAMPLE_CV_TEXT, None, "en") == master
+    assert await player.analyze(SAMPLE_JD, master.plain_text(), "en") == analysis
+    assert await player.tailor_cv(SAMPLE_JD, analysis, master, "en") == tailored
+    assert await player.outreach(SAMPLE_JD, analysis, tailored, "en") == message
+    assert sleeps == [pytest.approx(2.0 * line["latency_s"]) for line in lines]
+
+
+async def test_unseen_inputs_draw_a_take_of_the_same_method(tmp_path, monkeypatch):
+    path = tmp_path / "cassette.jsonl"
+    master, analysis, tailored, _ = await _record(path)
+    _capture_sleeps(monkeypatch)
+    player = ReplayProvider(Cassette(path), latency_scale=0)
+    other = master.model_copy(update={"full_name": "Grace Hopper"})
+    first = await player.tailor_cv("Another posting entirely", analysis, other, "en")
+    again = await player.tailor_cv("Another posting entirely", analysis, other, "en")
+    assert first == again, "the same input always draws the same take"
+    assert first.experience == tailored.experience
+    assert first.full_name == "Grace Hopper", "identity comes from the master, not the take"
+    with pytest.raises(AIError, match="edit_message"):
+        await player.edit_message("hi", "shorter")
+
+
+async def test_replayed_streams_report_progress_and_usage(tmp_path, monkeypatch):
+    path = tmp_path / "cassette.jsonl"
+    _, analysis, tailored, _ = await _record(path)
+    _capture_sleeps(monkeypatch)
+    player = ReplayProvider(Cassette(path))
+    log = usage.UsageLog()
+    token = usage.current.set(log)
+    seen = []
+    try:
+        out = await player.outreach(SAMPLE_JD, analysis, tailored, "en", on_progress=lambda p: seen.append(p.chars))
+    finally:
+        usage.current.reset(token)
+    assert seen and seen[-1] == len(out) and seen == sorted(seen)
+    assert log.as_dict()["outreach"]["calls"] == 1
+
+
+def test_config_selects_replay_or_recording(tmp_path, monkeypatch, caplog):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "cvg_replay_cassette", str(tmp_path / "c.jsonl"))
+    assert isinstance(get_provider(), ReplayProvider)
+    assert get_provider()._tape is get_provider()._tape, "one cassette per file"
+    monkeypatch.setattr(settings, "cvg_replay_mode", "record")
+    monkeypatch.setattr(settings, "cvg_fake_ai", True)
+    monkeypatch.setattr(ai, "_warned_unrecorded", False)
+    # Nothing real to record from: recording mode leaves the fake untouched,
+    # and says so once rather than per job.
+    assert isinstance(get_provider(), FakeProvider)
+    assert isinstance(get_provider(), FakeProvider)
+    warnings = [r for r in caplog.records if "nothing is recorded" in r.getMessage()]
+    assert len(warnings) == 1
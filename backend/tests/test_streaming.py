@@ -0,0 +1,108 @@
+"""Streamed generation: incremental JSON assembly, the fake's streaming mode,
+the Gemini stream path, and the progress events the pipeline emits."""
+import json
+from types import SimpleNamespace
+
+from backend.app.ai.fake import FakeProvider
+from backend.app.ai.gemini import GeminiProvider
+from backend.app.ai.stream import StreamProgress
+from backend.app.schemas import CVData, LetterData
+
+from .conftest import SAMPLE_CV_TEXT, SAMPLE_JD
+
+
+def test_sections_close_as_the_json_arrives():
+    payload = json.dumps({
+        "full_name": 'Alex "AM" Martin',
+        "contacts": {"email": "a@b.c", "location": "Paris, {France}"},
+        "summary": "Built things, shipped [many] of them.",
+        "experience": [{"title": "ML", "bullets": ["a, b", "c"]}],
+    })
+    progress = StreamProgress(CVData.model_fields)
+    seen = []
+    for i in range(0, len(payload), 7):
+        progress.feed(payload[i:i + 7])
+        seen.append(list(progress.sections))
+    assert progress.sections == ["full_name", "contacts", "summary", "experience"]
+    assert progress.text == payload
+    # Sections appear one by one, never all at once at the end.
+    assert len({len(s) for s in seen}) == 5
+    assert progress.tokens == len(payload) // 4
+
+
+def test_plain_text_progress_counts_characters():
+    progress = StreamProgress()
+    progress.feed("Hi, {not json}", tokens=5)
+    assert progress.sections == [] and progress.tokens == 5
+    assert 0 < progress.fraction(expected_chars=28) == 0.5
+
+
+async def test_fake_streaming_mode_round_trips():
+    plain, streaming = FakeProvider(), FakeProvider(stream=True)
+    master = await plain.parse_cv(SAMPLE_CV_TEXT, None, "en")
+    analysis = await plain.analyze(SAMPLE_JD, master.plain_text(), "en")
+    updates: list[int] = []
+
+    def on_progress(p: StreamProgress) -> None:
+        updates.append(len(p.sections))
+
+    streamed = await streaming.tailor_cv(SAMPLE_JD, analysis, master, "en", on_progress=on_progress)
+    assert streamed == await plain.tailor_cv(SAMPLE_JD, analysis, master, "en")
+    assert len(updates) > 3 and updates[-1] == len(CVData.model_fields)
+
+    letter = await streaming.write_letter(SAMPLE_JD, analysis, master, "en", on_progress=on_progress)
+    assert isinstance(letter, LetterData) and letter.paragraphs
+    # Without a listener the streaming fake answers in one piece.
+    assert await streaming.outreach(SAMPLE_JD, analysis, master, "en") == await plain.outreach(
+        SAMPLE_JD, analysis, master, "en"
+    )
+
+
+async def test_gemini_streams_and_validates_when_listening(monkeypatch):
+    provider = GeminiProvider(api_key="test-key-not-used")
+    payload = LetterData(subject="Hello", paragraphs=["one", "two"]).model_dump_json()
+    chunks = [payload[i:i + 20] for i in range(0, len(payload), 20)]
+
+    async def fake_stream(model, contents, config):
+        async def gen():
+            for n, text in enumerate(chunks, start=1):
+                yield SimpleNamespace(text=text, usage_metadata=SimpleNamespace(candidates_token_count=n * 3))
+
+        return gen()
+
+    async def no_unary(**kwargs):
+        raise AssertionError("unary call used while a listener was attached")
+
+    monkeypatch.setattr(provider._client.aio.models, "generate_content_stream", fake_stream)
+    monkeypatch.setattr(provider._client.aio.models, "generate_content", no_unary)
+    reports: list[StreamProgress] = []
+    letter = await provider._generate("prompt", schema=LetterData, on_progress=reports.append)
+    assert letter.subject == "Hello" and letter.paragraphs == ["one", "two"]
+    assert len(reports) == len(chunks)
+    assert reports[-1].tokens == len(chunks) * 3
+
+
+async def test_pipeline_emits_streaming_progress(client, monkeypatch):
+    from backend.app import jobs
+    from backend.app.typstsvc import renderer
+    from backend.app.typstsvc.renderer import CompileResult
+
+    from .test_api import _register, _wait_job
+
+    async def fake_render(*args, **kwargs):
+        return CompileResult(ok=True, pages=1, pdf=b"%PDF-fake"), "// source"
+
+    monkeypatch.setattr(renderer, "compile_document", fake_render)
+    monkeypatch.setattr(jobs, "get_provider", lambda byok_key=None: FakeProvider(stream=True))
+    monkeypatch.setattr(jobs, "_PROGRESS_INTERVAL", 0)
+    await _register(client)
+    r = await client.post(
+        "/api/generate",
+        json={"job_descriptions": [SAMPLE_JD], "cv_text": SAMPLE_CV_TEXT, "language": "en"},
+    )
+    snap = await _wait_job(client, r.json()["jobs"][0])
+    assert snap["status"] == "completed", snap.get("error")
+    progress = [ev for ev in snap["events"] if ev["message"].startswith("Writing:")]
+    assert progress, "no streaming progress was reported"
+    assert all(30 <= ev["pct"] <= 60 for ev in progress)
+    assert "tokens received" in progress[-1]["message"]
@@ -2,6 +2,9 @@
 work: no TeX binary, no network. Real compiles live in services/latexc/tests."""
 import re
 
+from services.latexc.contract import FORMAT_MARKER
+
+from backend.app.config import REPO_ROOT
 from backend.app.texsvc.escape import esc
 from backend.app.texsvc.tex_onyx import render_tex
 
@@ -64,6 +67,18 @@ def test_render_tex_bad_accent_falls_back():
     assert "\\definecolor{cvaccent}{HTML}{C2551B}" in tex
 
 
+def test_render_tex_static_header_is_the_shipped_format_header():
+    """latexc dumps templates/latex/onyx_header.tex as a format; it only
+    loads if the rendered header matches it byte for byte, whatever the
+    settings."""
+    shipped = (REPO_ROOT / "templates" / "latex" / "onyx_header.tex").read_text(encoding="utf-8")
+    for settings in (_settings(), _settings(accent="#1D4ED8", density="xtight", font_scale=1.3),
+                     _settings(page_mode="continuous")):
+        head, marker, _ = render_tex(_cv_data(), settings).partition(FORMAT_MARKER)
+        assert marker and head == shipped
+    assert "setmainfont" not in shipped, "XeTeX cannot dump OpenType fonts"
+
+
 def test_render_tex_localized_labels():
     tex = render_tex(_cv_data(), _settings(lang="de"))
     assert "Berufserfahrung" in tex
@@ -1,13 +1,17 @@
-"""Gate tests for the LaTeX one-page fit loop (texsvc/fit.py) and the CVGFILL
-probe parser. The latexc client is replaced with scripted fakes; real compiles
-live in services/latexc/tests."""
+"""Gate tests for the LaTeX one-page fit (texsvc/fit.py builds the /v1/fit
+request, services/latexc/fitloop.py runs the search) and the CVGFILL probe
+parser. The search runs for real against scripted compile outcomes in place
+of latexc's TeX runs; real compiles live in services/latexc/tests."""
+import base64
 import json
 from pathlib import Path
 
 import pytest
+from services.latexc import fitloop
+from services.latexc.contract import LatexFitOut, fill_tokens
 
 from backend.app.texsvc import fit
-from backend.app.texsvc.client import _parse_fill, _parse_total
+from backend.app.typstsvc import renderer
 from backend.app.typstsvc.renderer import CompileResult
 
 FIXTURES = Path(__file__).parent / "fixtures"
@@ -27,19 +31,29 @@ def _script(monkeypatch, outcomes):
     Pops one per compile attempt; returns the list of sources attempted."""
     seen: list[str] = []
 
-    async def fake(doc_id: str, tex: str):
-        pages, fill, total = outcomes.pop(0)
-        seen.append(tex)
-        if pages < 0:
-            return CompileResult(ok=False, diagnostics="scripted failure"), tex, None, None
-        return (
-            CompileResult(ok=True, pages=pages, pdf=b"%PDF-f", svgs=["<svg/>"] * pages),
-            tex,
-            fill,
-            total,
+    async def fake(body, priority="interactive"):
+        template = base64.b64decode(body.template_b64).decode()
+
+        async def compile_(density: str, scale: float, paper: str) -> fitloop.Attempt:
+            pages, fill, total = outcomes.pop(0)
+            seen.append(fill_tokens(template, body.tokens[density], scale, {body.paper_token: paper}))
+            if pages < 0:
+                return fitloop.Attempt(ok=False)
+            return fitloop.Attempt(ok=True, pages=pages, fill=fill, total=total)
+
+        search = await fitloop.run(body, compile_)
+        chosen = search.chosen
+        out = LatexFitOut(
+            ok=chosen.ok, pages=chosen.pages, density=chosen.density,
+            font_scale=chosen.font_scale, overflowed=search.overflowed,
+            page_height_pt=search.page_height_pt,
         )
+        if not chosen.ok:
+            return CompileResult(ok=False, diagnostics="scripted failure"), out
+        pages = chosen.pages
+        return CompileResult(ok=True, pages=pages, pdf=b"%PDF-f", svgs=["<svg/>"] * pages), out
 
-    monkeypatch.setattr(fit.client, "compile_tex_measured", fake)
+    monkeypatch.setattr(fit.client, "fit_tex", fake)
     return seen
 
 
@@ -107,12 +121,41 @@ async def test_fitting_cv_is_never_flagged_as_overflowed(monkeypatch):
 
 
 async def test_compile_failure_short_circuits(monkeypatch):
-    async def fake(doc_id: str, tex: str):
-        return CompileResult(ok=False, diagnostics="boom"), tex, None, None
-
-    monkeypatch.setattr(fit.client, "compile_tex_measured", fake)
+    seen = _script(monkeypatch, [(-1, None, None), (1, 0.95, None)])
     result, _ = await fit.compile_tex_fitted("d5", _cv_data(), dict(_SETTINGS))
-    assert not result.ok and result.diagnostics == "boom"
+    assert not result.ok and result.diagnostics == "scripted failure"
+    assert len(seen) == 1
+
+
+async def test_fit_is_one_request_carrying_the_shared_thresholds(monkeypatch):
+    bodies = []
+
+    async def fake(body, priority="interactive"):
+        bodies.append(body)
+        return CompileResult(ok=True, pages=1, svgs=["<svg/>"]), LatexFitOut(
+            ok=True, pages=1, density="tight", font_scale=1.12)
+
+    monkeypatch.setattr(fit.client, "fit_tex", fake)
+    result, source = await fit.compile_tex_fitted("d9", _cv_data(), dict(_SETTINGS))
+    assert len(bodies) == 1
+    ladder = bodies[0].ladder
+    assert ladder.densities == list(renderer._DENSITIES)
+    assert (ladder.fill_min, ladder.max_scale) == (renderer._FILL_MIN, renderer._MAX_FONT_SCALE)
+    assert set(bodies[0].tokens) == set(renderer._DENSITIES)
+    assert "@BASE@" in base64.b64decode(bodies[0].template_b64).decode()
+    # the final source is rendered locally at the rung the service landed on
+    assert (result.density_used, result.font_scale_used) == ("tight", 1.12)
+    assert source == fit.render_tex(_cv_data(), {**_SETTINGS, "density": "tight", "font_scale": 1.12})
+
+
+async def test_service_down_keeps_the_requested_rung(monkeypatch):
+    async def fake(body, priority="interactive"):
+        return CompileResult(ok=False, diagnostics="LaTeX service unavailable: nope"), None
+
+    monkeypatch.setattr(fit.client, "fit_tex", fake)
+    result, source = await fit.compile_tex_fitted("d10", _cv_data(), {**_SETTINGS, "font_scale": 1.2})
+    assert not result.ok and result.font_scale_used == 1.2
+    assert "@BASE@" not in source and "a4paper" in source
 
 
 _CONT = {**_SETTINGS, "page_mode": "continuous"}
@@ -171,7 +214,7 @@ async def test_dispatcher_routes_by_page_mode(monkeypatch):
     ],
 )
 def test_parse_fill(tail, expected):
-    assert _parse_fill(tail) == expected
+    assert fitloop.fill_from_log(tail) == expected
 
 
 @pytest.mark.parametrize(
@@ -183,4 +226,4 @@ def test_parse_fill(tail, expected):
     ],
 )
 def test_parse_total(tail, expected):
-    assert _parse_total(tail) == expected
+    assert fitloop.total_from_log(tail) == expected
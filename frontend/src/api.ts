@@ -52,6 +52,8 @@ export interface JobSnapshot {
   id: string; status: "queued" | "running" | "completed" | "failed" | "unknown";
   title: string | null; company: string | null; language: string;
   events: JobEvent[]; error: string | null; created_at: string | null;
+  /* Provider tokens spent per method, across every attempt of the job. */
+  token_usage?: Record<string, { calls: number; prompt: number; response: number; cached: number }>;
   documents?: DocSummary[];
 }
 
@@ -127,23 +129,25 @@ async function request<T>(path: string, init?: RequestInit): Promise<T> {
   if (byok) headers.set("X-User-Gemini-Key", byok);
 
   const res = await fetch(path, { credentials: "include", ...init, headers });
-  if (!res.ok) {
-    let message = `Request failed (${res.status})`;
-    let code: string | undefined;
-    try {
-      const body = await res.json();
-      const detail = body.detail ?? body;
-      if (typeof detail === "string") message = detail;
-      else if (detail?.message) { message = detail.message; code = detail.code; }
-      else if (detail?.diagnostics) { message = detail.diagnostics; code = "compile_error"; }
-      else if (Array.isArray(detail) && detail[0]?.msg) message = detail[0].msg;
-    } catch { /* keep default */ }
-    throw new ApiError(res.status, message, code);
-  }
+  if (!res.ok) throw await errorFrom(res);
   const ct = res.headers.get("content-type") ?? "";
   return (ct.includes("application/json") ? res.json() : res.blob()) as Promise<T>;
 }
 
+async function errorFrom(res: Response): Promise<ApiError> {
+  let message = `Request failed (${res.status})`;
+  let code: string | undefined;
+  try {
+    const body = await res.json();
+    const detail = body.detail ?? body;
+    if (typeof detail === "string") message = detail;
+    else if (detail?.message) { message = detail.message; code = detail.code; }
+    else if (detail?.diagnostics) { message = detail.diagnostics; code = "compile_error"; }
+    else if (Array.isArray(detail) && detail[0]?.msg) message = detail[0].msg;
+  } catch { /* keep default */ }
+  return new ApiError(res.status, message, code);
+}
+
 export const api = {
   me: () => request<Me>("/api/auth/me"),
   register: (email: string, password: string) =>
@@ -222,6 +226,45 @@ export const api = {
     request<unknown>(`/api/latex/session/${docId}/end`, { method: "POST" }),
 };
 
+export interface CompileStatus { ok: boolean; pages: number; diagnostics: string; saved: boolean; mode: string }
+
+/* Streamed preview compile (NDJSON): the status first, then each page's SVG
+   as soon as the server has it, so page 1 of a LaTeX CV shows before the
+   rest are converted. Resolves true once the stream completed cleanly;
+   aborting signal rejects it with an AbortError. */
+export async function compileStream(
+  id: string,
+  source: string | undefined,
+  onStatus: (s: CompileStatus) => void,
+  onPage: (page: number, svg: string) => void,
+  signal?: AbortSignal,
+): Promise<boolean> {
+  const headers = new Headers({ "Content-Type": "application/json" });
+  const byok = byokStore.get();
+  if (byok) headers.set("X-User-Gemini-Key", byok);
+  const res = await fetch(`/api/documents/${id}/compile/stream`, {
+    method: "POST", credentials: "include", headers, body: JSON.stringify({ source: source ?? null }), signal,
+  });
+  if (!res.ok || !res.body) throw await errorFrom(res);
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffered = "";
+  let ok = false;
+  for (;;) {
+    const { value, done } = await reader.read();
+    buffered += value ?? "";
+    const lines = buffered.split("\n");
+    buffered = lines.pop() ?? "";
+    for (const line of lines) {
+      if (!line) continue;
+      const frame = JSON.parse(line);
+      if (frame.kind === "status") onStatus(frame);
+      else if (frame.kind === "page") onPage(frame.page, frame.svg);
+      else if (frame.kind === "done") ok = frame.ok;
+    }
+    if (done) return ok;
+  }
+}
+
 export function jobEvents(jobId: string, onSnapshot: (s: JobSnapshot) => void): () => void {
   const es = new EventSource(`/api/jobs/${jobId}/events`);
   es.onmessage = (e) => {
@@ -1,7 +1,7 @@
 /* Orchestrates one open document: optimistic edits, debounced server sync,
    live recompiles, chat edits, mode transitions. */
 import { useCallback, useEffect, useRef, useState } from "react";
-import { api, ApiError, type DocSettings, type DocumentPayload } from "../../api";
+import { api, ApiError, compileStream, type DocSettings, type DocumentPayload } from "../../api";
 import { useStudio } from "../../store";
 
 export interface DocController {
@@ -32,6 +32,7 @@ export function useDocument(docId: string | null): DocController {
   const dataTimer = useRef<number>();
   const sourceTimer = useRef<number>();
   const textTimer = useRef<number>();
+  const stream = useRef<AbortController>();
 
   const doc = docId ? (docs[docId] ?? null) : null;
   const svgs = docId ? (svgCache[docId] ?? null) : null;
@@ -48,6 +49,7 @@ export function useDocument(docId: string | null): DocController {
       window.clearTimeout(dataTimer.current);
       window.clearTimeout(sourceTimer.current);
       window.clearTimeout(textTimer.current);
+      stream.current?.abort();
     };
   }, [docId]);
 
@@ -104,8 +106,38 @@ export function useDocument(docId: string | null): DocController {
       applyDocument({ ...doc, source, mode: "source" });
       window.clearTimeout(sourceTimer.current);
       sourceTimer.current = window.setTimeout(async () => {
+        // A newer edit supersedes any stream still in flight.
+        stream.current?.abort();
+        const current = new AbortController();
+        stream.current = current;
         setSyncing(true);
         try {
+          if (doc.settings?.compiler === "latex") {
+            // Pages swap in one by one as latexc converts them; until then
+            // the previous render of that page stays up.
+            let pages: string[] = [];
+            let failed = false;
+            const ok = await compileStream(
+              docId,
+              source,
+              (status) => {
+                if (!status.ok) {
+                  failed = true;
+                  return setDiagnostics(status.diagnostics);
+                }
+                const shown = useStudio.getState().svgCache[docId] ?? [];
+                pages = Array.from({ length: status.pages }, (_, i) => shown[i] ?? "");
+                setDiagnostics("");
+              },
+              (page, svg) => {
+                pages = pages.map((old, i) => (i === page - 1 ? svg : old));
+                setSvgs(docId, pages);
+              },
+              current.signal,
+            );
+            // The stream broke after a good status: fetch the pages whole.
+            if (ok || failed) return;
+          }
           const res = await api.compile(docId, source);
           if (res.ok) {
             setSvgs(docId, res.svgs);
@@ -114,9 +146,10 @@ export function useDocument(docId: string | null): DocController {
             setDiagnostics(res.diagnostics);
           }
         } catch (e) {
+          if (current.signal.aborted) return;
           setDiagnostics(e instanceof Error ? e.message : "Compile failed.");
         } finally {
-          setSyncing(false);
+          if (stream.current === current) setSyncing(false);
         }
       }, 850);
     },
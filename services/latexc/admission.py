@@ -0,0 +1,185 @@
+"""Admission control: who gets a TeX process, who waits, who is turned away.
+
+TeX runs take one of LATEXC_CONCURRENCY slots. Up to LATEXC_MAX_QUEUE
+requests may wait for one, interactive compiles ahead of fit searches and
+measure passes; past that a request is refused at once with Overloaded
+(503 + Retry-After) instead of sitting in a queue until the caller's
+timeout fires. A full queue makes room for an interactive request by
+refusing its newest batch waiter.
+
+The caller says which kind of work it sends (X-Request-Priority:
+interactive or batch); without it the route decides.
+
+Every request carries a deadline: when the caller gives up (the backend
+says how long it will wait in X-Request-Timeout). Work still waiting for
+its doc lock or a TeX slot at that point is dropped, since nobody is left
+to read the answer.
+
+Per-key locks (documents, format names) live in a LockRegistry that drops
+a lock as soon as no request holds or waits on it, so it stays as small
+as the work in flight.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITIES = {"interactive": INTERACTIVE, "batch": BATCH}
+
+
+def max_queue() -> int:
+    return int(os.environ.get("LATEXC_MAX_QUEUE", "8"))
+
+
+def default_timeout_s() -> float:
+    return float(os.environ.get("LATEXC_REQUEST_TIMEOUT_S", "50"))
+
+
+class Overloaded(Exception):
+    """Refused or dropped; the app answers 503 with Retry-After."""
+
+    def __init__(self, why: str, retry_after: int) -> None:
+        super().__init__(why)
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class Ticket:
+    """One request's queue priority and the monotonic time its caller gives
+    up at."""
+    priority: int = INTERACTIVE
+    deadline: float = math.inf
+
+    @classmethod
+    def for_request(
+        cls, priority: int, timeout_header: str | None, priority_header: str | None = None
+    ) -> "Ticket":
+        """priority is the route's default; a known priority_header wins."""
+        priority = PRIORITIES.get((priority_header or "").strip().lower(), priority)
+        try:
+            timeout_s = float(timeout_header) if timeout_header else default_timeout_s()
+        except ValueError:
+            timeout_s = default_timeout_s()
+        return cls(priority, time.monotonic() + timeout_s)
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+
+UNLIMITED = Ticket()  # internal work: prewarm, format rebuilds
+
+
+class TexSlots:
+    """A priority semaphore with a bounded wait queue. `async with slots`
+    takes a slot unconditionally (prewarm, format rebuilds)."""
+
+    def __init__(self, slots: int) -> None:
+        self.slots = slots
+        self.busy = 0
+        self._waiting: list[tuple[int, int, asyncio.Future]] = []  # heap
+        self._seq = itertools.count()
+        self._run_s = 3.0  # moving average of one TeX run, for Retry-After
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiting)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free for a new arrival."""
+        return max(1, min(60, math.ceil(self._run_s * (self.queued + 1) / self.slots)))
+
+    @asynccontextmanager
+    async def slot(self, ticket: Ticket = UNLIMITED, shed: bool = True) -> AsyncIterator[None]:
+        """Hold a slot for one TeX run. shed=False skips the queue bound, for
+        the later runs of a fit search that was already admitted."""
+        await self._acquire(ticket, shed)
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self._run_s = 0.8 * self._run_s + 0.2 * (time.monotonic() - t0)
+            self._release()
+
+    async def __aenter__(self) -> None:
+        await self._acquire(UNLIMITED, shed=False)
+
+    async def __aexit__(self, *exc: object) -> None:
+        self._release()
+
+    async def _acquire(self, ticket: Ticket, shed: bool) -> None:
+        if ticket.remaining() <= 0:
+            raise Overloaded("caller's deadline passed before a TeX slot", self.retry_after())
+        if self.busy < self.slots and not self._waiting:
+            self.busy += 1
+            return
+        if shed and self.queued >= max_queue():
+            self._make_room(ticket.priority)
+        fut = asyncio.get_running_loop().create_future()
+        entry = (ticket.priority, next(self._seq), fut)
+        heapq.heappush(self._waiting, entry)
+        try:
+            await asyncio.wait_for(fut, None if ticket.deadline == math.inf else ticket.remaining())
+        except BaseException as exc:
+            if entry in self._waiting:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+            elif fut.done() and not fut.cancelled() and fut.exception() is None:
+                self._release()  # handed a slot just as we gave up
+            if isinstance(exc, TimeoutError):
+                raise Overloaded("caller's deadline passed in the queue", self.retry_after()) from None
+            raise
+
+    def _make_room(self, priority: int) -> None:
+        """Refuse the newest lower-priority waiter, or the newcomer."""
+        live = [e for e in self._waiting if not e[2].done()]
+        worst = max(live, key=lambda e: (e[0], e[1]), default=None)
+        if worst is None or worst[0] <= priority:
+            raise Overloaded("TeX queue full", self.retry_after())
+        self._waiting.remove(worst)
+        heapq.heapify(self._waiting)
+        worst[2].set_exception(Overloaded("TeX queue full (shed for interactive work)", self.retry_after()))
+
+    def _release(self) -> None:
+        while self._waiting:
+            _, _, fut = heapq.heappop(self._waiting)
+            if not fut.done():  # a waiter timing out may not have left yet
+                fut.set_result(None)  # the slot passes straight to it
+                return
+        self.busy -= 1
+
+
+class LockRegistry:
+    """One asyncio.Lock per key, dropped when its last holder or waiter is
+    done."""
+
+    def __init__(self) -> None:
+        self._locks: dict[str, tuple[asyncio.Lock, list[int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, key: str, ticket: Ticket = UNLIMITED) -> AsyncIterator[None]:
+        lock, users = self._locks.setdefault(key, (asyncio.Lock(), [0]))
+        users[0] += 1
+        try:
+            timeout = None if ticket.deadline == math.inf else ticket.remaining()
+            try:
+                await asyncio.wait_for(lock.acquire(), timeout)
+            except TimeoutError:
+                raise Overloaded("caller's deadline passed waiting for the document", 1) from None
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            users[0] -= 1
+            if not users[0]:
+                del self._locks[key]
@@ -10,21 +10,39 @@ import hmac
 import logging
 import os
 import time
-from collections import defaultdict
+from collections.abc import AsyncIterator, Callable
 from importlib import resources
+from pathlib import Path
 
 from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from . import cache, runner
-from .contract import LatexCompileIn, LatexCompileOut, LatexStatus
+from . import admission, cache, fitloop, formats, pages, runner
+from .contract import (
+    CONTRACT_VERSION,
+    CompileFile,
+    CompileFrame,
+    FitAttempt,
+    LatexCompileIn,
+    LatexCompileOut,
+    LatexFitIn,
+    LatexFitOut,
+    LatexStatus,
+    fill_tokens,
+    parse_fill_probe,
+)
 
 log = logging.getLogger("latexc")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s latexc %(message)s")
 
 _START = time.time()
 _MAX_TEX_PROCS = int(os.environ.get("LATEXC_CONCURRENCY", "2"))
-_tex_sem = asyncio.Semaphore(_MAX_TEX_PROCS)
-_doc_locks: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+_tex = admission.TexSlots(_MAX_TEX_PROCS)
+_MAX_CONVERT_PROCS = int(os.environ.get("LATEXC_CONVERT_CONCURRENCY", "0")) or os.cpu_count() or 2
+_convert_sem = asyncio.Semaphore(_MAX_CONVERT_PROCS)
+_doc_locks = admission.LockRegistry()
+# Where a streamed compile hands its frames; None for a plain request.
+Emit = Callable[[CompileFrame], None] | None
 
 app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
 
@@ -43,9 +61,25 @@ async def require_auth(request: Request) -> None:
         raise HTTPException(status_code=401, detail="bad token")
 
 
+@app.exception_handler(admission.Overloaded)
+async def overloaded(request: Request, exc: admission.Overloaded) -> JSONResponse:
+    log.warning("shed %s: %s (queued=%d)", request.url.path, exc, _tex.queued)
+    return JSONResponse(
+        status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+def _ticket(request: Request, priority: int) -> admission.Ticket:
+    """priority is the route's guess; the caller's X-Request-Priority wins."""
+    return admission.Ticket.for_request(
+        priority, request.headers.get("x-request-timeout"), request.headers.get("x-request-priority")
+    )
+
+
 @app.on_event("startup")
 async def prewarm() -> None:
     _token()  # fail fast on missing token
+    cache.rebuild_index()
     try:
         probe = resources.files("latexc").joinpath("probe.tex").read_text(encoding="utf-8")
     except (FileNotFoundError, ModuleNotFoundError):
@@ -54,6 +88,18 @@ async def prewarm() -> None:
         log.warning("probe.tex missing; skipping prewarm")
         return
     t0 = time.time()
+    if not runner.tex_cache_ready():
+        # The image bakes it; a container without one builds it here.
+        built, why = await runner.build_tex_cache(probe)
+        log.info("tex cache build ok=%s in %.1fs %s", built, time.time() - t0, why)
+        if not built:
+            log.warning("no shared tex cache; projects keep their own")
+        t0 = time.time()
+    if formats.enabled():
+        probe_head = formats.header(probe)
+        ready = await formats.rebuild(_tex, 120, extra=(probe_head,) if probe_head else ())
+        log.info("formats ready=%d in %.1fs", ready, time.time() - t0)
+        t0 = time.time()
     body = LatexCompileIn(
         doc_id="_probe",
         files=[{"path": "main.tex", "content_b64": base64.b64encode(probe.encode()).decode()}],
@@ -68,71 +114,354 @@ async def prewarm() -> None:
         log.exception("prewarm crashed (service continues)")
 
 
-async def _compile(inp: LatexCompileIn) -> LatexCompileOut:
+def _ms(since: float) -> int:
+    return int((time.time() - since) * 1000)
+
+
+async def _format_for(
+    pdir: Path, main: str, timeout_s: int, ticket: admission.Ticket = admission.UNLIMITED, shed: bool = True
+) -> Path | None:
+    """The preamble's format; a dump on its second sighting queues on the
+    request's ticket like the compile it serves."""
+    if not formats.enabled():
+        return None
+    try:
+        head = formats.header((pdir / main).read_text(encoding="utf-8"))
+    except (OSError, UnicodeDecodeError):
+        return None
+    return await formats.ensure(head, _tex, timeout_s, ticket=ticket, shed=shed) if head is not None else None
+
+
+async def _run_tex(
+    pdir: Path,
+    main: str,
+    timeout_s: int,
+    use_format: bool = True,
+    ticket: admission.Ticket = admission.UNLIMITED,
+    shed: bool = True,
+) -> tuple[bool, str, str | None]:
+    """One latexmk run in a TeX slot (admission.TexSlots), on the preamble's
+    precompiled format when there is one: (ok, log tail, error line)."""
+    fmt = await _format_for(pdir, main, timeout_s, ticket, shed) if use_format else None
+    async with _tex.slot(ticket, shed):
+        ok, out = await runner.compile_latex(pdir, main, timeout_s, fmt=fmt)
+    if not ok and fmt is not None and runner.format_unusable(out):
+        async with _tex.slot(ticket, shed=False):
+            ok, out = await runner.compile_latex(pdir, main, timeout_s)
+        # The format is shared by every doc with this header: only the same
+        # source compiling without it proves the format was at fault.
+        if ok:
+            formats.reject(fmt)
+    tail = runner.log_tail(pdir, main, out)
+    error = None if ok else runner.first_error_line(tail) or runner.first_error_line(out)
+    return ok, tail, error
+
+
+async def _count_pages(pdir: Path, pdf_name: str, tail: str, pdf: bytes | None = None) -> int:
+    """From the log when TeX reported it, else from the PDF's page tree;
+    pdfinfo only when neither reads."""
+    count = runner.log_pages(tail)
+    if count is None:
+        count = pages.page_count(pdf if pdf is not None else (pdir / pdf_name).read_bytes())
+    return count if count is not None else await runner.pdf_pages(pdir, pdf_name)
+
+
+_FACTS = ("probe", "fill", "overfull", "overfull_pt")
+
+
+def _log_facts(tail: str) -> dict:
+    """The response's structured log fields; stored with the outputs so a
+    hit returns them without a log."""
+    overfull, widest = runner.log_overfull(tail)
+    return {
+        "probe": parse_fill_probe(tail), "fill": fitloop.fill_from_log(tail),
+        "overfull": overfull, "overfull_pt": widest,
+    }
+
+
+def _warmth(pdir: Path) -> str:
+    # A dir created by a hit on another doc's outputs holds no TeX state yet.
+    return "warm" if (pdir / "manifest.json").exists() else "cold"
+
+
+async def _convert(
+    pdir: Path, pdf_name: str, pdf: bytes, count: int, emit: Emit = None
+) -> tuple[list[str], list[str] | None, dict[str, int]]:
+    """Per-page SVGs: a page whose digest matches one of the doc's recent
+    outputs reuses that SVG, the rest convert in parallel. Returns (svgs,
+    page digests to store, timings); emit gets each page as it is ready."""
+    t0 = time.time()
+    digests = pages.page_digests(pdf)
+    if digests is not None and len(digests) != count:
+        digests = None
+    previous = cache.previous_svgs(pdir, digests) if digests else {}
+    todo = [n for n in range(1, count + 1) if digests is None or digests[n - 1] not in previous]
+    on_page = None
+    if emit is not None:
+        for n in range(1, count + 1):
+            if n not in todo:
+                emit(CompileFrame(kind="page", page=n, svg=previous[digests[n - 1]]))
+
+        def on_page(n: int, svg: str) -> None:
+            emit(CompileFrame(kind="page", page=n, svg=svg))
+
+    t_convert = time.time()
+    fresh = await runner.pdf_to_svgs(pdir, pdf_name, todo, _convert_sem, on_page)
+    svgs = [fresh[n] if n in fresh else previous[digests[n - 1]] for n in range(1, count + 1)]
+    log.info("convert pages=%d reused=%d", count, count - len(todo))
+    return svgs, digests, {"digest": int((t_convert - t0) * 1000), "convert": _ms(t_convert)}
+
+
+def _missing(exc: runner.MissingFiles) -> HTTPException:
+    return HTTPException(status_code=409, detail={"missing": exc.paths})
+
+
+async def _compile(
+    inp: LatexCompileIn, emit: Emit = None, ticket: admission.Ticket = admission.UNLIMITED
+) -> LatexCompileOut:
     t_start = time.time()
     pdir = cache.project_dir(inp.doc_id)
-    key = cache.content_key(inp)
+    try:
+        key = cache.content_key(inp)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail="bad base64 in files") from exc
 
-    async with _doc_locks[inp.doc_id]:
-        cached = cache.load_cached(pdir, key)
+    async with _doc_locks.hold(inp.doc_id, ticket):
+        cached = cache.load_cached(
+            pdir, key,
+            pdf=inp.want_pdf and not inp.measure_only,
+            svgs=inp.want_svgs and not inp.measure_only,
+        )
         if cached is not None:
-            os.utime(pdir)  # bump LRU mtime (Path.touch() raises on dirs)
+            cache.touch(pdir)
+            facts = {k: cached["meta"][k] for k in _FACTS if k in cached["meta"]}
+            if inp.measure_only:
+                return LatexCompileOut(
+                    ok=True, cache="hit", pages=cached["pages"],
+                    timings_ms={"total": _ms(t_start)}, **facts,
+                )
             return LatexCompileOut(
+                ok=True, cache="hit", pages=cached["pages"],
+                pdf_b64=base64.b64encode(cached["pdf"]).decode() if inp.want_pdf else None,
+                svgs=cached["svgs"],
+                timings_ms={"total": _ms(t_start)}, **facts,
+            )
+
+        try:
+            out = await _compile_fresh(inp, pdir, key, t_start, emit, ticket)
+        finally:
+            cache.record(pdir)  # failed compiles leave aux files too
+        if out.ok:
+            cache.evict(keep=pdir)
+        return out
+
+
+async def _compile_fresh(
+    inp: LatexCompileIn,
+    pdir: Path,
+    key: str,
+    t_start: float,
+    emit: Emit = None,
+    ticket: admission.Ticket = admission.UNLIMITED,
+) -> LatexCompileOut:
+    """_compile's miss path; the caller holds the doc lock."""
+    warmth = _warmth(pdir)
+    t_sync = time.time()
+    try:
+        runner.sync_files(pdir, inp.files)
+    except runner.MissingFiles as exc:
+        raise _missing(exc) from exc
+    except runner.CompileError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+
+    t_tex = time.time()
+    ok, tail, error = await _run_tex(pdir, inp.main, inp.timeout_s, ticket=ticket)
+    if not ok:
+        return LatexCompileOut(
+            ok=False, cache=warmth, log_tail=tail, error_line=error,
+            timings_ms={
+                "sync": int((t_tex - t_sync) * 1000),
+                "compile": _ms(t_tex),
+                "total": _ms(t_start),
+            },
+        )
+
+    t_compiled = time.time()
+    pdf_name = os.path.splitext(inp.main)[0] + ".pdf"
+    facts = _log_facts(tail)
+    timings = {"sync": int((t_tex - t_sync) * 1000), "compile": int((t_compiled - t_tex) * 1000)}
+    try:
+        if inp.measure_only:
+            # Nothing stored: a measure has no outputs to serve.
+            count = await _count_pages(pdir, pdf_name, tail)
+            return LatexCompileOut(
+                ok=True, cache=warmth, pages=count, log_tail=tail if inp.want_log else "",
+                timings_ms={**timings, "total": _ms(t_start)}, **facts,
+            )
+        pdf_bytes = (pdir / pdf_name).read_bytes()
+        count = await _count_pages(pdir, pdf_name, tail, pdf_bytes)
+        if emit is not None:
+            emit(CompileFrame(kind="status", status=LatexCompileOut(
+                ok=True, cache=warmth, pages=count, version=CONTRACT_VERSION, **facts,
+            )))
+        svgs, digests = [], None
+        if inp.want_svgs:
+            svgs, digests, convert_ms = await _convert(pdir, pdf_name, pdf_bytes, count, emit)
+            timings.update(convert_ms)
+    except runner.CompileError as exc:
+        return LatexCompileOut(ok=False, cache=warmth, log_tail=tail, error_line=str(exc))
+
+    cache.store(pdir, key, count, pdf_bytes, svgs, extra={**facts, "page_digests": digests})
+    return LatexCompileOut(
+        ok=True, cache=warmth, pages=count,
+        pdf_b64=base64.b64encode(pdf_bytes).decode() if inp.want_pdf else None,
+        svgs=svgs, log_tail=tail if inp.want_log else "",
+        timings_ms={**timings, "total": _ms(t_start)}, **facts,
+    )
+
+
+async def _fit(inp: LatexFitIn, ticket: admission.Ticket = admission.UNLIMITED) -> LatexFitOut:
+    """Run the whole fit search in the warm project dir under the doc lock.
+    Intermediate attempts only report pages and the fill probe; the chosen
+    attempt's PDF is kept in memory and converted to SVGs once at the end."""
+    t_start = time.time()
+    pdir = cache.project_dir(inp.doc_id)
+    try:
+        key = cache.fit_key(inp)
+        template = base64.b64decode(inp.template_b64, validate=True).decode("utf-8")
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail="bad base64 for template or files") from exc
+
+    async with _doc_locks.hold(inp.doc_id, ticket):
+        cached = cache.load_cached(pdir, key, svgs=inp.want_svgs)
+        if cached is not None and "fit" in cached["meta"]:
+            cache.touch(pdir)
+            return LatexFitOut(
                 ok=True, cache="hit", pages=cached["pages"],
                 pdf_b64=base64.b64encode(cached["pdf"]).decode(),
-                svgs=cached["svgs"] if inp.want_svgs else [],
-                timings_ms={"total": int((time.time() - t_start) * 1000)},
+                svgs=cached["svgs"],
+                timings_ms={"total": _ms(t_start)},
+                **cached["meta"]["fit"],
             )
 
-        warmth = "warm" if pdir.exists() else "cold"
-        t_sync = time.time()
         try:
-            runner.sync_files(pdir, inp.files)
+            out = await _fit_fresh(inp, pdir, key, template, t_start, ticket)
+        finally:
+            cache.record(pdir)
+        if out.ok:
+            cache.evict(keep=pdir)
+        return out
+
+
+async def _fit_fresh(
+    inp: LatexFitIn,
+    pdir: Path,
+    key: str,
+    template: str,
+    t_start: float,
+    ticket: admission.Ticket = admission.UNLIMITED,
+) -> LatexFitOut:
+    """_fit's miss path; the caller holds the doc lock."""
+    missing = runner.missing_files(pdir, inp.files)
+    if missing:
+        raise _missing(runner.MissingFiles(missing))
+    pdf_name = os.path.splitext(inp.main)[0] + ".pdf"
+    warmth = _warmth(pdir)
+    spent = {"sync": 0, "compile": 0}
+    admitted = False
+    # A token above the format marker would give every rung its own header.
+    head = formats.header(template)
+    tokens = {inp.paper_token, *(t for table in inp.tokens.values() for t in table)}
+    use_format = head is not None and not any(t in head for t in tokens)
+
+    async def compile_(density: str, scale: float, paper: str) -> fitloop.Attempt:
+        nonlocal admitted
+        t0 = time.time()
+        source = fill_tokens(template, inp.tokens[density], scale, {inp.paper_token: paper})
+        main = CompileFile(path=inp.main, content_b64=base64.b64encode(source.encode()).decode())
+        try:
+            runner.sync_files(pdir, [main, *inp.files])
         except runner.CompileError as exc:
             raise HTTPException(status_code=422, detail=str(exc)) from exc
-
         t_tex = time.time()
-        async with _tex_sem:
-            ok, out = await runner.compile_latex(pdir, inp.main, inp.timeout_s)
-        tail = runner.log_tail(pdir, inp.main, out)
+        # Only the first rung can be refused: a search once admitted finishes.
+        ok, tail, error = await _run_tex(
+            pdir, inp.main, inp.timeout_s, use_format, ticket, shed=not admitted
+        )
+        admitted = True
+        spent["sync"] += int((t_tex - t0) * 1000)
+        spent["compile"] += _ms(t_tex)
         if not ok:
-            return LatexCompileOut(
-                ok=False, cache=warmth, log_tail=tail,
-                error_line=runner.first_error_line(tail) or runner.first_error_line(out),
-                timings_ms={
-                    "sync": int((t_tex - t_sync) * 1000),
-                    "compile": int((time.time() - t_tex) * 1000),
-                    "total": int((time.time() - t_start) * 1000),
-                },
-            )
-
-        t_convert = time.time()
-        pdf_name = os.path.splitext(inp.main)[0] + ".pdf"
+            return fitloop.Attempt(ok=False, ms=_ms(t0), output={"tail": tail, "error": error})
+        pdf = (pdir / pdf_name).read_bytes()
         try:
-            pages = await runner.pdf_pages(pdir, pdf_name)
-            svgs = await runner.pdf_to_svgs(pdir, pdf_name, pages) if inp.want_svgs else []
+            count = await _count_pages(pdir, pdf_name, tail, pdf)
         except runner.CompileError as exc:
-            return LatexCompileOut(ok=False, cache=warmth, log_tail=tail, error_line=str(exc))
+            return fitloop.Attempt(ok=False, ms=_ms(t0), output={"tail": tail, "error": str(exc)})
+        return fitloop.Attempt(
+            ok=True, pages=count, ms=_ms(t0),
+            fill=fitloop.fill_from_log(tail), total=fitloop.total_from_log(tail),
+            output={"tail": tail, "pdf": pdf},
+        )
 
-        pdf_bytes = (pdir / pdf_name).read_bytes()
-        cache.store(pdir, key, pages, pdf_bytes, svgs)
-        cache.evict(keep=pdir)
-        return LatexCompileOut(
-            ok=True, cache=warmth, pages=pages,
-            pdf_b64=base64.b64encode(pdf_bytes).decode(),
-            svgs=svgs, log_tail=tail,
-            timings_ms={
-                "sync": int((t_tex - t_sync) * 1000),
-                "compile": int((t_convert - t_tex) * 1000),
-                "convert": int((time.time() - t_convert) * 1000),
-                "total": int((time.time() - t_start) * 1000),
-            },
+    search = await fitloop.run(inp, compile_)
+    chosen = search.chosen
+    meta = {
+        **_log_facts(chosen.output["tail"]),
+        "density": chosen.density,
+        "font_scale": chosen.font_scale,
+        "overflowed": search.overflowed,
+        "fill": chosen.fill,
+        "page_height_pt": search.page_height_pt,
+        "attempts": [
+            FitAttempt(
+                density=a.density, font_scale=a.font_scale, paper=a.paper,
+                ok=a.ok, pages=a.pages, fill=a.fill, ms=a.ms,
+            ).model_dump()
+            for a in search.attempts
+        ],
+    }
+    if not chosen.ok:
+        return LatexFitOut(
+            ok=False, cache=warmth, log_tail=chosen.output["tail"],
+            error_line=chosen.output["error"],
+            timings_ms={**spent, "total": _ms(t_start)}, **meta,
         )
 
+    pdf_bytes = chosen.output["pdf"]
+    # The chosen attempt is not always the last one compiled (upscale
+    # back-off, trim-pass fallback): convert from its own bytes.
+    svgs, digests = [], None
+    try:
+        if inp.want_svgs:
+            (pdir / "last.pdf").write_bytes(pdf_bytes)
+            try:
+                svgs, digests, convert_ms = await _convert(pdir, "last.pdf", pdf_bytes, chosen.pages)
+            finally:
+                (pdir / "last.pdf").unlink(missing_ok=True)
+            spent.update(convert_ms)
+    except runner.CompileError as exc:
+        return LatexFitOut(
+            ok=False, cache=warmth, log_tail=chosen.output["tail"], error_line=str(exc), **meta
+        )
+
+    cache.store(pdir, key, chosen.pages, pdf_bytes, svgs, extra={"fit": meta, "page_digests": digests})
+    return LatexFitOut(
+        ok=True, cache=warmth, pages=chosen.pages,
+        pdf_b64=base64.b64encode(pdf_bytes).decode(),
+        svgs=svgs, log_tail=chosen.output["tail"] if inp.want_log else "",
+        timings_ms={**spent, "total": _ms(t_start)},
+        **meta,
+    )
+
 
 @app.post("/v1/compile", response_model=LatexCompileOut, dependencies=[Depends(require_auth)])
-async def compile_endpoint(inp: LatexCompileIn) -> LatexCompileOut:
-    out = await _compile(inp)
+async def compile_endpoint(inp: LatexCompileIn, request: Request) -> LatexCompileOut:
+    # Unless the caller says otherwise, a measure is one attempt of a fit
+    # search: it queues behind edits.
+    priority = admission.BATCH if inp.measure_only else admission.INTERACTIVE
+    out = await _compile(inp, ticket=_ticket(request, priority))
+    out.version = CONTRACT_VERSION
     log.info(
         "compile doc=%s cache=%s ok=%s pages=%s total_ms=%s",
         inp.doc_id, out.cache, out.ok, out.pages, out.timings_ms.get("total"),
@@ -140,13 +469,83 @@ async def compile_endpoint(inp: LatexCompileIn) -> LatexCompileOut:
     return out
 
 
+@app.post("/v1/compile/stream", dependencies=[Depends(require_auth)])
+async def compile_stream_endpoint(inp: LatexCompileIn, request: Request) -> StreamingResponse:
+    """/v1/compile as NDJSON CompileFrames: the status once the page count is
+    known, then every page as it converts, so the first page's latency no
+    longer grows with the page count. Request errors (409 missing files,
+    422, 503) are answered before the stream starts, as plain HTTP errors."""
+    frames: asyncio.Queue[CompileFrame | None] = asyncio.Queue()
+    ticket = _ticket(request, admission.INTERACTIVE)
+    task = asyncio.create_task(_compile(inp, emit=frames.put_nowait, ticket=ticket))
+    task.add_done_callback(lambda _: frames.put_nowait(None))
+    first = await frames.get()
+    if first is None:
+        task.result()  # raises the HTTPException, if any
+    return StreamingResponse(_frames(inp, task, first, frames), media_type="application/x-ndjson")
+
+
+async def _frames(
+    inp: LatexCompileIn,
+    task: asyncio.Task,
+    frame: CompileFrame | None,
+    frames: asyncio.Queue,
+) -> AsyncIterator[str]:
+    """Relay what the compile emitted, then whatever its result holds that
+    was not streamed (all of it on a hit or a failure). The compile runs to
+    completion even if the caller goes away, so its outputs are still
+    stored."""
+    streamed: set[int] = set()
+    status_sent = False
+    while frame is not None:
+        status_sent = status_sent or frame.kind == "status"
+        streamed.add(frame.page)
+        yield frame.model_dump_json(exclude_defaults=True) + "\n"
+        frame = await frames.get()
+    out = task.result()
+    out.version = CONTRACT_VERSION
+    tail: list[CompileFrame] = []
+    if not status_sent or not out.ok:  # a conversion can fail after the status went out
+        tail.append(CompileFrame(kind="status", status=out.model_copy(update={"pdf_b64": None, "svgs": []})))
+    tail += [
+        CompileFrame(kind="page", page=n, svg=svg)
+        for n, svg in enumerate(out.svgs, 1) if n not in streamed
+    ]
+    if out.pdf_b64:
+        tail.append(CompileFrame(kind="pdf", pdf_b64=out.pdf_b64))
+    tail.append(CompileFrame(kind="done", timings_ms=out.timings_ms))
+    for frame in tail:
+        yield frame.model_dump_json(exclude_defaults=True) + "\n"
+    log.info(
+        "compile_stream doc=%s cache=%s ok=%s pages=%s total_ms=%s",
+        inp.doc_id, out.cache, out.ok, out.pages, out.timings_ms.get("total"),
+    )
+
+
+@app.post("/v1/fit", response_model=LatexFitOut, dependencies=[Depends(require_auth)])
+async def fit_endpoint(inp: LatexFitIn, request: Request) -> LatexFitOut:
+    # The backend says whose fit this is (Studio edit or generation); an
+    # older one does not, and most fits it sends are generation.
+    out = await _fit(inp, _ticket(request, admission.BATCH))
+    out.version = CONTRACT_VERSION
+    log.info(
+        "fit doc=%s mode=%s cache=%s ok=%s pages=%s attempts=%s rung=%s@%s total_ms=%s",
+        inp.doc_id, inp.mode, out.cache, out.ok, out.pages, len(out.attempts),
+        out.density, out.font_scale, out.timings_ms.get("total"),
+    )
+    return out
+
+
 @app.delete("/v1/project/{doc_id}", status_code=204, dependencies=[Depends(require_auth)])
 async def clear_project(doc_id: str) -> None:
-    async with _doc_locks[doc_id]:
+    async with _doc_locks.hold(doc_id):
         cache.clear_project(doc_id)
 
 
 @app.get("/v1/status", response_model=LatexStatus, dependencies=[Depends(require_auth)])
 async def status() -> LatexStatus:
     projects, disk_mb = cache.stats()
-    return LatexStatus(uptime_s=int(time.time() - _START), projects=projects, disk_mb=disk_mb)
+    return LatexStatus(
+        uptime_s=int(time.time() - _START), projects=projects, disk_mb=disk_mb,
+        tex_busy=_tex.busy, tex_queued=_tex.queued, warm_projects=cache.warm_projects(),
+    )
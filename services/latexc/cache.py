@@ -1,15 +1,18 @@
 """Per-document compile-dir cache: the warm state that makes recompiles not
 start from zero (Overleaf CLSI model: the project dir persists between
 requests; latexmk's .fdb/aux files ride along). Content-addressed outputs
-short-circuit unchanged recompiles entirely."""
+(outputs.py, shared by every project) short-circuit any recompile whose
+input was seen before, in this doc or another."""
 import hashlib
+import heapq
 import json
 import os
 import shutil
 import time
 from pathlib import Path
 
-from .contract import LatexCompileIn
+from . import outputs
+from .contract import LatexCompileIn, LatexFitIn, file_sha256
 
 
 def _max_projects() -> int:
@@ -19,9 +22,13 @@ def _max_projects() -> int:
 def _max_total_mb() -> int:
     return int(os.environ.get("LATEXC_MAX_TOTAL_MB", "512"))
 
+
+def _max_recent() -> int:
+    return int(os.environ.get("LATEXC_RECENT_OUTPUTS", "8"))
+
 # Artifacts the cache layer owns; user files are tracked in manifest.json and
 # anything else (aux, fdb, logs) is latexmk's warm state.
-_STATE_FILES = {"last.json", "manifest.json"}
+_STATE_FILES = {"recent.json", "manifest.json"}
 
 
 def compile_root() -> Path:
@@ -35,6 +42,8 @@ def project_dir(doc_id: str) -> Path:
 
 
 def content_key(inp: LatexCompileIn) -> str:
+    """Over the files' content hashes, so a hash-only (v2) request keys the
+    same as one carrying the bytes. ValueError on bad base64."""
     h = hashlib.sha256()
     h.update(inp.engine.encode())
     h.update(b"\x00")
@@ -43,41 +52,79 @@ def content_key(inp: LatexCompileIn) -> str:
         h.update(b"\x00")
         h.update(f.path.encode())
         h.update(b"\x00")
-        h.update(f.content_b64.encode())
+        h.update(file_sha256(f).encode())
     return h.hexdigest()
 
 
-def load_cached(pdir: Path, key: str) -> dict | None:
-    """Stored outputs for this exact input, or None."""
-    meta_path = pdir / "last.json"
-    pdf_path = pdir / "last.pdf"
-    if not (meta_path.exists() and pdf_path.exists()):
-        return None
+def fit_key(inp: LatexFitIn) -> str:
+    """A fit's outputs depend on the whole search spec, not on one source.
+    Extra files count by content hash, as in content_key."""
+    spec = inp.model_dump(mode="json", exclude={"doc_id", "want_svgs", "want_log", "timeout_s", "files"})
+    spec["files"] = sorted([f.path, file_sha256(f)] for f in inp.files)
+    return "fit:" + hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+def _recent(pdir: Path) -> list[str]:
     try:
-        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        return json.loads((pdir / "recent.json").read_text(encoding="utf-8"))
     except (ValueError, OSError):
+        return []
+
+
+def _remember(pdir: Path, key: str) -> None:
+    """Move key to the front of the project's recent-outputs list."""
+    keys = [key, *(k for k in _recent(pdir) if k != key)][: _max_recent()]
+    pdir.mkdir(parents=True, exist_ok=True)
+    (pdir / "recent.json").write_text(json.dumps(keys), encoding="utf-8")
+
+
+def load_cached(pdir: Path, key: str, *, pdf: bool = True, svgs: bool = True) -> dict | None:
+    """Stored outputs for this exact input, from any project, or None. Only
+    the parts asked for are read: a measure hit reads no blobs at all, and
+    svgs=False skips the pages. An entry stored without SVGs misses when
+    they are wanted."""
+    store = outputs.store(compile_root())
+    entry = store.get(key)
+    if entry is None or (svgs and len(entry["svgs"]) != entry["pages"]):
         return None
-    if meta.get("content_key") != key:
+    try:
+        pdf_bytes = store.read(entry["pdf"]) if pdf else None
+        svg_texts = [store.read(d).decode("utf-8") for d in entry["svgs"]] if svgs else []
+    except OSError:
+        store.drop(key)
         return None
-    svgs = []
-    for i in range(1, int(meta.get("pages", 0)) + 1):
-        svg_path = pdir / f"page-{i}.svg"
-        if not svg_path.exists():
-            return None
-        svgs.append(svg_path.read_text(encoding="utf-8"))
-    return {"pages": int(meta.get("pages", 0)), "pdf": pdf_path.read_bytes(), "svgs": svgs}
-
-
-def store(pdir: Path, key: str, pages: int, pdf: bytes, svgs: list[str]) -> None:
-    (pdir / "last.pdf").write_bytes(pdf)
-    for old in pdir.glob("page-*.svg"):
-        old.unlink(missing_ok=True)
-    for i, svg in enumerate(svgs, start=1):
-        (pdir / f"page-{i}.svg").write_text(svg, encoding="utf-8")
-    (pdir / "last.json").write_text(
-        json.dumps({"content_key": key, "pages": pages, "ts": time.time()}),
-        encoding="utf-8",
-    )
+    _remember(pdir, key)
+    return {"pages": entry["pages"], "pdf": pdf_bytes, "svgs": svg_texts, "meta": entry["extra"]}
+
+
+def previous_svgs(pdir: Path, digests: list[str]) -> dict[str, str]:
+    """SVGs for whichever of these page digests appear in the project's
+    recent outputs, keyed by digest; pages not found convert fresh."""
+    store = outputs.store(compile_root())
+    wanted = set(digests)
+    out: dict[str, str] = {}
+    for key in _recent(pdir):
+        entry = store.entries.get(key)
+        if entry is None:
+            continue
+        page_digests = entry["extra"].get("page_digests") or []
+        if len(page_digests) != len(entry["svgs"]):
+            continue  # no per-page digests (or a mismatch): nothing to match
+        for digest, blob in zip(page_digests, entry["svgs"], strict=True):
+            if digest in wanted and digest not in out:
+                try:
+                    out[digest] = store.read(blob).decode("utf-8")
+                except OSError:
+                    continue
+    return out
+
+
+def store(
+    pdir: Path, key: str, pages: int, pdf: bytes, svgs: list[str], extra: dict | None = None
+) -> None:
+    """extra rides along in the entry and comes back as load_cached's meta."""
+    outputs.store(compile_root()).put(key, pages, pdf, svgs, extra or {})
+    _remember(pdir, key)
 
 
 def dir_size_bytes(path: Path) -> int:
@@ -91,37 +138,131 @@ def dir_size_bytes(path: Path) -> int:
     return total
 
 
-def evict(keep: Path) -> int:
-    """LRU-evict project dirs beyond the caps; never the dir just used."""
+class _SizeIndex:
+    """Per-project byte totals and last-use times for one compile root, so
+    eviction and /v1/status never walk the whole cache. Rebuilt from disk at
+    startup (and whenever COMPILE_ROOT changes); after that each compile
+    re-measures only its own project dir. LRU order is a lazy heap: a stale
+    (used, name) entry is skipped when popped."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.sizes: dict[str, int] = {}
+        self.used: dict[str, float] = {}
+        self.total = 0
+        self._heap: list[tuple[float, str]] = []
+        for d in root.iterdir():
+            if d.is_dir() and not d.name.startswith("."):
+                try:
+                    used = d.stat().st_mtime
+                except OSError:
+                    continue
+                self.set(d.name, dir_size_bytes(d), used)
+
+    def set(self, name: str, size: int, used: float) -> None:
+        self.total += size - self.sizes.get(name, 0)
+        self.sizes[name] = size
+        self.used[name] = used
+        heapq.heappush(self._heap, (used, name))
+        if len(self._heap) > 4 * len(self.used) + 64:
+            self._heap = [(u, n) for n, u in self.used.items()]
+            heapq.heapify(self._heap)
+
+    def drop(self, name: str) -> None:
+        self.total -= self.sizes.pop(name, 0)
+        self.used.pop(name, None)
+
+    def pop_lru(self, keep: str) -> str | None:
+        """Least recently used live project other than keep, or None."""
+        held = []
+        found = None
+        while self._heap:
+            used, name = heapq.heappop(self._heap)
+            if self.used.get(name) != used:
+                continue  # superseded by a later use, or dropped
+            if name == keep:
+                held.append((used, name))
+                continue
+            found = name
+            break
+        for entry in held:
+            heapq.heappush(self._heap, entry)
+        return found
+
+
+_index: _SizeIndex | None = None
+
+
+def _size_index() -> _SizeIndex:
+    global _index
     root = compile_root()
-    dirs = [d for d in root.iterdir() if d.is_dir() and d != keep]
-    dirs.sort(key=lambda d: d.stat().st_mtime)  # oldest first
-    removed = 0
-    total_cap = _max_total_mb() * 1024 * 1024
+    if _index is None or _index.root != root:
+        _index = _SizeIndex(root)
+    return _index
+
+
+def rebuild_index() -> None:
+    """Startup: one full walk, the only one (projects and output store)."""
+    global _index
+    _index = _SizeIndex(compile_root())
+    outputs.rebuild(compile_root())
+
 
-    def over_budget() -> bool:
-        live = [d for d in root.iterdir() if d.is_dir()]
-        if len(live) > _max_projects():
-            return True
-        return dir_size_bytes(root) > total_cap
+def record(pdir: Path) -> None:
+    """Re-measure one project after it changed (compile, sync, store)."""
+    index = _size_index()
+    if pdir.is_dir():
+        index.set(pdir.name, dir_size_bytes(pdir), time.time())
+    else:
+        index.drop(pdir.name)
 
-    for d in dirs:
-        if not over_budget():
+
+def touch(pdir: Path) -> None:
+    """Mark a project used without re-measuring it (cache hit). A hit on
+    another project's outputs may have just created this dir; that one gets
+    measured."""
+    # The on-disk mtime keeps the LRU order for the next rebuild
+    # (Path.touch() raises on dirs).
+    os.utime(pdir)
+    index = _size_index()
+    if pdir.name in index.sizes:
+        index.set(pdir.name, index.sizes[pdir.name], time.time())
+    else:
+        record(pdir)
+
+
+def evict(keep: Path) -> int:
+    """LRU-evict project dirs beyond the caps; never the dir just used."""
+    index = _size_index()
+    total_cap = _max_total_mb() * 1024 * 1024
+    removed = 0
+    while len(index.sizes) > _max_projects() or index.total > total_cap:
+        name = index.pop_lru(keep=keep.name)
+        if name is None:
             break
-        shutil.rmtree(d, ignore_errors=True)
+        shutil.rmtree(index.root / name, ignore_errors=True)
+        index.drop(name)
         removed += 1
     return removed
 
 
 def clear_project(doc_id: str) -> bool:
     pdir = project_dir(doc_id)
+    _size_index().drop(doc_id)
     if pdir.exists():
         shutil.rmtree(pdir, ignore_errors=True)
         return True
     return False
 
 
+def warm_projects() -> list[str]:
+    """Doc ids with a project dir here, most recently used first."""
+    used = _size_index().used
+    return sorted(used, key=used.__getitem__, reverse=True)
+
+
 def stats() -> tuple[int, float]:
-    root = compile_root()
-    dirs = [d for d in root.iterdir() if d.is_dir()]
-    return len(dirs), round(dir_size_bytes(root) / (1024 * 1024), 1)
+    """(projects, MB on disk across projects and the output store)."""
+    index = _size_index()
+    total = index.total + outputs.store(compile_root()).total
+    return len(index.sizes), round(total / (1024 * 1024), 1)
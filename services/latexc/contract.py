@@ -1,17 +1,95 @@
-"""latexc wire contract v1. Imported by the backend (services.latexc.contract)
+"""latexc wire contract v2. Imported by the backend (services.latexc.contract)
 and by the service itself (latexc.contract inside the container). Bump
-CONTRACT_VERSION on breaking changes and update both deploys together."""
-from pydantic import BaseModel, Field
+CONTRACT_VERSION on breaking changes and update both deploys together.
 
-CONTRACT_VERSION = "1"
+v2 (delta sync): a CompileFile may carry only the sha256 of its bytes. The
+server uses its synced copy when it has that content, and answers 409 with
+{"detail": {"missing": [paths]}} when it does not; the client resends those
+with content. The server still accepts v1 bodies (content always present),
+and reports CONTRACT_VERSION on every response, so a client learns from its
+first reply whether hash-only files are understood."""
+import base64
+import hashlib
+import re
+from typing import Literal
+
+from pydantic import BaseModel, Field, model_validator
+
+CONTRACT_VERSION = "2"
+SUPPORTED_VERSIONS = ("1", "2")
 FILE_NAME_RE = r"^[A-Za-z0-9._-]{1,64}$"
 MAX_FILES = 16
 MAX_TOTAL_BYTES = 4_000_000
+TOKEN_RE = r"^@[A-Z]{1,24}@$"
+# A main file opts into a precompiled preamble format (formats.py) by placing
+# this after its static preamble; without the format it expands to \relax.
+FORMAT_MARKER = r"\csname endofdump\endcsname"
+
+# Who is waiting on a request, sent as X-Request-Priority: someone editing in
+# the Studio, or background generation. latexc queues interactive work first
+# and goes by the route when the header is absent.
+Priority = Literal["interactive", "batch"]
+
+# One-page fill probe the templates type into the log at end of document:
+# CVGFILL:<\pagetotal>/<\pagegoal>, both TeX pt dimens.
+FILL_PROBE_RE = re.compile(r"CVGFILL:([0-9.]+)pt/([0-9.]+)pt")
+
+
+def parse_fill_probe(log: str) -> tuple[float, float] | None:
+    """Raw (pagetotal, pagegoal) in pt from the CVGFILL probe line."""
+    m = FILL_PROBE_RE.search(log)
+    if not m:
+        return None
+    try:
+        return float(m.group(1)), float(m.group(2))
+    except ValueError:
+        return None
+
+
+def token_value(v: float) -> str:
+    """How a numeric token is spelled in the source (pt/cm figures)."""
+    return f"{round(v, 2):g}"
+
+
+def fill_tokens(
+    template: str, table: dict[str, tuple[float, float]], scale: float, fixed: dict[str, str]
+) -> str:
+    """Substitute the preamble tokens of a fit template: numeric ones from
+    their (offset, slope) at this font scale, then the fixed strings (paper).
+    Only the text before \\begin{document} is touched, so user content that
+    happens to spell a token survives. The backend renders its final source
+    through this same function, which keeps both sides byte-identical."""
+    head, sep, body = template.partition("\\begin{document}")
+    for tok, (offset, slope) in table.items():
+        head = head.replace(tok, token_value(offset + slope * scale))
+    for tok, value in fixed.items():
+        head = head.replace(tok, value)
+    return head + sep + body
+
+
+def sha256_hex(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()
+
+
+def file_sha256(f: "CompileFile") -> str:
+    """The file's content hash, stated or computed; ValueError on bad base64."""
+    if f.sha256 is not None:
+        return f.sha256
+    return sha256_hex(base64.b64decode(f.content_b64, validate=True))
 
 
 class CompileFile(BaseModel):
     path: str = Field(pattern=FILE_NAME_RE)
-    content_b64: str
+    content_b64: str | None = None
+    # v2: sha256 of the raw bytes. Alone, it stands for the server's synced
+    # copy; with content, the server checks it.
+    sha256: str | None = Field(default=None, pattern=r"^[0-9a-f]{64}$")
+
+    @model_validator(mode="after")
+    def _check_body(self) -> "CompileFile":
+        if self.content_b64 is None and self.sha256 is None:
+            raise ValueError(f"{self.path}: needs content_b64 or sha256")
+        return self
 
 
 class LatexCompileIn(BaseModel):
@@ -20,23 +98,137 @@ class LatexCompileIn(BaseModel):
     main: str = Field(default="main.tex", pattern=FILE_NAME_RE)
     files: list[CompileFile] = Field(min_length=1, max_length=MAX_FILES)
     want_svgs: bool = True
+    # Compile and report pages + the CVGFILL probe only: no pdfinfo/pdftocairo,
+    # no PDF, no SVGs, no log tail unless the compile failed. For attempts a
+    # fit search will discard.
+    measure_only: bool = False
+    want_pdf: bool = True
+    # The log tail comes back on failure; on success only when asked for.
+    want_log: bool = False
     timeout_s: int = Field(default=40, ge=5, le=60)
 
 
 class LatexCompileOut(BaseModel):
     ok: bool
+    # Set by v2+ servers; a reply without it comes from a v1 server.
+    version: str = "1"
     cache: str = "cold"  # hit | warm | cold
     pages: int = 0
     pdf_b64: str | None = None
     svgs: list[str] = Field(default_factory=list)
+    # Log facts parsed server-side (a hit returns the stored ones): raw CVGFILL
+    # (pagetotal, pagegoal) in pt and the last-page fill ratio when the source
+    # carries the probe, Overfull \hbox/\vbox warnings and the widest in pt.
+    probe: tuple[float, float] | None = None
+    fill: float | None = None
+    overfull: int = 0
+    overfull_pt: float = 0.0
     log_tail: str = ""
     error_line: str | None = None
     timings_ms: dict[str, int] = Field(default_factory=dict)
 
 
+class CompileFrame(BaseModel):
+    """One NDJSON line of POST /v1/compile/stream. In order: "status" (a
+    LatexCompileOut without pdf_b64/svgs, sent once the page count is known;
+    a failure carries its log here and nothing else follows but "done"; a
+    page conversion that fails later sends a second, failed status),
+    one "page" per page as soon as its SVG is ready (not necessarily in page
+    order), "pdf" when want_pdf, then "done" with the timings. A stream
+    that ends without "done" broke off mid-way."""
+    kind: Literal["status", "page", "pdf", "done"]
+    status: LatexCompileOut | None = None
+    page: int = 0  # 1-based
+    svg: str = ""
+    pdf_b64: str | None = None
+    timings_ms: dict[str, int] = Field(default_factory=dict)
+
+
+class FitLadder(BaseModel):
+    """The fit search's levers and thresholds, sent by the caller so both
+    engines keep one definition of "fits" (the backend's Typst renderer)."""
+    densities: list[str] = Field(min_length=1, max_length=8)
+    fill_min: float = Field(ge=0, le=1)
+    fill_target: float = Field(ge=0, le=1)
+    min_scale: float = Field(ge=0.5, le=2.0)
+    max_scale: float = Field(ge=0.5, le=2.0)
+    downscale_step: float = Field(gt=0, le=0.5)
+
+
+class LatexFitIn(BaseModel):
+    """One-page fit (or continuous trim) run next to the compiler.
+
+    template_b64 is the main file with numeric @TOKEN@ placeholders left in
+    its preamble (the text before \\begin{document}; the body is never
+    substituted). tokens[density][token] = (offset, slope): the token's value
+    at font scale s is offset + slope * s, spelled by token_value. The paper
+    token takes `paper` in fit mode; continuous mode measures on
+    `canvas_paper`, then recompiles on `trimmed_paper` with @HEIGHT@ set to
+    the measured content height + trim_extra_pt."""
+    doc_id: str = Field(pattern=r"^[A-Za-z0-9_-]{1,64}$")
+    engine: str = "xelatex"
+    main: str = Field(default="main.tex", pattern=FILE_NAME_RE)
+    template_b64: str
+    files: list[CompileFile] = Field(default_factory=list, max_length=MAX_FILES - 1)
+    tokens: dict[str, dict[str, tuple[float, float]]] = Field(min_length=1)
+    mode: Literal["fit", "continuous"] = "fit"
+    density: str = "normal"
+    font_scale: float = Field(default=1.0, ge=0.5, le=2.0)
+    ladder: FitLadder
+    paper_token: str = Field(default="@PAPER@", pattern=TOKEN_RE)
+    paper: str = "a4paper"
+    canvas_paper: str = ""
+    trimmed_paper: str = ""
+    trim_extra_pt: float = Field(default=0.0, ge=0, le=1000)
+    want_svgs: bool = True
+    want_log: bool = False
+    timeout_s: int = Field(default=40, ge=5, le=60)
+
+    @model_validator(mode="after")
+    def _check_tokens(self) -> "LatexFitIn":
+        missing = [d for d in (*self.ladder.densities, self.density) if d not in self.tokens]
+        if missing:
+            raise ValueError(f"no token table for density {missing[0]!r}")
+        for table in self.tokens.values():
+            for tok in table:
+                if not re.fullmatch(TOKEN_RE, tok):
+                    raise ValueError(f"bad token name {tok!r}")
+        if self.mode == "continuous" and not (self.canvas_paper and "@HEIGHT@" in self.trimmed_paper):
+            raise ValueError("continuous mode needs canvas_paper and a trimmed_paper with @HEIGHT@")
+        return self
+
+
+class FitAttempt(BaseModel):
+    density: str
+    font_scale: float
+    paper: str = ""
+    ok: bool = True
+    pages: int = 0
+    fill: float | None = None
+    ms: int = 0
+
+
+class LatexFitOut(LatexCompileOut):
+    """The chosen attempt's outputs (SVGs only for it) and log facts, plus
+    where the search landed. page_height_pt is set when a continuous page was
+    trimmed."""
+    density: str = ""
+    font_scale: float = 1.0
+    overflowed: bool = False
+    page_height_pt: float | None = None
+    attempts: list[FitAttempt] = Field(default_factory=list)
+
+
 class LatexStatus(BaseModel):
     ok: bool = True
     version: str = CONTRACT_VERSION
+    versions: list[str] = Field(default_factory=lambda: list(SUPPORTED_VERSIONS))
     uptime_s: int = 0
     projects: int = 0
     disk_mb: float = 0.0
+    # TeX slots in use and requests waiting for one (admission.py).
+    tex_busy: int = 0
+    tex_queued: int = 0
+    # Doc ids with warm state on this instance, most recent first; the
+    # backend's pool routes a doc to an instance that holds it.
+    warm_projects: list[str] = Field(default_factory=list)
@@ -0,0 +1,148 @@
+"""The one-page fit search, run next to the compiler so a re-fit is one
+request instead of one round trip per attempt.
+
+Pure: the caller hands in a compile callback (density, font scale, paper ->
+Attempt), so the ladder is testable without TeX. The ladder is the backend's
+texsvc fit loop moved here unchanged: overflow tightens density (dropping any
+font upscale first) and then shrinks the type toward the floor; underflow
+grows font_scale until the page reads full. Continuous mode measures on a
+tall canvas and recompiles once with the page trimmed to the content.
+"""
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from .contract import LatexFitIn, parse_fill_probe
+
+# A \pagegoal above this is maxdimen noise or the continuous measuring canvas,
+# not an A4 goal.
+_MAX_GOAL_PT = 10_000
+
+
+@dataclass
+class Attempt:
+    ok: bool
+    pages: int = 0
+    fill: float | None = None
+    total: float | None = None
+    density: str = ""
+    font_scale: float = 1.0
+    paper: str = ""
+    ms: int = 0
+    output: Any = None  # whatever the compile callback needs to serve it
+
+
+@dataclass
+class Search:
+    chosen: Attempt
+    overflowed: bool = False
+    page_height_pt: float | None = None
+    attempts: list[Attempt] = field(default_factory=list)
+
+
+Compile = Callable[[str, float, str], Awaitable[Attempt]]
+
+
+def fill_from_log(log: str) -> float | None:
+    """Last-page fill ratio from the CVGFILL probe, None when unusable."""
+    probe = parse_fill_probe(log)
+    if probe is None:
+        return None
+    total, goal = probe
+    if goal <= 0 or goal > _MAX_GOAL_PT:
+        return None
+    return min(1.0, total / goal)
+
+
+def total_from_log(log: str) -> float | None:
+    """Raw content height in pt; no goal guard, the measuring canvas goal is
+    deliberately huge."""
+    probe = parse_fill_probe(log)
+    return probe[0] if probe else None
+
+
+async def run(inp: LatexFitIn, compile_: Compile) -> Search:
+    attempts: list[Attempt] = []
+
+    async def attempt(density: str, scale: float, paper: str) -> Attempt:
+        res = await compile_(density, scale, paper)
+        res.density, res.font_scale, res.paper = density, scale, paper
+        attempts.append(res)
+        return res
+
+    if inp.mode == "continuous":
+        search = await _continuous(inp, attempt)
+    else:
+        search = await _fit(inp, attempt)
+    search.attempts = attempts
+    return search
+
+
+async def _continuous(inp: LatexFitIn, attempt: Compile) -> Search:
+    """Degenerate cases (probe lost, content past the canvas, trim-pass
+    failure) serve the measuring page, which is already laid out correctly,
+    just with trailing whitespace."""
+    first = await attempt(inp.density, inp.font_scale, inp.canvas_paper)
+    if not first.ok or first.pages > 1 or first.total is None:
+        return Search(first)
+    height = round(first.total + inp.trim_extra_pt, 2)
+    paper = inp.trimmed_paper.replace("@HEIGHT@", f"{height:.2f}")
+    second = await attempt(inp.density, inp.font_scale, paper)
+    if not second.ok or second.pages != 1:
+        return Search(first)
+    return Search(second, page_height_pt=height)
+
+
+async def _fit(inp: LatexFitIn, attempt: Compile) -> Search:
+    ladder = inp.ladder
+    densities = ladder.densities
+    d_idx = densities.index(inp.density) if inp.density in densities else 0
+    scale = inp.font_scale
+
+    async def at(s: float) -> Attempt:
+        return await attempt(densities[d_idx], s, inp.paper)
+
+    result = await at(scale)
+    if not result.ok:
+        return Search(result)
+
+    # ---- overflow: undo any upscale first, then tighten density ------------
+    while result.pages > 1 and scale > 1.0:
+        scale = max(1.0, round(scale * 0.92, 2))
+        result = await at(scale)
+        if not result.ok:
+            return Search(result)
+    while result.pages > 1 and d_idx + 1 < len(densities):
+        d_idx += 1
+        result = await at(scale)
+        if not result.ok:
+            return Search(result)
+    # ---- still over: shrink the type toward the readable floor -------------
+    while result.pages > 1 and scale > ladder.min_scale:
+        scale = max(ladder.min_scale, round(scale - ladder.downscale_step, 2))
+        result = await at(scale)
+        if not result.ok:
+            return Search(result)
+    if result.pages > 1:
+        return Search(result, overflowed=True)
+
+    # ---- underflow: grow the type until the page reads full ----------------
+    fill = result.fill
+    for _ in range(3):
+        if fill is None or fill >= ladder.fill_min or scale >= ladder.max_scale:
+            break
+        factor = min(ladder.fill_target / max(fill, 0.3), 1.35)
+        scale = min(ladder.max_scale, round(scale * factor, 2))
+        cand = await at(scale)
+        if not cand.ok:
+            break
+        if cand.pages > 1:
+            # overshot past one page: back off until it fits again
+            while cand.ok and cand.pages > 1 and scale > 1.0:
+                scale = max(1.0, round(scale - 0.06, 2))
+                cand = await at(scale)
+            if cand.ok and cand.pages == 1:
+                result = cand
+            break
+        result, fill = cand, cand.fill
+    return Search(result)
@@ -0,0 +1,125 @@
+"""Precompiled formats for a document's static preamble (mylatexformat).
+
+A main file opts in by placing contract.FORMAT_MARKER after the part of its
+preamble that never changes: class, packages, fixed colours. Everything
+above the marker is hashed and dumped as `$COMPILE_ROOT/.formats/
+pre-<hash>.fmt`; every compile with that header then starts from the dump
+instead of loading the packages again. Without the format the marker
+expands to \\relax, so the same source compiles both ways.
+
+Prewarm dumps the headers the image ships (`headers/`, copied from
+templates/latex). Any other header is dumped the second time it shows up,
+so a one-off hand-edited preamble never pays for a dump.
+
+XeTeX cannot dump OpenType fonts, so font selection (\\setmainfont,
+\\newfontfamily) has to stay below the marker. A header that will not dump,
+or a format xelatex refuses to load while the same source compiles without
+it, is marked failed and compiles take the normal path. The dump runs the
+header's TeX with the compile's hardening, in a private dir.
+"""
+import hashlib
+import logging
+import os
+import time
+from pathlib import Path
+
+from . import admission, cache, runner
+from .contract import FORMAT_MARKER as MARKER
+
+log = logging.getLogger("latexc")
+_locks = admission.LockRegistry()
+
+
+def enabled() -> bool:
+    return os.environ.get("LATEXC_FORMATS", "1") != "0"
+
+
+def formats_dir() -> Path:
+    d = cache.compile_root() / ".formats"
+    d.mkdir(exist_ok=True)
+    return d
+
+
+def header(source: str) -> str | None:
+    """The static preamble above the marker, or None without one."""
+    head, found, _ = source.partition(MARKER)
+    return head if found else None
+
+
+def name_for(head: str) -> str:
+    return "pre-" + hashlib.sha256(head.encode("utf-8")).hexdigest()[:16]
+
+
+def _max_formats() -> int:
+    return int(os.environ.get("LATEXC_MAX_FORMATS", "8"))
+
+
+def bundled() -> list[str]:
+    """Static preambles shipped with the image."""
+    shipped = sorted((Path(__file__).parent / "headers").glob("*.tex"))
+    return [p.read_text(encoding="utf-8") for p in shipped]
+
+
+async def ensure(
+    head: str,
+    limit: admission.TexSlots,
+    timeout_s: int,
+    now: bool = False,
+    ticket: admission.Ticket = admission.UNLIMITED,
+    shed: bool = True,
+) -> Path | None:
+    """The format for this header; None when it is not built yet (first
+    sighting, unless now) or cannot be. A dump a request triggers waits on
+    that request's ticket (queue bound, priority, deadline); rebuilds at
+    startup pass none."""
+    fdir = formats_dir()
+    name = name_for(head)
+    fmt = fdir / f"{name}.fmt"
+    src = fdir / f"{name}.tex"
+    async with _locks.hold(name, ticket):
+        if fmt.exists():
+            os.utime(fmt)  # LRU order for _prune
+            return fmt
+        if (fdir / f"{name}.failed").exists():
+            return None
+        seen = src.exists()
+        src.write_text(head + MARKER + "\n\\begin{document}\\end{document}\n", encoding="utf-8")
+        if not (seen or now):
+            _prune(fdir, keep=fmt)
+            return None
+        t0 = time.time()
+        async with limit.slot(ticket, shed):
+            ok, out = await runner.build_format(fdir, name, timeout_s)
+        log.info("format %s built ok=%s in %.1fs", name, ok, time.time() - t0)
+        if not ok:
+            (fdir / f"{name}.failed").write_text(out[-runner.LOG_TAIL_BYTES:], encoding="utf-8")
+            return None
+    _prune(fdir, keep=fmt)
+    return fmt
+
+
+def _prune(fdir: Path, keep: Path) -> None:
+    """Drop the least recently used formats beyond LATEXC_MAX_FORMATS (a few
+    MB each), and the oldest sightings beyond a multiple of it. The dir
+    holds a few dozen files at most, so listing it is cheap."""
+    for pattern, cap in (("pre-*.fmt", _max_formats()), ("pre-*.tex", 8 * _max_formats())):
+        files = sorted(fdir.glob(pattern), key=lambda p: p.stat().st_mtime)
+        for old in files[: max(0, len(files) - cap)]:
+            if old.stem != keep.stem:
+                old.unlink(missing_ok=True)
+
+
+def reject(fmt: Path) -> None:
+    """xelatex would not load it: stop offering it."""
+    fmt.with_suffix(".failed").write_text("format did not load\n", encoding="utf-8")
+    fmt.unlink(missing_ok=True)
+
+
+async def rebuild(limit: admission.TexSlots, timeout_s: int, extra: tuple[str, ...] = ()) -> int:
+    """Prewarm: dump the bundled headers and extra. Returns how many formats
+    are ready."""
+    ready = 0
+    for head in dict.fromkeys([*bundled(), *extra]):
+        if await ensure(head, limit, timeout_s, now=True, shed=False):
+            ready += 1
+    return ready
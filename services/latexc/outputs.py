@@ -0,0 +1,196 @@
+"""Content-addressed output store shared by every project.
+
+An entry maps a content key (cache.content_key / cache.fit_key, neither of
+which includes the doc id) to the outputs it produced: page count, the PDF,
+one SVG per page and the caller's extra metadata. The bytes live in blobs
+named by their own sha256, so two entries that share a PDF or a page SVG
+(an undo, a fit rung revisited, two docs with the same source) store it
+once. Layout under `$COMPILE_ROOT/.outputs/` (the dot keeps it out of the
+doc-id namespace):
+
+    entries/<key>.json    {"pages", "pdf", "svgs", "extra"}
+    blobs/<aa>/<sha256>   raw bytes
+
+Entries are evicted least-recently-used against a byte budget
+(LATEXC_OUTPUT_CACHE_MB); a blob goes when no entry references it. Sizes,
+refcounts and last-use times live in memory, rebuilt from disk at startup
+like the project size index. Every operation here is synchronous, so on
+the event loop each one is atomic with respect to other requests.
+"""
+import hashlib
+import heapq
+import json
+import os
+import time
+from pathlib import Path
+
+DIR_NAME = ".outputs"
+
+
+def _budget_bytes() -> int:
+    return int(os.environ.get("LATEXC_OUTPUT_CACHE_MB", "256")) * 1024 * 1024
+
+
+def _entry_name(key: str) -> str:
+    return key.replace(":", "-") + ".json"
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class _Store:
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.entries: dict[str, dict] = {}
+        self.used: dict[str, float] = {}
+        self.refs: dict[str, int] = {}
+        self.sizes: dict[str, int] = {}
+        self.total = 0
+        self._heap: list[tuple[float, str]] = []
+        self._load()
+
+    # ---- startup ------------------------------------------------------------
+    def _load(self) -> None:
+        entries = self.root / "entries"
+        if entries.is_dir():
+            for path in entries.glob("*.json"):
+                try:
+                    entry = json.loads(path.read_text(encoding="utf-8"))
+                    key = entry["key"]
+                    used = path.stat().st_mtime
+                except (ValueError, OSError, KeyError, TypeError):
+                    path.unlink(missing_ok=True)
+                    continue
+                self._add(key, entry, used)
+        blobs = self.root / "blobs"
+        if blobs.is_dir():
+            for path in blobs.glob("*/*"):
+                if path.name not in self.refs:  # orphan of an interrupted put
+                    path.unlink(missing_ok=True)
+
+    # ---- bookkeeping --------------------------------------------------------
+    def _blob_path(self, digest: str) -> Path:
+        return self.root / "blobs" / digest[:2] / digest
+
+    def _add(self, key: str, entry: dict, used: float) -> None:
+        for digest in [entry["pdf"], *entry["svgs"]]:
+            if digest not in self.refs:
+                try:
+                    size = self._blob_path(digest).stat().st_size
+                except OSError:
+                    size = 0
+                self.sizes[digest] = size
+                self.total += size
+            self.refs[digest] = self.refs.get(digest, 0) + 1
+        self.entries[key] = entry
+        self._bump(key, used)
+
+    def _bump(self, key: str, used: float) -> None:
+        self.used[key] = used
+        heapq.heappush(self._heap, (used, key))
+        if len(self._heap) > 4 * len(self.used) + 64:
+            self._heap = [(u, k) for k, u in self.used.items()]
+            heapq.heapify(self._heap)
+
+    def drop(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        self.used.pop(key, None)
+        if entry is None:
+            return
+        (self.root / "entries" / _entry_name(key)).unlink(missing_ok=True)
+        self._release(entry)
+
+    def _release(self, entry: dict) -> None:
+        for digest in [entry["pdf"], *entry["svgs"]]:
+            self.refs[digest] -= 1
+            if self.refs[digest] <= 0:
+                del self.refs[digest]
+                self.total -= self.sizes.pop(digest, 0)
+                self._blob_path(digest).unlink(missing_ok=True)
+
+    def _pop_lru(self, keep: str) -> str | None:
+        held = []
+        found = None
+        while self._heap:
+            used, key = heapq.heappop(self._heap)
+            if self.used.get(key) != used:
+                continue
+            if key == keep:
+                held.append((used, key))
+                continue
+            found = key
+            break
+        for item in held:
+            heapq.heappush(self._heap, item)
+        return found
+
+    # ---- API ----------------------------------------------------------------
+    def get(self, key: str) -> dict | None:
+        entry = self.entries.get(key)
+        if entry is not None:
+            try:
+                os.utime(self.root / "entries" / _entry_name(key))
+            except OSError:  # removed behind the index: compile fresh
+                self.drop(key)
+                return None
+            self._bump(key, time.time())
+        return entry
+
+    def read(self, digest: str) -> bytes:
+        return self._blob_path(digest).read_bytes()
+
+    def _put_blob(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if digest not in self.refs or not path.exists():
+            _write_atomic(path, data)
+        return digest
+
+    def put(self, key: str, pages: int, pdf: bytes, svgs: list[str], extra: dict) -> None:
+        entry = {
+            "key": key,
+            "pages": pages,
+            "pdf": self._put_blob(pdf),
+            "svgs": [self._put_blob(svg.encode("utf-8")) for svg in svgs],
+            "extra": extra,
+        }
+        # Take the new references before releasing the old entry's, so blobs
+        # both versions share are never deleted in between.
+        previous = self.entries.pop(key, None)
+        self.used.pop(key, None)
+        self._add(key, entry, time.time())
+        if previous is not None:
+            self._release(previous)
+        _write_atomic(self.root / "entries" / _entry_name(key), json.dumps(entry).encode("utf-8"))
+        self.evict(keep=key)
+
+    def evict(self, keep: str) -> int:
+        budget = _budget_bytes()
+        removed = 0
+        while self.total > budget:
+            key = self._pop_lru(keep)
+            if key is None:
+                break
+            self.drop(key)
+            removed += 1
+        return removed
+
+
+_store: _Store | None = None
+
+
+def store(compile_root: Path) -> _Store:
+    global _store
+    root = compile_root / DIR_NAME
+    if _store is None or _store.root != root:
+        _store = _Store(root)
+    return _store
+
+
+def rebuild(compile_root: Path) -> None:
+    global _store
+    _store = _Store(compile_root / DIR_NAME)
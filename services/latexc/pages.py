@@ -0,0 +1,96 @@
+"""In-process PDF page inspection: the page count without a pdfinfo
+subprocess, and a per-page digest so a recompile only converts the pages
+whose drawing actually changed.
+
+A page digest covers what pdftocairo renders: the page box, the content
+stream(s) and every resource they reach (fonts, XObjects, graphics states),
+resolved recursively. Font subsets are the one deliberate blind spot: adding
+a glyph anywhere in the document renames every subset (ABCDEF+Font) and
+rewrites the embedded font program, width tables and bounding box, but a page whose
+content stream is unchanged still draws the same glyphs, so subset tags,
+font programs and width arrays are left out. Encodings stay in: they map the
+content stream's codes to glyphs.
+"""
+import hashlib
+import io
+import re
+
+from pypdf import PdfReader
+from pypdf.errors import PdfReadError
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+_SUBSET_TAG = re.compile(rb"^/[A-Z]{6}\+")
+_SKIP_KEYS = {
+    "/Parent", "/FontFile", "/FontFile2", "/FontFile3", "/CIDSet",
+    "/W", "/W2", "/Widths", "/FirstChar", "/LastChar", "/ToUnicode",
+    "/FontBBox", "/CharSet", "/MaxWidth", "/AvgWidth",
+}
+_MAX_DEPTH = 32
+
+
+def _reader(pdf: bytes) -> PdfReader | None:
+    try:
+        return PdfReader(io.BytesIO(pdf))
+    except (PdfReadError, ValueError, OSError):
+        return None
+
+
+def page_count(pdf: bytes) -> int | None:
+    reader = _reader(pdf)
+    if reader is None:
+        return None
+    try:
+        return len(reader.pages)
+    except (PdfReadError, ValueError, KeyError):
+        return None
+
+
+def _feed(h, obj, depth: int, seen: set) -> None:
+    if depth > _MAX_DEPTH:
+        return
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        if ref in seen:  # shared resource already hashed on this page
+            h.update(b"R")
+            return
+        seen.add(ref)
+        obj = obj.get_object()
+    if isinstance(obj, StreamObject):
+        h.update(b"S")
+        h.update(obj.get_data())
+        # the stream's own dict (Resources of a form XObject, BBox, ...)
+    if isinstance(obj, DictionaryObject):
+        h.update(b"{")
+        for key in sorted(obj):
+            if key in _SKIP_KEYS or key in ("/Length", "/Filter", "/DecodeParms"):
+                continue
+            h.update(key.encode())
+            _feed(h, obj.raw_get(key), depth + 1, seen)
+        h.update(b"}")
+    elif isinstance(obj, ArrayObject):
+        h.update(b"[")
+        for item in obj:
+            _feed(h, item, depth + 1, seen)
+        h.update(b"]")
+    elif not isinstance(obj, StreamObject):
+        h.update(_SUBSET_TAG.sub(b"/", str(obj).encode()))
+
+
+def page_digests(pdf: bytes) -> list[str] | None:
+    """One digest per page, or None when the PDF will not parse (convert
+    everything then)."""
+    reader = _reader(pdf)
+    if reader is None:
+        return None
+    digests = []
+    try:
+        for page in reader.pages:
+            h = hashlib.sha256()
+            for key in ("/MediaBox", "/CropBox", "/Rotate", "/Contents", "/Resources"):
+                if key in page:
+                    h.update(key.encode())
+                    _feed(h, page.raw_get(key), 0, set())
+            digests.append(h.hexdigest())
+    except (PdfReadError, ValueError, KeyError, TypeError):
+        return None
+    return digests
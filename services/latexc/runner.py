@@ -1,15 +1,20 @@
 """latexmk/pdftocairo subprocess layer. Hardening lives here: no shell
-escape, paranoid openin/openout, per-project TEXMF state, hard timeout with
-process-group kill, capped log tails."""
+escape, paranoid openin/openout, hard timeout with process-group kill,
+capped log tails. Font and TEXMF caches come from one read-only layer built
+with the image (build_tex_cache), so a project dir holds only its sources
+and latexmk's aux/fdb state."""
 import asyncio
 import base64
 import json
 import os
 import re
+import shutil
 import signal
+import tempfile
+from collections.abc import Callable
 from pathlib import Path
 
-from .contract import MAX_TOTAL_BYTES, CompileFile
+from .contract import MAX_TOTAL_BYTES, CompileFile, sha256_hex
 
 LOG_TAIL_BYTES = 20_000
 
@@ -18,15 +23,68 @@ class CompileError(Exception):
     pass
 
 
+class MissingFiles(CompileError):
+    """Hash-only files (contract v2) this project has no copy of."""
+
+    def __init__(self, paths: list[str]) -> None:
+        super().__init__(f"missing files: {', '.join(paths)}")
+        self.paths = paths
+
+
+def _manifest(pdir: Path) -> dict[str, dict]:
+    """User files as last synced: name -> {sha256, size, mtime_ns}. A v1
+    manifest (bare name list) knows no hashes."""
+    try:
+        data = json.loads((pdir / "manifest.json").read_text(encoding="utf-8"))
+    except (ValueError, OSError):
+        return {}
+    if isinstance(data, list):
+        return {name: {} for name in data}
+    return data
+
+
+def _unchanged(pdir: Path, name: str, entry: dict, sha256: str) -> bool:
+    """The synced copy still holds these bytes: same hash when synced, and
+    the file untouched since (a document may \\openout over its own files)."""
+    if entry.get("sha256") != sha256:
+        return False
+    try:
+        st = (pdir / name).stat()
+    except OSError:
+        return False
+    return st.st_size == entry.get("size") and st.st_mtime_ns == entry.get("mtime_ns")
+
+
+def missing_files(pdir: Path, files: list[CompileFile]) -> list[str]:
+    known = _manifest(pdir)
+    return [
+        f.path for f in files
+        if f.content_b64 is None and not _unchanged(pdir, f.path, known.get(f.path, {}), f.sha256)
+    ]
+
+
 def sync_files(pdir: Path, files: list[CompileFile]) -> None:
     """Write the request's files; delete user files from previous requests
-    that were not re-sent (aux/fdb/latexmk state stays, that IS the cache)."""
-    pdir.mkdir(parents=True, exist_ok=True)
-    total = 0
-    names: list[str] = []
+    that were not re-sent (aux/fdb/latexmk state stays, that IS the cache).
+    A file whose synced copy already holds its bytes is not rewritten, so its
+    mtime only moves when its content does."""
     for f in files:
         if "/" in f.path or "\\" in f.path or ".." in f.path:
             raise CompileError(f"illegal path: {f.path}")
+    pdir.mkdir(parents=True, exist_ok=True)
+    missing = missing_files(pdir, files)
+    if missing:
+        raise MissingFiles(missing)
+    known = _manifest(pdir)
+    total = 0
+    synced: dict[str, dict] = {}
+    for f in files:
+        if f.content_b64 is None:
+            synced[f.path] = known[f.path]
+            total += known[f.path]["size"]
+            if total > MAX_TOTAL_BYTES:
+                raise CompileError("files too large")
+            continue
         try:
             raw = base64.b64decode(f.content_b64, validate=True)
         except Exception as exc:
@@ -34,18 +92,18 @@ def sync_files(pdir: Path, files: list[CompileFile]) -> None:
         total += len(raw)
         if total > MAX_TOTAL_BYTES:
             raise CompileError("files too large")
-        (pdir / f.path).write_bytes(raw)
-        names.append(f.path)
+        digest = sha256_hex(raw)
+        if f.sha256 is not None and f.sha256 != digest:
+            raise CompileError(f"sha256 mismatch for {f.path}")
+        path = pdir / f.path
+        if not _unchanged(pdir, f.path, known.get(f.path, {}), digest):
+            path.write_bytes(raw)
+        st = path.stat()
+        synced[f.path] = {"sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
 
-    manifest = pdir / "manifest.json"
-    if manifest.exists():
-        try:
-            previous = json.loads(manifest.read_text(encoding="utf-8"))
-        except (ValueError, OSError):
-            previous = []
-        for stale in set(previous) - set(names):
-            (pdir / stale).unlink(missing_ok=True)
-    manifest.write_text(json.dumps(sorted(names)), encoding="utf-8")
+    for stale in set(known) - set(synced):
+        (pdir / stale).unlink(missing_ok=True)
+    (pdir / "manifest.json").write_text(json.dumps(synced, sort_keys=True), encoding="utf-8")
 
 
 async def _run(cmd: list[str], cwd: Path, env: dict, timeout_s: int) -> tuple[int, str]:
@@ -69,27 +127,86 @@ async def _run(cmd: list[str], cwd: Path, env: dict, timeout_s: int) -> tuple[in
     return proc.returncode or 0, out.decode("utf-8", errors="replace")
 
 
+def tex_cache_dir() -> Path:
+    return Path(os.environ.get("LATEXC_TEX_CACHE", "/srv/texcache"))
+
+
+def tex_cache_ready() -> bool:
+    return (tex_cache_dir() / ".ready").exists()
+
+
+def _cache_env(root: Path) -> dict:
+    return {
+        "XDG_CACHE_HOME": str(root / "xdg"),  # fontconfig's user cache
+        "TEXMFVAR": str(root / "texmf-var"),
+        "TEXMFCONFIG": str(root / "texmf-cfg"),
+    }
+
+
 def _tex_env(pdir: Path) -> dict:
     env = dict(os.environ)
-    env.update(
-        {
-            "HOME": str(pdir),
-            "TEXMFVAR": str(pdir / ".texmf-var"),
-            "TEXMFCONFIG": str(pdir / ".texmf-cfg"),
-            "TEXMFHOME": str(pdir / ".texmf-home"),
-            "openout_any": "p",
-            "openin_any": "p",
-        }
-    )
+    env.update({"HOME": str(pdir), "openout_any": "p", "openin_any": "p"})
+    if tex_cache_ready():
+        shared = _cache_env(tex_cache_dir())
+        env.update(
+            {
+                "XDG_CACHE_HOME": shared["XDG_CACHE_HOME"],
+                # Searched ahead of TEXMFVAR; the project's own var tree only
+                # fills if a doc needs something the probe did not generate.
+                "TEXMFAUXTREES": shared["TEXMFVAR"] + ",",
+                "TEXMFCONFIG": shared["TEXMFCONFIG"],
+                "TEXMFVAR": str(pdir / ".texmf-var"),
+                "TEXMFHOME": str(pdir / ".texmf-home"),
+            }
+        )
+    else:
+        env.update(
+            {
+                "TEXMFVAR": str(pdir / ".texmf-var"),
+                "TEXMFCONFIG": str(pdir / ".texmf-cfg"),
+                "TEXMFHOME": str(pdir / ".texmf-home"),
+            }
+        )
     return env
 
 
+async def build_tex_cache(probe: str, timeout_s: int = 300) -> tuple[bool, str]:
+    """Populate the shared layer once, writable: fontconfig's cache of every
+    installed font (IBM Plex included) and whatever TEXMFVAR artifacts a
+    probe compile generates. The Dockerfile runs this and then drops write
+    permission; compiles only ever read it."""
+    root = tex_cache_dir()
+    work = root / "probe"
+    try:
+        work.mkdir(parents=True, exist_ok=True)
+    except OSError as exc:
+        return False, str(exc)
+    env = {**os.environ, "HOME": str(work), **_cache_env(root)}
+    try:
+        code, out = await _run(["fc-cache", "-f"], work, env, timeout_s)
+        if code != 0:
+            return False, f"fc-cache failed: {out[:300]}"
+        (work / "main.tex").write_text(probe, encoding="utf-8")
+        code, out = await _run(_latexmk_cmd("main.tex"), work, env, timeout_s)
+        if code != 0:
+            return False, f"probe compile failed: {first_error_line(out) or out[-300:]}"
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    (root / ".ready").write_text("", encoding="utf-8")
+    return True, ""
+
+
 def log_tail(pdir: Path, main: str, fallback: str) -> str:
+    """The last LOG_TAIL_BYTES of the TeX log, read from the end; the
+    latexmk output when there is no log."""
     log = pdir / (Path(main).stem + ".log")
-    if log.exists():
-        data = log.read_bytes()[-LOG_TAIL_BYTES:]
-        return data.decode("utf-8", errors="replace")
-    return fallback[-LOG_TAIL_BYTES:]
+    try:
+        with log.open("rb") as f:
+            f.seek(max(0, f.seek(0, os.SEEK_END) - LOG_TAIL_BYTES))
+            data = f.read()
+    except OSError:
+        return fallback[-LOG_TAIL_BYTES:]
+    return data.decode("utf-8", errors="replace")
 
 
 def first_error_line(log: str) -> str | None:
@@ -101,11 +218,13 @@ def first_error_line(log: str) -> str | None:
     return (m.group(1) or m.group(2)).strip()[:300]
 
 
-async def compile_latex(pdir: Path, main: str, timeout_s: int) -> tuple[bool, str]:
-    """Run latexmk -xelatex in the project dir. Aux files persist on purpose."""
-    cmd = [
+def _latexmk_cmd(main: str, fmt: Path | None = None) -> list[str]:
+    engine = ["-xelatex"]
+    if fmt is not None:
+        engine.append(f"-xelatex=xelatex %O -fmt={fmt.stem} %S")
+    return [
         "latexmk",
-        "-xelatex",
+        *engine,
         "-interaction=nonstopmode",
         "-halt-on-error",
         "-file-line-error",
@@ -116,10 +235,76 @@ async def compile_latex(pdir: Path, main: str, timeout_s: int) -> tuple[bool, st
         "-g",
         main,
     ]
-    code, out = await _run(cmd, pdir, _tex_env(pdir), timeout_s)
+
+
+async def compile_latex(
+    pdir: Path, main: str, timeout_s: int, fmt: Path | None = None
+) -> tuple[bool, str]:
+    """Run latexmk -xelatex in the project dir, on a precompiled format when
+    given one. Aux files persist on purpose."""
+    env = _tex_env(pdir)
+    if fmt is not None:
+        env["TEXFORMATS"] = f"{fmt.parent}:"  # trailing ':' keeps the default path
+    code, out = await _run(_latexmk_cmd(main, fmt), pdir, env, timeout_s)
     return code == 0, out
 
 
+_FORMAT_LOAD_RE = re.compile(
+    r"Fatal format file error|I can't find the format file|^---! .+ (?:was written by|doesn't match)",
+    re.MULTILINE,
+)
+
+
+def format_unusable(out: str) -> bool:
+    """xelatex could not load the format (engine mismatch, truncated file):
+    its own load-failure messages, not anything a document can print."""
+    return _FORMAT_LOAD_RE.search(out) is not None
+
+
+async def build_format(fdir: Path, name: str, timeout_s: int) -> tuple[bool, str]:
+    """Dump fdir/<name>.fmt from fdir/<name>.tex with mylatexformat: the
+    preamble up to the endofdump marker, packages loaded, saved as a format.
+    The header is user text, so it runs hardened like a compile and in a
+    private dir: the finished dump is moved in, and whatever the header
+    \\openouts never lands next to the other formats."""
+    cmd = [
+        "xelatex", "-ini", "-interaction=nonstopmode", "-halt-on-error",
+        "-no-shell-escape", f"-jobname={name}", "&xelatex", "mylatexformat.ltx", f"{name}.tex",
+    ]
+    try:
+        work = Path(tempfile.mkdtemp(prefix=f".build-{name}-", dir=fdir))
+    except OSError as exc:  # optional speed-up: never fail the compile over it
+        return False, str(exc)
+    try:
+        shutil.copyfile(fdir / f"{name}.tex", work / f"{name}.tex")
+        code, out = await _run(cmd, work, _tex_env(work), timeout_s)
+        built = work / f"{name}.fmt"
+        if code != 0 or not built.exists():
+            return False, out
+        os.replace(built, fdir / f"{name}.fmt")
+        return True, out
+    except OSError as exc:
+        return False, str(exc)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def log_pages(log: str) -> int | None:
+    """Page count from TeX's closing "Output written on main.pdf (N pages)"
+    line: spares the pdfinfo subprocess when only the count is wanted."""
+    m = re.search(r"^Output written on \S+ \((\d+) pages?", log, re.MULTILINE)
+    return int(m.group(1)) if m else None
+
+
+_OVERFULL_RE = re.compile(r"^Overfull \\[hv]box \(([0-9.]+)pt too", re.MULTILINE)
+
+
+def log_overfull(log: str) -> tuple[int, float]:
+    """(count, widest overflow in pt) of the Overfull \\hbox/\\vbox warnings."""
+    widths = [float(w) for w in _OVERFULL_RE.findall(log)]
+    return len(widths), max(widths, default=0.0)
+
+
 async def pdf_pages(pdir: Path, pdf_name: str) -> int:
     code, out = await _run(["pdfinfo", pdf_name], pdir, _tex_env(pdir), 20)
     if code != 0:
@@ -130,15 +315,31 @@ async def pdf_pages(pdir: Path, pdf_name: str) -> int:
     return int(m.group(1))
 
 
-async def pdf_to_svgs(pdir: Path, pdf_name: str, pages: int) -> list[str]:
-    svgs: list[str] = []
-    for n in range(1, pages + 1):
+async def pdf_to_svgs(
+    pdir: Path,
+    pdf_name: str,
+    pages: list[int],
+    limit: asyncio.Semaphore,
+    on_page: Callable[[int, str], None] | None = None,
+) -> dict[int, str]:
+    """Convert the given 1-based pages, one pdftocairo per page, concurrently
+    up to `limit` (shared across requests: it is the CPU budget). on_page
+    sees each page as soon as it is converted."""
+
+    async def one(n: int) -> tuple[int, str]:
         out_name = f"page-{n}.svg"
-        code, out = await _run(
-            ["pdftocairo", "-svg", "-f", str(n), "-l", str(n), pdf_name, out_name],
-            pdir, _tex_env(pdir), 30,
-        )
+        async with limit:
+            code, out = await _run(
+                ["pdftocairo", "-svg", "-f", str(n), "-l", str(n), pdf_name, out_name],
+                pdir, _tex_env(pdir), 30,
+            )
         if code != 0:
             raise CompileError(f"pdftocairo failed on page {n}: {out[:200]}")
-        svgs.append((pdir / out_name).read_text(encoding="utf-8"))
-    return svgs
+        path = pdir / out_name
+        svg = path.read_text(encoding="utf-8")
+        path.unlink()  # served from the output store from here on
+        if on_page is not None:
+            on_page(n, svg)
+        return n, svg
+
+    return dict(await asyncio.gather(*(one(n) for n in pages)))
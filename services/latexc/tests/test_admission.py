@@ -0,0 +1,150 @@
+"""Admission control on its own: no TeX involved, so these also run outside
+the container (PYTHONPATH=services python -m pytest
+services/latexc/tests/test_admission.py)."""
+import asyncio
+import time
+
+import pytest
+from latexc import admission
+from latexc.admission import BATCH, INTERACTIVE, Overloaded, Ticket
+
+
+def _ticket(priority: int, timeout_s: float = 10) -> Ticket:
+    return Ticket(priority, time.monotonic() + timeout_s)
+
+
+async def _run(slots: admission.TexSlots, log: list, name: str, ticket: Ticket, hold_s: float = 0.05):
+    try:
+        async with slots.slot(ticket):
+            log.append(name)
+            await asyncio.sleep(hold_s)
+    except Overloaded as exc:
+        log.append(("refused", name, exc.retry_after > 0))
+
+
+async def _start(*coros) -> list[asyncio.Task]:
+    """Start each in turn so they queue in this order."""
+    tasks = []
+    for coro in coros:
+        tasks.append(asyncio.create_task(coro))
+        await asyncio.sleep(0.005)
+    return tasks
+
+
+async def test_interactive_runs_before_batch(monkeypatch):
+    monkeypatch.setenv("LATEXC_MAX_QUEUE", "8")
+    slots, log = admission.TexSlots(1), []
+    await asyncio.gather(*await _start(
+        _run(slots, log, "first", _ticket(INTERACTIVE)),
+        _run(slots, log, "fit", _ticket(BATCH)),
+        _run(slots, log, "edit", _ticket(INTERACTIVE)),
+    ))
+    assert log == ["first", "edit", "fit"]
+    assert slots.busy == 0 and slots.queued == 0
+
+
+async def test_full_queue_sheds_batch_then_refuses(monkeypatch):
+    monkeypatch.setenv("LATEXC_MAX_QUEUE", "1")
+    slots, log = admission.TexSlots(1), []
+    await asyncio.gather(*await _start(
+        _run(slots, log, "first", _ticket(INTERACTIVE)),
+        _run(slots, log, "fit", _ticket(BATCH)),
+        _run(slots, log, "edit", _ticket(INTERACTIVE)),  # takes the fit's place
+        _run(slots, log, "edit2", _ticket(INTERACTIVE)),  # nothing left to shed
+    ))
+    assert ("refused", "fit", True) in log
+    assert ("refused", "edit2", True) in log
+    assert [n for n in log if isinstance(n, str)] == ["first", "edit"]
+    assert slots.busy == 0 and slots.queued == 0
+
+
+async def test_expired_deadline_is_dropped_from_the_queue():
+    slots, log = admission.TexSlots(1), []
+    await asyncio.gather(*await _start(
+        _run(slots, log, "first", _ticket(INTERACTIVE), hold_s=0.2),
+        _run(slots, log, "impatient", _ticket(INTERACTIVE, timeout_s=0.05)),
+    ))
+    assert log == ["first", ("refused", "impatient", True)]
+    with pytest.raises(Overloaded):
+        async with slots.slot(_ticket(INTERACTIVE, timeout_s=-1)):
+            pass
+    assert slots.busy == 0 and slots.queued == 0
+
+
+def test_ticket_reads_the_timeout_header(monkeypatch):
+    monkeypatch.setenv("LATEXC_REQUEST_TIMEOUT_S", "30")
+    assert 29 < Ticket.for_request(BATCH, None).remaining() <= 30
+    assert 4 < Ticket.for_request(BATCH, "5").remaining() <= 5
+    assert 29 < Ticket.for_request(BATCH, "soon").remaining() <= 30
+
+
+def test_callers_priority_wins_over_the_routes():
+    assert Ticket.for_request(BATCH, None, "interactive").priority == INTERACTIVE
+    assert Ticket.for_request(INTERACTIVE, None, "batch").priority == BATCH
+    assert Ticket.for_request(BATCH, None, None).priority == BATCH
+    assert Ticket.for_request(BATCH, None, "urgent").priority == BATCH
+
+
+async def test_format_dump_queues_on_the_requests_ticket(tmp_path, monkeypatch):
+    from latexc import formats, runner
+
+    monkeypatch.setenv("COMPILE_ROOT", str(tmp_path))
+    monkeypatch.setenv("LATEXC_MAX_QUEUE", "0")
+    built = []
+
+    async def build_format(fdir, name, timeout_s):
+        built.append(name)
+        (fdir / f"{name}.fmt").write_bytes(b"fmt")
+        return True, ""
+
+    monkeypatch.setattr(runner, "build_format", build_format)
+    head = "\\documentclass{article}\n"
+    slots = admission.TexSlots(1)
+    slots.busy = 1  # the one slot is taken and nobody may queue
+    with pytest.raises(Overloaded):
+        await formats.ensure(head, slots, 10, now=True, ticket=_ticket(INTERACTIVE))
+    assert built == []
+    slots.busy = 0
+    assert await formats.ensure(head, slots, 10, ticket=_ticket(INTERACTIVE)) is not None
+    assert built == [formats.name_for(head)] and slots.busy == 0
+
+
+async def test_lock_registry_only_holds_keys_in_use():
+    locks, order = admission.LockRegistry(), []
+
+    async def work(key: str, name: str):
+        async with locks.hold(key, _ticket(INTERACTIVE)):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(work("a", "a1"), work("a", "a2"), *(work(f"k{i}", "k") for i in range(50)))
+    assert order.index("a1") < order.index("a2")
+    assert len(locks) == 0
+
+    async def stuck():
+        async with locks.hold("a"):
+            await asyncio.sleep(0.2)
+
+    held = asyncio.create_task(stuck())
+    await asyncio.sleep(0.01)
+    with pytest.raises(Overloaded):
+        async with locks.hold("a", _ticket(INTERACTIVE, timeout_s=0.05)):
+            pass
+    await held
+    assert len(locks) == 0
+
+
+async def test_overloaded_compile_answers_503(client, monkeypatch):
+    from latexc import app as svc
+
+    from .conftest import compile_body, probe_source
+
+    monkeypatch.setenv("LATEXC_MAX_QUEUE", "0")
+    slots = admission.TexSlots(1)
+    slots.busy = 1  # the one slot is taken
+    monkeypatch.setattr(svc, "_tex", slots)
+    r = await client.post("/v1/compile", json=compile_body("busy", probe_source()))
+    assert r.status_code == 503
+    assert int(r.headers["retry-after"]) >= 1
+    status = (await client.get("/v1/status")).json()
+    assert status["tex_busy"] == 1 and status["tex_queued"] == 0
@@ -1,4 +1,5 @@
 import asyncio
+import os
 
 from .conftest import compile_body, probe_source
 
@@ -10,7 +11,7 @@ async def test_lru_eviction_beyond_project_cap(client, monkeypatch, tmp_path):
         assert r.json()["ok"]
         await asyncio.sleep(0.05)  # distinct mtimes for LRU order
     root = tmp_path / "compiles"
-    live = sorted(d.name for d in root.iterdir() if d.is_dir())
+    live = sorted(d.name for d in root.iterdir() if d.is_dir() and not d.name.startswith("."))
     assert len(live) == 2
     assert "evict-0" not in live, "oldest project should have been evicted"
     assert "evict-2" in live, "the dir just used must never be evicted"
@@ -39,3 +40,126 @@ async def test_aux_state_persists_between_compiles(client, tmp_path):
     r = await client.post("/v1/compile", json=changed)
     assert r.json()["cache"] == "warm"
     assert list(pdir.glob("*.fdb_latexmk")), "fdb must survive recompiles"
+
+
+async def test_size_index_matches_disk_and_status_reads_it(client, tmp_path):
+    from latexc import cache
+
+    for doc in ("size-a", "size-b"):
+        r = await client.post("/v1/compile", json=compile_body(doc, probe_source()))
+        assert r.json()["ok"]
+    root = tmp_path / "compiles"
+
+    def projects_on_disk() -> int:
+        return sum(cache.dir_size_bytes(d) for d in root.iterdir() if not d.name.startswith("."))
+
+    outputs_mb = (projects_on_disk() + cache.dir_size_bytes(root / ".outputs")) / (1024 * 1024)
+    assert cache.stats() == (2, round(outputs_mb, 1))
+    assert cache._size_index().total == projects_on_disk()
+
+    await client.delete("/v1/project/size-a")
+    assert cache.stats()[0] == 1
+    assert cache._size_index().total == projects_on_disk()
+
+    # a failed compile's leftovers are counted too
+    bad = probe_source().replace(r"\begin{document}", "\\begin{document}\n\\errmessage{boom}")
+    await client.post("/v1/compile", json=compile_body("size-bad", bad))
+    assert cache.stats()[0] == 2
+    assert cache._size_index().total == projects_on_disk()
+
+
+def test_eviction_walks_only_the_recorded_project(tmp_path, monkeypatch):
+    from latexc import cache
+
+    monkeypatch.setenv("COMPILE_ROOT", str(tmp_path / "compiles"))
+    monkeypatch.setenv("LATEXC_MAX_PROJECTS", "2")
+    root = cache.compile_root()
+    for i in range(4):
+        d = root / f"p{i}"
+        d.mkdir()
+        (d / "main.pdf").write_bytes(b"x" * 1000)
+        os.utime(d, (i, i))  # p0 oldest on disk
+    cache.rebuild_index()
+
+    walks = []
+    real = cache.dir_size_bytes
+    monkeypatch.setattr(cache, "dir_size_bytes", lambda p: walks.append(p) or real(p))
+    cache.touch(root / "p0")  # a hit makes p0 the most recent
+    cache.record(root / "p3")
+    assert cache.evict(keep=root / "p3") == 2
+    assert sorted(d.name for d in root.iterdir()) == ["p0", "p3"]
+    assert walks == [root / "p3"]
+    assert cache.stats()[0] == 2
+
+
+async def test_outputs_are_shared_across_docs_and_versions(client):
+    edited = probe_source() + "\n% edited\n"
+    first = (await client.post("/v1/compile", json=compile_body("share-a", probe_source()))).json()
+    assert first["ok"]
+    assert (await client.post("/v1/compile", json=compile_body("share-a", edited))).json()["cache"] == "warm"
+
+    # undo: the previous version is still stored
+    undo = (await client.post("/v1/compile", json=compile_body("share-a", probe_source()))).json()
+    assert undo["cache"] == "hit" and undo["pdf_b64"] == first["pdf_b64"]
+    # another doc with the same source never runs TeX, and starts cold after
+    other = (await client.post("/v1/compile", json=compile_body("share-b", probe_source()))).json()
+    assert other["cache"] == "hit" and other["svgs"] == first["svgs"]
+    changed = (await client.post("/v1/compile", json=compile_body("share-b", edited + "%b\n"))).json()
+    assert changed["cache"] == "cold"
+
+
+async def test_hit_without_svgs_reads_no_pages(client, monkeypatch):
+    from latexc import outputs
+
+    first = (await client.post("/v1/compile", json=compile_body("nosvg", probe_source()))).json()
+    assert first["ok"]
+    reads = []
+    real = outputs._Store.read
+    monkeypatch.setattr(outputs._Store, "read", lambda self, d: reads.append(d) or real(self, d))
+    out = (await client.post("/v1/compile", json=compile_body("nosvg", probe_source(), want_svgs=False))).json()
+    assert out["cache"] == "hit" and out["svgs"] == []
+    assert len(reads) == 1, "only the PDF blob"
+
+
+def test_output_budget_evicts_lru_entries_and_unshared_blobs(tmp_path, monkeypatch):
+    from latexc import outputs
+
+    monkeypatch.setenv("LATEXC_OUTPUT_CACHE_MB", "0")
+    store = outputs.store(tmp_path)
+    store.put("k1", 1, b"%PDF-1", ["<svg>shared</svg>"], {})
+    store.put("k2", 1, b"%PDF-2", ["<svg>shared</svg>"], {})
+    assert list(store.entries) == ["k2"], "everything but the entry just stored goes"
+    blobs = sorted(p.name for p in (tmp_path / outputs.DIR_NAME / "blobs").glob("*/*"))
+    assert blobs == sorted(store.refs) and len(blobs) == 2
+    outputs.rebuild(tmp_path)
+    assert list(outputs.store(tmp_path).entries) == ["k2"]
+
+
+def test_output_store_survives_bad_and_vanished_entries(tmp_path):
+    from latexc import outputs
+
+    store = outputs.store(tmp_path)
+    store.put("k1", 1, b"%PDF-1", ["<svg>1</svg>"], {})
+    entries = tmp_path / outputs.DIR_NAME / "entries"
+    (entries / "nokey.json").write_text('{"pages": 1}', encoding="utf-8")
+    outputs.rebuild(tmp_path)  # a keyless entry must not stop startup
+    store = outputs.store(tmp_path)
+    assert list(store.entries) == ["k1"] and not (entries / "nokey.json").exists()
+
+    # pruned behind the index: a miss that compiles fresh, not a 500
+    for path in entries.glob("*.json"):
+        path.unlink()
+    assert store.get("k1") is None
+    assert store.entries == {} and store.refs == {}
+
+
+def test_previous_svgs_skips_entries_whose_digests_do_not_line_up(tmp_path, monkeypatch):
+    from latexc import cache
+
+    monkeypatch.setenv("COMPILE_ROOT", str(tmp_path / "compiles"))
+    pdir = cache.compile_root() / "doc"
+    pdir.mkdir()
+    cache.store(pdir, "k1", 2, b"%PDF", ["<svg>1</svg>", "<svg>2</svg>"], {"page_digests": ["d1"]})
+    assert cache.previous_svgs(pdir, ["d1"]) == {}
+    cache.store(pdir, "k2", 1, b"%PDF", ["<svg>1</svg>"], {"page_digests": ["d1"]})
+    assert cache.previous_svgs(pdir, ["d1"]) == {"d1": "<svg>1</svg>"}
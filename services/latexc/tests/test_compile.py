@@ -31,20 +31,26 @@ async def test_compile_probe_cold_then_hit_then_warm(client):
     assert out3["pdf_b64"] != out["pdf_b64"]
 
 
-async def test_fill_probe_line_lands_in_log(client):
-    # tex_onyx appends this AtEndDocument probe; the backend fit loop parses
-    # CVGFILL:<pagetotal>/<pagegoal> from log_tail. Pin that the log actually
-    # carries it end to end through latexmk.
+async def test_fill_probe_and_overfull_come_back_as_fields(client):
+    # tex_onyx appends this AtEndDocument probe; latexc parses
+    # CVGFILL:<pagetotal>/<pagegoal> from the log, so a success needs no log.
     probed = probe_source().replace(
         r"\begin{document}",
         "\\AtEndDocument{\\typeout{CVGFILL:\\the\\pagetotal/\\the\\pagegoal}}\n\\begin{document}",
-    )
+    ).replace(r"\end{document}", "\\hbox to 2cm{\\hskip 5cm}\n\\end{document}")
     r = await client.post("/v1/compile", json=compile_body("doc-fill", probed))
     out = r.json()
-    assert out["ok"], out.get("error_line") or out.get("log_tail")
-    m = re.search(r"CVGFILL:([0-9.]+)pt/([0-9.]+)pt", out["log_tail"])
-    assert m, "probe line missing from log tail"
-    assert float(m.group(2)) > 0
+    assert out["ok"], out.get("error_line")
+    assert out["probe"][1] > 0 and 0 < out["fill"] <= 1
+    assert out["overfull"] >= 1 and out["overfull_pt"] > 0
+    assert out["log_tail"] == ""
+
+    r = await client.post("/v1/compile", json=compile_body("doc-fill", probed + "%\n", want_log=True))
+    out = r.json()
+    assert re.search(r"CVGFILL:([0-9.]+)pt/([0-9.]+)pt", out["log_tail"])
+
+    hit = (await client.post("/v1/compile", json=compile_body("doc-fill", probed))).json()
+    assert hit["cache"] == "hit" and hit["overfull"] >= 1 and hit["fill"] is not None
 
 
 async def test_compile_error_reports_line(client):
@@ -68,8 +74,9 @@ async def test_status_endpoint(client):
     r = await client.get("/v1/status")
     assert r.status_code == 200
     s = r.json()
-    assert s["ok"] and s["version"] == "1"
+    assert s["ok"] and s["version"] == "2"
     assert s["projects"] >= 1 and s["disk_mb"] >= 0
+    assert s["warm_projects"][0] == "doc-status"
 
 
 async def test_clear_project(client):
@@ -97,3 +104,175 @@ async def test_multifile_and_stale_file_removal(client, tmp_path):
     body2 = compile_body("doc-multi", main)
     r = await client.post("/v1/compile", json=body2)
     assert not r.json()["ok"]
+
+
+async def test_hash_only_files_sync_by_delta(client, tmp_path):
+    import hashlib
+
+    main = probe_source().replace(r"\end{document}", "\\input{extra.tex}\n\\end{document}")
+    extra = "Extra content line.\n"
+    digest = hashlib.sha256(extra.encode()).hexdigest()
+    body = compile_body("doc-delta", main)
+    body["files"].append({"path": "extra.tex", "content_b64": b64(extra)})
+    r = await client.post("/v1/compile", json=body)
+    assert r.json()["ok"] and r.json()["version"] == "2"
+    extra_path = tmp_path / "compiles" / "doc-delta" / "extra.tex"
+    mtime = extra_path.stat().st_mtime_ns
+
+    # main changed, extra sent by hash only: warm, and extra.tex not rewritten
+    body = compile_body("doc-delta", main.replace("Warm boot probe", "Delta probe"))
+    body["files"].append({"path": "extra.tex", "sha256": digest})
+    r = await client.post("/v1/compile", json=body)
+    assert r.json()["ok"] and r.json()["cache"] == "warm", r.json().get("log_tail")
+    assert extra_path.stat().st_mtime_ns == mtime
+
+    # a project that never saw the file asks for it
+    body["doc_id"] = "doc-delta-new"
+    body["files"][0]["content_b64"] = b64(main.replace("Warm boot probe", "Fresh probe"))
+    r = await client.post("/v1/compile", json=body)
+    assert r.status_code == 409
+    assert r.json()["detail"]["missing"] == ["extra.tex"]
+
+
+async def test_compile_stream_sends_status_pages_then_done(client):
+    import json
+
+    src = _pages_source("Page one.", "Page two.", "Page three.")
+    body = compile_body("doc-stream", src, want_pdf=False)
+    for expected_cache in ("cold", "hit"):
+        async with client.stream("POST", "/v1/compile/stream", json=body) as r:
+            assert r.status_code == 200
+            frames = [json.loads(line) async for line in r.aiter_lines() if line]
+        assert frames[0]["kind"] == "status" and frames[0]["status"]["pages"] == 3
+        assert frames[0]["status"].get("cache", "cold") == expected_cache
+        assert sorted(f["page"] for f in frames if f["kind"] == "page") == [1, 2, 3]
+        assert frames[-1]["kind"] == "done"
+        assert not any(f["kind"] == "pdf" for f in frames)
+
+    r = await client.post("/v1/compile/stream", json={
+        "doc_id": "doc-stream-new", "files": [{"path": "main.tex", "sha256": "0" * 64}],
+    })
+    assert r.status_code == 409
+
+
+async def test_measure_only_reports_pages_and_probe_without_outputs(client):
+    probed = probe_source().replace(
+        r"\begin{document}",
+        "\\AtEndDocument{\\typeout{CVGFILL:\\the\\pagetotal/\\the\\pagegoal}}\n\\begin{document}",
+    )
+    r = await client.post("/v1/compile", json=compile_body("doc-measure", probed, measure_only=True))
+    out = r.json()
+    assert out["ok"], out.get("error_line") or out.get("log_tail")
+    assert out["pages"] == 1 and out["probe"] and out["probe"][1] > 0
+    assert out["pdf_b64"] is None and out["svgs"] == [] and out["log_tail"] == ""
+    assert "convert" not in out["timings_ms"]
+
+    # nothing was cached: the same content compiled in full is not a hit
+    r = await client.post("/v1/compile", json=compile_body("doc-measure", probed))
+    full = r.json()
+    assert full["cache"] == "warm" and full["svgs"]
+    assert full["probe"] == out["probe"]
+
+
+def test_log_pages_reads_the_output_line():
+    from latexc.runner import log_pages
+
+    assert log_pages("...\nOutput written on main.pdf (2 pages).\n") == 2
+    assert log_pages("Output written on main.pdf (1 page).") == 1
+    assert log_pages("No pages of output.") is None
+
+
+def test_log_overfull_counts_box_warnings():
+    from latexc.runner import log_overfull
+
+    log = (
+        "Overfull \\hbox (12.5pt too wide) in paragraph at lines 3--4\n"
+        "Underfull \\hbox (badness 10000) in paragraph\n"
+        "Overfull \\vbox (3.0pt too high) has occurred while \\output is active\n"
+    )
+    assert log_overfull(log) == (2, 12.5)
+    assert log_overfull("clean") == (0, 0.0)
+
+
+def test_log_tail_reads_from_the_end(tmp_path):
+    from latexc.runner import LOG_TAIL_BYTES, log_tail
+
+    (tmp_path / "main.log").write_bytes(b"x" * LOG_TAIL_BYTES + b"END")
+    tail = log_tail(tmp_path, "main.tex", "fallback")
+    assert len(tail) == LOG_TAIL_BYTES and tail.endswith("END")
+    assert log_tail(tmp_path, "other.tex", "fallback") == "fallback"
+
+
+def _pages_source(*pages: str) -> str:
+    return probe_source().replace(
+        r"\end{document}", "\n\\newpage\n".join(pages) + "\n\\end{document}"
+    )
+
+
+async def test_recompile_converts_only_changed_pages(client, monkeypatch):
+    from latexc import runner
+
+    converted: list[int] = []
+    real_run = runner._run
+
+    async def counting_run(cmd, cwd, env, timeout_s):
+        if cmd[0] == "pdftocairo":
+            converted.append(int(cmd[3]))
+        return await real_run(cmd, cwd, env, timeout_s)
+
+    monkeypatch.setattr(runner, "_run", counting_run)
+
+    r = await client.post("/v1/compile", json=compile_body("doc-pages", _pages_source("One", "Two", "Three")))
+    out = r.json()
+    assert out["ok"], out.get("error_line") or out.get("log_tail")
+    assert out["pages"] == 3 and sorted(converted) == [1, 2, 3]
+    assert {"digest", "convert"} <= set(out["timings_ms"])
+
+    converted.clear()
+    r = await client.post("/v1/compile", json=compile_body("doc-pages", _pages_source("One", "Two", "Changed")))
+    out2 = r.json()
+    assert out2["ok"] and out2["cache"] == "warm"
+    assert converted == [3], "only the edited page is reconverted"
+    assert out2["svgs"][:2] == out["svgs"][:2] and out2["svgs"][2] != out["svgs"][2]
+
+
+async def test_new_doc_reads_the_shared_tex_cache(client, tmp_path):
+    from latexc import runner
+
+    assert runner.tex_cache_ready(), "the image bakes LATEXC_TEX_CACHE"
+    r = await client.post("/v1/compile", json=compile_body("lean", probe_source()))
+    assert r.json()["ok"]
+    names = {p.name for p in (tmp_path / "compiles" / "lean").iterdir()}
+    assert not names & {".texmf-var", ".texmf-cfg", ".cache"}, "font/TEXMF caches are shared"
+    assert not any(n.endswith(".svg") for n in names), "SVGs live in the output store"
+
+
+async def test_repeated_header_compiles_on_a_precompiled_format(client, tmp_path):
+    from latexc import formats
+
+    head = formats.header(probe_source())
+    fmt = tmp_path / "compiles" / ".formats" / f"{formats.name_for(head)}.fmt"
+    first = (await client.post("/v1/compile", json=compile_body("fmt-a", probe_source()))).json()
+    assert first["ok"] and not fmt.exists(), "a first sighting does not dump"
+
+    # same header, different body and doc: dumped now, then loaded
+    body = probe_source().replace("Warm boot probe.", "Second body.")
+    out = (await client.post("/v1/compile", json=compile_body("fmt-b", body))).json()
+    assert out["ok"], out.get("log_tail")
+    assert fmt.exists()
+    assert f"format={fmt.stem}" in out["log_tail"]
+
+
+async def test_header_that_will_not_dump_falls_back(client, tmp_path):
+    from latexc import formats
+
+    # XeTeX cannot dump a loaded OpenType font
+    source = probe_source()
+    font = "\\setmainfont{IBM Plex Sans}\n"
+    broken = source.replace(font, "").replace(formats.MARKER, font + formats.MARKER)
+    for doc in ("nofmt-a", "nofmt-b"):
+        out = (await client.post("/v1/compile", json=compile_body(doc, broken + f"% {doc}\n"))).json()
+        assert out["ok"], out.get("log_tail")
+    name = formats.name_for(formats.header(broken))
+    assert (tmp_path / "compiles" / ".formats" / f"{name}.failed").exists()
+    assert not (tmp_path / "compiles" / ".formats" / f"{name}.fmt").exists()
@@ -0,0 +1,84 @@
+import base64
+
+from .conftest import b64, probe_source
+
+_LADDER = {"densities": ["normal", "tight"], "fill_min": 0.88, "fill_target": 0.95,
+           "min_scale": 0.9, "max_scale": 1.5, "downscale_step": 0.04}
+# Body size and margin per density; the size follows the font scale.
+_TOKENS = {
+    "normal": {"@MX@": (2.0, 0.0), "@BASE@": (0.0, 10.0)},
+    "tight": {"@MX@": (1.5, 0.0), "@BASE@": (0.0, 9.0)},
+}
+
+
+def _template(paragraphs: int) -> str:
+    body = "\n\n".join(
+        "Warm boot probe paragraph with enough words to wrap across the line. " * 4
+        for _ in range(paragraphs)
+    )
+    return (
+        probe_source()
+        .replace("a4paper,margin=2cm", "@PAPER@,margin=@MX@cm")
+        .replace(r"\pagestyle{empty}",
+                 "\\pagestyle{empty}\n\\AtBeginDocument{\\fontsize{@BASE@pt}{1.3em}\\selectfont}\n"
+                 "\\AtEndDocument{\\typeout{CVGFILL:\\the\\pagetotal/\\the\\pagegoal}}")
+        .replace(r"\end{document}", body + "\n\\end{document}")
+    )
+
+
+def fit_body(doc_id: str, paragraphs: int, **over) -> dict:
+    body = {
+        "doc_id": doc_id,
+        "template_b64": b64(_template(paragraphs)),
+        "tokens": _TOKENS,
+        "ladder": _LADDER,
+    }
+    body.update(over)
+    return body
+
+
+async def test_fit_sparse_page_scales_up_and_serves_only_the_result(client):
+    r = await client.post("/v1/fit", json=fit_body("fit-sparse", 2))
+    assert r.status_code == 200, r.text
+    out = r.json()
+    assert out["ok"], out.get("error_line") or out.get("log_tail")
+    assert out["pages"] == 1 and out["density"] == "normal"
+    assert out["font_scale"] > 1.0, "a sparse page grows its type"
+    assert len(out["attempts"]) >= 2 and out["attempts"][0]["font_scale"] == 1.0
+    assert len(out["svgs"]) == 1
+    assert base64.b64decode(out["pdf_b64"]).startswith(b"%PDF")
+
+    # identical spec: served from the cache with the same landing rung
+    again = (await client.post("/v1/fit", json=fit_body("fit-sparse", 2))).json()
+    assert again["cache"] == "hit"
+    assert (again["density"], again["font_scale"]) == (out["density"], out["font_scale"])
+    assert again["pdf_b64"] == out["pdf_b64"]
+
+
+async def test_fit_overflow_tightens_density(client):
+    out = (await client.post("/v1/fit", json=fit_body("fit-long", 60))).json()
+    assert out["ok"], out.get("error_line") or out.get("log_tail")
+    assert out["attempts"][0]["pages"] > 1
+    assert out["density"] == "tight"
+    assert out["overflowed"] == (out["pages"] > 1)
+
+
+async def test_fit_continuous_trims_to_content(client):
+    body = fit_body(
+        "fit-cont", 3, mode="continuous",
+        canvas_paper="paperwidth=21cm,paperheight=500cm",
+        trimmed_paper="paperwidth=21cm,paperheight=@HEIGHT@pt",
+        trim_extra_pt=2 * 2.0 * 28.3465 + 12,
+    )
+    out = (await client.post("/v1/fit", json=body)).json()
+    assert out["ok"], out.get("error_line") or out.get("log_tail")
+    assert out["pages"] == 1 and len(out["attempts"]) == 2
+    assert 100 < out["page_height_pt"] < 842
+    assert "@HEIGHT@" not in out["attempts"][1]["paper"]
+
+
+async def test_fit_rejects_unknown_density_and_bad_template(client):
+    r = await client.post("/v1/fit", json=fit_body("fit-bad", 1, density="xtight"))
+    assert r.status_code == 422
+    r = await client.post("/v1/fit", json={**fit_body("fit-bad", 1), "template_b64": "%%%"})
+    assert r.status_code == 422
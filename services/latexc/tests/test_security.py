@@ -55,3 +55,31 @@ async def test_oversize_rejected(client):
     body = {"doc_id": "d-big", "files": [{"path": "main.tex", "content_b64": b64(big)}]}
     r = await client.post("/v1/compile", json=body)
     assert r.status_code == 422
+
+
+async def test_header_dump_is_hardened(client, tmp_path):
+    from latexc import formats
+
+    # the dump (second sighting) runs the header's own TeX: no shell escape,
+    # and no \openout beside the other formats
+    src = probe_source().replace(
+        formats.MARKER,
+        "\\immediate\\write18{touch pwned.txt}\n"
+        "\\newwrite\\evil\\immediate\\openout\\evil=planted.tex\n"
+        "\\immediate\\write\\evil{x}\\immediate\\closeout\\evil\n" + formats.MARKER,
+    )
+    for doc in ("d-fmt-a", "d-fmt-b"):
+        await client.post("/v1/compile", json=compile_body(doc, src + f"% {doc}\n"))
+    root = tmp_path / "compiles"
+    assert not list(root.rglob("pwned.txt")), "shell escape executed in the format dump"
+    fdir = root / ".formats"
+    assert not (fdir / "planted.tex").exists(), "the dump wrote into the shared formats dir"
+    assert not [p for p in fdir.iterdir() if p.name.startswith(".build-")]
+
+
+def test_document_text_does_not_reject_a_format():
+    from latexc import runner
+
+    assert not runner.format_unusable("! Package x Error: format file.\n")
+    assert runner.format_unusable("---! ./pre-0123.fmt was written by pdftex\n")
+    assert runner.format_unusable("I can't find the format file `pre-0123.fmt'!\n")